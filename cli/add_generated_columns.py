@@ -0,0 +1,59 @@
+import sys
+
+from datastore.shared.di import injector
+from datastore.shared.postgresql_backend import ConnectionHandler
+from datastore.writer.app import register_services
+
+
+# table -> name of the column holding the id of the model and the indexes on the columns
+TABLES = {
+    "events": (
+        "model_id",
+        {
+            "event_collection_model_id_idx": "collection, model_id",
+            "event_collection_position_idx": "collection, position",
+        },
+    ),
+    "migration_events": (
+        "model_id",
+        {
+            "migration_events_collection_model_id_idx": "collection, model_id",
+            "migration_events_collection_position_idx": "collection, position",
+        },
+    ),
+    "models": ("id", {"models_collection_id_idx": "collection, id"}),
+}
+
+
+def main(args: list[str] = []):
+    """
+    Usage: python add_generated_columns.py
+    Adds the generated `collection` and id columns to existing databases and creates the
+    indexes on them ahead of the next start of the writer. Each table is rewritten once
+    under an exclusive lock, so the writer and the reader must be stopped while this is
+    executed.
+    """
+    register_services()
+    connection: ConnectionHandler = injector.get(ConnectionHandler)
+
+    for table, (id_column, indexes) in TABLES.items():
+        with connection.get_connection_context():
+            connection.execute(
+                f"""
+                ALTER TABLE {table}
+                ADD COLUMN IF NOT EXISTS collection VARCHAR(32)
+                    GENERATED ALWAYS AS (split_part(fqid, '/', 1)) STORED,
+                ADD COLUMN IF NOT EXISTS {id_column} INTEGER
+                    GENERATED ALWAYS AS (split_part(fqid, '/', 2)::integer) STORED
+                """,
+                [],
+            )
+            for index, columns in indexes.items():
+                connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({columns})", []
+                )
+        print(f"Added generated columns to {table}.")
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,5 +1,4 @@
-import json
-from typing import Any, cast
+import sys
 
 from datastore.reader.core import GetEverythingRequest, Reader
 from datastore.reader.services import register_services
@@ -9,7 +8,13 @@ from datastore.shared.services.environment_service import (
     DATASTORE_DEV_MODE_ENVIRONMENT_VAR,
     EnvironmentService,
 )
-from datastore.shared.util import strip_reserved_fields
+from datastore.shared.util import stream_json, strip_reserved_fields
+
+
+def strip_meta_fields(models):
+    for collection, id, model in models:
+        strip_reserved_fields(model)
+        yield collection, id, model
 
 
 def main():
@@ -19,17 +24,18 @@ def main():
     read_database: ReadDatabase = injector.get(ReadDatabase)
 
     env_service.set(DATASTORE_DEV_MODE_ENVIRONMENT_VAR, "1")
+    # the models are written while they are fetched, so the memory usage does not
+    # depend on the size of the datastore
     with reader.get_database_context():
-        response = reader.get_everything(GetEverythingRequest())
         migration_index = read_database.get_current_migration_index()
-
-    # strip meta fields
-    for models in response.values():
-        for model in models.values():
-            strip_reserved_fields(model)
-
-    response["_migration_index"] = cast(Any, migration_index)
-    print(json.dumps(response))
+        models = reader.get_everything_stream(GetEverythingRequest())
+        for chunk in stream_json(
+            strip_meta_fields(models),
+            trailing={"_migration_index": migration_index},
+            separators=(", ", ": "),
+        ):
+            sys.stdout.write(chunk)
+    sys.stdout.write("\n")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,53 @@
+import sys
+from textwrap import dedent
+
+from datastore.shared.di import injector
+from datastore.shared.postgresql_backend import ConnectionHandler
+from datastore.writer.app import register_services
+
+
+def main(args: list[str] = []):
+    """
+    Usage: python fill_modified_fields.py [batch_size=1000]
+    Fills the `modified_fields` column of all events from the `events_to_collectionfields` table
+    and empties the latter afterwards. The events are processed in batches of the given amount
+    of positions. Must be executed while the writer is stopped, before switching
+    DATASTORE_MODIFIED_FIELDS_LAYOUT to `array`.
+    """
+    register_services()
+    connection: ConnectionHandler = injector.get(ConnectionHandler)
+
+    batch_size = int(args[1]) if len(args) > 1 else 1000
+    with connection.get_connection_context():
+        max_position = (
+            connection.query_single_value("SELECT max(position) FROM positions", [])
+            or 0
+        )
+    for from_position in range(0, max_position, batch_size):
+        with connection.get_connection_context():
+            connection.execute(
+                dedent(
+                    """\
+                    UPDATE events e SET modified_fields = f.fields FROM (
+                        SELECT ecf.event_id, array_agg(split_part(cf.collectionfield, '/', 2)) AS fields
+                        FROM events_to_collectionfields ecf
+                            INNER JOIN collectionfields cf ON ecf.collectionfield_id = cf.id
+                            INNER JOIN events ev ON ecf.event_id = ev.id
+                        WHERE ev.position > %s AND ev.position <= %s
+                        GROUP BY ecf.event_id
+                    ) f
+                    WHERE e.id = f.event_id
+                    """
+                ),
+                [from_position, from_position + batch_size],
+            )
+        print(
+            f"Filled positions up to {min(from_position + batch_size, max_position)}."
+        )
+    with connection.get_connection_context():
+        connection.execute("DELETE FROM events_to_collectionfields", [])
+    print("Filled modified fields.")
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
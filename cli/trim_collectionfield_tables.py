@@ -4,17 +4,24 @@ from textwrap import dedent
 
 from datastore.shared.di import injector
 from datastore.shared.postgresql_backend import ConnectionHandler
+from datastore.shared.services import EnvironmentService
 from datastore.writer.app import register_services
+from datastore.writer.postgresql_backend.modified_fields_layout import (
+    MODIFIED_FIELDS_LAYOUT,
+    get_modified_fields_layout,
+)
 
 
 def main(args: list[str] = []):
     """
     Usage: python trim_collectionfield_tables.py [days=1]
     Trims all collectionfield tables by deleting all entries which are older than the given amount
-    of days (which may be a floating point number).
+    of days (which may be a floating point number). With the `array` layout of the modified fields,
+    only the collectionfields table has to be trimmed.
     """
     register_services()
     connection: ConnectionHandler = injector.get(ConnectionHandler)
+    layout = get_modified_fields_layout(injector.get(EnvironmentService))
 
     delta = float(args[1]) if len(args) > 1 else 2
     threshold = datetime.now() - timedelta(days=delta)
@@ -30,17 +37,18 @@ def main(args: list[str] = []):
             ),
             [threshold],
         )
-        # delete events_to_collectionfields from events older than <delta> days
-        connection.execute(
-            dedent(
-                """\
-                DELETE FROM events_to_collectionfields ecf
-                    USING events e, positions p
-                WHERE ecf.event_id = e.id AND e.position = p.position AND p.timestamp < %s
-                """
-            ),
-            [threshold],
-        )
+        if layout == MODIFIED_FIELDS_LAYOUT.TABLE:
+            # delete events_to_collectionfields from events older than <delta> days
+            connection.execute(
+                dedent(
+                    """\
+                    DELETE FROM events_to_collectionfields ecf
+                        USING events e, positions p
+                    WHERE ecf.event_id = e.id AND e.position = p.position AND p.timestamp < %s
+                    """
+                ),
+                [threshold],
+            )
     print("Trimmed collectionfield tables.")
 
 
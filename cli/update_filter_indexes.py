@@ -0,0 +1,25 @@
+import sys
+
+from datastore.shared.di import injector
+from datastore.shared.postgresql_backend import ConnectionHandler, FilterIndexRegistry
+from datastore.writer.app import register_services
+
+
+def main(args: list[str] = []):
+    """
+    Usage: python update_filter_indexes.py
+    Creates the filter indexes configured via DATASTORE_FILTER_INDEXES and drops the ones
+    which are not configured anymore. The indexes are built concurrently, so this can be
+    run while the datastore is in use.
+    """
+    register_services()
+    connection: ConnectionHandler = injector.get(ConnectionHandler)
+    registry: FilterIndexRegistry = injector.get(FilterIndexRegistry)
+
+    with connection.get_connection_context(autocommit=True):
+        created, dropped = registry.update_indexes()
+    print(f"Created {len(created)} and dropped {len(dropped)} filter indexes.")
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,6 +1,7 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 from datastore.migrations.core.migration_reader import MigrationReader
+from datastore.shared.typing import JSON
 from datastore.writer.core import BaseRequestEvent
 
 from .base_migration import BaseMigration
@@ -10,11 +11,47 @@ class BaseModelMigration(BaseMigration):
     """The base class to represent a model migration."""
 
     reader: MigrationReader
+    shard: Optional[JSON] = None
 
     def migrate(self, reader: MigrationReader) -> Optional[List[BaseRequestEvent]]:
+        shards = self.get_shards(reader)
+        if shards is None:
+            return self.migrate_models()
+
+        events: List[BaseRequestEvent] = []
+        for shard in shards:
+            events.extend(self.migrate_shard(reader, shard) or [])
+        return events
+
+    def get_shards(self, reader: MigrationReader) -> Optional[List[JSON]]:
+        self.reader = reader
+        self.shard = None
+        return self.shard_models()
+
+    def migrate_shard(
+        self, reader: MigrationReader, shard: JSON
+    ) -> Optional[List[BaseRequestEvent]]:
         self.reader = reader
+        self.shard = shard
         return self.migrate_models()
 
+    def __getstate__(self) -> Dict[str, Any]:
+        # the reader is bound to this process, so it is not sent to the workers
+        state = self.__dict__.copy()
+        state.pop("reader", None)
+        return state
+
+    def shard_models(self) -> Optional[List[JSON]]:
+        """
+        Can be overwritten to split the migration into independent shards, e.g. one per
+        meeting. `migrate_models` is then called once for each shard with `self.shard`
+        set to it and must only read and change the models of this shard. The shards
+        can be migrated in parallel by other processes (see `DATASTORE_MIGRATION_WORKERS`),
+        so the migration class must be defined at the module level. Returns None, if the
+        migration is not sharded.
+        """
+        return None
+
     def migrate_models(self) -> Optional[List[BaseRequestEvent]]:
         """
         Migrates the models. The current models can be accessed via self.database. Should return
@@ -1,10 +1,12 @@
+from collections import defaultdict
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from datastore.shared.di import service_as_factory
 from datastore.shared.postgresql_backend import ConnectionHandler
-from datastore.shared.services import ReadDatabase
+from datastore.shared.services import EnvironmentService, ReadDatabase
 from datastore.shared.typing import JSON, Position
 
 from ..base_migrations import PositionData
@@ -19,6 +21,11 @@ from ..migration_logger import MigrationLogger
 from .migrater import EventMigrater
 
 
+# the amount of positions which are migrated in one transaction
+MIGRATION_BATCH_SIZE_ENVIRONMENT_VAR = "DATASTORE_MIGRATION_BATCH_SIZE"
+DEFAULT_MIGRATION_BATCH_SIZE = 1000
+
+
 @dataclass
 class RawPosition:
     position: Position
@@ -40,30 +47,12 @@ class RawPosition:
 class EventMigraterImplementation(EventMigrater):
     read_database: ReadDatabase
     connection: ConnectionHandler
+    environment: EnvironmentService
     logger: MigrationLogger
 
     def migrate(self) -> None:
-        # TODO: paginate and use "client-side cursor". We cannot use a server-side cursor since
-        # currently the implementation of self.connection does nto allow nested transactions (=contexts)
         with self.connection.get_connection_context():
-            min_position_1 = self.connection.query_single_value(
-                "select min(position) from positions where migration_index<%s",
-                [self.target_migration_index],
-            )
-            min_position_2 = self.connection.query_single_value(
-                "select min(position) from migration_positions where migration_index<%s",
-                [self.target_migration_index],
-            )
-            if min_position_2 is None:
-                min_position_2 = self.connection.query_single_value(
-                    """select min(position) from positions where position >
-                    (select max(position) from migration_positions)""",
-                    [],
-                )
-            if min_position_2 is not None:
-                min_position = max(min_position_1, min_position_2)
-            else:
-                min_position = min_position_1
+            min_position = self.get_min_position()
 
             min_mi_positions = (
                 self.connection.query_single_value(
@@ -78,10 +67,6 @@ class EventMigraterImplementation(EventMigrater):
                 or 1
             )
 
-            positions = self.connection.query(
-                "select * from positions where position >= %s order by position asc",
-                [min_position],
-            )
             _last_position = self.connection.query(
                 "select * from positions where position < %s order by position desc limit 1",
                 [min_position],
@@ -102,37 +87,171 @@ class EventMigraterImplementation(EventMigrater):
                 + f"{min_mi_migration_positions}"
             )
 
-        for _position in positions:
-            position = RawPosition(**_position)
+        if min_position is None:
+            return
 
+        batch_size = self.get_batch_size()
+        next_position = min_position
+        while True:
+            error: Optional[Exception] = None
+            # Each batch is migrated in one transaction. The migration index of each
+            # position is stored in `migration_positions`, so an aborted migration
+            # continues after the last committed position.
             with self.connection.get_connection_context():
-                last_position_value = (
-                    0 if last_position is None else last_position.position
-                )
-                migration_index = self.get_migration_index(position)
-
-                # sanity check: Do not have raising migration indices
-                if (
-                    last_position is not None
-                    and last_migration_index is not None
-                    and migration_index > last_migration_index
-                ):
-                    raise MismatchingMigrationIndicesException(
-                        f"Position {position.position} has a higher migration index as it's predecessor "
-                        + f"(position {last_position.position})"
+                positions = [
+                    RawPosition(**row)
+                    for row in self.connection.query(
+                        "select * from positions where position >= %s order by position asc limit %s",
+                        [next_position, batch_size],
+                    )
+                ]
+                if not positions:
+                    break
+
+                migration_indices = self.get_migration_indices(positions)
+                events = self.get_first_events(positions, migration_indices)
+                for position in positions:
+                    migration_index = migration_indices[position.position]
+
+                    # sanity check: Do not have raising migration indices
+                    if (
+                        last_position is not None
+                        and last_migration_index is not None
+                        and migration_index > last_migration_index
+                    ):
+                        error = MismatchingMigrationIndicesException(
+                            f"Position {position.position} has a higher migration index as it's predecessor "
+                            + f"(position {last_position.position})"
+                        )
+                        break
+
+                    last_position_value = (
+                        0 if last_position is None else last_position.position
                     )
+                    # Commit the already migrated positions of this batch, if this one
+                    # fails.
+                    try:
+                        with self.savepoint():
+                            self.migrate_position(
+                                position,
+                                migration_index,
+                                last_position_value,
+                                events.get(position.position, []),
+                            )
+                    except Exception as e:
+                        error = e
+                        break
+                    last_position = position
+                    last_migration_index = migration_index
+
+            if error is not None:
+                raise error
+            self.logger.debug(f"Migrated all positions up to {positions[-1].position}")
+            if len(positions) < batch_size:
+                break
+            next_position = positions[-1].position + 1
+
+    def get_min_position(self) -> Optional[Position]:
+        """Returns the first position, which is not yet migrated."""
+        min_position_1 = self.connection.query_single_value(
+            "select min(position) from positions where migration_index<%s",
+            [self.target_migration_index],
+        )
+        min_position_2 = self.connection.query_single_value(
+            "select min(position) from migration_positions where migration_index<%s",
+            [self.target_migration_index],
+        )
+        if min_position_2 is None:
+            min_position_2 = self.connection.query_single_value(
+                """select min(position) from positions where position >
+                (select max(position) from migration_positions)""",
+                [],
+            )
+        if min_position_2 is not None and min_position_1 is not None:
+            return max(min_position_1, min_position_2)
+        return min_position_1
 
-                self.migrate_position(position, migration_index, last_position_value)
-                last_position = position
-                last_migration_index = migration_index
+    def get_batch_size(self) -> int:
+        return max(
+            int(
+                self.environment.try_get(MIGRATION_BATCH_SIZE_ENVIRONMENT_VAR)
+                or DEFAULT_MIGRATION_BATCH_SIZE
+            ),
+            1,
+        )
+
+    @contextmanager
+    def savepoint(self) -> Iterator[None]:
+        self.connection.execute("savepoint migrate_position", [])
+        try:
+            yield
+        except Exception:
+            self.connection.execute("rollback to savepoint migrate_position", [])
+            raise
+        self.connection.execute("release savepoint migrate_position", [])
+
+    def get_migration_indices(
+        self, positions: List[RawPosition]
+    ) -> Dict[Position, int]:
+        """Returns the current migration index of all given positions at once."""
+        migrated = {
+            row["position"]: row["migration_index"]
+            for row in self.connection.query(
+                "select position, migration_index from migration_positions where position between %s and %s",
+                [positions[0].position, positions[-1].position],
+            )
+        }
+        return {
+            position.position: migrated.get(position.position)
+            or position.migration_index
+            for position in positions
+        }
+
+    def get_first_events(
+        self, positions: List[RawPosition], migration_indices: Dict[Position, int]
+    ) -> Dict[Position, List[BaseEvent]]:
+        """
+        Returns the events, which are the input of the first migration of each position.
+        If a position was not migrated yet, these are the original events, else the
+        events of the last migration.
+        """
+        from_events: List[Position] = []
+        from_migration_events: List[Position] = []
+        for position in positions:
+            migration_index = migration_indices[position.position]
+            if migration_index >= self.target_migration_index:
+                continue
+            elif migration_index == position.migration_index:
+                from_events.append(position.position)
+            else:
+                from_migration_events.append(position.position)
+
+        events: Dict[Position, List[BaseEvent]] = defaultdict(list)
+        for table, _positions in (
+            ("events", from_events),
+            ("migration_events", from_migration_events),
+        ):
+            if not _positions:
+                continue
+            rows = self.connection.query(
+                f"""select position, id, fqid, type, data from {table}
+                where position in %s order by position asc, weight asc""",
+                [tuple(_positions)],
+            )
+            for row in rows:
+                events[row["position"]].append(to_event(row))
+        return events
 
     def migrate_position(
-        self, position: RawPosition, migration_index: int, last_position_value: int
+        self,
+        position: RawPosition,
+        migration_index: int,
+        last_position_value: int,
+        old_events: List[BaseEvent],
     ) -> None:
         self.logger.info(
             f"Position {position.position} from MI {migration_index} to MI {self.target_migration_index} ..."
         )
-        events_from_migration_table = migration_index != position.migration_index
         for (
             source_migration_index,
             target_migration_index,
@@ -149,19 +268,16 @@ class EventMigraterImplementation(EventMigrater):
                 is_last_migration_index,
             )
 
-            if events_from_migration_table:
+            if source_migration_index != migration_index:
+                # after the first migration use the migration table
                 _old_events = self.connection.query(
                     "select id, fqid, type, data from migration_events where position=%s order by weight asc",
                     [position.position],
                 )
-            else:
-                _old_events = self.connection.query(
-                    "select id, fqid, type, data from events where position=%s order by weight asc",
-                    [position.position],
-                )
-                # after the first event use the migration table
-                events_from_migration_table = True
-            old_events = [to_event(row) for row in _old_events]
+                old_events = [to_event(row) for row in _old_events]
+            fqids = {event.fqid for event in old_events}
+            old_accessor.prefetch_models(fqids)
+            new_accessor.prefetch_models(fqids)
             try:
                 new_events = migration.migrate(
                     old_events, old_accessor, new_accessor, position.to_position_data()
@@ -237,27 +353,33 @@ class EventMigraterImplementation(EventMigrater):
         """
         Performs a diff: Update (overwrite) existing events for this position. Delete
         all events, that there are too many, create new events, if there are more new
-        events than old events.
+        events than old events. Each of these steps is done with one statement.
         """
 
         old_event_ids = self.connection.query_list_of_single_values(
-            "select id from migration_events where position=%s", [position]
+            "select id from migration_events where position=%s order by weight asc",
+            [position],
         )
+        rows = [
+            (
+                self.connection.to_json(new_event.get_data()),
+                new_event.fqid,
+                new_event.type,
+                weight,
+            )
+            for weight, new_event in enumerate(new_events, start=1)
+        ]
 
         # simple overwrite the old events with the new ones and delete old
         # events, if there are less new events.
-        for i in range(min(len(old_event_ids), len(new_events))):
-            # update event old_event_ids[i] to new_events[i] and set weight to i+1
-            statement = "update migration_events set fqid=%s, type=%s, data=%s, weight=%s where id=%s"
-            new_event = new_events[i]
-            arguments = [
-                new_event.fqid,
-                new_event.type,
-                self.connection.to_json(new_event.get_data()),
-                i + 1,
-                old_event_ids[i],
-            ]
-            self.connection.execute(statement, arguments)
+        if updated := list(zip(old_event_ids, rows)):
+            self.connection.execute(
+                """update migration_events as e set data=v.data::jsonb, fqid=v.fqid,
+                type=v.type::event_type, weight=v.weight
+                from (values %s) as v (id, data, fqid, type, weight) where e.id=v.id""",
+                [(id, *row) for id, row in updated],
+                use_execute_values=True,
+            )
 
         if len(old_event_ids) > len(new_events):
             # delete all ids from old_event_ids[len(new_events):] in the database
@@ -267,18 +389,8 @@ class EventMigraterImplementation(EventMigrater):
 
         if len(new_events) > len(old_event_ids):
             # There are new events, that must be created.
-            # TODO: This can be a single insert statement.
-            for i in range(len(old_event_ids), len(new_events)):
-                # create new event for this position and set weight to i+1
-                statement = """
-                    insert into migration_events (position, fqid, type, data, weight)
-                    values (%s, %s, %s, %s, %s)"""
-                new_event = new_events[i]
-                arguments = [
-                    position,
-                    new_event.fqid,
-                    new_event.type,
-                    self.connection.to_json(new_event.get_data()),
-                    i + 1,
-                ]
-                self.connection.execute(statement, arguments)
+            self.connection.execute(
+                "insert into migration_events (position, data, fqid, type, weight) values %s",
+                [(position, *row) for row in rows[len(old_event_ids) :]],
+                use_execute_values=True,
+            )
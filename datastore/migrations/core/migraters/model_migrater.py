@@ -1,19 +1,46 @@
+import multiprocessing
+from concurrent.futures import FIRST_EXCEPTION, Future, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional
+
+from datastore.migrations.core.base_migrations import BaseModelMigration
 from datastore.migrations.core.migration_reader import MigrationReader
-from datastore.shared.di import service_as_factory
+from datastore.shared.di import injector, service_as_factory
 from datastore.shared.postgresql_backend import ConnectionHandler
-from datastore.shared.services import ReadDatabase
-from datastore.writer.core import Database
+from datastore.shared.services import EnvironmentService, ReadDatabase
+from datastore.shared.typing import JSON
+from datastore.writer.core import BaseRequestEvent, Database
 
 from ..migration_logger import MigrationLogger
 from .migrater import ModelMigrater
 
 
+# the amount of processes which migrate the shards of a model migration in parallel
+MIGRATION_WORKERS_ENVIRONMENT_VAR = "DATASTORE_MIGRATION_WORKERS"
+
+
+def init_worker() -> None:
+    from ..setup import register_services
+
+    register_services()
+
+
+def migrate_shard(
+    migration: BaseModelMigration, shard: JSON
+) -> Optional[List[BaseRequestEvent]]:
+    """Migrates one shard in a worker process with its own connection."""
+    connection = injector.get(ConnectionHandler)
+    reader = injector.get(MigrationReader)
+    with connection.get_connection_context():
+        return migration.migrate_shard(reader, shard)
+
+
 @service_as_factory
 class ModelMigraterImplementation(ModelMigrater):
     reader: MigrationReader
     read_database: ReadDatabase
     write_database: Database
     connection: ConnectionHandler
+    environment: EnvironmentService
     logger: MigrationLogger
 
     def migrate(self) -> None:
@@ -22,12 +49,66 @@ class ModelMigraterImplementation(ModelMigrater):
         self.logger.info(
             f"Migrating models from MI {current_migration_index} to MI {self.target_migration_index} ..."
         )
+        workers = self.get_workers()
         for _, target_migration_index, migration in self.get_migrations(
             current_migration_index
         ):
-            with self.connection.get_connection_context():
-                events = migration.migrate(self.reader)
-                if events:
-                    self.write_database.insert_events(
-                        events, target_migration_index, None, 0
+            shards = None
+            if workers > 1:
+                with self.connection.get_connection_context():
+                    shards = migration.get_shards(self.reader)
+
+            if shards:
+                events = self.migrate_shards(migration, shards, workers)
+                with self.connection.get_connection_context():
+                    self.write_events(events, target_migration_index)
+            else:
+                with self.connection.get_connection_context():
+                    self.write_events(
+                        migration.migrate(self.reader), target_migration_index
                     )
+
+    def get_workers(self) -> int:
+        return int(self.environment.try_get(MIGRATION_WORKERS_ENVIRONMENT_VAR) or 1)
+
+    def migrate_shards(
+        self, migration: BaseModelMigration, shards: List[JSON], workers: int
+    ) -> List[BaseRequestEvent]:
+        """
+        Migrates the shards in parallel. The events of all shards are returned in the
+        order of the shards, so that they can be written in one transaction.
+        """
+        self.logger.info(
+            f"Migrating {len(shards)} shards with {min(workers, len(shards))} workers ..."
+        )
+        results: Dict[int, List[BaseRequestEvent]] = {}
+        # spawn the workers, so that they do not share the connections of this process
+        with ProcessPoolExecutor(
+            min(workers, len(shards)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+        ) as executor:
+            futures: Dict[Future, int] = {
+                executor.submit(migrate_shard, migration, shard): index
+                for index, shard in enumerate(shards)
+            }
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_EXCEPTION)
+                for future in done:
+                    if future.exception() is not None:
+                        executor.shutdown(cancel_futures=True)
+                        raise future.exception()  # type: ignore
+                    index = futures[future]
+                    results[index] = future.result() or []
+                    self.logger.info(
+                        f"Migrated shard {shards[index]} ({len(results)}/{len(shards)}): "
+                        + f"{len(results[index])} events"
+                    )
+        return [event for index in sorted(results) for event in results[index]]
+
+    def write_events(
+        self, events: Optional[List[BaseRequestEvent]], target_migration_index: int
+    ) -> None:
+        if events:
+            self.write_database.insert_events(events, target_migration_index, None, 0)
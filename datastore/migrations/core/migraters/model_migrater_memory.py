@@ -5,6 +5,7 @@ from datastore.migrations.core.migration_reader import (
     MigrationReaderImplementationMemory,
 )
 from datastore.shared.di import service_as_factory
+from datastore.shared.postgresql_backend import CollectionIndexedModels
 from datastore.shared.typing import Fqid, Model
 from datastore.writer.postgresql_backend import EventTranslator, apply_event_to_models
 
@@ -29,6 +30,8 @@ class ModelMigraterImplementationMemory(_ModelMigraterImplementationMemory):
     reader: MigrationReaderImplementationMemory
 
     def migrate(self) -> None:
+        # the migrations usually read whole collections, so the models are indexed
+        self.models = CollectionIndexedModels(self.models)
         self.reader.models = self.models
 
         self.logger.info(
@@ -13,8 +13,9 @@ from datastore.shared.di import service_as_factory, service_interface
 from datastore.shared.postgresql_backend import ConnectionHandler
 from datastore.shared.services import ReadDatabase
 from datastore.shared.typing import Fqid, Model
-from datastore.shared.util import KEYSEPARATOR, InvalidDatastoreState
+from datastore.shared.util import InvalidDatastoreState
 from datastore.shared.util.key_strings import META_DELETED, strip_reserved_fields
+from datastore.writer.core import Messaging
 
 from .base_migrations.base_migration import BaseMigration
 from .exceptions import MigrationSetupException, MismatchingMigrationIndicesException
@@ -77,6 +78,7 @@ class MigrationHandlerImplementation(MigrationHandler):
     event_migrater: EventMigrater
     model_migrater: ModelMigrater
     logger: MigrationLogger
+    messaging: Messaging
     target_migration_index: int
     last_event_migration_target_index: int
 
@@ -282,16 +284,26 @@ class MigrationHandlerImplementation(MigrationHandler):
                 self.connection.execute(
                     "alter table events_swap rename to migration_events", []
                 )
+                # the snapshots were built from the old events, so the counting of the
+                # events since the last snapshot starts anew
+                self.connection.execute("delete from model_snapshots", [])
+                self.connection.execute(
+                    "update models set events_since_snapshot=0 where events_since_snapshot>0",
+                    [],
+                )
             with self.connection.get_connection_context():
                 self._update_migration_index(self.last_event_migration_target_index)
 
             self._clean_migration_data()
+            # the models were rebuilt, so the caches of the readers are outdated
+            self.messaging.handle_reset()
 
         if self.last_event_migration_target_index < self.target_migration_index:
             self.model_migrater.migrate()
             self.delete_collectionfield_aux_tables()
             with self.connection.get_connection_context():
                 self._update_migration_index()
+            self.messaging.handle_reset()
             self.logger.info("Done.")
 
     def reset(self) -> None:
@@ -360,11 +372,9 @@ class MigrationHandlerImplementation(MigrationHandler):
         self.connection.execute(
             """\
             insert into id_sequences (collection, id)
-            select split_part(fqid, %s, 1) as collection,
-            max((split_part(fqid, %s, 2))::int) + 1 as id
-            from models group by split_part(fqid, %s, 1)
+            select collection, max(id) + 1 as id from models group by collection
             """,
-            [KEYSEPARATOR] * 3,
+            [],
         )
 
     def get_stats(self) -> Dict[str, Any]:  # pragma: no cover
@@ -1,8 +1,12 @@
 from collections import defaultdict
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Set, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
-from datastore.shared.postgresql_backend import ConnectionHandler, apply_fields
+from datastore.shared.postgresql_backend import (
+    ConnectionHandler,
+    apply_fields,
+    copy_json,
+)
 from datastore.shared.typing import Collection, Fqid, Id, Model, Position
 from datastore.shared.util import (
     KEYSEPARATOR,
@@ -92,6 +96,12 @@ class MigrationKeyframeAccessor:
             raise MigrationKeyframeModelDoesNotExist()
         return (model.data, model.deleted)
 
+    def prefetch_models(self, fqids: Iterable[Fqid]) -> None:
+        """
+        Loads the given models at once, so that accessing them later on does not need
+        a query for each model.
+        """
+
     def model_exists(self, fqid: Fqid) -> bool:
         """regardless of the deleted-state"""
         return self._fetch_model(fqid) is not None
@@ -291,9 +301,10 @@ class InitialMigrationKeyframeModifier(MigrationKeyframeModifier):
 
 class DatabaseMigrationKeyframeModifier(MigrationKeyframeModifier):
     """
-    This class represents a keyframe in the database. If `persistence` is False,
-    all changes are applied in-memory and `move_to_next_position` is not available.
-    Otherwise, the changes are applied to the database.
+    This class represents a keyframe in the database. All accessed models are cached
+    and all changes are applied in-memory. If `persistent` is True, the changed models
+    are written to the database at once in `move_to_next_position`. Otherwise,
+    `move_to_next_position` is not available.
     """
 
     def __init__(
@@ -309,9 +320,9 @@ class DatabaseMigrationKeyframeModifier(MigrationKeyframeModifier):
 
         super().__init__(connection, position, migration_index, next_position)
         self.persistent = persistent
-        self.model_store: Dict[Fqid, RawKeyframeModel] = {}
-        self.created_collection_ids: Dict[Collection, Set[Id]] = defaultdict(set)
-        self.deleted_collection_ids: Dict[Collection, Set[Id]] = defaultdict(set)
+        # None marks models which do not exist in this keyframe
+        self.model_cache: Dict[Fqid, Optional[RawKeyframeModel]] = {}
+        self.modified_fqids: Set[Fqid] = set()
         self.keyframe_id: int = self.get_keyframe_id(
             connection, position, migration_index
         )
@@ -330,61 +341,77 @@ class DatabaseMigrationKeyframeModifier(MigrationKeyframeModifier):
 
     def get_all_ids_for_collection(self, collection: Collection) -> Set[Id]:
         fqids = self.connection.query_list_of_single_values(
-            "select fqid from migration_keyframe_models where keyframe_id=%s and fqid like %s",
+            "select fqid from migration_keyframe_models where keyframe_id=%s and fqid like %s and not deleted",
             [self.keyframe_id, collection + KEYSEPARATOR + "%"],
         )
-        ids = set(id_from_fqid(fqid) for fqid in fqids)
-        ids = (
-            ids | self.created_collection_ids[collection]
-        ) - self.deleted_collection_ids[collection]
+        # the modified models are not written yet, so their state takes precedence
+        ids = set(
+            id_from_fqid(fqid) for fqid in fqids if fqid not in self.modified_fqids
+        )
+        prefix = collection + KEYSEPARATOR
+        for fqid in self.modified_fqids:
+            model = self.model_cache[fqid]
+            if fqid.startswith(prefix) and model is not None and not model.deleted:
+                ids.add(id_from_fqid(fqid))
         return ids
 
-    def _fetch_model(self, fqid: Fqid) -> Optional[RawKeyframeModel]:
-        if not self.persistent:
-            model = self.model_store.get(fqid)
-            if model is not None:
-                return model
+    def prefetch_models(self, fqids: Iterable[Fqid]) -> None:
+        missing_fqids = tuple(set(fqids) - self.model_cache.keys())
+        if not missing_fqids:
+            return
 
         result = self.connection.query(
-            "select data, deleted from migration_keyframe_models where keyframe_id=%s and fqid=%s",
-            [self.keyframe_id, fqid],
+            "select fqid, data, deleted from migration_keyframe_models where keyframe_id=%s and fqid in %s",
+            [self.keyframe_id, missing_fqids],
         )
-        if not result:
+        for fqid in missing_fqids:
+            self.model_cache[fqid] = None
+        for row in result:
+            self.model_cache[row["fqid"]] = RawKeyframeModel(
+                data=row["data"], deleted=row["deleted"]
+            )
+
+    def _fetch_model(self, fqid: Fqid) -> Optional[RawKeyframeModel]:
+        self.prefetch_models((fqid,))
+        model = self.model_cache[fqid]
+        if model is None:
             return None
-        return RawKeyframeModel(**result[0])
+        # the cached model must not be changed by the caller
+        return RawKeyframeModel(data=copy_json(model.data), deleted=model.deleted)
 
     def _create_model(self, fqid: Fqid, model: Model) -> None:
-        if self.persistent:
-            self.connection.execute(
-                "insert into migration_keyframe_models (keyframe_id, fqid, data, deleted) values (%s, %s, %s, %s)",
-                [self.keyframe_id, fqid, self.connection.to_json(model), False],
-            )
-        else:
-            self.model_store[fqid] = RawKeyframeModel(data=model, deleted=False)
-            collection, id = collection_and_id_from_fqid(fqid)
-            self.created_collection_ids[collection].add(id)
-            self.deleted_collection_ids[collection].discard(id)
+        # the model must not be changed by the caller afterwards
+        self.model_cache[fqid] = RawKeyframeModel(data=copy_json(model), deleted=False)
+        self.modified_fqids.add(fqid)
 
     def _update_model(self, fqid: Fqid, model: RawKeyframeModel) -> None:
-        if self.persistent:
-            self.connection.execute(
-                "update migration_keyframe_models set data=%s, deleted=%s where keyframe_id=%s and fqid=%s",
-                [
-                    self.connection.to_json(model.data),
-                    model.deleted,
+        self.model_cache[fqid] = model
+        self.modified_fqids.add(fqid)
+
+    def write_modified_models(self) -> None:
+        """Writes all created and updated models to the database with one statement."""
+        if not self.modified_fqids:
+            return
+
+        arguments: List[Tuple[int, Fqid, Any, bool]] = []
+        for fqid in sorted(self.modified_fqids):
+            model = self.model_cache[fqid]
+            assert model is not None
+            arguments.append(
+                (
                     self.keyframe_id,
                     fqid,
-                ],
+                    self.connection.to_json(model.data),
+                    model.deleted,
+                )
             )
-        else:
-            self.model_store[fqid] = model
-            collection, id = collection_and_id_from_fqid(fqid)
-            if model.deleted:
-                self.created_collection_ids[collection].discard(id)
-                self.deleted_collection_ids[collection].add(id)
-            else:
-                self.created_collection_ids[collection].add(id)
-                self.deleted_collection_ids[collection].discard(id)
+        self.connection.execute(
+            """insert into migration_keyframe_models (keyframe_id, fqid, data, deleted) values %s
+            on conflict (keyframe_id, fqid) do update set data=excluded.data, deleted=excluded.deleted""",
+            arguments,
+            use_execute_values=True,
+        )
+        self.modified_fqids.clear()
 
     def move_to_next_position(self) -> None:
         if not self.persistent:
@@ -399,7 +426,8 @@ class DatabaseMigrationKeyframeModifier(MigrationKeyframeModifier):
             )
             return
 
-        # Else: Modify the position of this keyframe
+        # Else: Write the changes and modify the position of this keyframe
+        self.write_modified_models()
         self.connection.execute(
             "update migration_keyframes set position=%s where id=%s",
             [new_position, self.keyframe_id],
@@ -12,10 +12,14 @@ from datastore.reader.core import (
 )
 from datastore.reader.core.requests import GetManyRequestPart
 from datastore.shared.di import service_as_factory, service_interface
-from datastore.shared.postgresql_backend import filter_models
+from datastore.shared.postgresql_backend import (
+    filter_models,
+    iter_collection,
+    iter_filtered_models,
+)
 from datastore.shared.services.read_database import HistoryInformation, ReadDatabase
 from datastore.shared.typing import Collection, Field, Fqid, Id, Model, Position
-from datastore.shared.util import ModelDoesNotExist, collection_from_fqid
+from datastore.shared.util import ModelDoesNotExist
 from datastore.shared.util.filter import Filter
 from datastore.shared.util.key_transforms import fqid_from_collection_and_id
 
@@ -167,8 +171,7 @@ class MigrationReaderImplementationMemory(MigrationReader):
     ) -> Dict[Id, Model]:
         return {
             model["id"]: self._deep_copy_dict(model, mapped_fields)
-            for fqid, model in self.models.items()
-            if collection_from_fqid(fqid) == collection
+            for _, model in iter_collection(self.models, collection)
         }
 
     def filter(
@@ -177,10 +180,10 @@ class MigrationReaderImplementationMemory(MigrationReader):
         return filter_models(self.models, collection, filter, mapped_fields)
 
     def exists(self, collection: Collection, filter: Filter) -> bool:
-        return self.count(collection, filter) > 0
+        return any(True for _ in iter_filtered_models(self.models, collection, filter))
 
     def count(self, collection: Collection, filter: Filter) -> int:
-        return len(self.filter(collection, filter))
+        return sum(1 for _ in iter_filtered_models(self.models, collection, filter))
 
     def min(
         self, collection: Collection, filter: Filter, field: Field
@@ -201,7 +204,7 @@ class MigrationReaderImplementationMemory(MigrationReader):
     ) -> Optional[int]:
         values = [
             model[field]
-            for model in self.filter(collection, filter).values()
+            for model in iter_filtered_models(self.models, collection, filter)
             if field in model
         ]
         if values:
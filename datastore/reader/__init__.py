@@ -3,5 +3,7 @@ from . import core, flask_frontend
 
 def setup_di():
     from .core import setup_di as core_setup_di
+    from .redis_backend import setup_di as redis_setup_di
 
+    redis_setup_di()
     core_setup_di()
@@ -1,6 +1,10 @@
-from .reader import Reader
+from .model_cache import ModelCache, ModelCacheStats
+from .reader import BatchResult, Reader
 from .requests import (
     AggregateRequest,
+    BatchRequest,
+    BatchRequestPart,
+    ExplainRequest,
     FilterRequest,
     GetAllRequest,
     GetEverythingRequest,
@@ -15,6 +19,8 @@ from .requests import (
 def setup_di():
     from datastore.shared.di import injector
 
+    from .model_cache_service import ModelCacheService
     from .reader_service import ReaderService
 
+    injector.register(ModelCache, ModelCacheService)
     injector.register(Reader, ReaderService)
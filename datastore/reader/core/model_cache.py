@@ -0,0 +1,66 @@
+from typing import Dict, List, Protocol, Tuple, TypedDict
+
+from datastore.shared.di import service_interface
+from datastore.shared.typing import Fqid, Model, Position
+
+
+class ModelCacheStats(TypedDict):
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    entries: int
+    size: int
+
+
+@service_interface
+class ModelCache(Protocol):
+    """
+    In-process cache for the current state of whole models. Entries are keyed by
+    fqid and tagged with their meta_position. The cache is kept up to date by
+    listening to the ModifiedFields and ModelsReset streams of the writer.
+    """
+
+    def is_active(self) -> bool:
+        """
+        Returns whether the cache may currently be used. If the cache is enabled,
+        this makes sure that the invalidation listener is running. The cache is
+        inactive while the listener is not connected to the message bus.
+        """
+
+    def get_token(self) -> int:
+        """
+        Returns a token which has to be obtained before the database is queried for
+        the models which are later passed to `put_many`.
+        """
+
+    def get_many(self, fqids: List[Fqid]) -> Tuple[Dict[Fqid, Model], List[Fqid]]:
+        """
+        Returns all cached models (including deleted ones) and the list of fqids
+        which were not found in the cache. The returned models may be modified by
+        the caller.
+        """
+
+    def put_many(self, models: Dict[Fqid, Model], token: int) -> None:
+        """
+        Puts the given whole models into the cache. Models which were invalidated
+        since the token was obtained are discarded.
+        """
+
+    def get_position(self) -> Position:
+        """
+        Returns the position of the newest write whose invalidations were applied to
+        the cache, as given by the last received ModifiedFields message.
+        """
+
+    def invalidate(self, positions: Dict[Fqid, Position]) -> None:
+        """
+        Removes the given fqids from the cache if the cached model is older than the
+        given position. A position of 0 always removes the model.
+        """
+
+    def clear(self) -> None:
+        """Removes all entries and discards all pending `put_many` calls."""
+
+    def get_stats(self) -> ModelCacheStats:
+        """Returns the counters of the cache."""
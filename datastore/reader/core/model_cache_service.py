@@ -0,0 +1,255 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from datastore.reader.redis_backend.connection_handler import ConnectionHandler
+from datastore.shared.di import service_as_singleton
+from datastore.shared.redis_backend import MODELS_RESET_TOPIC, MODIFIED_FIELDS_TOPIC
+from datastore.shared.services import EnvironmentService, ShutdownService
+from datastore.shared.typing import Fqid, Model, Position
+from datastore.shared.util import (
+    KEYSEPARATOR,
+    META_POSITION,
+    fqid_from_fqfield,
+    json_dumps,
+    json_loads,
+    logger,
+)
+
+from .model_cache import ModelCacheStats
+
+
+class ENVIRONMENT_VARIABLES:
+    ENABLED = "DATASTORE_MODEL_CACHE_ENABLED"
+    MAX_ENTRIES = "DATASTORE_MODEL_CACHE_MAX_ENTRIES"
+    MAX_SIZE = "DATASTORE_MODEL_CACHE_MAX_SIZE"
+
+
+# how long the listener waits for new messages in one call, in ms
+LISTENER_BLOCK_TIMEOUT = 1000
+# how long the listener waits before reconnecting after an error, in sec
+LISTENER_RETRY_TIMEOUT = 5
+
+
+class CacheEntry(NamedTuple):
+    position: Position
+    data: str
+
+
+@service_as_singleton
+class ModelCacheService:
+    """
+    LRU cache bounded by the number of entries and the summed size of the serialized
+    models. The models are stored as JSON strings so that every caller gets its own
+    copy without having to deepcopy the model.
+
+    To prevent caching stale models, every put is guarded by a token: The invalidation
+    generation at the time the database was queried. If a model was invalidated after
+    that, the database result may be outdated and is not cached. This relies on each
+    database query seeing all data committed before the query started, which is
+    guaranteed by the default isolation level (READ COMMITTED).
+
+    Since the invalidations arrive asynchronously, a model may be returned in its
+    previous state shortly after a write. The position of the newest write whose
+    invalidations were applied is tracked to make this delay observable. If all models
+    may have changed (see MODELS_RESET_TOPIC), the cache is cleared.
+    """
+
+    environment: EnvironmentService
+    shutdown_service: ShutdownService
+    connection: ConnectionHandler
+
+    def __init__(self, shutdown_service: ShutdownService):
+        shutdown_service.register(self)
+        self.enabled = self.environment.is_truthy(
+            self.environment.try_get(ENVIRONMENT_VARIABLES.ENABLED)
+        )
+        self.max_entries = int(
+            self.environment.try_get(ENVIRONMENT_VARIABLES.MAX_ENTRIES) or 10000
+        )
+        # given in MB
+        self.max_size = int(
+            float(self.environment.try_get(ENVIRONMENT_VARIABLES.MAX_SIZE) or 64)
+            * 1024
+            * 1024
+        )
+
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[Fqid, CacheEntry] = OrderedDict()
+        self.size = 0
+
+        # generation of the last invalidation per fqid. Only the most recent ones
+        # are remembered; puts with tokens older than the last forgotten generation
+        # are discarded.
+        self.generation = 0
+        self.invalidated_at: OrderedDict[Fqid, int] = OrderedDict()
+        self.forgotten_generation = 0
+        # position of the newest write whose invalidations were applied
+        self.position: Position = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self.active = False
+        self.listener: Optional[threading.Thread] = None
+        self.process_id: Optional[int] = None
+        self.stop_event = threading.Event()
+
+    def is_active(self) -> bool:
+        if not self.enabled:
+            return False
+        self.ensure_listener()
+        return self.active
+
+    def ensure_listener(self) -> None:
+        # after a fork, the listener thread is not running anymore
+        with self.lock:
+            if (
+                self.listener
+                and self.listener.is_alive()
+                and self.process_id == os.getpid()
+            ):
+                return
+            self.process_id = os.getpid()
+            self.active = False
+            self.stop_event.clear()
+            self.listener = threading.Thread(
+                target=self.listen, name="model-cache-listener", daemon=True
+            )
+            self.listener.start()
+
+    def listen(self) -> None:
+        last_ids: Optional[Dict[str, str]] = None
+        while not self.stop_event.is_set():
+            try:
+                if last_ids is None:
+                    entry = self.connection.get_last_entry(MODIFIED_FIELDS_TOPIC)
+                    reset_entry = self.connection.get_last_entry(MODELS_RESET_TOPIC)
+                    # messages may have been missed, so start from scratch
+                    self.clear()
+                    last_ids = {
+                        MODIFIED_FIELDS_TOPIC: entry[0] if entry else "0-0",
+                        MODELS_RESET_TOPIC: reset_entry[0] if reset_entry else "0-0",
+                    }
+                    if entry:
+                        self.position = self.get_max_position_from_message(entry[1])
+                    self.active = True
+                    logger.info("Model cache is listening for invalidations")
+                entries = self.connection.xread(last_ids, LISTENER_BLOCK_TIMEOUT)
+                for message_id, fields in entries.get(MODIFIED_FIELDS_TOPIC, []):
+                    self.invalidate(self.get_positions_from_message(fields))
+                    last_ids[MODIFIED_FIELDS_TOPIC] = message_id
+                if reset_entries := entries.get(MODELS_RESET_TOPIC):
+                    self.clear()
+                    last_ids[MODELS_RESET_TOPIC] = reset_entries[-1][0]
+            except Exception as e:
+                logger.error(f"Model cache listener failed, disabling cache: {e!r}")
+                self.active = False
+                self.clear()
+                self.connection.close()
+                last_ids = None
+                self.stop_event.wait(LISTENER_RETRY_TIMEOUT)
+
+    def get_positions_from_message(
+        self, fields: Dict[str, str]
+    ) -> Dict[Fqid, Position]:
+        positions: Dict[Fqid, Position] = {}
+        for fqfield, value in fields.items():
+            # ignore additional keys like the otel trace data
+            if fqfield.count(KEYSEPARATOR) != 2:
+                continue
+            fqid = fqid_from_fqfield(fqfield)
+            if fqfield.endswith(KEYSEPARATOR + META_POSITION):
+                positions[fqid] = int(value)
+            else:
+                positions.setdefault(fqid, 0)
+        return positions
+
+    def get_max_position_from_message(self, fields: Dict[str, str]) -> Position:
+        return max(self.get_positions_from_message(fields).values(), default=0)
+
+    def get_token(self) -> int:
+        return self.generation
+
+    def get_many(self, fqids: List[Fqid]) -> Tuple[Dict[Fqid, Model], List[Fqid]]:
+        found: Dict[Fqid, str] = {}
+        missing: List[Fqid] = []
+        with self.lock:
+            for fqid in fqids:
+                if (entry := self.entries.get(fqid)) is not None:
+                    self.entries.move_to_end(fqid)
+                    found[fqid] = entry.data
+                else:
+                    missing.append(fqid)
+            self.hits += len(found)
+            self.misses += len(missing)
+        return {fqid: json_loads(data) for fqid, data in found.items()}, missing
+
+    def put_many(self, models: Dict[Fqid, Model], token: int) -> None:
+        serialized = {fqid: json_dumps(model) for fqid, model in models.items()}
+        with self.lock:
+            if token < self.forgotten_generation:
+                return
+            for fqid, data in serialized.items():
+                if (
+                    self.invalidated_at.get(fqid, -1) > token
+                    or len(data) > self.max_size
+                ):
+                    continue
+                self.remove(fqid)
+                self.entries[fqid] = CacheEntry(
+                    models[fqid].get(META_POSITION, 0), data
+                )
+                self.size += len(data)
+            while len(self.entries) > self.max_entries or self.size > self.max_size:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def get_position(self) -> Position:
+        return self.position
+
+    def invalidate(self, positions: Dict[Fqid, Position]) -> None:
+        with self.lock:
+            self.generation += 1
+            self.position = max(self.position, *positions.values(), 0)
+            for fqid, position in positions.items():
+                self.invalidated_at[fqid] = self.generation
+                self.invalidated_at.move_to_end(fqid)
+                entry = self.entries.get(fqid)
+                if entry and (position == 0 or entry.position < position):
+                    self.remove(fqid)
+                    self.invalidations += 1
+            while len(self.invalidated_at) > self.max_entries:
+                _, generation = self.invalidated_at.popitem(last=False)
+                self.forgotten_generation = generation
+
+    def remove(self, fqid: Fqid) -> None:
+        if (entry := self.entries.pop(fqid, None)) is not None:
+            self.size -= len(entry.data)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            self.invalidated_at.clear()
+            self.position = 0
+            self.generation += 1
+            self.forgotten_generation = self.generation
+
+    def get_stats(self) -> ModelCacheStats:
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self.entries),
+                "size": self.size,
+            }
+
+    def shutdown(self) -> None:
+        self.enabled = False
+        self.stop_event.set()
@@ -1,11 +1,13 @@
-from typing import Any, ContextManager, Dict, List, Protocol, TypedDict
+from typing import Any, ContextManager, Dict, Iterator, List, Protocol, Tuple, TypedDict
 
 from datastore.shared.di import service_interface
-from datastore.shared.services import HistoryInformation
+from datastore.shared.services import HistoryInformation, QueryPlan
 from datastore.shared.typing import Collection, Fqid, Id, Model
 
 from .requests import (
     AggregateRequest,
+    BatchRequest,
+    ExplainRequest,
     FilterRequest,
     GetAllRequest,
     GetEverythingRequest,
@@ -41,6 +43,11 @@ class MaxResult(TypedDict):
     position: int
 
 
+class BatchResult(TypedDict):
+    results: List[Any]
+    position: int
+
+
 @service_interface
 class Reader(Protocol):
     """An abstract class for the reader. For more details, see the specs."""
@@ -60,6 +67,12 @@ class Reader(Protocol):
         of data, so use with caution.
         """
 
+    def get_all_stream(self, request: GetAllRequest) -> Iterator[Tuple[Id, Model]]:
+        """
+        Same as `get_all`, but yields the models one by one instead of loading all
+        of them into memory. Must be consumed inside the database context.
+        """
+
     def get_everything(
         self, request: GetEverythingRequest
     ) -> Dict[Collection, Dict[Id, Model]]:
@@ -68,6 +81,15 @@ class Reader(Protocol):
         lists of models.
         """
 
+    def get_everything_stream(
+        self, request: GetEverythingRequest
+    ) -> Iterator[Tuple[Collection, Id, Model]]:
+        """
+        Same as `get_everything`, but yields the models one by one instead of
+        loading all of them into memory. The models of one collection are yielded
+        consecutively. Must be consumed inside the database context.
+        """
+
     def filter(self, request: FilterRequest) -> FilterResult:
         """Returns all models that satisfy the filter condition."""
 
@@ -89,6 +111,20 @@ class Reader(Protocol):
         given filter.
         """
 
+    def batch(self, request: BatchRequest) -> BatchResult:
+        """
+        Executes multiple requests in one read-only transaction, so that all of them
+        see the same state of the datastore. Returns the results in the order of the
+        requests together with the position of this state. In contrast to the other
+        methods, it opens the database context itself.
+        """
+
+    def explain(self, request: ExplainRequest) -> QueryPlan:
+        """
+        Executes the query of the given filter, exists, count, min or max request
+        under `EXPLAIN ANALYZE` and returns its plan and duration.
+        """
+
     def history_information(
         self, request: HistoryInformationRequest
     ) -> Dict[Fqid, List[HistoryInformation]]:
@@ -1,7 +1,8 @@
 from collections import defaultdict
-from typing import Any, ContextManager, Dict, List, cast
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Tuple, cast
 
 from datastore.reader.core.reader import (
+    BatchResult,
     CountResult,
     ExistsResult,
     FilterResult,
@@ -10,14 +11,17 @@ from datastore.reader.core.reader import (
 )
 from datastore.shared.di import service_as_factory
 from datastore.shared.postgresql_backend import ConnectionHandler, retry_on_db_failure
-from datastore.shared.services import HistoryInformation, ReadDatabase
+from datastore.shared.services import HistoryInformation, QueryPlan, ReadDatabase
 from datastore.shared.services.read_database import (
     AggregateFilterQueryFieldsParameters,
     BaseAggregateFilterQueryFieldsParameters,
+    BaseFilterQueryFieldsParameters,
     CountFilterQueryFieldsParameters,
+    MappedFieldsFilterQueryFieldsParameters,
 )
-from datastore.shared.typing import Collection, Fqid, Id, Model
+from datastore.shared.typing import Collection, Fqid, Id, Model, Position
 from datastore.shared.util import (
+    META_DELETED,
     DeletedModelsBehaviour,
     Filter,
     MappedFields,
@@ -26,8 +30,11 @@ from datastore.shared.util import (
 from datastore.shared.util.key_transforms import collection_and_id_from_fqid
 from datastore.shared.util.otel import make_span
 
+from .model_cache import ModelCache
 from .requests import (
     AggregateRequest,
+    BatchRequest,
+    ExplainRequest,
     FilterRequest,
     GetAllRequest,
     GetEverythingRequest,
@@ -42,6 +49,10 @@ from .requests import (
 class ReaderService:
     connection: ConnectionHandler
     database: ReadDatabase
+    model_cache: ModelCache
+
+    # set while a batch request is executed
+    batch_position: Optional[Position] = None
 
     def get_database_context(self) -> ContextManager[None]:
         return self.database.get_context()
@@ -67,6 +78,17 @@ class ReaderService:
                         )
                 with make_span("apply mapped fields"):
                     model = self.apply_mapped_fields(model, request.mapped_fields)
+            elif self.use_model_cache():
+                with make_span("get from cache"):
+                    mapped_fields = request.build_mapped_fields()
+                    models = self.get_many_from_cache(
+                        mapped_fields, request.get_deleted_models
+                    )
+                    if request.fqid not in models:
+                        raise get_exception_for_deleted_models_behaviour(
+                            request.fqid, request.get_deleted_models
+                        )
+                    model = models[request.fqid]
             else:
                 with make_span("get from database"):
                     model = self.database.get(
@@ -95,6 +117,10 @@ class ReaderService:
                     result = self.apply_mapped_fields_multi(
                         result, mapped_fields.per_fqid
                     )
+                elif self.use_model_cache():
+                    result = self.get_many_from_cache(
+                        mapped_fields, request.get_deleted_models
+                    )
                 else:
                     result = self.database.get_many(
                         mapped_fields.fqids,
@@ -126,19 +152,31 @@ class ReaderService:
             )
         return models
 
+    def get_all_stream(self, request: GetAllRequest) -> Iterator[Tuple[Id, Model]]:
+        return self.database.get_all_stream(
+            request.collection,
+            MappedFields(request.mapped_fields),
+            request.get_deleted_models,
+        )
+
     @retry_on_db_failure
     def get_everything(
         self, request: GetEverythingRequest
     ) -> Dict[Collection, Dict[Id, Model]]:
         return self.database.get_everything(request.get_deleted_models)
 
+    def get_everything_stream(
+        self, request: GetEverythingRequest
+    ) -> Iterator[Tuple[Collection, Id, Model]]:
+        return self.database.get_everything_stream(request.get_deleted_models)
+
     @retry_on_db_failure
     def filter(self, request: FilterRequest) -> FilterResult:
         with make_span("filter request"):
             data = self.database.filter(
                 request.collection, request.filter, request.mapped_fields
             )
-            position = self.database.get_max_position()
+            position = self.get_max_position()
         return {
             "data": data,
             "position": position,
@@ -176,6 +214,76 @@ class ReaderService:
         result = self.database.aggregate(collection, filter, fields_params)
         return result
 
+    @retry_on_db_failure
+    def batch(self, request: BatchRequest) -> BatchResult:
+        # Opens its own transaction, so that a retry starts with a new one. The
+        # requests are not retried on their own.
+        with self.get_database_context():
+            # all requests have to see the same snapshot of the database
+            self.connection.execute(
+                "set transaction isolation level repeatable read, read only", []
+            )
+            position = self.batch_position = self.database.get_max_position()
+            try:
+                results = [
+                    getattr(self, part.route)(part.request) for part in request.requests
+                ]
+            finally:
+                self.batch_position = None
+        return {"results": results, "position": position}
+
+    @retry_on_db_failure
+    def explain(self, request: ExplainRequest) -> QueryPlan:
+        inner_request = request.request
+        fields_params: BaseFilterQueryFieldsParameters
+        if isinstance(inner_request, FilterRequest):
+            fields_params = MappedFieldsFilterQueryFieldsParameters(
+                inner_request.mapped_fields
+            )
+        elif isinstance(inner_request, MinMaxRequest):
+            fields_params = AggregateFilterQueryFieldsParameters(
+                request.route, inner_request.field, inner_request.type
+            )
+        else:
+            fields_params = CountFilterQueryFieldsParameters()
+        return self.database.explain_filter(
+            inner_request.collection, inner_request.filter, fields_params
+        )
+
+    def get_max_position(self) -> Position:
+        if self.batch_position is not None:
+            return self.batch_position
+        return self.database.get_max_position()
+
+    def use_model_cache(self) -> bool:
+        # the cache may contain newer models than the snapshot of a batch request
+        return self.batch_position is None and self.model_cache.is_active()
+
+    def get_many_from_cache(
+        self, mapped_fields: MappedFields, get_deleted_models: DeletedModelsBehaviour
+    ) -> Dict[Fqid, Model]:
+        """
+        Returns the requested models like ReadDatabase.get_many, but uses the model
+        cache. Missing models are fetched completely from the database and cached.
+        """
+        token = self.model_cache.get_token()
+        models, missing_fqids = self.model_cache.get_many(mapped_fields.fqids)
+        if missing_fqids:
+            db_models = self.database.get_many(
+                missing_fqids, MappedFields(), DeletedModelsBehaviour.ALL_MODELS
+            )
+            self.model_cache.put_many(db_models, token)
+            models.update(db_models)
+
+        if get_deleted_models != DeletedModelsBehaviour.ALL_MODELS:
+            only_deleted = get_deleted_models == DeletedModelsBehaviour.ONLY_DELETED
+            models = {
+                fqid: model
+                for fqid, model in models.items()
+                if bool(model.get(META_DELETED)) == only_deleted
+            }
+        return self.apply_mapped_fields_multi(models, mapped_fields.per_fqid)
+
     def filter_fqids_by_deleted_status(
         self,
         fqids: List[str],
@@ -82,11 +82,13 @@ class GetAllRequest(SelfValidatingDataclass):
     collection: Collection
     mapped_fields: List[Field] = field(default_factory=list)
     get_deleted_models: DeletedModelsBehaviour = DeletedModelsBehaviour.NO_DELETED
+    stream: bool = False
 
 
 @dataclass
 class GetEverythingRequest(SelfValidatingDataclass):
     get_deleted_models: DeletedModelsBehaviour = DeletedModelsBehaviour.NO_DELETED
+    stream: bool = False
 
 
 @dataclass
@@ -110,6 +112,30 @@ class MinMaxRequest(SelfValidatingDataclass):
     type: str = VALID_AGGREGATE_CAST_TARGETS[0]
 
 
+@dataclass
+class ExplainRequest:
+    route: str
+    request: Union[FilterRequest, AggregateRequest, MinMaxRequest]
+
+
 @dataclass
 class HistoryInformationRequest(SelfValidatingDataclass):
     fqids: List[Fqid]
+
+
+@dataclass
+class BatchRequestPart:
+    route: str
+    request: Union[
+        GetRequest,
+        GetManyRequest,
+        FilterRequest,
+        AggregateRequest,
+        MinMaxRequest,
+        HistoryInformationRequest,
+    ]
+
+
+@dataclass
+class BatchRequest:
+    requests: List[BatchRequestPart]
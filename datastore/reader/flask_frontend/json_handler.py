@@ -1,50 +1,108 @@
-from typing import Dict
+from typing import Any, Dict, Iterator, Union
 
 import fastjsonschema
 from dacite import Config, from_dict
 from dacite.exceptions import MissingValueError
 
-from datastore.reader.core import Reader
+from datastore.reader.core import BatchRequest, BatchRequestPart, ExplainRequest, Reader
 from datastore.shared.di import injector
-from datastore.shared.flask_frontend import InvalidRequest
+from datastore.shared.flask_frontend import InvalidRequest, JsonStreamResponse
 from datastore.shared.typing import JSON
-from datastore.shared.util import BadCodingError, logger
+from datastore.shared.util import BadCodingError, logger, stream_json
 
 from .routes import Route, route_configurations
 
 
 class JSONHandler:
-    def handle_request(self, route: Route, data: JSON) -> Dict:
+    def handle_request(
+        self, route: Route, data: JSON
+    ) -> Union[Dict, JsonStreamResponse]:
         """
         A generic handler for all requests. Parses the request to a python object
         according to the route_setup and execute the according route_handler.
         """
 
+        logger.info(f"{route.upper()}-request: {data}")
+
+        request_object: Any
+        if route == Route.EXPLAIN:
+            request_object = self.parse_explain_request(data)
+        elif route == Route.BATCH:
+            request_object = self.parse_batch_request(data)
+        else:
+            request_object = self.parse_request(route, data)
+
+        reader = injector.get(Reader)
+        if getattr(request_object, "stream", False):
+            return self.stream_response(reader, route, request_object)
+
+        route_handler = getattr(reader, route)
+
+        if route == Route.BATCH:
+            # the batch request opens its own context to be able to retry it
+            return route_handler(request_object)
+        with reader.get_database_context():
+            return route_handler(request_object)
+
+    def validate_request(self, route: Route, data: JSON) -> Any:
+        """Validates the data with the schema of the route."""
         try:
             route_configuration = route_configurations[route]
         except KeyError:
             raise BadCodingError("Invalid route metadata: " + route)
 
-        logger.info(f"{route.upper()}-request: {data}")
-
         try:
-            request_data = route_configuration.schema(data)
+            return route_configuration.schema(data)
         except fastjsonschema.JsonSchemaException as e:
             if route_configuration.schema_error_handler:
                 route_configuration.schema_error_handler(e)
             raise InvalidRequest(e.message)
 
+    def parse_request(self, route: Route, data: JSON) -> Any:
+        """
+        Validates the data and parses it to the request class of the route.
+        """
+        request_data = self.validate_request(route, data)
         try:
-            request_object = from_dict(
-                route_configuration.request_class,
+            return from_dict(
+                route_configurations[route].request_class,
                 request_data,
                 Config(check_types=False),
             )
         except (TypeError, MissingValueError) as e:
             raise BadCodingError("Invalid data to initialize class\n" + str(e))
 
-        reader = injector.get(Reader)
-        route_handler = getattr(reader, route)
+    def parse_explain_request(self, data: JSON) -> ExplainRequest:
+        """
+        The explain route wraps the request of another route, so the nested request
+        is parsed according to the configuration of that route.
+        """
+        request_data = self.validate_request(Route.EXPLAIN, data)
+        route = Route(request_data["route"])
+        return ExplainRequest(route, self.parse_request(route, request_data["request"]))
 
-        with reader.get_database_context():
-            return route_handler(request_object)
+    def parse_batch_request(self, data: JSON) -> BatchRequest:
+        """Parses each nested request according to the configuration of its route."""
+        request_data = self.validate_request(Route.BATCH, data)
+        parts = []
+        for part in request_data["requests"]:
+            route = Route(part["route"])
+            parts.append(
+                BatchRequestPart(route, self.parse_request(route, part["request"]))
+            )
+        return BatchRequest(parts)
+
+    def stream_response(self, reader: Reader, route: Route, request_object: Any):
+        """
+        Returns a response which serializes the models while they are fetched from
+        the database.
+        """
+        stream_handler = getattr(reader, route + "_stream")
+
+        def generate() -> Iterator[str]:
+            # the response body is generated after the request handler returned, so
+            # a separate database context is needed
+            with reader.get_database_context():
+                yield from stream_json(stream_handler(request_object))
+
+        return JsonStreamResponse(generate())
@@ -6,6 +6,8 @@ import fastjsonschema
 
 from datastore.reader.core.requests import (
     AggregateRequest,
+    BatchRequest,
+    ExplainRequest,
     FilterRequest,
     GetAllRequest,
     GetEverythingRequest,
@@ -23,6 +25,9 @@ from datastore.shared.util import DeletedModelsBehaviour, filter_definitions_sch
 
 URL_PREFIX = build_url_prefix("reader")
 
+# enables the explain route outside of the development mode
+EXPLAIN_ENABLED_ENVIRONMENT_VAR = "DATASTORE_EXPLAIN_ENABLED"
+
 
 class Route(str, Enum):
     GET = "get"
@@ -35,6 +40,8 @@ class Route(str, Enum):
     MIN = "min"
     MAX = "max"
     HISTORY_INFORMATION = "history_information"
+    EXPLAIN = "explain"
+    BATCH = "batch"
 
     @property
     def URL(self):
@@ -111,6 +118,7 @@ get_all_schema = fastjsonschema.compile(
                 "type": "integer",
                 "enum": deleted_models_behaviour_list,
             },
+            "stream": {"type": "boolean"},
         },
         "required": ["collection"],
     }
@@ -125,6 +133,7 @@ get_everything_schema = fastjsonschema.compile(
                 "type": "integer",
                 "enum": deleted_models_behaviour_list,
             },
+            "stream": {"type": "boolean"},
         },
     }
 )
@@ -182,6 +191,65 @@ history_information_schema = fastjsonschema.compile(
     }
 )
 
+# the nested request is validated with the configuration of the given route
+explain_schema = fastjsonschema.compile(
+    {
+        "$schema": "http://json-schema.org/draft-07/schema#",
+        "type": "object",
+        "properties": {
+            "route": {
+                "type": "string",
+                "enum": [
+                    Route.FILTER.value,
+                    Route.EXISTS.value,
+                    Route.COUNT.value,
+                    Route.MIN.value,
+                    Route.MAX.value,
+                ],
+            },
+            "request": {"type": "object"},
+        },
+        "required": ["route", "request"],
+    }
+)
+
+# routes which can be used inside a batch request
+batch_routes = [
+    Route.GET,
+    Route.GET_MANY,
+    Route.FILTER,
+    Route.EXISTS,
+    Route.COUNT,
+    Route.MIN,
+    Route.MAX,
+    Route.HISTORY_INFORMATION,
+]
+
+# the nested requests are validated with the configurations of the given routes
+batch_schema = fastjsonschema.compile(
+    {
+        "$schema": "http://json-schema.org/draft-07/schema#",
+        "type": "object",
+        "properties": {
+            "requests": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "route": {
+                            "type": "string",
+                            "enum": [route.value for route in batch_routes],
+                        },
+                        "request": {"type": "object"},
+                    },
+                    "required": ["route", "request"],
+                },
+            },
+        },
+        "required": ["requests"],
+    }
+)
+
 
 def handle_filter_schema_error(e: fastjsonschema.JsonSchemaException) -> None:
     if e.rule == "anyOf":
@@ -239,4 +307,8 @@ route_configurations: Dict[Route, RouteConfiguration] = {
         schema=history_information_schema,
         request_class=HistoryInformationRequest,
     ),
+    Route.EXPLAIN: RouteConfiguration(
+        schema=explain_schema, request_class=ExplainRequest
+    ),
+    Route.BATCH: RouteConfiguration(schema=batch_schema, request_class=BatchRequest),
 }
@@ -1,13 +1,20 @@
+from typing import List
+
+from datastore.reader.core import ModelCache
+from datastore.shared.di import injector
 from datastore.shared.flask_frontend import (
     JsonResponse,
     add_health_route,
+    add_metrics_route,
+    dev_only_route,
     get_json_from_request,
     handle_internal_errors,
     unify_urls,
 )
+from datastore.shared.util.metrics import render_gauge
 
 from .json_handler import JSONHandler
-from .routes import Route
+from .routes import EXPLAIN_ENABLED_ENVIRONMENT_VAR, Route
 
 
 def make_json_response(fn):
@@ -22,6 +29,36 @@ def make_json_response(fn):
     return wrapper
 
 
+def render_model_cache_stats() -> List[str]:
+    model_cache = injector.get(ModelCache)
+    stats = model_cache.get_stats()
+    return [
+        render_gauge(
+            f"datastore_model_cache_{name}_total",
+            f"Model cache {name}",
+            stats[name],  # type: ignore
+            "counter",
+        )
+        for name in ("hits", "misses", "evictions", "invalidations")
+    ] + [
+        render_gauge(
+            "datastore_model_cache_entries",
+            "Models held by the model cache",
+            stats["entries"],
+        ),
+        render_gauge(
+            "datastore_model_cache_size_bytes",
+            "Size of the serialized models held by the model cache",
+            stats["size"],
+        ),
+        render_gauge(
+            "datastore_model_cache_position",
+            "Position of the newest write whose invalidations reached the model cache",
+            model_cache.get_position(),
+        ),
+    ]
+
+
 def get_route(route: Route):
     @make_json_response
     @handle_internal_errors
@@ -29,6 +66,8 @@ def get_route(route: Route):
         json_handler = JSONHandler()
         return json_handler.handle_request(route, get_json_from_request())
 
+    if route == Route.EXPLAIN:
+        return dev_only_route(route_func, EXPLAIN_ENABLED_ENVIRONMENT_VAR)
     return route_func
 
 
@@ -43,3 +82,4 @@ def register_routes(app, url_prefix):
             strict_slashes=False,
         )
     add_health_route(app, url_prefix)
+    add_metrics_route(app, url_prefix, render_model_cache_stats)
@@ -0,0 +1,27 @@
+from typing import Dict, List, Optional, Protocol, Tuple
+
+from datastore.shared.di import service_interface
+
+
+StreamEntry = Tuple[str, Dict[str, str]]
+
+
+@service_interface
+class ConnectionHandler(Protocol):
+    def get_last_entry(self, topic: str) -> Optional[StreamEntry]:
+        """
+        Returns the newest entry of the stream with name topic or None if the stream
+        is empty.
+        """
+
+    def xread(
+        self, last_ids: Dict[str, str], block: int
+    ) -> Dict[str, List[StreamEntry]]:
+        """
+        Returns all entries of the given streams which are newer than the given last
+        id per stream name. Blocks at most block milliseconds if there are no such
+        entries.
+        """
+
+    def close(self) -> None:
+        """Closes the current connection, if there is one."""
@@ -0,0 +1,49 @@
+from typing import Any, Dict, List, Optional
+
+import redis
+
+from datastore.shared.di import service_as_singleton
+from datastore.shared.redis_backend import ENVIRONMENT_VARIABLES
+from datastore.shared.services import EnvironmentService, ShutdownService
+
+from .connection_handler import StreamEntry
+
+
+@service_as_singleton
+class RedisConnectionHandlerService:
+    environment: EnvironmentService
+    shutdown_service: ShutdownService
+    connection: Optional[Any] = None
+
+    def __init__(self, shutdown_service: ShutdownService):
+        shutdown_service.register(self)
+
+    def ensure_connection(self):
+        if not self.connection:
+            self.connection = self.get_connection()
+        return self.connection
+
+    def get_connection(self):
+        host = self.environment.get(ENVIRONMENT_VARIABLES.HOST)
+        port = int(self.environment.try_get(ENVIRONMENT_VARIABLES.PORT) or 6379)
+        return redis.Redis(host=host, port=port, decode_responses=True)
+
+    def get_last_entry(self, topic: str) -> Optional[StreamEntry]:
+        connection = self.ensure_connection()
+        entries = connection.xrevrange(topic, count=1)
+        return entries[0] if entries else None
+
+    def xread(
+        self, last_ids: Dict[str, str], block: int
+    ) -> Dict[str, List[StreamEntry]]:
+        connection = self.ensure_connection()
+        response = connection.xread(last_ids, block=block)
+        return {topic: entries for topic, entries in response or []}
+
+    def close(self) -> None:
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+    def shutdown(self):
+        self.close()
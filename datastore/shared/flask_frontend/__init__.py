@@ -9,7 +9,8 @@ from .errors import (
     register_error_handlers,
 )
 from .health_route import add_health_route, get_health_url, health
-from .json_response import JsonResponse
+from .json_response import JsonResponse, JsonStreamResponse
+from .metrics_route import add_metrics_route, get_metrics_url
 from .urls import build_url_prefix, unify_urls
 
 
@@ -4,10 +4,18 @@ from datastore.shared.di import injector
 from datastore.shared.services import EnvironmentService
 
 
-def dev_only_route(fn):
+def dev_only_route(fn, enabled_environment_var=None):
+    """
+    Only makes the route available in development mode. If an environment variable
+    is given, the route is also available if this variable is set to a truthy value.
+    """
+
     def wrapper(*args, **kwargs):
         env_service = injector.get(EnvironmentService)
-        if not env_service.is_dev_mode():
+        if not env_service.is_dev_mode() and not (
+            enabled_environment_var
+            and env_service.is_truthy(env_service.try_get(enabled_environment_var))
+        ):
             abort(404)
 
         return fn(*args, **kwargs)
@@ -1,8 +1,9 @@
-import json
+from typing import Iterator
 
 from flask import Response
 
 from datastore.shared.typing import JSON
+from datastore.shared.util import json_dumps
 
 
 class JsonResponse(Response):
@@ -12,4 +13,15 @@ class JsonResponse(Response):
         )
 
     def dumps(self, obj: JSON) -> str:
-        return json.dumps(obj, indent=None, separators=(",", ":"))
+        return json_dumps(obj)
+
+
+class JsonStreamResponse(Response):
+    """
+    Sends the JSON chunks of the given iterator as they are generated. Since the
+    status is sent before the first chunk, errors during the generation can only
+    be noticed by the client through the truncated body.
+    """
+
+    def __init__(self, chunks: Iterator[str]) -> None:
+        super().__init__(chunks, status=200, mimetype="application/json")
@@ -0,0 +1,134 @@
+from time import perf_counter
+from typing import Callable, List, Optional
+
+from flask import Response, g, request
+
+from ..di import injector
+from ..postgresql_backend import ConnectionHandler
+from ..util.metrics import (
+    CONTENT_TYPE,
+    Counter,
+    Histogram,
+    escape,
+    format_value,
+    render_gauge,
+    render_metrics,
+)
+from .urls import unify_urls
+
+
+REQUESTS = Counter("datastore_requests_total", "Handled requests", ["route", "status"])
+REQUEST_DURATION = Histogram(
+    "datastore_request_duration_seconds",
+    "Duration of the handling of requests, without streamed response bodies",
+    ["route"],
+)
+
+
+def before_request() -> None:
+    g.metrics_start = perf_counter()
+
+
+def after_request(response: Response) -> Response:
+    start = g.pop("metrics_start", None)
+    if start is not None:
+        route = request.endpoint or "unknown"
+        REQUEST_DURATION.observe(perf_counter() - start, (route,))
+        REQUESTS.inc(labels=(route, str(response.status_code)))
+    return response
+
+
+def render_pool_stats() -> List[str]:
+    stats = injector.get(ConnectionHandler).get_pool_stats()
+    return [
+        render_gauge(
+            "datastore_db_pool_max_connections",
+            "Maximum amount of database connections",
+            stats["max_connections"],
+        ),
+        render_gauge(
+            "datastore_db_pool_checked_out",
+            "Database connections currently in use",
+            stats["checked_out"],
+        ),
+        render_gauge(
+            "datastore_db_pool_waiting",
+            "Requests currently waiting for a database connection",
+            stats["waiting"],
+        ),
+        render_gauge(
+            "datastore_db_pool_acquisitions_total",
+            "Acquired database connections",
+            stats["acquisitions"],
+            "counter",
+        ),
+        render_gauge(
+            "datastore_db_pool_exhaustions_total",
+            "Acquisitions which had to wait for a free database connection",
+            stats["exhaustions"],
+            "counter",
+        ),
+        render_gauge(
+            "datastore_db_pool_timeouts_total",
+            "Acquisitions which timed out",
+            stats["timeouts"],
+            "counter",
+        ),
+        render_gauge(
+            "datastore_db_pool_wait_seconds_total",
+            "Time spent waiting for a free database connection",
+            stats["wait_time"],
+            "counter",
+        ),
+    ]
+
+
+def render_statement_stats() -> List[str]:
+    """Renders the statement statistics if they are enabled."""
+    stats = injector.get(ConnectionHandler).get_statement_stats()
+    if not stats:
+        return []
+    lines = []
+    for name, documentation, attribute in (
+        ("calls_total", "Executions of the statement", "calls"),
+        ("seconds_total", "Time spent executing the statement", "total_time"),
+        ("rows_total", "Rows returned or affected by the statement", "rows"),
+    ):
+        lines.append(f"# HELP datastore_db_statement_{name} {documentation}")
+        lines.append(f"# TYPE datastore_db_statement_{name} counter")
+        lines.extend(
+            f'datastore_db_statement_{name}{{fingerprint="{stat.fingerprint}",'
+            f'statement="{escape(stat.statement)}"}} '
+            + format_value(getattr(stat, attribute))
+            for stat in stats
+        )
+    return ["\n".join(lines)]
+
+
+def get_metrics_url(url_prefix):
+    return unify_urls(url_prefix, "metrics")
+
+
+def add_metrics_route(
+    app, url_prefix, render_extra: Optional[Callable[[], List[str]]] = None
+):
+    """
+    Adds the metrics route and measures all requests of the app. `render_extra` may
+    return additional metrics of the app which are rendered on each scrape.
+    """
+
+    def metrics():
+        parts = [render_metrics(), *render_pool_stats(), *render_statement_stats()]
+        if render_extra:
+            parts.extend(render_extra())
+        return Response("\n".join(parts) + "\n", content_type=CONTENT_TYPE)
+
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.add_url_rule(
+        get_metrics_url(url_prefix),
+        "metrics",
+        metrics,
+        methods=["GET"],
+        strict_slashes=False,
+    )
@@ -1,9 +1,19 @@
 from .apply_list_updates import ListUpdatesDict, apply_fields
-from .connection_handler import ConnectionHandler, DatabaseError
-from .filter_models import filter_models, is_comparable
+from .connection_handler import ConnectionHandler, ConnectionPoolStats, DatabaseError
+from .filter_index_registry import FilterIndexRegistry
+from .filter_models import (
+    CollectionIndexedModels,
+    compile_filter,
+    copy_json,
+    filter_models,
+    is_comparable,
+    iter_collection,
+    iter_filtered_models,
+)
 from .pg_connection_handler import retry_on_db_failure
 from .sql_event_types import EVENT_TYPE
 from .sql_query_helper import SqlQueryHelper
+from .statement_stats import StatementStat, normalize_statement
 
 
 ALL_TABLES = (
@@ -13,6 +23,7 @@ ALL_TABLES = (
     "collectionfields",
     "events_to_collectionfields",
     "models",
+    "model_snapshots",
     "migration_keyframes",
     "migration_keyframe_models",
     "migration_events",
@@ -28,5 +39,6 @@ def setup_di():
     from .sql_read_database_backend_service import SqlReadDatabaseBackendService
 
     injector.register(ConnectionHandler, PgConnectionHandlerService)
+    injector.register(FilterIndexRegistry, FilterIndexRegistry)
     injector.register(SqlQueryHelper, SqlQueryHelper)
     injector.register(ReadDatabase, SqlReadDatabaseBackendService)
@@ -1,7 +1,9 @@
-from typing import Optional, Protocol
+from typing import List, Optional, Protocol, TypedDict
 
 from datastore.shared.di import service_interface
 
+from .statement_stats import StatementStat
+
 
 class DatabaseError(Exception):
     def __init__(self, msg, base_exception: Optional[Exception] = None):
@@ -9,10 +11,25 @@ class DatabaseError(Exception):
         self.base_exception = base_exception
 
 
+class ConnectionPoolStats(TypedDict):
+    max_connections: int
+    checked_out: int
+    waiting: int
+    acquisitions: int
+    # amount of acquisitions which had to wait for a free connection
+    exhaustions: int
+    timeouts: int
+    # summed time spent waiting for a connection, in sec
+    wait_time: float
+
+
 @service_interface
 class ConnectionHandler(Protocol):
-    def get_connection_context(self):
-        """Returns the connection"""
+    def get_connection_context(self, autocommit=False):
+        """
+        Returns the connection. With autocommit, each statement is executed in its
+        own transaction, which is needed e.g. for `create index concurrently`.
+        """
 
     def to_json(self, data):
         """
@@ -30,6 +47,21 @@ class ConnectionHandler(Protocol):
         The columns are given as defined in the query.
         """
 
+    def copy_from(self, table, columns, rows):
+        """
+        Loads the rows into the given columns of the table via COPY. The rows are
+        serialized while they are sent to the database, so no SQL string containing
+        all values has to be built in memory.
+        """
+
+    def query_stream(self, query, arguments, sql_parameters=[]):
+        """
+        Executes the query with a server-side cursor and returns an iterator over
+        the resulting rows. The rows are fetched from the database in batches, so
+        only one batch is held in memory at a time. The iterator must be consumed
+        inside the connection context it was created in.
+        """
+
     def query_single_value(self, query, arguments, sql_parameters=[]):
         """
         This will return None, if no row was returned.
@@ -47,3 +79,12 @@ class ConnectionHandler(Protocol):
         row returns exactly one value. An empty list will be returned if
         no rows were returned from the db.
         """
+
+    def get_pool_stats(self) -> ConnectionPoolStats:
+        """Returns the current state and the counters of the connection pool."""
+
+    def get_statement_stats(self) -> List[StatementStat]:
+        """
+        Returns the aggregated executions of all statements per fingerprint, the most
+        expensive ones first. Empty if the statement statistics are disabled.
+        """
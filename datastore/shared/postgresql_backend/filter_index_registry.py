@@ -0,0 +1,144 @@
+import hashlib
+from typing import Dict, List, NamedTuple, Set, Tuple
+
+from datastore.shared.di import service_as_singleton
+from datastore.shared.services import EnvironmentService
+from datastore.shared.typing import Collection, Field
+from datastore.shared.util import (
+    KEYSEPARATOR,
+    InvalidFormat,
+    assert_is_collection,
+    assert_is_field,
+    logger,
+)
+
+from .connection_handler import ConnectionHandler
+
+
+FILTER_INDEXES_ENVIRONMENT_VAR = "DATASTORE_FILTER_INDEXES"
+
+# all indexes created by the registry start with this prefix, every other index with
+# this prefix on the models table is dropped
+INDEX_PREFIX = "models_filter_"
+# postgres truncates longer identifiers
+MAX_INDEX_NAME_LENGTH = 63
+GIN_SUFFIX = ":gin"
+
+
+class FilterIndex(NamedTuple):
+    collection: Collection
+    field: Field
+    gin: bool
+
+
+@service_as_singleton
+class FilterIndexRegistry:
+    """
+    Manages the indexes on the models table for frequently filtered fields. They are
+    configured via `DATASTORE_FILTER_INDEXES` as a comma-separated list of
+    `collection/field` entries. Each entry results in a partial expression index on
+    `data->>field` for the models of the collection. Entries with the suffix `:gin`
+    result in a `jsonb_path_ops` GIN index on the data of the collection's models
+    instead, which is used by rewriting equality filters on the field into
+    containment checks.
+
+    The indexes are built and dropped concurrently, so that writes to the models table
+    are not blocked meanwhile. The filter queries do not depend on the indexes, so they
+    can be updated while the datastore is running.
+    """
+
+    environment: EnvironmentService
+    connection: ConnectionHandler
+
+    def __init__(self):
+        self.indexes = self.parse_indexes(
+            self.environment.try_get(FILTER_INDEXES_ENVIRONMENT_VAR) or ""
+        )
+        self.gin_fields: Set[Tuple[Collection, Field]] = set(
+            (index.collection, index.field) for index in self.indexes if index.gin
+        )
+
+    def parse_indexes(self, value: str) -> List[FilterIndex]:
+        indexes = []
+        for entry in value.split(","):
+            entry = entry.strip()
+            if not entry:
+                continue
+            gin = entry.endswith(GIN_SUFFIX)
+            if gin:
+                entry = entry[: -len(GIN_SUFFIX)]
+            try:
+                collection, field = entry.split(KEYSEPARATOR)
+                assert_is_collection(collection)
+                assert_is_field(field)
+            except (ValueError, InvalidFormat):
+                raise InvalidFormat(
+                    f"Invalid entry in {FILTER_INDEXES_ENVIRONMENT_VAR}: {entry}"
+                )
+            indexes.append(FilterIndex(collection, field, gin))
+        return indexes
+
+    def uses_gin_index(self, collection: Collection, field: Field) -> bool:
+        return (collection, field) in self.gin_fields
+
+    def get_index_definitions(self) -> Dict[str, Tuple[str, List[str]]]:
+        """
+        Returns the query and arguments to create each configured index, mapped by the
+        name of the index.
+        """
+        definitions: Dict[str, Tuple[str, List[str]]] = {}
+        for index in self.indexes:
+            if index.gin:
+                name = self.get_index_name(index.collection + GIN_SUFFIX)
+                query = """
+                    create index concurrently if not exists {} on models
+                    using gin (data jsonb_path_ops) where collection = %s"""
+                definitions[name] = (query, [index.collection])
+            else:
+                name = self.get_index_name(
+                    index.collection + KEYSEPARATOR + index.field
+                )
+                query = """
+                    create index concurrently if not exists {} on models
+                    ((data->>%s)) where collection = %s"""
+                definitions[name] = (query, [index.field, index.collection])
+        return definitions
+
+    def get_index_name(self, key: str) -> str:
+        # the names are always quoted, so the key can be used as is
+        name = INDEX_PREFIX + key
+        if len(name) > MAX_INDEX_NAME_LENGTH:
+            hash = hashlib.md5(name.encode()).hexdigest()[:8]
+            name = name[: MAX_INDEX_NAME_LENGTH - len(hash) - 1] + "_" + hash
+        return name
+
+    def update_indexes(self) -> Tuple[List[str], List[str]]:
+        """
+        Creates all missing indexes and drops all previously created indexes which are
+        not configured anymore. Returns the names of the created and dropped indexes.
+        Has to be called inside a connection context with autocommit, since indexes
+        cannot be built concurrently inside a transaction.
+        """
+        definitions = self.get_index_definitions()
+        # an interrupted concurrent build leaves an invalid index behind
+        existing = dict(
+            self.connection.query(
+                """
+                select c.relname, i.indisvalid from pg_index i
+                join pg_class c on c.oid = i.indexrelid
+                join pg_class t on t.oid = i.indrelid
+                where t.relname = 'models' and starts_with(c.relname, %s)""",
+                [INDEX_PREFIX],
+            )
+        )
+        valid = set(name for name, is_valid in existing.items() if is_valid)
+        created = sorted(set(definitions.keys()) - valid)
+        dropped = sorted(set(existing.keys()) - set(definitions.keys()))
+        for name in dropped + [name for name in created if name in existing]:
+            logger.info(f"Dropping filter index {name}")
+            self.connection.execute("drop index concurrently if exists {}", [], [name])
+        for name in created:
+            logger.info(f"Creating filter index {name}")
+            query, arguments = definitions[name]
+            self.connection.execute(query, arguments, [name])
+        return created, dropped
@@ -1,17 +1,34 @@
+import json
+import operator
 import re
-from copy import deepcopy
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 from ..typing import Collection, Fqid, Model
-from ..util import Filter, collection_from_fqid
-from .sql_query_helper import SqlQueryHelper
+from ..util import (
+    KEYSEPARATOR,
+    And,
+    BadCodingError,
+    Filter,
+    FilterOperator,
+    InvalidFormat,
+    Not,
+    Or,
+    collection_from_fqid,
+)
 
 
-MODEL_FIELD_SQL = "data->>%s"
-MODEL_FIELD_NUMERIC_SQL = r"\(data->%s\)::numeric"
-MODEL_FIELD_NUMERIC_REPLACE = "(data->%s)::numeric"
-COMPARISON_VALUE_TEXT_SQL = "%s::text"
-COMPARISON_VALUE_SQL = "%s"
+ModelPredicate = Callable[[Model], bool]
+
+# compiled filters by the representation of the filter
+MAX_COMPILED_FILTERS = 1024
+compiled_filters: Dict[str, ModelPredicate] = {}
+
+COMPARISON_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">=": operator.ge,
+    ">": operator.gt,
+}
 
 
 def is_comparable(a: Any, b: Any) -> bool:
@@ -24,6 +41,193 @@ def is_comparable(a: Any, b: Any) -> bool:
     )
 
 
+def get_text(value: Any) -> Optional[str]:
+    """Returns the value as postgres returns it for `data->>field`."""
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def compile_ilike(pattern: str) -> re.Pattern:
+    """Translates the pattern of ILIKE (with `\\` as escape character) into a regex."""
+    regex = []
+    escaped = False
+    for char in pattern:
+        if escaped:
+            regex.append(re.escape(char))
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == "%":
+            regex.append(".*")
+        elif char == "_":
+            regex.append(".")
+        else:
+            regex.append(re.escape(char))
+    return re.compile("".join(regex), re.IGNORECASE | re.DOTALL)
+
+
+def compile_filter_operator(filter: FilterOperator) -> ModelPredicate:
+    field = filter.field
+    value = filter.value
+    if value is None:
+        if filter.operator == "=":
+            return lambda model: model.get(field) is None
+        elif filter.operator == "!=":
+            return lambda model: model.get(field) is not None
+        raise InvalidFormat("You can only compare to None with = or !=")
+
+    if filter.operator == "=":
+        return lambda model: model.get(field) == value
+    elif filter.operator == "!=":
+        return lambda model: model.get(field) != value
+    elif filter.operator == "~=":
+        lower_value = cast_text(value).lower()
+
+        def case_insensitive_equals(model: Model) -> bool:
+            text = get_text(model.get(field))
+            return text is not None and text.lower() == lower_value
+
+        return case_insensitive_equals
+    elif filter.operator == "%=":
+        pattern = compile_ilike(cast_text(value))
+
+        def ilike(model: Model) -> bool:
+            text = get_text(model.get(field))
+            return text is not None and pattern.fullmatch(text) is not None
+
+        return ilike
+    elif filter.operator in COMPARISON_OPERATORS:
+        compare = COMPARISON_OPERATORS[filter.operator]
+
+        def comparison(model: Model) -> bool:
+            model_value = model.get(field)
+            return is_comparable(model_value, value) and compare(model_value, value)
+
+        return comparison
+    raise BadCodingError("Invalid filter operator")
+
+
+def cast_text(value: Any) -> str:
+    """Returns the value as postgres casts it with `%s::text`."""
+    if isinstance(value, bool):
+        return str(value).lower()
+    return value if isinstance(value, str) else str(value)
+
+
+def compile_filter_tree(filter: Filter) -> ModelPredicate:
+    if isinstance(filter, Not):
+        not_filter = compile_filter_tree(filter.not_filter)
+        return lambda model: not not_filter(model)
+    elif isinstance(filter, Or):
+        or_filters = [compile_filter_tree(part) for part in filter.or_filter]
+        return lambda model: any(part(model) for part in or_filters)
+    elif isinstance(filter, And):
+        and_filters = [compile_filter_tree(part) for part in filter.and_filter]
+        return lambda model: all(part(model) for part in and_filters)
+    elif isinstance(filter, FilterOperator):
+        return compile_filter_operator(filter)
+    raise BadCodingError("Invalid filter type")
+
+
+def compile_filter(filter: Filter) -> ModelPredicate:
+    """
+    Returns a function which checks whether a model matches the filter. The functions
+    are cached, so repeated filters are only compiled once.
+    """
+    key = repr(filter)
+    if (predicate := compiled_filters.get(key)) is None:
+        predicate = compile_filter_tree(filter)
+        if len(compiled_filters) >= MAX_COMPILED_FILTERS:
+            compiled_filters.clear()
+        compiled_filters[key] = predicate
+    return predicate
+
+
+class CollectionIndexedModels(Dict[Fqid, Model]):
+    """
+    Dict of models which additionally keeps the fqids per collection, so that the models
+    of one collection can be iterated without looking at all other models.
+    """
+
+    def __init__(self, models: Optional[Dict[Fqid, Model]] = None) -> None:
+        super().__init__()
+        # the dicts are used as ordered sets
+        self.collections: Dict[Collection, Dict[Fqid, None]] = {}
+        if models:
+            self.update(models)
+
+    def __setitem__(self, fqid: Fqid, model: Model) -> None:
+        super().__setitem__(fqid, model)
+        collection = collection_from_fqid(fqid)
+        self.collections.setdefault(collection, {})[fqid] = None
+
+    def __delitem__(self, fqid: Fqid) -> None:
+        super().__delitem__(fqid)
+        del self.collections[collection_from_fqid(fqid)][fqid]
+
+    def update(self, *args: Any, **kwargs: Any) -> None:  # type: ignore
+        for fqid, model in dict(*args, **kwargs).items():
+            self[fqid] = model
+
+    def setdefault(self, fqid: Fqid, model: Model) -> Model:  # type: ignore
+        if fqid not in self:
+            self[fqid] = model
+        return self[fqid]
+
+    def pop(self, fqid: Fqid, *default: Any) -> Any:  # type: ignore
+        if fqid not in self:
+            return super().pop(fqid, *default)
+        model = self[fqid]
+        del self[fqid]
+        return model
+
+    def popitem(self) -> Tuple[Fqid, Model]:
+        fqid, model = super().popitem()
+        del self.collections[collection_from_fqid(fqid)][fqid]
+        return fqid, model
+
+    def clear(self) -> None:
+        super().clear()
+        self.collections.clear()
+
+    def get_collection(self, collection: Collection) -> Iterator[Tuple[Fqid, Model]]:
+        for fqid in self.collections.get(collection, {}):
+            yield fqid, self[fqid]
+
+
+def iter_collection(
+    models: Dict[Fqid, Model], collection: Collection
+) -> Iterator[Tuple[Fqid, Model]]:
+    """Iterates over all models of the collection."""
+    if isinstance(models, CollectionIndexedModels):
+        yield from models.get_collection(collection)
+        return
+    prefix = collection + KEYSEPARATOR
+    for fqid, model in models.items():
+        if fqid.startswith(prefix):
+            yield fqid, model
+
+
+def iter_filtered_models(
+    models: Dict[Fqid, Model], collection: Collection, filter: Filter
+) -> Iterator[Model]:
+    """Iterates over all models of the collection matching the filter without copying them."""
+    predicate = compile_filter(filter)
+    for _, model in iter_collection(models, collection):
+        if predicate(model):
+            yield model
+
+
+def copy_json(value: Any) -> Any:
+    """Deep copy for JSON values, which is much faster than `deepcopy`."""
+    if isinstance(value, dict):
+        return {key: copy_json(item) for key, item in value.items()}
+    elif isinstance(value, list):
+        return [copy_json(item) for item in value]
+    return value
+
+
 def filter_models(
     models: Dict[Fqid, Model],
     collection: Collection,
@@ -31,80 +235,19 @@ def filter_models(
     mapped_fields: Optional[List[str]] = None,
 ) -> Dict[int, Dict[str, Any]]:
     """
-    Uses the SqlQueryHelper to build an SQL query for the given filter, transforms it into valid
-    python code and then executes it to filter models in-memory.
+    Filters the models in-memory with the compiled filter. Only the returned fields of
+    the matching models are copied.
     """
-    # Build sql query for this filter. The arguments array contains the replacements for all %s in the query in the
-    # correct order.
-    query_helper = SqlQueryHelper()
-    arguments: List[str] = []
-    sql_query = query_helper.build_filter_str(filter, arguments)
-
-    # transform query into valid python code
-    filter_code = sql_query.lower().replace("null", "None").replace(" = ", " == ")
-    # regex for all FilterOperators which were translated by the SqlQueryHelper
-    regex = (
-        rf"(?:{MODEL_FIELD_SQL}|lower\({MODEL_FIELD_SQL}\)|"
-        rf"{MODEL_FIELD_NUMERIC_SQL}|lower\({MODEL_FIELD_NUMERIC_SQL}\))"
-        r" (<|<=|>=|>|==|!=|is|is not|ilike) "
-        rf"({COMPARISON_VALUE_SQL}|lower\({COMPARISON_VALUE_SQL}\)|"
-        rf"{COMPARISON_VALUE_TEXT_SQL}|lower\({COMPARISON_VALUE_TEXT_SQL}\)|None)"
-    )
-    matches = re.findall(regex, filter_code)
-    # this will hold all items from arguments, but correctly formatted for python and enhanced with validity checks
-    formatted_args = []
-    i = 0
-    for match in matches:
-        # for these operators, ensure that the model field is actually comparable to prevent TypeErrors
-        if match[0] in ("<", "<=", ">=", ">"):
-            val_str = (
-                arguments[i + 1]
-                if isinstance(arguments[i + 1], (int, float))
-                else repr(arguments[i + 1])
-            )
-            formatted_args.append(
-                f'is_comparable(model.get("{arguments[i]}"), {val_str}) and model.get("{arguments[i]}")'
-            )
-        elif match[0] == "ilike":
-            raise NotImplementedError("Operator %= is not supported")
-        else:
-            formatted_args.append(f'model.get("{arguments[i]}")')
-        i += 1
-        # if comparison happens with a value, append it as well
-        if match[1] in (
-            COMPARISON_VALUE_SQL,
-            f"lower({COMPARISON_VALUE_SQL})",
-            COMPARISON_VALUE_TEXT_SQL,
-            f"lower({COMPARISON_VALUE_TEXT_SQL})",
-        ):
-            formatted_args.append(repr(arguments[i]))
-            i += 1
-    # replace SQL placeholders and SQL specific code with the formatted python snippets
-    filter_code = (
-        filter_code.replace(MODEL_FIELD_NUMERIC_REPLACE, "{}")
-        .replace(COMPARISON_VALUE_TEXT_SQL, "{}")
-        .replace(MODEL_FIELD_SQL, "{}")
-        .replace(COMPARISON_VALUE_SQL, "{}")
-    )
-    filter_code = filter_code.format(*formatted_args)
-
-    # needed for generated code since postgres uses it
-    def lower(s: str) -> str:
-        return s.lower()
-
-    # run eval with the generated code
-    scope = locals()
-    # copy globals we need explicitly to avoid copying all globals
-    scope["collection_from_fqid"] = collection_from_fqid
-    scope["is_comparable"] = is_comparable
-    results = {
-        model["id"]: (
-            {field: model[field] for field in mapped_fields if field in model}
-            if mapped_fields
-            else model
-        )
-        for fqid, model in models.items()
-        if collection_from_fqid(fqid) == collection
-        and eval(filter_code, scope, locals())
+    if mapped_fields:
+        return {
+            model["id"]: {
+                field: copy_json(model[field])
+                for field in mapped_fields
+                if field in model
+            }
+            for model in iter_filtered_models(models, collection, filter)
+        }
+    return {
+        model["id"]: copy_json(model)
+        for model in iter_filtered_models(models, collection, filter)
     }
-    return deepcopy(results)
@@ -1,54 +1,90 @@
 import multiprocessing
 import threading
+from collections import deque
+from dataclasses import dataclass, field
 from functools import wraps
 from time import monotonic, sleep
-from typing import Any, Dict, Optional, cast
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, cast
+from uuid import uuid4
 
 import psycopg2
 from psycopg2 import sql
-from psycopg2.extras import DictCursor, Json, execute_values
+from psycopg2.extras import (
+    DictCursor,
+    Json,
+    execute_values,
+    register_default_json,
+    register_default_jsonb,
+)
 from psycopg2.pool import PoolError, ThreadedConnectionPool
 
 from datastore.shared.di import injector, service_as_singleton
 from datastore.shared.services import EnvironmentService, ShutdownService
-from datastore.shared.util import BadCodingError, logger
+from datastore.shared.util import BadCodingError, json_dumps, json_loads, logger
+from datastore.shared.util.metrics import Counter, Histogram
 
-from .connection_handler import DatabaseError
+from .connection_handler import ConnectionPoolStats, DatabaseError
+from .statement_stats import (
+    SLOW_STATEMENT_THRESHOLD_ENVIRONMENT_VAR,
+    STATEMENT_STATS_ENVIRONMENT_VAR,
+    StatementStat,
+    StatementStatistics,
+)
+
+
+# marks whether a function with retries is currently executed by the thread
+retry_state = threading.local()
 
 
 def retry_on_db_failure(fn):
+    """
+    Retries the function if the connection to the database broke. Only the outermost
+    of nested functions is retried, since the inner ones are executed in the
+    transaction of the outer one, which is aborted after such an error.
+    """
+
     @wraps(fn)
     def wrapper(*args, **kwargs):
-        env_service: EnvironmentService = injector.get(EnvironmentService)
-        RETRY_TIMEOUT = float(env_service.try_get("DATASTORE_RETRY_TIMEOUT") or 0.4)
-        MAX_RETRIES = int(env_service.try_get("DATASTORE_MAX_RETRIES") or 5)
-        tries = 0
-        while True:
-            try:
-                return fn(*args, **kwargs)
-            except DatabaseError as e:
-                # this seems to be the only indication for a sudden connection break
-                if (
-                    isinstance(e.base_exception, psycopg2.OperationalError)
-                    and e.base_exception.pgcode is None
-                ):
-                    tries += 1
-                    if tries < MAX_RETRIES:
-                        oe = e.base_exception
-                        logger.info(
-                            "Retrying request to database because of the following error "
-                            f"({type(oe).__name__}, code {oe.pgcode}): {oe.pgerror}"
-                        )
-                    else:
-                        raise
-                else:
-                    raise
-            if RETRY_TIMEOUT:
-                sleep(RETRY_TIMEOUT)
+        if getattr(retry_state, "active", False):
+            return fn(*args, **kwargs)
+        retry_state.active = True
+        try:
+            return retry(fn, *args, **kwargs)
+        finally:
+            retry_state.active = False
 
     return wrapper
 
 
+def retry(fn, *args, **kwargs):
+    env_service: EnvironmentService = injector.get(EnvironmentService)
+    RETRY_TIMEOUT = float(env_service.try_get("DATASTORE_RETRY_TIMEOUT") or 0.4)
+    MAX_RETRIES = int(env_service.try_get("DATASTORE_MAX_RETRIES") or 5)
+    tries = 0
+    while True:
+        try:
+            return fn(*args, **kwargs)
+        except DatabaseError as e:
+            # this seems to be the only indication for a sudden connection break
+            if (
+                isinstance(e.base_exception, psycopg2.OperationalError)
+                and e.base_exception.pgcode is None
+            ):
+                tries += 1
+                if tries < MAX_RETRIES:
+                    oe = e.base_exception
+                    logger.info(
+                        "Retrying request to database because of the following error "
+                        f"({type(oe).__name__}, code {oe.pgcode}): {oe.pgerror}"
+                    )
+                else:
+                    raise
+            else:
+                raise
+        if RETRY_TIMEOUT:
+            sleep(RETRY_TIMEOUT)
+
+
 class DATABASE_ENVIRONMENT_VARIABLES:
     HOST = "DATABASE_HOST"
     PORT = "DATABASE_PORT"
@@ -58,15 +94,94 @@ class DATABASE_ENVIRONMENT_VARIABLES:
 
 
 EXECUTE_VALUES_PAGE_SIZE = int(1e7)
+STREAM_BATCH_SIZE_ENVIRONMENT_VAR = "DATASTORE_STREAM_BATCH_SIZE"
+POOL_TIMEOUT_ENVIRONMENT_VAR = "DATASTORE_POOL_TIMEOUT"
+
+QUERY_DURATION = Histogram(
+    "datastore_db_query_duration_seconds",
+    "Duration of database statements, without fetching streamed rows",
+    ["operation"],
+)
+ROWS_RETURNED = Counter(
+    "datastore_db_rows_returned_total", "Rows returned by database queries"
+)
+
+
+class CopyInput:
+    """
+    File-like object for `copy_expert`, which serializes the rows into the text format
+    of COPY while they are read.
+    """
+
+    def __init__(self, rows: Iterable[Sequence[Any]]):
+        self.lines: Iterator[bytes] = (self.format_row(row) for row in rows)
+        self.buffer = bytearray()
+
+    def format_row(self, row: Sequence[Any]) -> bytes:
+        return ("\t".join(self.format_value(value) for value in row) + "\n").encode()
+
+    def format_value(self, value: Any) -> str:
+        if value is None:
+            return "\\N"
+        if isinstance(value, Json):
+            value = value.dumps(value.adapted)
+        elif isinstance(value, bool):
+            value = "t" if value else "f"
+        elif isinstance(value, (list, tuple)):
+            value = self.format_array(value)
+        elif not isinstance(value, str):
+            value = str(value)
+        return (
+            value.replace("\\", "\\\\")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+            .replace("\t", "\\t")
+        )
+
+    def format_array(self, values: Sequence[Any]) -> str:
+        elements = []
+        for value in values:
+            if value is None:
+                elements.append("NULL")
+            else:
+                value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+                elements.append(f'"{value}"')
+        return "{" + ",".join(elements) + "}"
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self.buffer) < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            self.buffer += line
+        if size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+
+@dataclass
+class ConnectionWaiter:
+    """A thread waiting for a connection. The connection is handed over directly."""
+
+    event: threading.Event = field(default_factory=threading.Event)
+    connection: Any = None
+    error: Optional[psycopg2.Error] = None
 
 
 class ConnectionContext:
-    def __init__(self, connection_handler):
+    def __init__(self, connection_handler, autocommit=False):
         self.connection_handler = connection_handler
+        self.autocommit = autocommit
 
     def __enter__(self):
         self.connection = self.connection_handler.get_connection()
-        self.connection.__enter__()
+        if self.autocommit:
+            # the connection's context manager would open a transaction anyway
+            self.connection.autocommit = True
+        else:
+            self.connection.__enter__()
 
     def __exit__(self, exception, exception_value, traceback):
         new_connection_pool = False
@@ -75,7 +190,7 @@ class ConnectionContext:
         ):
             new_connection_pool = issubclass(exception, psycopg2.OperationalError)
         # connection which were already closed will raise an InterfaceError in __exit__
-        if not self.connection.closed:
+        if not self.autocommit and not self.connection.closed:
             self.connection.__exit__(exception, exception_value, traceback)
         # some errors are not correctly recognized by the connection pool, soto be save we dispose
         # all connection which errored out, even though some might still be usable
@@ -91,7 +206,7 @@ class ConnectionContext:
 class PgConnectionHandlerService:
     _storage: threading.local
     sync_lock: threading.Lock
-    sync_event: threading.Event
+    waiters: Deque[ConnectionWaiter]
 
     environment: EnvironmentService
     shutdown_service: ShutdownService
@@ -100,8 +215,12 @@ class PgConnectionHandlerService:
         shutdown_service.register(self)
         self._storage = threading.local()
         self.sync_lock = threading.Lock()
-        self.sync_event = threading.Event()
-        self.sync_event.set()
+        # threads waiting for a connection, served in FIFO order
+        self.waiters = deque()
+        self.acquisitions = 0
+        self.exhaustions = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
 
         self.min_conn: int = max(
             int(self.environment.try_get("DATASTORE_MIN_CONNECTIONS") or 2), 2
@@ -112,10 +231,32 @@ class PgConnectionHandlerService:
         self.failover_connection_pool_timeout = int(
             self.environment.try_get("FAILOVER_CONNECTION_POOL_TIMEOUT") or 3600
         )
+        self.stream_batch_size = int(
+            self.environment.try_get(STREAM_BATCH_SIZE_ENVIRONMENT_VAR) or 1000
+        )
+        # in sec, 0 means waiting indefinitely
+        self.pool_timeout = float(
+            self.environment.try_get(POOL_TIMEOUT_ENVIRONMENT_VAR) or 0
+        )
+        self.statement_stats = self.get_statement_statistics()
         self.kwargs: Dict[str, Any] = self.get_connection_params()
         self.connection_pool: Optional[ThreadedConnectionPool] = None
+        # parse all json values with the same serializer which is used to write them
+        register_default_json(globally=True, loads=json_loads)
+        register_default_jsonb(globally=True, loads=json_loads)
         self.process_id: Optional[int] = 0
 
+    def get_statement_statistics(self) -> Optional[StatementStatistics]:
+        enabled = self.environment.is_truthy(
+            self.environment.try_get(STATEMENT_STATS_ENVIRONMENT_VAR)
+        )
+        threshold = self.environment.try_get(SLOW_STATEMENT_THRESHOLD_ENVIRONMENT_VAR)
+        if not enabled and not threshold:
+            return None
+        return StatementStatistics(
+            enabled, float(threshold) / 1000 if threshold else None
+        )
+
     def create_connection_pool(self, timeout: int = 0):  # pragma: no cover
         """
         If timeout is set, the first psycopg2-execption will be logged
@@ -174,49 +315,83 @@ class PgConnectionHandlerService:
         }
 
     def get_connection(self):
-        while True:
-            self.sync_event.wait()
-            with self.sync_lock:
-                if not self.sync_event.is_set():
-                    continue
-                if self.connection_pool is None:
-                    self.create_connection_pool()
-                    self.process_id = multiprocessing.current_process().pid
+        start = monotonic()
+        waiter: Optional[ConnectionWaiter] = None
+        with self.sync_lock:
+            if self.connection_pool is None:
+                self.create_connection_pool()
+                self.process_id = multiprocessing.current_process().pid
+            else:
+                if self.process_id != (
+                    process_id := multiprocessing.current_process().pid
+                ):
+                    msg = f"Try to change db-connection-pool process from {self.process_id} to {process_id}"
+                    logger.error(msg)
+                    raise BadCodingError(msg)
+            if old_conn := self.get_current_connection():
+                if old_conn.closed:
+                    # If an error happens while returning the connection to the pool, it
+                    # might still be set as the current connection although it is already
+                    # closed. In this case, we just discard it.
+                    logger.debug(
+                        f"Discarding old connection (closed={old_conn.closed})"
+                    )
+                    logger.debug(
+                        "This indicates a previous error, please check the logs"
+                    )
+                    self._put_connection(old_conn, True, False)
                 else:
-                    if self.process_id != (
-                        process_id := multiprocessing.current_process().pid
-                    ):
-                        msg = f"Try to change db-connection-pool process from {self.process_id} to {process_id}"
-                        logger.error(msg)
-                        raise BadCodingError(msg)
-                if old_conn := self.get_current_connection():
-                    if old_conn.closed:
-                        # If an error happens while returning the connection to the pool, it
-                        # might still be set as the current connection although it is already
-                        # closed. In this case, we just discard it.
-                        logger.debug(
-                            f"Discarding old connection (closed={old_conn.closed})"
-                        )
-                        logger.debug(
-                            "This indicates a previous error, please check the logs"
-                        )
-                        self._put_connection(old_conn, True, False)
-                    else:
-                        raise BadCodingError(
-                            "You cannot start multiple transactions in one thread!"
-                        )
-                try:
-                    connection = cast(
-                        ThreadedConnectionPool, self.connection_pool
-                    ).getconn()
-                except PoolError:
-                    self.sync_event.clear()
-                    continue
-                connection.autocommit = False
-                self.set_current_connection(connection)
-                break
+                    raise BadCodingError(
+                        "You cannot start multiple transactions in one thread!"
+                    )
+            # waiting threads must not be overtaken
+            if self.waiters or not self.has_free_connection():
+                waiter = ConnectionWaiter()
+                self.waiters.append(waiter)
+                self.exhaustions += 1
+            else:
+                connection = cast(
+                    ThreadedConnectionPool, self.connection_pool
+                ).getconn()
+                self.acquisitions += 1
+        if waiter:
+            connection = self.wait_for_connection(waiter, start)
+        connection.autocommit = False
+        self.set_current_connection(connection)
         return connection
 
+    def has_free_connection(self) -> bool:
+        pool = cast(ThreadedConnectionPool, self.connection_pool)
+        return len(pool._used) < self.max_conn
+
+    def wait_for_connection(self, waiter: ConnectionWaiter, start: float):
+        waiter.event.wait(self.pool_timeout or None)
+        with self.sync_lock:
+            self.wait_time += monotonic() - start
+            # the connection may have been handed over right after the timeout
+            if not waiter.event.is_set():
+                self.waiters.remove(waiter)
+                self.timeouts += 1
+                msg = f"Timeout while waiting for a database connection ({self.pool_timeout}s)"
+                logger.error(msg)
+                raise DatabaseError(msg)
+        if waiter.error:
+            self.raise_error(waiter.error)
+        return waiter.connection
+
+    def serve_waiters(self) -> None:
+        """Hands over free connections to the waiting threads. Needs the sync_lock."""
+        while self.waiters and self.has_free_connection():
+            waiter = self.waiters.popleft()
+            try:
+                waiter.connection = cast(
+                    ThreadedConnectionPool, self.connection_pool
+                ).getconn()
+                self.acquisitions += 1
+            except psycopg2.Error as e:
+                waiter.error = e
+            waiter.event.set()
+
     def put_connection(self, connection, has_error=False, new_connection_pool=False):
         with self.sync_lock:
             self._put_connection(connection, has_error, new_connection_pool)
@@ -244,19 +419,34 @@ class PgConnectionHandlerService:
             self.shutdown()  # pragma: no cover
             self.create_connection_pool(self.failover_connection_pool_timeout)
             logger.info("Successfully recreated DB connection pool.")
-        self.sync_event.set()
+        self.serve_waiters()
+
+    def get_connection_context(self, autocommit=False):
+        return ConnectionContext(self, autocommit)
 
-    def get_connection_context(self):
-        return ConnectionContext(self)
+    def get_pool_stats(self) -> ConnectionPoolStats:
+        with self.sync_lock:
+            return {
+                "max_connections": self.max_conn,
+                "checked_out": (
+                    len(self.connection_pool._used) if self.connection_pool else 0
+                ),
+                "waiting": len(self.waiters),
+                "acquisitions": self.acquisitions,
+                "exhaustions": self.exhaustions,
+                "timeouts": self.timeouts,
+                "wait_time": self.wait_time,
+            }
 
     def to_json(self, data):
-        return Json(data)
+        return Json(data, dumps=json_dumps)
 
     def execute(self, query, arguments, sql_parameters=[], use_execute_values=False):
         prepared_query = self.prepare_query(query, sql_parameters)
         with self.get_current_connection().cursor() as cursor:
+            start = monotonic()
             if use_execute_values:
-                execute_values(  # pragma: no cover
+                execute_values(
                     cursor,
                     prepared_query,
                     arguments,
@@ -264,10 +454,18 @@ class PgConnectionHandlerService:
                 )
             else:
                 cursor.execute(prepared_query, arguments)
+            self.observe_query(
+                "execute",
+                query,
+                monotonic() - start,
+                max(cursor.rowcount, 0),
+                rows_returned=False,
+            )
 
     def query(self, query, arguments, sql_parameters=[], use_execute_values=False):
         prepared_query = self.prepare_query(query, sql_parameters)
         with self.get_current_connection().cursor() as cursor:
+            start = monotonic()
             if use_execute_values:
                 result = execute_values(  # pragma: no cover
                     cursor,
@@ -279,13 +477,56 @@ class PgConnectionHandlerService:
             else:
                 cursor.execute(prepared_query, arguments)
                 result = cursor.fetchall()
+            self.observe_query("query", query, monotonic() - start, len(result))
             return result
 
+    def copy_from(self, table, columns, rows):
+        query = sql.SQL("copy {} ({}) from stdin").format(
+            sql.Identifier(table), sql.SQL(", ").join(map(sql.Identifier, columns))
+        )
+        with self.get_current_connection().cursor() as cursor:
+            start = monotonic()
+            cursor.copy_expert(query, CopyInput(rows))
+            self.observe_query(
+                "copy",
+                f"copy {table} ({', '.join(columns)}) from stdin",
+                monotonic() - start,
+                max(cursor.rowcount, 0),
+                rows_returned=False,
+            )
+
+    def query_stream(self, query, arguments, sql_parameters=[]):
+        prepared_query = self.prepare_query(query, sql_parameters)
+        # named cursors are declared as server-side cursors in the current transaction
+        with self.get_current_connection().cursor(
+            name=f"stream_{uuid4().hex}"
+        ) as cursor:
+            cursor.itersize = self.stream_batch_size
+            start = monotonic()
+            cursor.execute(prepared_query, arguments)
+            # the rows are fetched while they are consumed, so only the execution of
+            # the statement is measured
+            duration = monotonic() - start
+            rows = 0
+            try:
+                for row in cursor:
+                    rows += 1
+                    yield row
+            finally:
+                self.observe_query("stream", query, duration, rows)
+
     def query_single_value(self, query, arguments, sql_parameters=[]):
         prepared_query = self.prepare_query(query, sql_parameters)
         with self.get_current_connection().cursor() as cursor:
+            start = monotonic()
             cursor.execute(prepared_query, arguments)
             result = cursor.fetchone()
+            self.observe_query(
+                "query_single_value",
+                query,
+                monotonic() - start,
+                int(result is not None),
+            )
 
             if result is None:
                 return None
@@ -297,6 +538,25 @@ class PgConnectionHandlerService:
         result = self.query(query, arguments, sql_parameters, use_execute_values)
         return list(map(lambda row: row[0], result))
 
+    def observe_query(
+        self,
+        operation: str,
+        query: str,
+        duration: float,
+        rows: int = 0,
+        rows_returned: bool = True,
+    ) -> None:
+        QUERY_DURATION.observe(duration, (operation,))
+        if rows and rows_returned:
+            ROWS_RETURNED.inc(rows)
+        if self.statement_stats:
+            self.statement_stats.record(query, duration, rows)
+
+    def get_statement_stats(self) -> List[StatementStat]:
+        if not self.statement_stats:
+            return []
+        return self.statement_stats.get_stats()
+
     def prepare_query(self, query, sql_parameters):
         prepared_query = sql.SQL(query).format(
             *[sql.Identifier(param) for param in sql_parameters]
@@ -311,5 +571,7 @@ class PgConnectionHandlerService:
             raise DatabaseError(msg, e)
 
     def shutdown(self):
+        if self.statement_stats:
+            self.statement_stats.log_summary()
         cast(ThreadedConnectionPool, self.connection_pool).closeall()
         self.connection_pool = None
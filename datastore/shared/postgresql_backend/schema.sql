@@ -39,11 +39,26 @@ CREATE TABLE IF NOT EXISTS events (
     fqid VARCHAR(48) NOT NULL,
     type event_type NOT NULL,
     data JSONB,
-    weight INTEGER NOT NULL
+    weight INTEGER NOT NULL,
+    collection VARCHAR(32) GENERATED ALWAYS AS (split_part(fqid, '/', 1)) STORED,
+    model_id INTEGER GENERATED ALWAYS AS (split_part(fqid, '/', 2)::integer) STORED
 );
+-- Since `id` is already taken by the event id, the id of the model is called `model_id` here. The
+-- generated columns were introduced with an update. Adding them to an existing table rewrites the
+-- whole table once, which can be done beforehand with `cli/add_generated_columns.py`.
+ALTER TABLE events ADD COLUMN IF NOT EXISTS collection VARCHAR(32) GENERATED ALWAYS AS (split_part(fqid, '/', 1)) STORED;
+ALTER TABLE events ADD COLUMN IF NOT EXISTS model_id INTEGER GENERATED ALWAYS AS (split_part(fqid, '/', 2)::integer) STORED;
+-- The names of the fields modified by the event. Only filled if the writer uses the `array` layout
+-- (see `DATASTORE_MODIFIED_FIELDS_LAYOUT`), otherwise `events_to_collectionfields` is used. Lock
+-- checks look up the events of a single model (`event_fqid_idx`) or the recent events of a
+-- collection (`event_collection_position_idx`), so the column itself is not indexed.
+ALTER TABLE events ADD COLUMN IF NOT EXISTS modified_fields VARCHAR(207)[];
 CREATE INDEX IF NOT EXISTS event_position_idx ON events (position);
 CREATE INDEX IF NOT EXISTS event_fqid_idx ON events (fqid);
 CREATE INDEX IF NOT EXISTS event_data_meeting_id_idx ON events ((data->>'meeting_id')) WHERE data->>'meeting_id' IS NOT NULL;
+CREATE INDEX IF NOT EXISTS event_collection_model_id_idx ON events (collection, model_id);
+-- used by the collectionfield locks with filters in the `array` layout
+CREATE INDEX IF NOT EXISTS event_collection_position_idx ON events (collection, position);
 
 -- For the `reserve_ids` feature
 CREATE TABLE IF NOT EXISTS id_sequences (
@@ -72,12 +87,21 @@ CREATE TABLE IF NOT EXISTS models (
     fqid VARCHAR(48) PRIMARY KEY,
     data JSONB NOT NULL,
     deleted BOOLEAN NOT NULL,
-    updated TIMESTAMP NOT NULL DEFAULT current_timestamp
+    updated TIMESTAMP NOT NULL DEFAULT current_timestamp,
+    -- counts the events of the model since its last snapshot, see DATASTORE_SNAPSHOT_INTERVAL
+    events_since_snapshot INTEGER NOT NULL DEFAULT 0,
+    collection VARCHAR(32) GENERATED ALWAYS AS (split_part(fqid, '/', 1)) STORED,
+    id INTEGER GENERATED ALWAYS AS (split_part(fqid, '/', 2)::integer) STORED
 );
 
--- The following field was introduced with an update. To make sure the column exists the table
--- is altered and the column added. This could maybe be deleted in the future.
+-- The following fields were introduced with an update. To make sure the columns exist the table
+-- is altered and the columns added. This could maybe be deleted in the future. For the generated
+-- columns, see the note at the events table.
 ALTER TABLE models ADD COLUMN IF NOT EXISTS updated timestamp NOT NULL DEFAULT current_timestamp;
+ALTER TABLE models ADD COLUMN IF NOT EXISTS events_since_snapshot INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE models ADD COLUMN IF NOT EXISTS collection VARCHAR(32) GENERATED ALWAYS AS (split_part(fqid, '/', 1)) STORED;
+ALTER TABLE models ADD COLUMN IF NOT EXISTS id INTEGER GENERATED ALWAYS AS (split_part(fqid, '/', 2)::integer) STORED;
+CREATE INDEX IF NOT EXISTS models_collection_id_idx ON models (collection, id);
 
 -- Trigger for setting the models updated column
 DROP TRIGGER IF EXISTS models_updated_trigger ON models;
@@ -86,6 +110,16 @@ CREATE TRIGGER models_updated_trigger
     FOR EACH ROW EXECUTE FUNCTION models_updated();
     END;
 
+-- Periodic snapshots of the models to speed up building historic models. Only written if
+-- DATASTORE_SNAPSHOT_INTERVAL is set. They are deleted when the events are migrated.
+CREATE TABLE IF NOT EXISTS model_snapshots (
+    fqid VARCHAR(48) NOT NULL,
+    position INTEGER REFERENCES positions(position) ON DELETE CASCADE,
+    data JSONB NOT NULL,
+    deleted BOOLEAN NOT NULL,
+    PRIMARY KEY (fqid, position)
+);
+
 -- Migrations
 CREATE TABLE IF NOT EXISTS migration_keyframes (
     id INTEGER PRIMARY KEY GENERATED ALWAYS AS IDENTITY,
@@ -106,6 +140,12 @@ CREATE TABLE IF NOT EXISTS migration_keyframe_models (
 CREATE INDEX IF NOT EXISTS migration_keyframe_models_idx ON migration_keyframe_models (keyframe_id, fqid);
 
 CREATE TABLE IF NOT EXISTS migration_events (LIKE events INCLUDING ALL);
+-- see the note at the events table
+ALTER TABLE migration_events ADD COLUMN IF NOT EXISTS modified_fields VARCHAR(207)[];
+ALTER TABLE migration_events ADD COLUMN IF NOT EXISTS collection VARCHAR(32) GENERATED ALWAYS AS (split_part(fqid, '/', 1)) STORED;
+ALTER TABLE migration_events ADD COLUMN IF NOT EXISTS model_id INTEGER GENERATED ALWAYS AS (split_part(fqid, '/', 2)::integer) STORED;
+CREATE INDEX IF NOT EXISTS migration_events_collection_model_id_idx ON migration_events (collection, model_id);
+CREATE INDEX IF NOT EXISTS migration_events_collection_position_idx ON migration_events (collection, position);
 
 CREATE TABLE IF NOT EXISTS migration_positions (
     position INTEGER PRIMARY KEY,
@@ -1,4 +1,5 @@
-from typing import List, Optional, Tuple
+import json
+from typing import Any, List, Optional, Tuple
 
 from datastore.shared.di import service_as_singleton
 from datastore.shared.services.read_database import (
@@ -8,7 +9,6 @@ from datastore.shared.services.read_database import (
     MappedFieldsFilterQueryFieldsParameters,
 )
 from datastore.shared.util import (
-    KEYSEPARATOR,
     And,
     BadCodingError,
     DeletedModelsBehaviour,
@@ -20,6 +20,8 @@ from datastore.shared.util import (
 )
 from datastore.shared.util.mapped_fields import MappedFields
 
+from .filter_index_registry import FilterIndexRegistry
+
 
 # extend if neccessary. first is always the default (should be int)
 # min/max functions support the following:
@@ -31,6 +33,8 @@ VALID_AGGREGATE_FUNCTIONS = ["min", "max", "count"]
 
 @service_as_singleton
 class SqlQueryHelper:
+    filter_index_registry: FilterIndexRegistry
+
     def get_deleted_condition(
         self, flag: DeletedModelsBehaviour, prepend_and: bool = True
     ) -> str:
@@ -61,13 +65,13 @@ class SqlQueryHelper:
         collection: str,
         filter: Filter,
         fields_params: Optional[BaseFilterQueryFieldsParameters] = None,
-        select_fqid: bool = False,
+        select_id: bool = False,
     ) -> Tuple[str, List[str], List[str]]:
         arguments: List[str] = []
         sql_parameters: List[str] = []
-        filter_str = self.build_filter_str(filter, arguments)
+        filter_str = self.build_filter_str(filter, arguments, collection=collection)
 
-        arguments = [collection + KEYSEPARATOR + "%"] + arguments
+        arguments = [collection] + arguments
 
         if isinstance(fields_params, MappedFieldsFilterQueryFieldsParameters):
             fields, mapped_field_args = self.build_select_from_mapped_fields(
@@ -95,10 +99,10 @@ class SqlQueryHelper:
             fields += f" AS {fields_params.function},\
                         (SELECT MAX(position) FROM positions) AS position"
 
-        if select_fqid:
-            fields = f"fqid as __fqid__, {fields}"
+        if select_id:
+            fields = f"id as __id__, {fields}"
 
-        query = f"select {fields} from models where fqid like %s and ({filter_str})"
+        query = f"select {fields} from models where collection = %s and ({filter_str})"
         return (
             query,
             arguments,
@@ -106,21 +110,29 @@ class SqlQueryHelper:
         )
 
     def build_filter_str(
-        self, filter: Filter, arguments: List[str], table_alias=""
+        self,
+        filter: Filter,
+        arguments: List[str],
+        table_alias="",
+        collection: Optional[str] = None,
     ) -> str:
+        """
+        If the collection is given, the condition is built for the models of this
+        collection and may make use of the configured filter indexes.
+        """
         if isinstance(filter, Not):
             filter_str = self.build_filter_str(
-                filter.not_filter, arguments, table_alias
+                filter.not_filter, arguments, table_alias, collection
             )
             return f"NOT ({filter_str})"
         elif isinstance(filter, Or):
             return " OR ".join(
-                f"({self.build_filter_str(part, arguments, table_alias)})"
+                f"({self.build_filter_str(part, arguments, table_alias, collection)})"
                 for part in filter.or_filter
             )
         elif isinstance(filter, And):
             return " AND ".join(
-                f"({self.build_filter_str(part, arguments, table_alias)})"
+                f"({self.build_filter_str(part, arguments, table_alias, collection)})"
                 for part in filter.and_filter
             )
         elif isinstance(filter, FilterOperator):
@@ -139,9 +151,60 @@ class SqlQueryHelper:
                     condition = f"{table_alias}data->>%s ILIKE %s::text"
                 elif filter.operator in ("=", "!="):
                     condition = f"{table_alias}data->>%s {filter.operator} %s::text"
+                    if (
+                        filter.operator == "="
+                        and collection
+                        and self.filter_index_registry.uses_gin_index(
+                            collection, filter.field
+                        )
+                        and (documents := self.get_containment_documents(filter))
+                    ):
+                        # the GIN index only supports containment checks, which may
+                        # also match other values, so the original condition is kept
+                        containment = " OR ".join(
+                            [f"{table_alias}data @> %s::jsonb"] * len(documents)
+                        )
+                        condition = f"({containment}) AND {condition}"
+                        arguments += documents
                 else:
                     condition = f"({table_alias}data->%s)::numeric {filter.operator} %s"
                 arguments += [filter.field, filter.value]
             return condition
         else:
             raise BadCodingError("Invalid filter type")
+
+    def get_containment_documents(self, filter: FilterOperator) -> List[str]:
+        """
+        Returns JSON documents so that every model for which `data->>field` equals the
+        text representation of the filter value contains at least one of them. An
+        empty list is returned if the value cannot be handled.
+        """
+        text = self.get_text_representation(filter.value)
+        if text is None:
+            return []
+        field = json.dumps(filter.field)
+        # the value may be stored as string...
+        documents = [f"{{{field}:{json.dumps(text)}}}"]
+        # ...or as any other JSON value with the same text representation
+        try:
+            value = json.loads(text, parse_constant=self.reject_constant)
+        except ValueError:
+            pass
+        else:
+            if not isinstance(value, str):
+                documents.append(f"{{{field}:{text}}}")
+        return documents
+
+    def get_text_representation(self, value: Any) -> Optional[str]:
+        """Returns the value as postgres would cast it to text."""
+        if isinstance(value, bool):
+            return str(value).lower()
+        elif isinstance(value, str):
+            return value
+        elif isinstance(value, int):
+            return str(value)
+        return None
+
+    def reject_constant(self, constant: str) -> None:
+        # NaN and Infinity are not valid JSON for postgres
+        raise ValueError(constant)
@@ -1,14 +1,27 @@
+import time
 from collections import defaultdict
 from textwrap import dedent
-from typing import Any, ContextManager, Dict, Iterable, List, Optional
+from typing import (
+    Any,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
 
 from datastore.shared.di import service_as_singleton
 from datastore.shared.postgresql_backend import apply_fields
 from datastore.shared.postgresql_backend.sql_query_helper import SqlQueryHelper
 from datastore.shared.services.read_database import (
     BaseAggregateFilterQueryFieldsParameters,
+    BaseFilterQueryFieldsParameters,
     HistoryInformation,
     MappedFieldsFilterQueryFieldsParameters,
+    QueryPlan,
 )
 from datastore.shared.typing import Collection, Field, Fqid, Id, Model, Position
 from datastore.shared.util import (
@@ -19,10 +32,7 @@ from datastore.shared.util import (
     Filter,
     InvalidDatastoreState,
     ModelDoesNotExist,
-    collection_and_id_from_fqid,
-    fqid_from_collection_and_id,
     get_exception_for_deleted_models_behaviour,
-    id_from_fqid,
 )
 from datastore.shared.util.mapped_fields import MappedFields
 
@@ -87,49 +97,98 @@ class SqlReadDatabaseBackendService:
     ) -> Dict[Id, Model]:
         if mapped_fields is None:
             mapped_fields = MappedFields()
-        del_cond = self.query_helper.get_deleted_condition(get_deleted_models)
-        (
-            mapped_fields_str,
-            mapped_field_args,
-        ) = self.query_helper.build_select_from_mapped_fields(mapped_fields)
-        query = f"""
-            select fqid as __fqid__, {mapped_fields_str} from models
-            where fqid like %s {del_cond}"""
+        query, arguments = self.build_get_all_query(
+            collection, mapped_fields, get_deleted_models
+        )
         models = self.fetch_models(
             query,
-            mapped_field_args + [fqid_from_collection_and_id(collection, "%")],
+            arguments,
             mapped_fields.unique_fields,
             mapped_fields.unique_fields,
         )
         return models
 
-    def get_everything(
+    def get_all_stream(
         self,
+        collection: Collection,
+        mapped_fields: Optional[MappedFields] = None,
         get_deleted_models: DeletedModelsBehaviour = DeletedModelsBehaviour.NO_DELETED,
-    ) -> Dict[Collection, Dict[Id, Model]]:
-        del_cond = self.query_helper.get_deleted_condition(
-            get_deleted_models, prepend_and=False
+    ) -> Iterator[Tuple[Id, Model]]:
+        if mapped_fields is None:
+            mapped_fields = MappedFields()
+        query, arguments = self.build_get_all_query(
+            collection, mapped_fields, get_deleted_models
         )
+        result = self.connection.query_stream(
+            query, arguments, mapped_fields.unique_fields
+        )
+        for row in result:
+            yield row["__id__"], self.get_model_from_row(
+                row, mapped_fields.unique_fields
+            )
+
+    def build_get_all_query(
+        self,
+        collection: Collection,
+        mapped_fields: MappedFields,
+        get_deleted_models: DeletedModelsBehaviour,
+    ) -> Tuple[str, List[Any]]:
+        del_cond = self.query_helper.get_deleted_condition(get_deleted_models)
+        (
+            mapped_fields_str,
+            mapped_field_args,
+        ) = self.query_helper.build_select_from_mapped_fields(mapped_fields)
         query = f"""
-            select fqid as __fqid__, data from models
-            {"where " + del_cond if del_cond else ""}"""
+            select id as __id__, {mapped_fields_str} from models
+            where collection = %s {del_cond}"""
+        return query, mapped_field_args + [collection]
+
+    def get_everything(
+        self,
+        get_deleted_models: DeletedModelsBehaviour = DeletedModelsBehaviour.NO_DELETED,
+    ) -> Dict[Collection, Dict[Id, Model]]:
+        query = self.build_get_everything_query(get_deleted_models)
         result = self.connection.query(query, [], [])
 
         data: Dict[Collection, Dict[Id, Model]] = defaultdict(dict)
         for row in result:
-            collection, id = collection_and_id_from_fqid(row["__fqid__"])
-            model = row["data"]
-            model["id"] = id
+            collection, id, model = self.get_everything_model_from_row(row)
             data[collection][id] = model
 
         return data
 
+    def get_everything_stream(
+        self,
+        get_deleted_models: DeletedModelsBehaviour = DeletedModelsBehaviour.NO_DELETED,
+    ) -> Iterator[Tuple[Collection, Id, Model]]:
+        query = self.build_get_everything_query(get_deleted_models)
+        # keep the models of one collection together
+        query += " order by collection"
+        result = self.connection.query_stream(query, [], [])
+        for row in result:
+            yield self.get_everything_model_from_row(row)
+
+    def build_get_everything_query(
+        self, get_deleted_models: DeletedModelsBehaviour
+    ) -> str:
+        del_cond = self.query_helper.get_deleted_condition(
+            get_deleted_models, prepend_and=False
+        )
+        return f"""
+            select collection, id, data from models
+            {"where " + del_cond if del_cond else ""}"""
+
+    def get_everything_model_from_row(self, row) -> Tuple[Collection, Id, Model]:
+        model = row["data"]
+        model["id"] = row["id"]
+        return row["collection"], row["id"], model
+
     def filter(
         self, collection: Collection, filter: Filter, mapped_fields: List[Field]
     ) -> Dict[Id, Model]:
         fields_params = MappedFieldsFilterQueryFieldsParameters(mapped_fields)
         query, arguments, sql_params = self.query_helper.build_filter_query(
-            collection, filter, fields_params, select_fqid=True
+            collection, filter, fields_params, select_id=True
         )
         models = self.fetch_models(query, arguments, sql_params, mapped_fields)
         return models
@@ -146,6 +205,32 @@ class SqlReadDatabaseBackendService:
         value = self.connection.query(query, arguments, sql_params)
         return value[0].copy()
 
+    def explain_filter(
+        self,
+        collection: Collection,
+        filter: Filter,
+        fields_params: BaseFilterQueryFieldsParameters,
+    ) -> QueryPlan:
+        query, arguments, sql_params = self.query_helper.build_filter_query(
+            collection,
+            filter,
+            fields_params,
+            select_id=isinstance(
+                fields_params, MappedFieldsFilterQueryFieldsParameters
+            ),
+        )
+        start = time.perf_counter()
+        plan = self.connection.query_single_value(
+            "explain (analyze, buffers, format json) " + query, arguments, sql_params
+        )
+        duration = (time.perf_counter() - start) * 1000
+        return {
+            "query": dedent(query).strip(),
+            "arguments": arguments,
+            "plan": plan,
+            "duration": duration,
+        }
+
     def fetch_models(
         self,
         query: str,
@@ -157,16 +242,19 @@ class SqlReadDatabaseBackendService:
         result = self.connection.query(query, arguments, sql_parameters)
         models = {}
         for row in result:
-            # if there are mapped_fields, we already resolved them in the query and
-            # can just copy all fields. else we can just use the whole `data` field
-            if len(mapped_fields) > 0:
-                model = row.copy()
-                del model["__fqid__"]
-            else:
-                model = row["data"]
-            models[id_from_fqid(row["__fqid__"])] = model
+            models[row["__id__"]] = self.get_model_from_row(row, mapped_fields)
         return models
 
+    def get_model_from_row(self, row, mapped_fields: List[str]) -> Model:
+        # if there are mapped_fields, we already resolved them in the query and
+        # can just copy all fields. else we can just use the whole `data` field
+        if len(mapped_fields) > 0:
+            model = row.copy()
+            del model["__id__"]
+        else:
+            model = row["data"]
+        return model
+
     def build_models_from_result(
         self, result, mapped_fields: MappedFields
     ) -> Dict[str, Model]:
@@ -201,48 +289,288 @@ class SqlReadDatabaseBackendService:
     def build_models_ignore_deleted(
         self, fqids: List[Fqid], position: Optional[Position] = None
     ) -> Dict[Fqid, Model]:
-        # Optionally only builds the models up to the specified position.
-        # TODO: There might be a speedup: Get the model from the readdb first.
-        # If the model exists there, read the position from it, use the model
-        # as a starting point in `build_model_from_events` and just fetch all
-        # events after the position.
-        if position:
-            pos_cond = "and position <= %s"
-            pos_args = [position]
-        else:
-            pos_cond = ""
-            pos_args = []
+        """
+        Optionally only builds the models up to the specified position. The current
+        models and the newest snapshots up to the position are used as starting
+        points: If a model was not changed after the position, it is returned as is.
+        Otherwise, depending on which needs fewer events, the model is either built
+        from its newest snapshot (or its create event) onward or the changes after
+        the position are reverted on the current model.
+        """
+        if not fqids:
+            return {}
+        current_models = self.get_current_models(fqids)
+
+        models: Dict[Fqid, Model] = {}
+        outdated_fqids: List[Fqid] = []
+        for fqid in dict.fromkeys(fqids):
+            model = current_models.get(fqid)
+            if model is not None and (not position or model[META_POSITION] <= position):
+                models[fqid] = model
+            else:
+                outdated_fqids.append(fqid)
+        if not outdated_fqids:
+            return models
+        if not position:
+            models.update(self.build_models_from_events(outdated_fqids))
+            return models
+
+        snapshots = self.get_snapshots(outdated_fqids, position)
+        forward_fqids = [fqid for fqid in outdated_fqids if fqid not in current_models]
+        if reverse_fqids := [fqid for fqid in outdated_fqids if fqid in current_models]:
+            event_counts = self.get_event_counts(reverse_fqids, position, snapshots)
+            models_to_revert: Dict[Fqid, Model] = {}
+            for fqid, (
+                count_forward,
+                count_after,
+                last_position,
+            ) in event_counts.items():
+                # models with no events up to the position did not exist then
+                if last_position is None:
+                    continue
+                elif count_after < count_forward:
+                    models_to_revert[fqid] = current_models[fqid]
+                    models_to_revert[fqid][META_POSITION] = last_position
+                else:
+                    forward_fqids.append(fqid)
+            if models_to_revert:
+                models.update(
+                    self.revert_models_to_position(
+                        models_to_revert, position, snapshots
+                    )
+                )
 
+        if forward_fqids:
+            models.update(
+                self.build_models_from_events(forward_fqids, position, snapshots)
+            )
+        return models
+
+    def get_current_models(self, fqids: List[Fqid]) -> Dict[Fqid, Model]:
+        """
+        Returns the current models which can be used as a starting point for building
+        historic models. Models which are not backed by events are skipped.
+        """
+        query = "select fqid, data from models where fqid in %s"
+        result = self.connection.query(query, [tuple(fqids)])
+        return {
+            row["fqid"]: row["data"] for row in result if META_POSITION in row["data"]
+        }
+
+    def get_snapshots(self, fqids: List[Fqid], position: Position) -> Dict[Fqid, Model]:
+        """
+        Returns the newest snapshot up to the position per fqid. The snapshots
+        contain META_DELETED and META_POSITION.
+        """
+        query = dedent(
+            """\
+            select distinct on (fqid) fqid, data from model_snapshots
+            where fqid in %s and position <= %s order by fqid, position desc"""
+        )
+        result = self.connection.query(query, [tuple(fqids), position])
+        return {row["fqid"]: row["data"] for row in result}
+
+    def get_event_counts(
+        self, fqids: List[Fqid], position: Position, snapshots: Dict[Fqid, Model]
+    ) -> Dict[Fqid, Tuple[int, int, Optional[Position]]]:
+        """
+        Returns the amount of events between the newest snapshot and the position,
+        the amount of events after the position and the position of the last event
+        up to the position per fqid.
+        """
+        values, arguments = self.get_snapshot_positions_values(fqids, snapshots)
         query = dedent(
             f"""\
-            select fqid, type, data, position from events e
-            where fqid in %s {pos_cond}
-            order by position asc, weight asc"""
+            select e.fqid,
+                count(*) filter (
+                    where e.position > t.snapshot_position and e.position <= %s
+                ) as count_forward,
+                count(*) filter (where e.position > %s) as count_after,
+                max(e.position) filter (where e.position <= %s) as last_position
+            from events e join (values {values}) as t (fqid, snapshot_position)
+            on e.fqid = t.fqid group by e.fqid"""
         )
-
-        args: List[Any] = [tuple(fqids)]
-        db_events = self.connection.query(query, args + pos_args)
+        result = self.connection.query(
+            query, [position, position, position] + arguments
+        )
+        return {
+            row["fqid"]: (
+                row["count_forward"],
+                row["count_after"],
+                row["last_position"],
+            )
+            for row in result
+        }
+
+    def get_snapshot_positions_values(
+        self, fqids: List[Fqid], snapshots: Dict[Fqid, Model]
+    ) -> Tuple[str, List[Any]]:
+        """
+        Returns a VALUES list and its arguments which map each fqid to the position
+        of its snapshot or 0 if there is none.
+        """
+        values = ", ".join(["(%s, %s::integer)"] * len(fqids))
+        arguments: List[Any] = []
+        for fqid in fqids:
+            snapshot = snapshots.get(fqid)
+            arguments.extend((fqid, snapshot[META_POSITION] if snapshot else 0))
+        return values, arguments
+
+    def build_models_from_events(
+        self,
+        fqids: List[Fqid],
+        position: Optional[Position] = None,
+        snapshots: Optional[Dict[Fqid, Model]] = None,
+    ) -> Dict[Fqid, Model]:
+        snapshots = snapshots or {}
+        snapshots = {fqid: snapshots[fqid] for fqid in fqids if fqid in snapshots}
+        if snapshots:
+            values, arguments = self.get_snapshot_positions_values(fqids, snapshots)
+            query = dedent(
+                f"""\
+                select e.fqid, e.type, e.data, e.position from events e
+                join (values {values}) as t (fqid, snapshot_position)
+                on e.fqid = t.fqid
+                where e.position > t.snapshot_position and e.position <= %s
+                order by e.position asc, e.weight asc"""
+            )
+            db_events = self.connection.query(query, arguments + [position])
+        else:
+            if position:
+                pos_cond = "and position <= %s"
+                pos_args = [position]
+            else:
+                pos_cond = ""
+                pos_args = []
+
+            query = dedent(
+                f"""\
+                select fqid, type, data, position from events e
+                where fqid in %s {pos_cond}
+                order by position asc, weight asc"""
+            )
+            args: List[Any] = [tuple(fqids)]
+            db_events = self.connection.query(query, args + pos_args)
 
         events_per_fqid: Dict[Fqid, List[Dict[str, Any]]] = defaultdict(list)
         for event in db_events:
             events_per_fqid[event["fqid"]].append(event)
 
         models = {}
+        for fqid, snapshot in snapshots.items():
+            models[fqid] = self.build_model_from_events(
+                events_per_fqid.pop(fqid, []), snapshot
+            )
         for fqid, events in events_per_fqid.items():
             models[fqid] = self.build_model_from_events(events)
 
         return models
 
-    def build_model_from_events(self, events: List[Dict[str, Any]]) -> Model:
-        if not events:
-            raise BadCodingError()
+    def revert_models_to_position(
+        self,
+        models: Dict[Fqid, Model],
+        position: Position,
+        snapshots: Optional[Dict[Fqid, Model]] = None,
+    ) -> Dict[Fqid, Model]:
+        """
+        Reverts the given current models to the given position. The META_POSITION of
+        the models must already be set to the last position up to the given one.
+        Only the fields changed after the position are rebuilt from the snapshot and
+        the events up to the position which touch them; all other fields are taken
+        from the model.
+        """
+        snapshots = snapshots or {}
+        query = dedent(
+            """\
+            select fqid, type, data from events
+            where fqid in %s and position > %s"""
+        )
+        events_after = self.connection.query(query, [tuple(models.keys()), position])
+        modified_fields: Dict[Fqid, Set[Field]] = {fqid: set() for fqid in models}
+        for event in events_after:
+            modified_fields[event["fqid"]].update(self.get_fields_from_event(event))
+
+        values = ", ".join(["(%s, %s::text[], %s::integer)"] * len(models))
+        arguments: List[Any] = []
+        for fqid, fields in modified_fields.items():
+            snapshot = snapshots.get(fqid)
+            arguments.extend(
+                (fqid, list(fields), snapshot[META_POSITION] if snapshot else 0)
+            )
+        query = dedent(
+            f"""\
+            select e.fqid, e.type, e.data, e.position from events e
+            join (values {values}) as t (fqid, fields, snapshot_position)
+            on e.fqid = t.fqid
+            where e.position > t.snapshot_position and e.position <= %s and (
+                e.type in ('{EVENT_TYPE.CREATE}', '{EVENT_TYPE.DELETE}',
+                    '{EVENT_TYPE.RESTORE}')
+                or e.type in ('{EVENT_TYPE.UPDATE}',
+                    '{EVENT_TYPE.DELETE_FIELDS}') and e.data ?| t.fields
+                or e.type = '{EVENT_TYPE.LIST_FIELDS}' and (
+                    e.data->'add' ?| t.fields or e.data->'remove' ?| t.fields)
+            )
+            order by e.position asc, e.weight asc"""
+        )
+        events_before: Dict[Fqid, List[Dict[str, Any]]] = defaultdict(list)
+        for event in self.connection.query(query, arguments + [position]):
+            events_before[event["fqid"]].append(event)
+
+        result = {}
+        for fqid, model in models.items():
+            fields = modified_fields[fqid]
+            old_model = self.build_model_from_events(
+                events_before[fqid], snapshots.get(fqid)
+            )
+            result[fqid] = {
+                **{
+                    field: value
+                    for field, value in model.items()
+                    if field not in fields
+                },
+                **{
+                    field: value
+                    for field, value in old_model.items()
+                    if field in fields
+                },
+                META_DELETED: old_model[META_DELETED],
+                META_POSITION: model[META_POSITION],
+            }
+        return result
+
+    def get_fields_from_event(self, event: Dict[str, Any]) -> List[Field]:
+        if event["type"] in (EVENT_TYPE.CREATE, EVENT_TYPE.UPDATE):
+            return list(event["data"].keys())
+        elif event["type"] == EVENT_TYPE.DELETE_FIELDS:
+            return event["data"]
+        elif event["type"] == EVENT_TYPE.LIST_FIELDS:
+            return list(event["data"]["add"].keys()) + list(
+                event["data"]["remove"].keys()
+            )
+        else:
+            return []
+
+    def build_model_from_events(
+        self, events: List[Dict[str, Any]], snapshot: Optional[Model] = None
+    ) -> Model:
+        """
+        Applies the events to the snapshot or, if no snapshot is given, builds the
+        model from the events starting with the create event.
+        """
+        if snapshot is not None:
+            model: Model = {**snapshot}
+            following_events = events
+        else:
+            if not events:
+                raise BadCodingError()
 
-        create_event = events[0]
-        assert create_event["type"] == EVENT_TYPE.CREATE
-        model: Model = {**create_event["data"], META_DELETED: False}
+            create_event = events[0]
+            assert create_event["type"] == EVENT_TYPE.CREATE
+            model = {**create_event["data"], META_DELETED: False}
+            following_events = events[1:]
 
         # apply all other update/delete_fields
-        for event in events[1:]:
+        for event in following_events:
             if event["type"] == EVENT_TYPE.UPDATE:
                 model.update(event["data"])
             elif event["type"] == EVENT_TYPE.DELETE_FIELDS:
@@ -261,7 +589,8 @@ class SqlReadDatabaseBackendService:
             else:
                 raise BadCodingError()
 
-        model[META_POSITION] = events[-1]["position"]
+        if events:
+            model[META_POSITION] = events[-1]["position"]
         return model
 
     def is_deleted(self, fqid: Fqid, position: Optional[Position] = None) -> bool:
@@ -293,15 +622,27 @@ class SqlReadDatabaseBackendService:
             '{EVENT_TYPE.DELETE}',
             '{EVENT_TYPE.RESTORE}')"""
         )
+        # only events after the newest snapshot up to the position are considered
         query = f"""
-                select fqid, type from (
-                    select fqid, max(position) as position from events
-                    where type in {included_types} and position <= {position}
-                    and fqid in %s group by fqid
-                ) t natural join events order by position asc, weight asc
+                with snapshots as (
+                    select fqid, max(position) as position from model_snapshots
+                    where fqid in %s and position <= {position} group by fqid
+                )
+                select fqid, deleted from (
+                    select s.fqid, m.deleted, s.position, 0 as weight
+                    from snapshots s natural join model_snapshots m
+                    union all
+                    select fqid, type = '{EVENT_TYPE.DELETE}', position, weight from (
+                        select e.fqid, max(e.position) as position from events e
+                        left join snapshots s on e.fqid = s.fqid
+                        where e.type in {included_types} and e.position <= {position}
+                        and e.position > coalesce(s.position, 0)
+                        and e.fqid in %s group by e.fqid
+                    ) t natural join events
+                ) r order by position asc, weight asc
                 """
-        result = self.connection.query(query, [tuple(fqids)])
-        return {row["fqid"]: row["type"] == EVENT_TYPE.DELETE for row in result}
+        result = self.connection.query(query, [tuple(fqids), tuple(fqids)])
+        return {row["fqid"]: row["deleted"] for row in result}
 
     def get_history_information(
         self, fqids: List[Fqid]
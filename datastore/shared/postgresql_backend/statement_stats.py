@@ -0,0 +1,112 @@
+import hashlib
+import re
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from datastore.shared.util import logger
+
+
+# aggregates the execution time and rows of all statements per fingerprint
+STATEMENT_STATS_ENVIRONMENT_VAR = "DATASTORE_STATEMENT_STATS"
+# statements taking longer than this many ms are logged
+SLOW_STATEMENT_THRESHOLD_ENVIRONMENT_VAR = "DATASTORE_SLOW_STATEMENT_THRESHOLD"
+
+# further statements are aggregated under OTHER_FINGERPRINT to bound the memory usage
+MAX_FINGERPRINTS = 1000
+OTHER_FINGERPRINT = "other"
+
+# the amount of statements logged on shutdown
+SUMMARY_SIZE = 10
+
+NORMALIZATIONS: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"--[^\n]*"), ""),
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"(?<![\w.])\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\s+"), " "),
+    # collapse lists of placeholders and of tuples of them, e.g. in `values` clauses
+    (re.compile(r"\?(?: ?, ?\?)+"), "?, ..."),
+    (re.compile(r"(\([^()]*\))(?: ?, ?\1)+"), r"\1, ..."),
+]
+
+
+@lru_cache(maxsize=1024)
+def normalize_statement(query: str) -> Tuple[str, str]:
+    """
+    Returns the fingerprint and the shape of the given statement. The shape does not
+    contain any values, so that all executions of a statement are aggregated, and the
+    fingerprint is a short hash of it.
+    """
+    shape = query
+    for pattern, replacement in NORMALIZATIONS:
+        shape = pattern.sub(replacement, shape)
+    shape = shape.strip()
+    return hashlib.sha1(shape.encode()).hexdigest()[:12], shape
+
+
+@dataclass
+class StatementStat:
+    fingerprint: str
+    statement: str
+    calls: int = 0
+    # in sec
+    total_time: float = 0.0
+    max_time: float = 0.0
+    rows: int = 0
+
+
+class StatementStatistics:
+    """
+    Aggregates the executed statements of a connection handler per fingerprint and
+    logs the ones exceeding the threshold.
+    """
+
+    def __init__(self, enabled: bool, slow_threshold: Optional[float]) -> None:
+        self.enabled = enabled
+        # in sec
+        self.slow_threshold = slow_threshold
+        self.stats: Dict[str, StatementStat] = {}
+        self.lock = threading.Lock()
+
+    def record(self, query: str, duration: float, rows: int) -> None:
+        if self.slow_threshold is not None and duration >= self.slow_threshold:
+            fingerprint, statement = normalize_statement(query)
+            logger.warning(
+                f"Slow statement {fingerprint} ({duration * 1000:.1f} ms, {rows} rows): "
+                + statement
+            )
+        if not self.enabled:
+            return
+
+        fingerprint, statement = normalize_statement(query)
+        with self.lock:
+            if fingerprint not in self.stats:
+                if len(self.stats) >= MAX_FINGERPRINTS:
+                    fingerprint = statement = OTHER_FINGERPRINT
+                if fingerprint not in self.stats:
+                    self.stats[fingerprint] = StatementStat(fingerprint, statement)
+            stat = self.stats[fingerprint]
+            stat.calls += 1
+            stat.total_time += duration
+            stat.max_time = max(stat.max_time, duration)
+            stat.rows += rows
+
+    def get_stats(self) -> List[StatementStat]:
+        """Returns copies of all stats, the most expensive statements first."""
+        with self.lock:
+            stats = [StatementStat(**vars(stat)) for stat in self.stats.values()]
+        return sorted(stats, key=lambda stat: stat.total_time, reverse=True)
+
+    def log_summary(self) -> None:
+        stats = self.get_stats()[:SUMMARY_SIZE]
+        if not stats:
+            return
+        lines = [
+            f"{stat.fingerprint}: {stat.calls} calls, {stat.total_time * 1000:.1f} ms "
+            f"total, {stat.max_time * 1000:.1f} ms max, {stat.rows} rows: "
+            + stat.statement
+            for stat in stats
+        ]
+        logger.info("Most expensive statements:\n" + "\n".join(lines))
@@ -0,0 +1,10 @@
+# name of the stream into which the writer publishes the modified fields
+MODIFIED_FIELDS_TOPIC = "ModifiedFields"
+# name of the stream into which a message is published if all models may have changed,
+# e.g. after truncating the database or finalizing migrations
+MODELS_RESET_TOPIC = "ModelsReset"
+
+
+class ENVIRONMENT_VARIABLES:
+    HOST = "MESSAGE_BUS_HOST"
+    PORT = "MESSAGE_BUS_PORT"
@@ -1,5 +1,5 @@
 from .environment_service import EnvironmentService, EnvironmentVariableMissing
-from .read_database import HistoryInformation, ReadDatabase
+from .read_database import HistoryInformation, QueryPlan, ReadDatabase
 from .shutdown_service import ShutdownService
 
 
@@ -4,9 +4,11 @@ from typing import (
     ContextManager,
     Dict,
     Iterable,
+    Iterator,
     List,
     Optional,
     Protocol,
+    Tuple,
     TypedDict,
 )
 
@@ -22,6 +24,13 @@ class HistoryInformation(TypedDict):
     information: JSON
 
 
+class QueryPlan(TypedDict):
+    query: str
+    arguments: List[Any]
+    plan: JSON
+    duration: float  # in ms
+
+
 class BaseFilterQueryFieldsParameters:
     pass
 
@@ -93,6 +102,17 @@ class ReadDatabase(Protocol):
         amount of data. Use with caution!
         """
 
+    def get_all_stream(
+        self,
+        collection: Collection,
+        mapped_fields: Optional[MappedFields] = None,
+        get_deleted_models: DeletedModelsBehaviour = DeletedModelsBehaviour.NO_DELETED,
+    ) -> Iterator[Tuple[Id, Model]]:
+        """
+        Like `get_all`, but yields the models one by one while fetching them in
+        batches. Must be consumed inside the database context.
+        """
+
     def get_everything(
         self,
         get_deleted_models: DeletedModelsBehaviour = DeletedModelsBehaviour.NO_DELETED,
@@ -102,6 +122,16 @@ class ReadDatabase(Protocol):
         amount of data. Use with caution!
         """
 
+    def get_everything_stream(
+        self,
+        get_deleted_models: DeletedModelsBehaviour = DeletedModelsBehaviour.NO_DELETED,
+    ) -> Iterator[Tuple[Collection, Id, Model]]:
+        """
+        Like `get_everything`, but yields the models one by one while fetching them
+        in batches. The models of one collection are yielded consecutively. Must be
+        consumed inside the database context.
+        """
+
     def filter(
         self, collection: Collection, filter: Filter, mapped_fields: List[Field]
     ) -> Dict[Id, Model]:
@@ -120,6 +150,19 @@ class ReadDatabase(Protocol):
         Aggregates the filtered models according to fields_params.
         """
 
+    def explain_filter(
+        self,
+        collection: Collection,
+        filter: Filter,
+        fields_params: BaseFilterQueryFieldsParameters,
+    ) -> QueryPlan:
+        """
+        Executes the query built for the given filter and fields_params under
+        `EXPLAIN ANALYZE` and returns the query together with its plan and the
+        measured duration. Used by `filter` with MappedFieldsFilterQueryFieldsParameters
+        and by `aggregate` with the other fields_params.
+        """
+
     def build_model_ignore_deleted(
         self, fqid: Fqid, position: Optional[Position] = None
     ) -> Model:
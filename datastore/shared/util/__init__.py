@@ -15,6 +15,8 @@ from .exceptions import (
     ModelNotDeleted,
 )
 from .filter import And, Filter, FilterOperator, Not, Or, filter_definitions_schema
+from .json_serializer import json_dumps, json_loads
+from .json_stream import stream_json
 from .key_strings import (
     KEYSEPARATOR,
     META_DELETED,
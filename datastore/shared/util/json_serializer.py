@@ -0,0 +1,82 @@
+import json
+import re
+from typing import Any, Protocol, Union
+
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+
+class JsonSerializer(Protocol):
+    def dumps(self, data: Any) -> str:
+        """Serializes the data into compact JSON."""
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        """Parses the given JSON."""
+
+
+class StdlibJsonSerializer:
+    def dumps(self, data: Any) -> str:
+        return json.dumps(data, separators=(",", ":"))
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+
+# orjson parses integers exceeding 64 bit as floats; these have at least 19 digits
+LONG_NUMBER_PATTERN = re.compile(r"\d{19}")
+LONG_NUMBER_BYTES_PATTERN = re.compile(rb"\d{19}")
+
+
+class OrjsonSerializer:
+    """
+    Serializes via orjson, which is several times faster than the standard library.
+    orjson rejects some data the standard library accepts, e.g. integers exceeding
+    64 bit, so such data is serialized with the standard library instead. Since
+    orjson parses such integers as floats, JSON containing long numbers is parsed
+    with the standard library, too.
+    """
+
+    def __init__(self) -> None:
+        self.fallback = StdlibJsonSerializer()
+
+    def dumps(self, data: Any) -> str:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode()
+        except TypeError:
+            return self.fallback.dumps(data)
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        if isinstance(data, bytes):
+            is_long = LONG_NUMBER_BYTES_PATTERN.search(data) is not None
+        else:
+            is_long = LONG_NUMBER_PATTERN.search(data) is not None
+        if is_long:
+            return self.fallback.loads(data)
+        return orjson.loads(data)
+
+
+_json_serializer: JsonSerializer = (
+    OrjsonSerializer() if orjson else StdlibJsonSerializer()
+)
+
+
+def get_json_serializer() -> JsonSerializer:
+    return _json_serializer
+
+
+def set_json_serializer(json_serializer: JsonSerializer) -> None:
+    global _json_serializer
+    _json_serializer = json_serializer
+
+
+def json_dumps(data: Any) -> str:
+    """Serializes the data into compact JSON with the current serializer."""
+    return _json_serializer.dumps(data)
+
+
+def json_loads(data: Union[str, bytes]) -> Any:
+    """Parses the given JSON with the current serializer."""
+    return _json_serializer.loads(data)
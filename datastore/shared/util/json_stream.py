@@ -0,0 +1,79 @@
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .json_serializer import json_dumps
+
+
+# minimal size of the chunks yielded by `stream_json`, in characters
+JSON_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def stream_json(
+    rows: Iterable[Tuple[Any, ...]],
+    trailing: Optional[Dict[str, Any]] = None,
+    separators: Tuple[str, str] = (",", ":"),
+    chunk_size: int = JSON_STREAM_CHUNK_SIZE,
+) -> Iterator[str]:
+    """
+    Serializes nested objects chunk by chunk. Each row consists of the keys leading
+    to a value and the value itself, e.g. `(collection, id, model)`. Rows with the
+    same key prefix must be consecutive, otherwise the prefix is emitted twice. The
+    items of `trailing` are added to the outermost object after all rows. Joining
+    all chunks yields the same JSON as serializing the nested dict at once.
+    """
+    item_separator, key_separator = separators
+
+    def dumps(value: Any) -> str:
+        if separators == (",", ":"):
+            return json_dumps(value)
+        return json.dumps(value, separators=separators)
+
+    parts: List[str] = ["{"]
+    size = 1
+    # keys of the currently opened nested objects
+    stack: List[Any] = []
+    # whether the innermost opened object is still empty
+    empty = True
+
+    def write(*new_parts: str) -> None:
+        nonlocal size
+        parts.extend(new_parts)
+        size += sum(len(part) for part in new_parts)
+
+    def write_key(key: Any) -> None:
+        nonlocal empty
+        if not empty:
+            write(item_separator)
+        write(json.dumps(str(key)), key_separator)
+        empty = True
+
+    for *keys, value in rows:
+        common = 0
+        while common < min(len(stack), len(keys) - 1) and stack[common] == keys[common]:
+            common += 1
+        if len(stack) > common:
+            write("}" * (len(stack) - common))
+            del stack[common:]
+            empty = False
+        for key in keys[common:-1]:
+            write_key(key)
+            write("{")
+            stack.append(key)
+        write_key(keys[-1])
+        write(dumps(value))
+        empty = False
+
+        if size >= chunk_size:
+            yield "".join(parts)
+            parts.clear()
+            size = 0
+
+    if stack:
+        write("}" * len(stack))
+        empty = False
+    for key, value in (trailing or {}).items():
+        write_key(key)
+        write(dumps(value))
+        empty = False
+    write("}")
+    yield "".join(parts)
@@ -0,0 +1,184 @@
+"""
+Minimal in-process metrics in the Prometheus text exposition format. The metrics are
+always collected, so recording a value only takes a lock and a few additions. Each
+worker process has its own values.
+
+Example:
+```
+REQUESTS = Counter("datastore_requests_total", "Handled requests", ["route"])
+REQUESTS.inc(labels=("get",))
+
+DURATION = Histogram("datastore_request_duration_seconds", "Request duration")
+with DURATION.time():
+    ...
+```
+"""
+
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from math import inf
+from time import perf_counter
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# in sec
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+
+Labels = Tuple[str, ...]
+
+
+class Metric:
+    type: str
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+            *self.render_samples(),
+        ]
+
+    def render_samples(self) -> List[str]:
+        raise NotImplementedError()
+
+    def format_labels(self, labels: Labels, extra: Dict[str, str] = {}) -> str:
+        pairs = list(zip(self.labelnames, labels)) + list(extra.items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}"
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Labels, float] = {} if labelnames else {(): 0.0}
+
+    def inc(self, amount: float = 1, labels: Labels = ()) -> None:
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def get(self, labels: Labels = ()) -> float:
+        return self.values.get(labels, 0.0)
+
+    def render_samples(self) -> List[str]:
+        with self.lock:
+            values = list(self.values.items())
+        return [
+            f"{self.name}{self.format_labels(labels)} {format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # per labels: the amount of observations per bucket (the last one is +Inf),
+        # their sum and their count
+        self.values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            if labels not in self.values:
+                self.values[labels] = ([0] * (len(self.buckets) + 1), [0.0, 0])
+            counts, sum_and_count = self.values[labels]
+            counts[index] += 1
+            sum_and_count[0] += value
+            sum_and_count[1] += 1
+
+    @contextmanager
+    def time(self, labels: Labels = ()) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, labels)
+
+    def get_count(self, labels: Labels = ()) -> int:
+        return int(self.values[labels][1][1]) if labels in self.values else 0
+
+    def render_samples(self) -> List[str]:
+        with self.lock:
+            values = [
+                (labels, counts.copy(), sum_and_count.copy())
+                for labels, (counts, sum_and_count) in self.values.items()
+            ]
+        lines = []
+        for labels, counts, (sum, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, inf), counts):
+                cumulative += bucket_count
+                le = self.format_labels(labels, {"le": format_value(bound)})
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{self.format_labels(labels)} {sum!r}")
+            lines.append(f"{self.name}_count{self.format_labels(labels)} {int(count)}")
+        return lines
+
+
+# all metrics of this process by their name
+REGISTRY: Dict[str, Metric] = {}
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_value(value: float) -> str:
+    if value == inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+def render_gauge(name: str, documentation: str, value: float, type="gauge") -> str:
+    """Renders a single value which is only known at the time of the scrape."""
+    return "\n".join(
+        (
+            f"# HELP {name} {documentation}",
+            f"# TYPE {name} {type}",
+            f"{name} {format_value(value)}",
+        )
+    )
+
+
+def render_metrics() -> str:
+    return "\n".join(
+        "\n".join(metric.render()) for _, metric in sorted(REGISTRY.items())
+    )
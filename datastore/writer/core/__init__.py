@@ -11,12 +11,15 @@ from .write_request import (
     RequestUpdateEvent,
     WriteRequest,
 )
+from .write_scheduler import WriteScheduler
 from .writer import Writer
 
 
 def setup_di():
     from datastore.shared.di import injector
 
+    from .write_scheduler_service import WriteSchedulerService
     from .writer_service import WriterService
 
+    injector.register(WriteScheduler, WriteSchedulerService)
     injector.register(Writer, WriterService)
@@ -12,6 +12,12 @@ class Database(Protocol):
         Creates a new context to execute all actions inside
         """
 
+    def get_savepoint_context(self) -> ContextManager[None]:
+        """
+        Creates a savepoint inside the current context. If an exception is raised
+        inside, all changes since the savepoint are rolled back.
+        """
+
     def insert_events(
         self,
         events: List[BaseRequestEvent],
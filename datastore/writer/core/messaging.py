@@ -14,3 +14,8 @@ class Messaging(Protocol):
         """
         Should initiale all events to the message bus.
         """
+
+    def handle_reset(self) -> None:
+        """
+        Should notify the message bus that all models may have changed.
+        """
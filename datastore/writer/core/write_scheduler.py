@@ -0,0 +1,37 @@
+from typing import List, Protocol
+
+from datastore.shared.di import service_interface
+from datastore.shared.typing import Position
+
+from .write_request import WriteRequest
+
+
+@service_interface
+class WriteScheduler(Protocol):
+    """
+    Decides which write requests may be executed concurrently. All methods refer to
+    the write of the current thread.
+    """
+
+    def start(self, write_requests: List[WriteRequest]) -> None:
+        """
+        Blocks until the given write requests do not conflict with any write started
+        before. Has to be called inside the database context, so that every started
+        write already holds a database connection.
+        """
+
+    def register_position(self, position: Position) -> None:
+        """Registers the position created for the current write."""
+
+    def wait_for_previous_positions(self) -> None:
+        """
+        Blocks until all writes with a lower position are finished, so that the
+        positions become visible in ascending order. Has to be called before the
+        transaction is committed.
+        """
+
+    def finish(self) -> None:
+        """
+        Finishes the current write, if one was started. Has to be called after the
+        transaction was committed and the updates were propagated.
+        """
@@ -0,0 +1,184 @@
+import threading
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import List, Optional, Set
+
+from datastore.shared.di import service_as_singleton
+from datastore.shared.services import EnvironmentService
+from datastore.shared.typing import Collection, Position
+from datastore.shared.util import (
+    META_DELETED,
+    InvalidFormat,
+    collection_from_fqid,
+    collectionfield_from_fqid_and_field,
+    fqid_from_fqfield,
+)
+from datastore.shared.util.metrics import Histogram
+
+from .write_request import RequestCreateEvent, RequestUpdateEvent, WriteRequest
+
+
+WRITER_LOCKING_ENVIRONMENT_VAR = "DATASTORE_WRITER_LOCKING"
+
+LOCK_WAIT = Histogram(
+    "datastore_writer_lock_wait_seconds",
+    "Time writes waited for conflicting writes of the same process",
+)
+
+
+class LOCKING_MODE:
+    GLOBAL = "global"
+    FINE_GRAINED = "fine_grained"
+
+
+@dataclass
+class ScheduledWrite:
+    """
+    The keys of a write are the fqids and collectionfields it reads or modifies. The
+    collections are used if all fields of the collection may be affected.
+    """
+
+    exclusive: bool
+    keys: Set[str] = field(default_factory=set)
+    collections: Set[Collection] = field(default_factory=set)
+    running: bool = False
+    position: Optional[Position] = None
+
+    def get_touched_collections(self) -> Set[Collection]:
+        # fqids and collectionfields both start with the collection
+        return self.collections | set(collection_from_fqid(key) for key in self.keys)
+
+    def conflicts_with(self, other: "ScheduledWrite") -> bool:
+        return (
+            self.exclusive
+            or other.exclusive
+            or bool(self.keys & other.keys)
+            or bool(self.collections & other.get_touched_collections())
+            or bool(other.collections & self.get_touched_collections())
+        )
+
+
+@service_as_singleton
+class WriteSchedulerService:
+    """
+    Schedules the writes of all threads of this process. In the global mode, only
+    one write is executed at a time. In the fine-grained mode, writes may be executed
+    concurrently as long as their keys do not overlap. Conflicting writes are started
+    in the order of their arrival.
+
+    Overlapping keys are not only needed for the locked fields: Writes modifying the
+    same collectionfield update the same row of the collectionfields table, so they
+    are serialized by postgres anyway. Treating them as conflicts prevents deadlocks
+    between the row locks and the commit order (see `wait_for_previous_positions`).
+    """
+
+    environment: EnvironmentService
+
+    def __init__(self):
+        self.mode = (
+            self.environment.try_get(WRITER_LOCKING_ENVIRONMENT_VAR)
+            or LOCKING_MODE.GLOBAL
+        )
+        if self.mode not in (LOCKING_MODE.GLOBAL, LOCKING_MODE.FINE_GRAINED):
+            raise InvalidFormat(
+                f"Invalid value for {WRITER_LOCKING_ENVIRONMENT_VAR}: {self.mode}"
+            )
+        self.condition = threading.Condition()
+        # all started writes in the order of their arrival
+        self.writes: List[ScheduledWrite] = []
+        self.local = threading.local()
+
+    def start(self, write_requests: List[WriteRequest]) -> None:
+        write = self.get_scheduled_write(write_requests)
+        start = perf_counter()
+        with self.condition:
+            self.writes.append(write)
+            self.local.write = write
+            self.condition.wait_for(lambda: self.can_run(write))
+            write.running = True
+        LOCK_WAIT.observe(perf_counter() - start)
+
+    def get_scheduled_write(self, write_requests: List[WriteRequest]) -> ScheduledWrite:
+        if (
+            self.mode == LOCKING_MODE.GLOBAL
+            or len(write_requests) != 1
+            or write_requests[0].migration_index is not None
+        ):
+            return ScheduledWrite(exclusive=True)
+
+        write = ScheduledWrite(exclusive=False)
+        write_request = write_requests[0]
+        for event in write_request.events:
+            write.keys.add(event.fqid)
+            if isinstance(event, RequestCreateEvent):
+                fields = [*event.fields.keys(), META_DELETED]
+            elif isinstance(event, RequestUpdateEvent):
+                fields = [
+                    *event.fields.keys(),
+                    *event.list_fields.get("add", {}).keys(),
+                    *event.list_fields.get("remove", {}).keys(),
+                ]
+            else:
+                # deleting and restoring affects all fields of the model
+                write.collections.add(collection_from_fqid(event.fqid))
+                continue
+            write.keys.update(
+                collectionfield_from_fqid_and_field(event.fqid, field)
+                for field in fields
+            )
+        write.keys.update(write_request.locked_fqids.keys())
+        write.keys.update(
+            fqid_from_fqfield(fqfield) for fqfield in write_request.locked_fqfields
+        )
+        write.keys.update(write_request.locked_collectionfields.keys())
+        return write
+
+    def can_run(self, write: ScheduledWrite) -> bool:
+        previous_writes = self.writes[: self.writes.index(write)]
+        return not any(write.conflicts_with(other) for other in previous_writes)
+
+    def register_position(self, position: Position) -> None:
+        write = self.get_current_write()
+        if not write or write.position is not None:
+            return
+        with self.condition:
+            write.position = position
+            self.condition.notify_all()
+
+    def wait_for_previous_positions(self) -> None:
+        """
+        Readers use the highest visible position as the position of their results,
+        which is later used to lock fields. If a position became visible before a
+        lower one, changes of the lower position would not be covered by such a lock.
+        Writes which did not register a position yet may already have created a lower
+        one, so they are waited for, too. Since all started writes hold a database
+        connection and non-conflicting writes do not share any rows, they can always
+        proceed.
+        """
+        write = self.get_current_write()
+        if not write or write.exclusive or write.position is None:
+            return
+        position = write.position
+
+        def is_first() -> bool:
+            return not any(
+                other.running
+                and other is not write
+                and (other.position is None or other.position < position)
+                for other in self.writes
+            )
+
+        with self.condition:
+            self.condition.wait_for(is_first)
+
+    def finish(self) -> None:
+        write = self.get_current_write()
+        if not write:
+            return
+        with self.condition:
+            self.writes.remove(write)
+            self.local.write = None
+            self.condition.notify_all()
+
+    def get_current_write(self) -> Optional[ScheduledWrite]:
+        return getattr(self.local, "write", None)
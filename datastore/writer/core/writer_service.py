@@ -1,29 +1,61 @@
 import copy
 import threading
 from collections import defaultdict
-from typing import Dict, List, Set, Tuple
+from dataclasses import dataclass, field
+from time import sleep
+from typing import ClassVar, Dict, List, Optional, Set, Tuple
 
 from datastore.shared.di import service_as_factory
 from datastore.shared.postgresql_backend import retry_on_db_failure
-from datastore.shared.services import ReadDatabase
-from datastore.shared.typing import JSON, Field, Fqid
-from datastore.shared.util import META_DELETED, DatastoreNotEmpty, logger
+from datastore.shared.services import EnvironmentService, ReadDatabase
+from datastore.shared.typing import JSON, Field, Fqid, Position
+from datastore.shared.util import (
+    META_DELETED,
+    DatastoreException,
+    DatastoreNotEmpty,
+    logger,
+)
+from datastore.shared.util.metrics import Counter
 from datastore.shared.util.otel import make_span
 
 from .database import Database
 from .messaging import Messaging
 from .occ_locker import OccLocker
 from .write_request import BaseRequestEvent, RequestDeleteEvent, WriteRequest
+from .write_scheduler import WriteScheduler
+
+
+# in ms, 0 disables the group commit
+GROUP_COMMIT_WINDOW_ENVIRONMENT_VAR = "DATASTORE_GROUP_COMMIT_WINDOW"
+
+POSITIONS_WRITTEN = Counter(
+    "datastore_writer_positions_total", "Committed positions of this process"
+)
+EVENTS_WRITTEN = Counter(
+    "datastore_writer_events_total", "Committed request events of this process"
+)
+
+
+@dataclass
+class PendingWrite:
+    write_requests: List[WriteRequest]
+    log_all_modified_fields: bool
+    done: threading.Event = field(default_factory=threading.Event)
+    error: Optional[Exception] = None
 
 
 @service_as_factory
 class WriterService:
-    _lock = threading.Lock()
+    # writes collected for the next group commit
+    _group_lock = threading.Lock()
+    _pending_writes: ClassVar[List[PendingWrite]] = []
 
     database: Database
     read_database: ReadDatabase
     occ_locker: OccLocker
     messaging: Messaging
+    write_scheduler: WriteScheduler
+    environment: EnvironmentService
 
     @retry_on_db_failure
     def write(
@@ -34,21 +66,114 @@ class WriterService:
         with make_span("write request"):
             self.write_requests = write_requests
 
-            with self._lock:
-                self.position_to_modified_models = {}
-                with self.database.get_context():
-                    for write_request in self.write_requests:
-                        position, modified_models = self.write_with_database_context(
-                            write_request
+            if self.get_group_commit_window():
+                self.write_grouped(write_requests, log_all_modified_fields)
+            else:
+                try:
+                    with self.database.get_context():
+                        self.write_scheduler.start(write_requests)
+                        self.position_to_modified_models = (
+                            self.write_all_with_database_context(write_requests)
                         )
-                        self.position_to_modified_models[position] = modified_models
+                        self.write_scheduler.wait_for_previous_positions()
+                    self.record_written(write_requests)
 
-                # Only propagate updates to redis after the transaction has finished
-                self.propagate_updates_to_redis(log_all_modified_fields)
+                    # Only propagate updates to redis after the transaction has finished
+                    self.propagate_updates_to_redis(log_all_modified_fields)
+                finally:
+                    self.write_scheduler.finish()
 
             self.print_stats()
             self.print_summary()
 
+    def get_group_commit_window(self) -> float:
+        """Returns the group commit window in sec."""
+        return (
+            float(self.environment.try_get(GROUP_COMMIT_WINDOW_ENVIRONMENT_VAR) or 0)
+            / 1000
+        )
+
+    def write_grouped(
+        self, write_requests: List[WriteRequest], log_all_modified_fields: bool
+    ) -> None:
+        """
+        Writes the requests together with all other requests arriving in the group
+        commit window. The first request of a group waits for the window to pass and
+        then writes the whole group, while the others wait for it to finish.
+        """
+        pending_write = PendingWrite(write_requests, log_all_modified_fields)
+        with self._group_lock:
+            self._pending_writes.append(pending_write)
+            is_leader = len(self._pending_writes) == 1
+
+        if is_leader:
+            sleep(self.get_group_commit_window())
+            with self._group_lock:
+                group = self._pending_writes.copy()
+                self._pending_writes.clear()
+            self.write_group(group)
+        else:
+            pending_write.done.wait()
+
+        if pending_write.error:
+            raise pending_write.error
+
+    def write_group(self, group: List[PendingWrite]) -> None:
+        """
+        Writes all given requests in one transaction. Each one gets its own
+        savepoint, so that a failing request (e.g. because of locked fields) does not
+        affect the others. The updates of all successful requests are propagated in
+        one message.
+        """
+        self.position_to_modified_models = {}
+        log_all_modified_fields = False
+        try:
+            with self.database.get_context():
+                self.write_scheduler.start(
+                    [
+                        write_request
+                        for pending_write in group
+                        for write_request in pending_write.write_requests
+                    ]
+                )
+                for pending_write in group:
+                    try:
+                        with self.database.get_savepoint_context():
+                            position_to_modified_models = (
+                                self.write_all_with_database_context(
+                                    pending_write.write_requests
+                                )
+                            )
+                    except DatastoreException as e:
+                        pending_write.error = e
+                    else:
+                        self.position_to_modified_models.update(
+                            position_to_modified_models
+                        )
+                        log_all_modified_fields |= pending_write.log_all_modified_fields
+                self.write_scheduler.wait_for_previous_positions()
+            self.record_written(
+                [
+                    write_request
+                    for pending_write in group
+                    if not pending_write.error
+                    for write_request in pending_write.write_requests
+                ]
+            )
+            if self.position_to_modified_models:
+                self.propagate_updates_to_redis(log_all_modified_fields)
+        except Exception as e:
+            for pending_write in group:
+                pending_write.error = pending_write.error or e
+        finally:
+            self.write_scheduler.finish()
+            for pending_write in group:
+                pending_write.done.set()
+
+    def record_written(self, write_requests: List[WriteRequest]) -> None:
+        POSITIONS_WRITTEN.inc(len(write_requests))
+        EVENTS_WRITTEN.inc(sum(len(request.events) for request in write_requests))
+
     def print_stats(self) -> None:
         stats: Dict[str, int] = defaultdict(int)
         for write_request in self.write_requests:
@@ -71,6 +196,15 @@ class WriterService:
     def get_request_name(self, event: BaseRequestEvent) -> str:
         return type(event).__name__.replace("Request", "").replace("Event", "").upper()
 
+    def write_all_with_database_context(
+        self, write_requests: List[WriteRequest]
+    ) -> Dict[Position, Dict[Fqid, Dict[Field, JSON]]]:
+        position_to_modified_models = {}
+        for write_request in write_requests:
+            position, modified_models = self.write_with_database_context(write_request)
+            position_to_modified_models[position] = modified_models
+        return position_to_modified_models
+
     def write_with_database_context(
         self, write_request: WriteRequest
     ) -> Tuple[int, Dict[Fqid, Dict[Field, JSON]]]:
@@ -98,6 +232,7 @@ class WriterService:
                 information,
                 write_request.user_id,
             )
+            self.write_scheduler.register_position(position)
 
             return position, modified_fqfields
 
@@ -120,6 +255,7 @@ class WriterService:
         with self.database.get_context():
             self.database.truncate_db()
             logger.info("Database truncated")
+        self.messaging.handle_reset()
 
     @retry_on_db_failure
     def write_without_events(
@@ -145,6 +281,9 @@ class WriterService:
                     fqids_to_delete.append(event.fqid)
                 with self.database.get_context():
                     self.database.write_model_deletes_without_events(fqids_to_delete)
+                self.position_to_modified_models[0] = {
+                    fqid: {} for fqid in fqids_to_delete
+                }
             else:
                 with self.database.get_context():
                     for event in write_request.events:
@@ -154,7 +293,7 @@ class WriterService:
                             {event.fqid: fields_with_delete}
                         )
                 self.position_to_modified_models[0] = {event.fqid: event.fields}  # type: ignore
-                self.propagate_updates_to_redis(False)
+            self.propagate_updates_to_redis(False)
 
         self.print_stats()
         self.print_summary()
@@ -7,6 +7,7 @@ from datastore.shared.flask_frontend import (
     InvalidRequest,
     JsonResponse,
     add_health_route,
+    add_metrics_route,
     dev_only_route,
     handle_internal_errors,
 )
@@ -98,3 +99,4 @@ def register_routes(app, url_prefix):
             strict_slashes=False,
         )
     add_health_route(app, url_prefix)
+    add_metrics_route(app, url_prefix)
@@ -9,6 +9,7 @@ from .db_events import (
     apply_event_to_models,
 )
 from .event_translator import EventTranslator
+from .recent_changes import RecentChanges
 from .sql_database_backend_service import SqlDatabaseBackendService
 from .sql_occ_locker_backend_service import SqlOccLockerBackendService
 
@@ -17,5 +18,7 @@ def setup_di():
     from datastore.shared.di import injector
 
     from .event_translator import EventTranslatorService
+    from .recent_changes import RecentChangesService
 
     injector.register(EventTranslator, EventTranslatorService)
+    injector.register(RecentChanges, RecentChangesService)
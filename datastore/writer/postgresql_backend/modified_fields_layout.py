@@ -0,0 +1,29 @@
+from datastore.shared.services import EnvironmentService
+from datastore.shared.util import InvalidFormat
+
+
+MODIFIED_FIELDS_LAYOUT_ENVIRONMENT_VAR = "DATASTORE_MODIFIED_FIELDS_LAYOUT"
+
+
+class MODIFIED_FIELDS_LAYOUT:
+    """
+    How the fields modified by each event are stored for the lock checks. With TABLE,
+    one row per event and modified field is inserted into `events_to_collectionfields`.
+    With ARRAY, the names of the modified fields are stored in the `modified_fields`
+    column of the event itself.
+    """
+
+    TABLE = "table"
+    ARRAY = "array"
+
+
+def get_modified_fields_layout(environment: EnvironmentService) -> str:
+    layout = (
+        environment.try_get(MODIFIED_FIELDS_LAYOUT_ENVIRONMENT_VAR)
+        or MODIFIED_FIELDS_LAYOUT.TABLE
+    )
+    if layout not in (MODIFIED_FIELDS_LAYOUT.TABLE, MODIFIED_FIELDS_LAYOUT.ARRAY):
+        raise InvalidFormat(
+            f"Invalid value for {MODIFIED_FIELDS_LAYOUT_ENVIRONMENT_VAR}: {layout}"
+        )
+    return layout
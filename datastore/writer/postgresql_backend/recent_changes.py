@@ -0,0 +1,114 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Protocol, Set
+
+from datastore.shared.di import service_as_singleton, service_interface
+from datastore.shared.services import EnvironmentService
+from datastore.shared.typing import JSON, Field, Fqfield, Fqid, Position
+from datastore.shared.util import (
+    collectionfield_from_fqid_and_field,
+    fqfield_from_fqid_and_field,
+)
+
+
+# amount of positions kept in the index, 0 disables it
+RECENT_CHANGES_SIZE_ENVIRONMENT_VAR = "DATASTORE_OCC_RECENT_POSITIONS"
+DEFAULT_RECENT_CHANGES_SIZE = 1000
+
+# positions modifying more fields are not indexed to bound the memory usage, so lock
+# checks covering them are answered by the database
+MAX_FQFIELDS_PER_POSITION = 10000
+
+
+@dataclass
+class RecentChange:
+    migration_index: int
+    fqids: Set[Fqid]
+    fqfields: Set[Fqfield]
+    collectionfields: Set[str]
+
+
+@service_interface
+class RecentChanges(Protocol):
+    """
+    Bounded in-process index of the fqids, fqfields and collectionfields modified by
+    the most recent positions written by this process. It is used to check locks
+    without querying the events.
+    """
+
+    def get_size(self) -> int:
+        """Returns the maximum amount of indexed positions. 0 means disabled."""
+
+    def is_empty(self) -> bool:
+        """Returns whether no position is indexed."""
+
+    def add(
+        self,
+        position: Position,
+        migration_index: int,
+        modified_models: Dict[Fqid, Dict[Field, JSON]],
+    ) -> None:
+        """
+        Indexes the changes of the given position. Must be called in the transaction
+        which created the position, so that it is indexed before it becomes visible.
+        """
+
+    def get(self, position: Position) -> Optional[RecentChange]:
+        """Returns the changes of the given position if it is indexed."""
+
+    def clear(self) -> None:
+        """Removes all positions from the index."""
+
+
+@service_as_singleton
+class RecentChangesService:
+    environment: EnvironmentService
+
+    def __init__(self):
+        self.size = int(
+            self.environment.try_get(RECENT_CHANGES_SIZE_ENVIRONMENT_VAR)
+            or DEFAULT_RECENT_CHANGES_SIZE
+        )
+        self.changes: OrderedDict[Position, RecentChange] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_size(self) -> int:
+        return self.size
+
+    def is_empty(self) -> bool:
+        return not self.changes
+
+    def add(
+        self,
+        position: Position,
+        migration_index: int,
+        modified_models: Dict[Fqid, Dict[Field, JSON]],
+    ) -> None:
+        if self.size <= 0:
+            return
+        fqfield_count = sum(len(fields) for fields in modified_models.values())
+        if fqfield_count > MAX_FQFIELDS_PER_POSITION:
+            return
+
+        change = RecentChange(
+            migration_index, set(modified_models.keys()), set(), set()
+        )
+        for fqid, fields in modified_models.items():
+            for field in fields:
+                change.fqfields.add(fqfield_from_fqid_and_field(fqid, field))
+                change.collectionfields.add(
+                    collectionfield_from_fqid_and_field(fqid, field)
+                )
+
+        with self.lock:
+            self.changes[position] = change
+            while len(self.changes) > self.size:
+                self.changes.popitem(last=False)
+
+    def get(self, position: Position) -> Optional[RecentChange]:
+        return self.changes.get(position)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.changes.clear()
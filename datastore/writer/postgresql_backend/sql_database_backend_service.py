@@ -1,6 +1,7 @@
 from collections import defaultdict
+from contextlib import contextmanager
 from textwrap import dedent
-from typing import ContextManager, Dict, Iterable, List, Tuple
+from typing import ContextManager, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from datastore.shared.di import service_as_singleton
 from datastore.shared.postgresql_backend import (
@@ -8,7 +9,7 @@ from datastore.shared.postgresql_backend import (
     EVENT_TYPE,
     ConnectionHandler,
 )
-from datastore.shared.services import ReadDatabase
+from datastore.shared.services import EnvironmentService, ReadDatabase
 from datastore.shared.typing import JSON, Collection, Field, Fqid, Id, Model, Position
 from datastore.shared.util import (
     META_DELETED,
@@ -25,6 +26,8 @@ from datastore.writer.core import BaseRequestEvent
 
 from .db_events import BaseDbEvent, DbCreateEvent, apply_event_to_models
 from .event_translator import EventTranslator
+from .modified_fields_layout import MODIFIED_FIELDS_LAYOUT, get_modified_fields_layout
+from .recent_changes import RecentChanges
 
 
 # Max lengths of the important key parts:
@@ -37,7 +40,12 @@ FQID_MAX_LEN = 48  # collection + id
 COLLECTIONFIELD_MAX_LEN = 239  # collection + field
 
 
-EventData = Tuple[Position, Fqid, EVENT_TYPE, JSON, int]
+EventData = Tuple[Position, Fqid, EVENT_TYPE, JSON, int, Optional[List[Field]]]
+
+SNAPSHOT_INTERVAL_ENVIRONMENT_VAR = "DATASTORE_SNAPSHOT_INTERVAL"
+# amount of events from which on COPY is used to write them, 0 disables it
+COPY_THRESHOLD_ENVIRONMENT_VAR = "DATASTORE_COPY_THRESHOLD"
+DEFAULT_COPY_THRESHOLD = 10000
 
 
 @service_as_singleton
@@ -45,10 +53,25 @@ class SqlDatabaseBackendService:
     connection: ConnectionHandler
     read_database: ReadDatabase
     event_translator: EventTranslator
+    environment: EnvironmentService
+    recent_changes: RecentChanges
 
     def get_context(self) -> ContextManager[None]:
         return self.connection.get_connection_context()
 
+    def get_savepoint_context(self) -> ContextManager[None]:
+        return self.savepoint()
+
+    @contextmanager
+    def savepoint(self) -> Iterator[None]:
+        self.connection.execute("savepoint write_request", [])
+        try:
+            yield
+        except Exception:
+            self.connection.execute("rollback to savepoint write_request", [])
+            raise
+        self.connection.execute("release savepoint write_request", [])
+
     def insert_events(
         self,
         events: List[BaseRequestEvent],
@@ -60,6 +83,9 @@ class SqlDatabaseBackendService:
             raise BadCodingError()
 
         position = self.create_position(migration_index, information, user_id)
+        use_modified_fields_array = self.use_modified_fields_array()
+        # the events since the last snapshot are only counted if snapshots are written
+        count_events = self.get_snapshot_interval() > 0
 
         # save all changes to all models to send them over redis
         modified_models: Dict[Fqid, Dict[Field, JSON]] = defaultdict(dict)
@@ -67,6 +93,8 @@ class SqlDatabaseBackendService:
         max_id_per_collection: Dict[Collection, int] = {}
         # save the raw data of the events to be inserted
         events_data: List[EventData] = []
+        # save the amount of events per model to decide which models need a snapshot
+        event_counts: Dict[Fqid, int] = defaultdict(int)
         # save all event indices which modified collection fields to connect them later
         event_indices_per_modified_collectionfield: Dict[str, List[int]] = defaultdict(
             list
@@ -82,6 +110,8 @@ class SqlDatabaseBackendService:
             for db_event in db_events:
                 weight += 1
                 fqid = db_event.fqid
+                if count_events:
+                    event_counts[fqid] += 1
                 collection, id = collection_and_id_from_fqid(fqid)
 
                 # create event data
@@ -92,6 +122,11 @@ class SqlDatabaseBackendService:
                         db_event.event_type,
                         self.json(db_event.get_event_data()),
                         weight,
+                        (
+                            list(db_event.get_modified_fields())
+                            if use_modified_fields_array
+                            else None
+                        ),
                     )
                 )
 
@@ -110,21 +145,56 @@ class SqlDatabaseBackendService:
                 self.apply_event_to_models(db_event, models, position)
                 modified_models[fqid].update(db_event.get_modified_fields())
 
+        use_copy = self.use_copy(len(events_data))
         self.update_id_sequences(max_id_per_collection)
-        self.write_model_updates(models)
-        event_ids = self.write_events(events_data)
+        if use_copy:
+            events_since_snapshot = self.copy_model_updates(models, event_counts)
+            self.connection.copy_from(
+                "events",
+                ("position", "fqid", "type", "data", "weight", "modified_fields"),
+                events_data,
+            )
+        else:
+            events_since_snapshot = self.write_model_updates(models, event_counts)
+            event_ids = self.write_events(events_data)
+        self.write_model_snapshots(models, events_since_snapshot)
 
         # update collectionfield tables
         collectionfield_ids = self.insert_modified_collectionfields_into_db(
             event_indices_per_modified_collectionfield.keys(), position
         )
-        self.connect_events_and_collection_fields(
-            event_ids,
-            collectionfield_ids,
-            event_indices_per_modified_collectionfield.values(),
-        )
+        # with the array layout, the modified fields were written with the events
+        if not use_modified_fields_array:
+            if use_copy:
+                self.copy_events_to_collectionfields(
+                    position,
+                    collectionfield_ids,
+                    event_indices_per_modified_collectionfield.values(),
+                )
+            else:
+                self.connect_events_and_collection_fields(
+                    event_ids,
+                    collectionfield_ids,
+                    event_indices_per_modified_collectionfield.values(),
+                )
+        self.recent_changes.add(position, migration_index, modified_models)
         return position, modified_models
 
+    def use_copy(self, event_count: int) -> bool:
+        threshold = int(
+            self.environment.try_get(COPY_THRESHOLD_ENVIRONMENT_VAR)
+            or DEFAULT_COPY_THRESHOLD
+        )
+        return threshold > 0 and event_count >= threshold
+
+    def get_snapshot_interval(self) -> int:
+        return int(self.environment.try_get(SNAPSHOT_INTERVAL_ENVIRONMENT_VAR) or 0)
+
+    def use_modified_fields_array(self) -> bool:
+        return (
+            get_modified_fields_layout(self.environment) == MODIFIED_FIELDS_LAYOUT.ARRAY
+        )
+
     def create_position(
         self, migration_index: int, information: JSON, user_id: int
     ) -> Position:
@@ -159,17 +229,141 @@ class SqlDatabaseBackendService:
         apply_event_to_models(event, models)
         models[event.fqid][META_POSITION] = position
 
-    def write_model_updates(self, models: Dict[Fqid, Model]) -> None:
+    def write_model_updates(
+        self, models: Dict[Fqid, Model], event_counts: Dict[Fqid, int]
+    ) -> Dict[Fqid, int]:
+        """
+        Writes the models and adds the given event counts to their events since the
+        last snapshot. Returns the updated amounts of events since the last snapshot.
+        """
         statement = dedent(
             """\
-            insert into models (fqid, data, deleted) values %s
-            on conflict(fqid) do update set data=excluded.data, deleted=excluded.deleted;"""
+            insert into models (fqid, data, deleted, events_since_snapshot) values %s
+            on conflict(fqid) do update set data=excluded.data, deleted=excluded.deleted,
+                events_since_snapshot=models.events_since_snapshot+excluded.events_since_snapshot
+            returning fqid, events_since_snapshot"""
         )
-        self.connection.execute(
+        result = self.connection.query(
             statement,
             [
-                (fqid, self.json(model), model[META_DELETED])
+                (fqid, self.json(model), model[META_DELETED], event_counts[fqid])
+                for fqid, model in models.items()
+            ],
+            use_execute_values=True,
+        )
+        return {row["fqid"]: row["events_since_snapshot"] for row in result}
+
+    def copy_model_updates(
+        self, models: Dict[Fqid, Model], event_counts: Dict[Fqid, int]
+    ) -> Dict[Fqid, int]:
+        """
+        Same as `write_model_updates`, but the models are loaded into a temporary
+        table via COPY first and then merged into the models table.
+        """
+        self.create_copy_table(
+            "models_copy",
+            "fqid varchar(48), data jsonb, deleted boolean, events_since_snapshot integer",
+        )
+        self.connection.copy_from(
+            "models_copy",
+            ("fqid", "data", "deleted", "events_since_snapshot"),
+            (
+                (fqid, self.json(model), model[META_DELETED], event_counts[fqid])
                 for fqid, model in models.items()
+            ),
+        )
+        statement = dedent(
+            """\
+            insert into models (fqid, data, deleted, events_since_snapshot)
+            select fqid, data, deleted, events_since_snapshot from models_copy
+            on conflict(fqid) do update set data=excluded.data, deleted=excluded.deleted,
+                events_since_snapshot=models.events_since_snapshot+excluded.events_since_snapshot
+            returning fqid, events_since_snapshot"""
+        )
+        result = self.connection.query(statement, [])
+        return {row["fqid"]: row["events_since_snapshot"] for row in result}
+
+    def copy_events_to_collectionfields(
+        self,
+        position: Position,
+        collectionfield_ids: List[int],
+        event_indices_order: Iterable[List[int]],
+    ) -> None:
+        """
+        Same as `connect_events_and_collection_fields` for events written via COPY.
+        Since their ids are not known, the events are identified by their weight.
+        """
+        self.create_copy_table(
+            "events_to_collectionfields_copy",
+            "weight integer, collectionfield_id bigint",
+        )
+        self.connection.copy_from(
+            "events_to_collectionfields_copy",
+            ("weight", "collectionfield_id"),
+            (
+                # weight is 1-indexed while the indices are 0-indexed
+                (event_index + 1, collectionfield_id)
+                for collectionfield_id, event_indices in zip(
+                    collectionfield_ids, event_indices_order
+                )
+                for event_index in event_indices
+            ),
+        )
+        statement = dedent(
+            """\
+            insert into events_to_collectionfields (event_id, collectionfield_id)
+            select e.id, c.collectionfield_id from events_to_collectionfields_copy c
+            join events e on e.position = %s and e.weight = c.weight"""
+        )
+        self.connection.execute(statement, [position])
+
+    def create_copy_table(self, name: str, columns: str) -> None:
+        # the table may already exist if multiple requests are written in one
+        # transaction
+        self.connection.execute(
+            f"create temporary table if not exists {{}} ({columns}) on commit drop",
+            [],
+            [name],
+        )
+        self.connection.execute("truncate {}", [], [name])
+
+    def write_model_snapshots(
+        self, models: Dict[Fqid, Model], events_since_snapshot: Dict[Fqid, int]
+    ) -> None:
+        """
+        Writes a snapshot of every given model which has at least as many events
+        since its last snapshot as configured in DATASTORE_SNAPSHOT_INTERVAL and
+        resets its counter. Must be called after the models were written.
+        """
+        interval = self.get_snapshot_interval()
+        if interval <= 0:
+            return
+
+        snapshot_fqids = [
+            fqid for fqid, count in events_since_snapshot.items() if count >= interval
+        ]
+        if not snapshot_fqids:
+            return
+
+        statement = dedent(
+            """\
+            with snapshots as (
+                insert into model_snapshots (fqid, position, data, deleted) values %s
+                on conflict do nothing returning fqid
+            )
+            update models set events_since_snapshot=0
+            where fqid in (select fqid from snapshots)"""
+        )
+        self.connection.execute(
+            statement,
+            [
+                (
+                    fqid,
+                    models[fqid][META_POSITION],
+                    self.json(models[fqid]),
+                    models[fqid][META_DELETED],
+                )
+                for fqid in snapshot_fqids
             ],
             use_execute_values=True,
         )
@@ -206,7 +400,7 @@ class SqlDatabaseBackendService:
 
     def write_events(self, events_data: List[EventData]) -> List[int]:
         return self.connection.query_list_of_single_values(
-            "insert into events (position, fqid, type, data, weight) values %s returning id",
+            "insert into events (position, fqid, type, data, weight, modified_fields) values %s returning id",
             events_data,
             use_execute_values=True,
         )
@@ -296,3 +490,5 @@ class SqlDatabaseBackendService:
         # restart sequences manually to provide a clean db
         for seq in ("positions_position", "events_id", "collectionfields_id"):
             self.connection.execute(f"ALTER SEQUENCE {seq}_seq RESTART WITH 1;", [])
+        # the positions will be reused
+        self.recent_changes.clear()
@@ -1,18 +1,21 @@
-from collections import defaultdict
 from textwrap import dedent
-from typing import Any, Dict, List, Sequence, Set, Tuple
+from typing import Any, Callable, Dict, List, Set, Tuple
 
 from datastore.shared.di import service_as_factory
 from datastore.shared.postgresql_backend import ConnectionHandler
 from datastore.shared.postgresql_backend.sql_query_helper import SqlQueryHelper
-from datastore.shared.services import ReadDatabase
+from datastore.shared.services import EnvironmentService, ReadDatabase
+from datastore.shared.typing import Position
 from datastore.shared.util import (
-    KEYSEPARATOR,
     ModelLocked,
     collectionfield_and_fqid_from_fqfield,
+    field_from_fqfield,
 )
 from datastore.writer.core import CollectionFieldLock, WriteRequest
 
+from .modified_fields_layout import MODIFIED_FIELDS_LAYOUT, get_modified_fields_layout
+from .recent_changes import RecentChanges
+
 
 # FQID LOCKING
 # positions:    <1> <2> <3> <4> <5>
@@ -21,136 +24,291 @@ from datastore.writer.core import CollectionFieldLock, WriteRequest
 # Lock a/1 with pos 3, 2, ..: not OK
 # Lock a/1 with pos P: Exists an event with pos>P -> not OK
 
+# The locks are passed as arrays and unnested into a relation, so the query text (and
+# with it the planning time) does not grow with the number of locks.
+
 
 @service_as_factory
 class SqlOccLockerBackendService:
     connection: ConnectionHandler
     read_db: ReadDatabase
     query_helper: SqlQueryHelper
+    recent_changes: RecentChanges
+    environment: EnvironmentService
 
     def assert_locked_fields(self, write_request: WriteRequest) -> None:
-        """May raise a ModelLockedException"""
-        broken_locks = set()
-        broken_locks.update(self.get_locked_fqids(write_request.locked_fqids))
-        broken_locks.update(self.get_locked_fqfields(write_request.locked_fqfields))
-        broken_locks.update(
-            self.get_locked_collectionfields(write_request.locked_collectionfields)
-        )
+        """
+        May raise a ModelLockedException. Locks on recent positions are checked with
+        the index of recent changes, all other locks with a single query.
+        """
+        fqids = dict(write_request.locked_fqids)
+        fqfields = dict(write_request.locked_fqfields)
+        collectionfields = dict(write_request.locked_collectionfields)
+        broken_locks = self.check_recent_changes(fqids, fqfields, collectionfields)
+        broken_locks.update(self.query_broken_locks(fqids, fqfields, collectionfields))
         if broken_locks:
             raise ModelLocked(list(broken_locks))
 
-    def get_locked_fqids(self, fqids: Dict[str, int]) -> List[str]:
-        if not fqids:
-            return []
+    def check_recent_changes(
+        self,
+        fqids: Dict[str, int],
+        fqfields: Dict[str, int],
+        collectionfields: Dict[str, CollectionFieldLock],
+    ) -> Set[str]:
+        """
+        Checks all locks whose position is covered by the index of recent changes and
+        removes them from the given dicts. Returns the broken locks.
+        """
+        size = self.recent_changes.get_size()
+        lock_positions = [*fqids.values(), *fqfields.values()]
+        for cf_lock in collectionfields.values():
+            if isinstance(cf_lock, int):
+                lock_positions.append(cf_lock)
+            else:
+                lock_positions.extend(lock.position for lock in cf_lock)
+        if not size or not lock_positions or self.recent_changes.is_empty():
+            return set()
 
-        query_arguments: List[Any] = []
-        filter_parts = []
-        for fqid, position in fqids.items():
-            query_arguments.extend(
-                (
-                    fqid,
-                    position,
-                )
-            )
-            filter_parts.append("(fqid=%s and position>%s)")
-        query = "select fqid from events where " + " or ".join(filter_parts)
+        # The positions may have been written by other processes, so the index only
+        # covers the positions after the newest one which is not indexed.
+        rows = self.connection.query(
+            dedent(
+                """\
+                select position, migration_index from positions where position>%s
+                order by position desc limit %s"""
+            ),
+            [min(lock_positions), size + 1],
+        )
+        last_modified_fqids: Dict[str, Position] = {}
+        last_modified_fqfields: Dict[str, Position] = {}
+        last_modified_collectionfields: Dict[str, Position] = {}
+        covered_from = min(lock_positions)
+        for row in rows:
+            position = row["position"]
+            change = self.recent_changes.get(position)
+            if not change or change.migration_index != row["migration_index"]:
+                covered_from = position
+                break
+            for keys, last_modified in (
+                (change.fqids, last_modified_fqids),
+                (change.fqfields, last_modified_fqfields),
+                (change.collectionfields, last_modified_collectionfields),
+            ):
+                for key in keys:
+                    last_modified.setdefault(key, position)
+        else:
+            if len(rows) > size:
+                covered_from = rows[-1]["position"]
 
-        return self.connection.query_list_of_single_values(query, query_arguments)
+        broken_locks = set()
+        for locks, last_modified in (
+            (fqids, last_modified_fqids),
+            (fqfields, last_modified_fqfields),
+        ):
+            for key, position in list(locks.items()):
+                if position >= covered_from:
+                    if last_modified.get(key, 0) > position:
+                        broken_locks.add(key)
+                    del locks[key]
+        for collectionfield, cf_lock in list(collectionfields.items()):
+            last_modified_position = last_modified_collectionfields.get(
+                collectionfield, 0
+            )
+            if isinstance(cf_lock, int):
+                if cf_lock >= covered_from:
+                    if last_modified_position > cf_lock:
+                        broken_locks.add(collectionfield)
+                    del collectionfields[collectionfield]
+            else:
+                # locks with filters can only be resolved here if the collectionfield
+                # was not modified at all, since the filter needs the model data
+                remaining_locks = [
+                    lock
+                    for lock in cf_lock
+                    if lock.position < covered_from
+                    or last_modified_position > lock.position
+                ]
+                if remaining_locks:
+                    collectionfields[collectionfield] = remaining_locks
+                else:
+                    del collectionfields[collectionfield]
+        return broken_locks
 
-    def get_locked_fqfields(self, fqfields: Dict[str, int]) -> List[str]:
-        if not fqfields:
+    def query_broken_locks(
+        self,
+        fqids: Dict[str, int],
+        fqfields: Dict[str, int],
+        collectionfields: Dict[str, CollectionFieldLock],
+    ) -> List[str]:
+        builders: List[Tuple[Callable[[Any, List[Any]], str], Dict[str, Any]]] = [
+            (self.build_locked_fqids_query, fqids),
+            (self.build_locked_fqfields_query, fqfields),
+            (self.build_locked_collectionfields_query, collectionfields),
+        ]
+        query_arguments: List[Any] = []
+        queries = [
+            build_query(locks, query_arguments)
+            for build_query, locks in builders
+            if locks
+        ]
+        queries = [query for query in queries if query]
+        if not queries:
             return []
 
-        event_query_arguments: List[Any] = []
-        event_filter_parts = []
-        collectionfield_query_arguments: List[Sequence[str]] = []
-        fqid_position_set: Set[Tuple[str, int]] = set()
-        collectionfield_query_data: Dict[str, List[str]] = defaultdict(list)
-
-        for fqfield, position in fqfields.items():
-            collectionfield, fqid = collectionfield_and_fqid_from_fqfield(fqfield)
-
-            if (fqid, position) not in fqid_position_set:
-                fqid_position_set.add((fqid, position))
-                event_query_arguments.extend(
-                    (
-                        fqid,
-                        position,
-                    )
-                )
-                event_filter_parts.append("(e.fqid=%s and e.position>%s)")
-
-            collectionfield_query_data[fqid].append(collectionfield)
+        query = "\nunion all\n".join(queries)
+        return self.connection.query_list_of_single_values(query, query_arguments)
 
-        event_filter = " or ".join(event_filter_parts)
-        collectionfield_filter = " or ".join(
-            ["(fqid=%s and collectionfield = ANY(%s))"]
-            * len(collectionfield_query_data)
+    def build_locked_fqids_query(
+        self, fqids: Dict[str, int], query_arguments: List[Any]
+    ) -> str:
+        query_arguments.extend((list(fqids.keys()), list(fqids.values())))
+        return dedent(
+            """\
+            select l.fqid from unnest(%s::varchar[], %s::int[]) l(fqid, position)
+            where exists (
+                select 1 from events e where e.fqid=l.fqid and e.position>l.position
+            )"""
         )
-        collectionfield_query_arguments = [
-            argument for item in collectionfield_query_data.items() for argument in item
-        ]
-        query = dedent(
-            f"""\
-            select e.fqid || %s || split_part(cf.collectionfield, %s, 2) from events e
-                inner join events_to_collectionfields ecf on e.id=ecf.event_id
-                inner join collectionfields cf on ecf.collectionfield_id=cf.id
-            where ({event_filter}) and ({collectionfield_filter})"""
+
+    def build_locked_fqfields_query(
+        self, fqfields: Dict[str, int], query_arguments: List[Any]
+    ) -> str:
+        use_modified_fields_array = self.use_modified_fields_array()
+        fqids = []
+        fields = []
+        for fqfield in fqfields.keys():
+            collectionfield, fqid = collectionfield_and_fqid_from_fqfield(fqfield)
+            fqids.append(fqid)
+            fields.append(
+                field_from_fqfield(fqfield)
+                if use_modified_fields_array
+                else collectionfield
+            )
+        query_arguments.extend(
+            (list(fqfields.keys()), fqids, fields, list(fqfields.values()))
         )
-        query_arguments = (
-            [KEYSEPARATOR] * 2 + event_query_arguments + collectionfield_query_arguments
+        if use_modified_fields_array:
+            return dedent(
+                """\
+                select l.fqfield from unnest(
+                    %s::varchar[], %s::varchar[], %s::varchar[], %s::int[]
+                ) l(fqfield, fqid, field, position)
+                where exists (
+                    select 1 from events e
+                    where e.fqid=l.fqid and e.position>l.position
+                        and l.field=any(e.modified_fields)
+                )"""
+            )
+        return dedent(
+            """\
+            select l.fqfield from unnest(
+                %s::varchar[], %s::varchar[], %s::varchar[], %s::int[]
+            ) l(fqfield, fqid, collectionfield, position)
+            where exists (
+                select 1 from events e
+                    inner join events_to_collectionfields ecf on e.id=ecf.event_id
+                    inner join collectionfields cf on ecf.collectionfield_id=cf.id
+                where e.fqid=l.fqid and e.position>l.position
+                    and cf.collectionfield=l.collectionfield
+            )"""
         )
-        return self.connection.query_list_of_single_values(query, query_arguments)
 
-    def get_locked_collectionfields(
-        self, collectionfields: Dict[str, CollectionFieldLock]
-    ) -> List[str]:
-        if not collectionfields:
-            return []
+    def build_locked_collectionfields_query(
+        self,
+        collectionfields: Dict[str, CollectionFieldLock],
+        query_arguments: List[Any],
+    ) -> str:
+        simple_locks = {
+            collectionfield: cf_lock
+            for collectionfield, cf_lock in collectionfields.items()
+            if isinstance(cf_lock, int)
+        }
+        queries = []
+        if simple_locks:
+            query_arguments.extend(
+                (list(simple_locks.keys()), list(simple_locks.values()))
+            )
+            queries.append(
+                dedent(
+                    """\
+                    select cf.collectionfield
+                    from unnest(%s::varchar[], %s::int[]) l(collectionfield, position)
+                        inner join collectionfields cf
+                            on cf.collectionfield=l.collectionfield
+                    where cf.position>l.position"""
+                )
+            )
 
-        query_arguments: List[Any] = []
+        # locks with filters differ in their structure, so they cannot be unnested
         filter_parts = []
-        joins_needed = False
+        filter_arguments_start = len(query_arguments)
+        filter_collectionfields: List[str] = []
+        filter_positions: List[Position] = []
         for collectionfield, cf_lock in collectionfields.items():
             if isinstance(cf_lock, int):
+                continue
+            for lock in cf_lock:
                 query_arguments.extend(
                     (
+                        lock.position,
                         collectionfield,
-                        cf_lock,
                     )
                 )
-                filter_parts.append("(cf.collectionfield=%s and cf.position>%s)")
-            else:
-                joins_needed = True
-                for lock in cf_lock:
-                    query_arguments.extend(
-                        (
-                            lock.position,
-                            collectionfield,
+                filter_part = "(e.position>%s and cf.collectionfield=%s"
+                if lock.filter:
+                    filter_part += (
+                        " and ("
+                        + self.query_helper.build_filter_str(
+                            lock.filter, query_arguments, "m"
                         )
+                        + ")"
                     )
-                    filter_part = "(e.position>%s and cf.collectionfield=%s"
-                    if lock.filter:
-                        filter_part += (
-                            " and ("
-                            + self.query_helper.build_filter_str(
-                                lock.filter, query_arguments, "m"
-                            )
-                            + ")"
-                        )
-                    filter_part += ")"
-                    filter_parts.append(filter_part)
-
-        filter_query = " or ".join(filter_parts)
-        joins = """\
-            inner join events_to_collectionfields ecf on cf.id=ecf.collectionfield_id
-            inner join events e on ecf.event_id=e.id
-            inner join models m on e.fqid=m.fqid
-        """
-        query = dedent(
-            f"""\
-            select collectionfield from collectionfields cf
-            {joins if joins_needed else ""}
-            where {filter_query}"""
+                filter_part += ")"
+                filter_parts.append(filter_part)
+                filter_positions.append(lock.position)
+            if cf_lock:
+                filter_collectionfields.append(collectionfield)
+        if filter_parts:
+            filter_query = " or ".join(filter_parts)
+            if self.use_modified_fields_array():
+                # There is no index on the modified fields, so all events of the
+                # collection since the oldest lock are checked. This bound is given in
+                # the join to use event_collection_position_idx. Collectionfields which
+                # were not modified since then are skipped beforehand.
+                min_position = min(filter_positions)
+                query_arguments[filter_arguments_start:filter_arguments_start] = [
+                    min_position,
+                    filter_collectionfields,
+                    min_position,
+                ]
+                events_join = (
+                    "inner join events e"
+                    " on e.collection=split_part(cf.collectionfield, '/', 1)"
+                    " and e.position>%s"
+                    " and split_part(cf.collectionfield, '/', 2)=any(e.modified_fields)"
+                )
+                filter_query = (
+                    "cf.collectionfield=any(%s::varchar[]) and cf.position>%s"
+                    f" and ({filter_query})"
+                )
+            else:
+                events_join = (
+                    "inner join events_to_collectionfields ecf"
+                    " on cf.id=ecf.collectionfield_id"
+                    " inner join events e on ecf.event_id=e.id"
+                )
+            queries.append(
+                dedent(
+                    f"""\
+                    select cf.collectionfield from collectionfields cf
+                        {events_join}
+                        inner join models m on e.fqid=m.fqid
+                    where {filter_query}"""
+                )
+            )
+        return "\nunion all\n".join(queries)
+
+    def use_modified_fields_array(self) -> bool:
+        return (
+            get_modified_fields_layout(self.environment) == MODIFIED_FIELDS_LAYOUT.ARRAY
         )
-        return self.connection.query_list_of_single_values(query, query_arguments)
@@ -3,6 +3,7 @@ from typing import Any, Dict, Optional
 import redis
 
 from datastore.shared.di import service_as_singleton
+from datastore.shared.redis_backend import ENVIRONMENT_VARIABLES
 from datastore.shared.services import EnvironmentService, ShutdownService
 
 
@@ -12,11 +13,6 @@ from datastore.shared.services import EnvironmentService, ShutdownService
 # Note: Which one is a connection error?
 
 
-class ENVIRONMENT_VARIABLES:
-    HOST = "MESSAGE_BUS_HOST"
-    PORT = "MESSAGE_BUS_PORT"
-
-
 @service_as_singleton
 class RedisConnectionHandlerService:
     environment: EnvironmentService
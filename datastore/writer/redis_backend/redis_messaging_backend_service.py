@@ -1,7 +1,7 @@
-import json
 from typing import Dict
 
 from datastore.shared.di import service_as_singleton
+from datastore.shared.redis_backend import MODELS_RESET_TOPIC, MODIFIED_FIELDS_TOPIC
 from datastore.shared.typing import Fqfield
 from datastore.shared.util import (
     JSON,
@@ -10,15 +10,20 @@ from datastore.shared.util import (
     Fqid,
     Position,
     fqfield_from_fqid_and_field,
+    json_dumps,
     logger,
 )
+from datastore.shared.util.metrics import Histogram
 from datastore.shared.util.otel import inject_otel_data
 from datastore.writer.core import Messaging
 
 from .connection_handler import ConnectionHandler
 
 
-MODIFIED_FIELDS_TOPIC = "ModifiedFields"
+PUBLISH_DURATION = Histogram(
+    "datastore_messaging_publish_duration_seconds",
+    "Duration of publishing the modified fields to the message bus",
+)
 
 
 @service_as_singleton
@@ -35,10 +40,15 @@ class RedisMessagingBackendService(Messaging):
         if log_all_modified_fields:
             logger.debug(
                 f"written fqfields into {MODIFIED_FIELDS_TOPIC}: "
-                + json.dumps(modified_fqfields)
+                + json_dumps(modified_fqfields)
             )
 
-        self.connection.xadd(MODIFIED_FIELDS_TOPIC, modified_fqfields)
+        with PUBLISH_DURATION.time():
+            self.connection.xadd(MODIFIED_FIELDS_TOPIC, modified_fqfields)
+
+    def handle_reset(self) -> None:
+        logger.debug(f"written reset into {MODELS_RESET_TOPIC}")
+        self.connection.xadd(MODELS_RESET_TOPIC, {"reset": "1"})
 
     def get_modified_fqfields(
         self, events_per_position: Dict[Position, Dict[Fqid, Dict[Field, JSON]]]
@@ -48,7 +58,7 @@ class RedisMessagingBackendService(Messaging):
             for fqid, fields in models.items():
                 for field, value in fields.items():
                     fqfield = fqfield_from_fqid_and_field(fqid, field)
-                    modified_fqfields[fqfield] = json.dumps(value)
+                    modified_fqfields[fqfield] = json_dumps(value)
                 meta_position_fqfield = fqfield_from_fqid_and_field(fqid, META_POSITION)
                 modified_fqfields[meta_position_fqfield] = str(position)
         return modified_fqfields
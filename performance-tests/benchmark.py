@@ -0,0 +1,378 @@
+"""
+Usage: python performance-tests/benchmark.py [options]
+
+Reproducible benchmarks of the hot paths of the reader and the writer. The datastore is filled
+with OpenSlides-shaped data (meetings with users and motions which were updated many times) via
+the writer and each benchmark is executed multiple times. The results are printed and written as
+JSON, so that they can be compared between releases with `--compare`.
+
+The datastore configured via the usual environment variables must be empty (see `--truncate`)
+and the message bus must be reachable. Run with `--help` for all options.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional
+
+from datastore.migrations import (
+    MigrationHandler,
+    RenameFieldMigration,
+    setup as migration_setup,
+)
+from datastore.reader.core import (
+    FilterRequest,
+    GetAllRequest,
+    GetManyRequest,
+    GetManyRequestPart,
+    GetRequest,
+    Reader,
+)
+from datastore.shared.di import injector
+from datastore.shared.postgresql_backend import ConnectionHandler
+from datastore.shared.services import ReadDatabase
+from datastore.shared.util import FilterOperator
+from datastore.writer.core import (
+    RequestCreateEvent,
+    RequestUpdateEvent,
+    Writer,
+    WriteRequest,
+)
+
+
+TEXT = "<p>" + "Lorem ipsum dolor sit amet, consetetur sadipscing elitr. " * 20 + "</p>"
+
+
+@dataclass
+class Scale:
+    meetings: int
+    users: int  # per meeting
+    motions: int  # per meeting
+    history: int  # amount of updates of each motion
+
+
+@dataclass
+class Timings:
+    repetitions: int
+    min: float
+    max: float
+    mean: float
+    median: float
+    stdev: float
+
+    @classmethod
+    def from_list(cls, timings: List[float]) -> "Timings":
+        return cls(
+            repetitions=len(timings),
+            min=min(timings),
+            max=max(timings),
+            mean=statistics.mean(timings),
+            median=statistics.median(timings),
+            stdev=statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        )
+
+
+class Benchmark:
+    def __init__(self, scale: Scale, repetitions: int) -> None:
+        self.scale = scale
+        self.repetitions = repetitions
+        self.writer: Writer = injector.get(Writer)
+        self.reader: Reader = injector.get(Reader)
+        self.read_database: ReadDatabase = injector.get(ReadDatabase)
+        self.connection: ConnectionHandler = injector.get(ConnectionHandler)
+        self.results: Dict[str, Timings] = {}
+
+    def get_ids(self, meeting_id: int, amount: int) -> List[int]:
+        return list(range((meeting_id - 1) * amount + 1, meeting_id * amount + 1))
+
+    def generate_data(self) -> None:
+        for meeting_id in range(1, self.scale.meetings + 1):
+            user_ids = self.get_ids(meeting_id, self.scale.users)
+            motion_ids = self.get_ids(meeting_id, self.scale.motions)
+            events: List[Any] = [
+                RequestCreateEvent(
+                    f"meeting/{meeting_id}",
+                    {
+                        "name": f"Meeting {meeting_id}",
+                        "user_ids": user_ids,
+                        "motion_ids": motion_ids,
+                    },
+                )
+            ]
+            events.extend(
+                RequestCreateEvent(
+                    f"user/{id}",
+                    {
+                        "username": f"user{id}",
+                        "first_name": f"First name {id}",
+                        "meeting_ids": [meeting_id],
+                    },
+                )
+                for id in user_ids
+            )
+            events.extend(
+                RequestCreateEvent(
+                    f"motion/{id}",
+                    {
+                        "title": f"Motion {id}",
+                        "text": TEXT,
+                        "meeting_id": meeting_id,
+                        "sequential_number": i + 1,
+                        "submitter_ids": user_ids[i % len(user_ids) :][:3],
+                        "tag_ids": [],
+                    },
+                )
+                for i, id in enumerate(motion_ids)
+            )
+            self.write(events)
+        for version in range(1, self.scale.history + 1):
+            for meeting_id in range(1, self.scale.meetings + 1):
+                self.write(
+                    [
+                        RequestUpdateEvent(
+                            f"motion/{id}",
+                            {"title": f"Motion {id} (version {version})"},
+                            {"add": {"tag_ids": [version]}},
+                        )
+                        for id in self.get_ids(meeting_id, self.scale.motions)
+                    ]
+                )
+
+    def write(self, events: List[Any], locked_fields: Dict[str, Any] = {}) -> None:
+        self.writer.write(
+            [WriteRequest(events, {}, 1, locked_fields)], log_all_modified_fields=False
+        )
+
+    def measure(self, name: str, fn: Callable[[], Any], warm_up: bool = True) -> None:
+        if warm_up:
+            fn()
+        timings = []
+        for _ in range(self.repetitions if warm_up else 1):
+            start = perf_counter()
+            fn()
+            timings.append(perf_counter() - start)
+        self.results[name] = Timings.from_list(timings)
+        print(f"{name:<24} median {self.results[name].median * 1000:10.2f} ms")
+
+    def read(self, fn: Callable[[], Any]) -> Callable[[], Any]:
+        def _read() -> Any:
+            with self.reader.get_database_context():
+                return fn()
+
+        return _read
+
+    def run(self) -> None:
+        motion_ids = self.get_ids(1, self.scale.motions)
+        with self.connection.get_connection_context():
+            max_position = self.read_database.get_max_position()
+
+        self.measure(
+            "get_many",
+            self.read(
+                lambda: self.reader.get_many(
+                    GetManyRequest([GetManyRequestPart("motion", motion_ids)])
+                )
+            ),
+        )
+        self.measure(
+            "get_many_mapped_fields",
+            self.read(
+                lambda: self.reader.get_many(
+                    GetManyRequest(
+                        [GetManyRequestPart("motion", motion_ids)],
+                        mapped_fields=["title", "meeting_id"],
+                    )
+                )
+            ),
+        )
+        # the models have to be built from their events
+        self.measure(
+            "get_many_position",
+            self.read(
+                lambda: self.reader.get_many(
+                    GetManyRequest(
+                        [GetManyRequestPart("motion", motion_ids)],
+                        position=max_position - 1,
+                    )
+                )
+            ),
+        )
+        self.measure(
+            "get_position",
+            self.read(
+                lambda: self.reader.get(
+                    GetRequest(f"motion/{motion_ids[0]}", position=max_position - 1)
+                )
+            ),
+        )
+        self.measure(
+            "filter",
+            self.read(
+                lambda: self.reader.filter(
+                    FilterRequest("motion", FilterOperator("meeting_id", "=", 1))
+                )
+            ),
+        )
+        self.measure(
+            "get_all",
+            self.read(lambda: self.reader.get_all(GetAllRequest("user"))),
+        )
+        self.measure("write_with_locks", self.write_with_locks)
+        self.measure_migration()
+
+    def write_with_locks(self) -> None:
+        with self.connection.get_connection_context():
+            position = self.read_database.get_max_position()
+        fqid = f"motion/{self.scale.motions}"
+        locked_fields: Dict[str, Any] = {
+            fqid: position,
+            **{
+                f"motion/{id}/title": position
+                for id in self.get_ids(1, self.scale.motions)
+            },
+            "motion/meeting_id": {
+                "position": position,
+                "filter": asdict(FilterOperator("meeting_id", "=", 1)),
+            },
+        }
+        self.write([RequestUpdateEvent(fqid, {"title": "Locked"})], locked_fields)
+
+    def measure_migration(self) -> None:
+        """Migrates all events once. This modifies the data, so it has to run last."""
+        handler: MigrationHandler = injector.get(MigrationHandler)
+        # sets the migration index of the generated data
+        handler.migrate()
+
+        class RenameText(RenameFieldMigration):
+            target_migration_index = 2
+            collection = "motion"
+            old_field = "text"
+            new_field = "description"
+
+        class RenameTitle(RenameFieldMigration):
+            target_migration_index = 3
+            collection = "motion"
+            old_field = "title"
+            new_field = "name"
+
+        handler.register_migrations(RenameText)
+        self.measure("migration_migrate", handler.migrate, warm_up=False)
+        # all events are now in `migration_events`, so the second migration has to
+        # overwrite each of them
+        handler = injector.get(MigrationHandler)
+        handler.register_migrations(RenameText, RenameTitle)
+        self.measure("migration_rewrite_events", handler.migrate, warm_up=False)
+        self.measure("migration_finalize", handler.finalize, warm_up=False)
+
+
+def get_metadata(scale: Scale, repetitions: int) -> Dict[str, Any]:
+    try:
+        commit: Optional[str] = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    connection: ConnectionHandler = injector.get(ConnectionHandler)
+    with connection.get_connection_context():
+        postgres_version = connection.query_single_value("show server_version", [])
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "postgres": postgres_version,
+        "scale": asdict(scale),
+        "repetitions": repetitions,
+        "config": {
+            key: value
+            for key, value in sorted(os.environ.items())
+            if key.startswith("DATASTORE_")
+        },
+    }
+
+
+def compare(
+    results: Dict[str, Any], baseline: Dict[str, Any], max_regression: Optional[float]
+) -> bool:
+    """Prints the change of the medians and returns whether all are within the limit."""
+    ok = True
+    print(f"\nCompared to {baseline['metadata'].get('commit')}:")
+    for name, timings in results["results"].items():
+        if name not in baseline["results"]:
+            continue
+        ratio = timings["median"] / baseline["results"][name]["median"]
+        regression = max_regression is not None and ratio > 1 + max_regression
+        ok = ok and not regression
+        print(f"{name:<24} {ratio:8.2f}x{'  REGRESSION' if regression else ''}")
+    return ok
+
+
+def main(args: List[str] = []) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the reader and writer of the datastore."
+    )
+    parser.add_argument("--meetings", type=int, default=10)
+    parser.add_argument("--users", type=int, default=200, help="per meeting")
+    parser.add_argument("--motions", type=int, default=200, help="per meeting")
+    parser.add_argument("--history", type=int, default=20, help="updates per motion")
+    parser.add_argument("--repetitions", type=int, default=20)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="results of a previous run as baseline")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        help="fail if a median is slower than the baseline by more than this factor, e.g. 0.2",
+    )
+    parser.add_argument(
+        "--truncate",
+        action="store_true",
+        help="delete all data of the datastore before generating the data",
+    )
+    options = parser.parse_args(args)
+
+    migration_setup(print_fn=lambda *_: None)
+    scale = Scale(options.meetings, options.users, options.motions, options.history)
+    benchmark = Benchmark(scale, options.repetitions)
+
+    if options.truncate:
+        benchmark.writer.truncate_db()
+    with benchmark.connection.get_connection_context():
+        if not benchmark.read_database.is_empty():
+            print("The datastore is not empty, use --truncate to clear it.")
+            return 1
+
+    start = perf_counter()
+    benchmark.generate_data()
+    print(f"Generated data in {perf_counter() - start:.1f} s")
+    benchmark.run()
+
+    results = {
+        "metadata": get_metadata(scale, options.repetitions),
+        "results": {
+            name: asdict(timings) for name, timings in benchmark.results.items()
+        },
+    }
+    with open(options.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {options.output}")
+
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, options.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,64 @@
+from cli.add_generated_columns import main as add_generated_columns
+from datastore.shared.di import injector
+from tests.fixtures import get_db_schema_definition
+
+
+def get_columns(db_cur, table):
+    db_cur.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = %s",
+        [table],
+    )
+    return set(row[0] for row in db_cur.fetchall())
+
+
+def get_indexes(db_cur, table):
+    db_cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", [table])
+    return set(row[0] for row in db_cur.fetchall())
+
+
+def test_add_generated_columns(db_cur):
+    db_cur.execute("INSERT INTO models VALUES ('a/1', '{}', false)", [])
+    # simulates a database from before the columns were introduced
+    db_cur.execute("ALTER TABLE models DROP COLUMN collection, DROP COLUMN id", [])
+    db_cur.connection.commit()
+
+    injector.provider_map.clear()  # de-register services for testing purposes
+    add_generated_columns()
+
+    assert {"collection", "id"} <= get_columns(db_cur, "models")
+    assert "models_collection_id_idx" in get_indexes(db_cur, "models")
+    db_cur.execute("SELECT collection, id FROM models", [])
+    assert db_cur.fetchall() == [("a", 1)]
+    for table in ("events", "migration_events"):
+        assert {"collection", "model_id"} <= get_columns(db_cur, table)
+    assert {
+        "event_collection_model_id_idx",
+        "event_collection_position_idx",
+    } <= get_indexes(db_cur, "events")
+
+
+def test_schema_adds_generated_columns(db_cur):
+    db_cur.execute("INSERT INTO models VALUES ('a/1', '{}', false)", [])
+    for table, id_column in (
+        ("models", "id"),
+        ("events", "model_id"),
+        ("migration_events", "model_id"),
+    ):
+        db_cur.execute(
+            f"ALTER TABLE {table} DROP COLUMN collection, DROP COLUMN {id_column}", []
+        )
+    db_cur.connection.commit()
+
+    db_cur.execute(get_db_schema_definition(), [])
+    db_cur.connection.commit()
+
+    assert {"collection", "id"} <= get_columns(db_cur, "models")
+    assert "models_collection_id_idx" in get_indexes(db_cur, "models")
+    db_cur.execute("SELECT collection, id FROM models", [])
+    assert db_cur.fetchall() == [("a", 1)]
+    for table in ("events", "migration_events"):
+        assert {"collection", "model_id"} <= get_columns(db_cur, table)
+    assert {
+        "migration_events_collection_model_id_idx",
+        "migration_events_collection_position_idx",
+    } <= get_indexes(db_cur, "migration_events")
@@ -0,0 +1,32 @@
+from cli.fill_modified_fields import main as fill_modified_fields
+from datastore.shared.di import injector
+
+
+def test_fill_modified_fields(db_cur):
+    db_cur.execute(
+        "INSERT INTO positions (timestamp, user_id, migration_index) VALUES (now(), -1, -1), (now(), -1, -1)",
+        [],
+    )
+    db_cur.execute(
+        "INSERT INTO events (position, fqid, type, weight) VALUES "
+        "(1, 'a/1', 'create', 1), (2, 'a/1', 'update', 1), (2, 'a/2', 'create', 2)",
+        [],
+    )
+    db_cur.execute(
+        "INSERT INTO collectionfields (collectionfield, position) VALUES ('a/f', 2), ('a/g', 2)",
+        [],
+    )
+    db_cur.execute(
+        "INSERT INTO events_to_collectionfields VALUES (1, 1), (1, 2), (2, 2)", []
+    )
+    db_cur.connection.commit()
+    injector.provider_map.clear()  # de-register services for testing purposes
+    fill_modified_fields(["", "1"])
+    db_cur.execute("SELECT id, modified_fields FROM events ORDER BY id")
+    assert [(id, sorted(fields or [])) for id, fields in db_cur.fetchall()] == [
+        (1, ["f", "g"]),
+        (2, ["g"]),
+        (3, []),
+    ]
+    db_cur.execute("SELECT * FROM events_to_collectionfields")
+    assert db_cur.fetchall() == []
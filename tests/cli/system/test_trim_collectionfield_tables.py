@@ -2,9 +2,13 @@ from datetime import datetime, timedelta
 
 from cli.trim_collectionfield_tables import main as trim_collectionfield_tables
 from datastore.shared.di import injector
+from datastore.writer.postgresql_backend.modified_fields_layout import (
+    MODIFIED_FIELDS_LAYOUT,
+    MODIFIED_FIELDS_LAYOUT_ENVIRONMENT_VAR,
+)
 
 
-def test_trim_collectionfield_tables(db_cur):
+def setup_data(db_cur):
     in_time = datetime.now() - timedelta(hours=36)
     out_time = datetime.now() - timedelta(hours=60)
     db_cur.execute(
@@ -24,8 +28,25 @@ def test_trim_collectionfield_tables(db_cur):
     )
     db_cur.connection.commit()
     injector.provider_map.clear()  # de-register services for testing purposes
+
+
+def test_trim_collectionfield_tables(db_cur):
+    setup_data(db_cur)
     trim_collectionfield_tables()
     db_cur.execute("SELECT * FROM collectionfields")
     assert db_cur.fetchall() == [(2, "a/g", 2)]
     db_cur.execute("SELECT * FROM events_to_collectionfields")
     assert db_cur.fetchall() == [(2, 2)]
+
+
+def test_trim_collectionfield_tables_array_layout(db_cur, monkeypatch):
+    monkeypatch.setenv(
+        MODIFIED_FIELDS_LAYOUT_ENVIRONMENT_VAR, MODIFIED_FIELDS_LAYOUT.ARRAY
+    )
+    setup_data(db_cur)
+    trim_collectionfield_tables()
+    db_cur.execute("SELECT * FROM collectionfields")
+    assert db_cur.fetchall() == [(2, "a/g", 2)]
+    # only the entries of the deleted collectionfield are removed via the foreign key
+    db_cur.execute("SELECT * FROM events_to_collectionfields")
+    assert db_cur.fetchall() == [(1, 2), (2, 2)]
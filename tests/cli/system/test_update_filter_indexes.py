@@ -0,0 +1,50 @@
+from cli.update_filter_indexes import main as update_filter_indexes
+from datastore.shared.di import injector
+from datastore.shared.postgresql_backend.filter_index_registry import (
+    FILTER_INDEXES_ENVIRONMENT_VAR,
+)
+
+
+def get_index_names(db_cur):
+    db_cur.execute(
+        "SELECT indexname FROM pg_indexes WHERE starts_with(indexname, 'models_filter_')"
+    )
+    return sorted(row[0] for row in db_cur.fetchall())
+
+
+def test_update_filter_indexes(db_cur, monkeypatch):
+    monkeypatch.setenv(FILTER_INDEXES_ENVIRONMENT_VAR, "a/f,a/g:gin")
+    injector.provider_map.clear()  # de-register services for testing purposes
+    update_filter_indexes()
+    assert get_index_names(db_cur) == ["models_filter_a/f", "models_filter_a:gin"]
+
+    monkeypatch.setenv(FILTER_INDEXES_ENVIRONMENT_VAR, "a/f")
+    injector.provider_map.clear()
+    update_filter_indexes()
+    assert get_index_names(db_cur) == ["models_filter_a/f"]
+
+    monkeypatch.delenv(FILTER_INDEXES_ENVIRONMENT_VAR)
+    injector.provider_map.clear()
+    update_filter_indexes()
+    assert get_index_names(db_cur) == []
+
+
+def test_update_filter_indexes_rebuilds_invalid(db_cur, monkeypatch):
+    # simulates an interrupted concurrent build
+    db_cur.execute('create index "models_filter_a/f" on models (fqid)')
+    db_cur.execute(
+        """update pg_index set indisvalid = false
+        where indexrelid = '"models_filter_a/f"'::regclass"""
+    )
+    db_cur.connection.commit()
+    monkeypatch.setenv(FILTER_INDEXES_ENVIRONMENT_VAR, "a/f")
+    injector.provider_map.clear()
+    update_filter_indexes()
+
+    db_cur.execute(
+        """select indisvalid, pg_get_indexdef(indexrelid) from pg_index
+        where indexrelid = '"models_filter_a/f"'::regclass"""
+    )
+    valid, definition = db_cur.fetchone()
+    assert valid
+    assert "data ->>" in definition
@@ -2,7 +2,7 @@ from unittest.mock import MagicMock
 
 import pytest
 
-from datastore.migrations import BaseEvent
+from datastore.migrations import BaseEvent, CreateEvent, DeleteEvent, UpdateEvent
 from datastore.migrations.core.migration_keyframes import (
     DatabaseMigrationKeyframeModifier,
     InitialMigrationKeyframeModifier,
@@ -50,3 +50,71 @@ def test_database_keyframe_modifier_no_keyframe():
         DatabaseMigrationKeyframeModifier(
             connection, 1, MagicMock(), MagicMock(), False
         )
+
+
+def test_database_keyframe_modifier_write_behind():
+    connection = MagicMock()
+    connection.query_single_value = MagicMock(side_effect=[1, 2, False])
+    connection.query = MagicMock(
+        return_value=[{"fqid": "a/1", "data": {"f": 1}, "deleted": False}]
+    )
+    modifier = DatabaseMigrationKeyframeModifier(connection, 1, 1, 2, True)
+
+    modifier.prefetch_models(["a/1", "a/2"])
+    connection.query.assert_called_once()
+    modifier.get_model("a/1")["f"] = 2
+    assert modifier.get_model("a/1") == {"f": 1}
+    assert not modifier.model_exists("a/2")
+
+    modifier.apply_event(UpdateEvent("a/1", {"f": 3}))
+    modifier.apply_event(CreateEvent("a/2", {"f": 4}))
+    connection.query.assert_called_once()
+    connection.execute.assert_not_called()
+    assert modifier.get_model("a/1") == {"f": 3, "meta_position": 2}
+
+    modifier.move_to_next_position()
+    assert connection.execute.call_count == 2
+    write_args = connection.execute.call_args_list[0][0][1]
+    assert [(fqid, deleted) for _, fqid, _, deleted in write_args] == [
+        ("a/1", False),
+        ("a/2", False),
+    ]
+
+
+def test_database_keyframe_modifier_create_model_copy():
+    connection = MagicMock()
+    connection.query_single_value = MagicMock(return_value=1)
+    modifier = DatabaseMigrationKeyframeModifier(connection, 1, 1, 2, False)
+    model = {"f": [1]}
+
+    modifier._create_model("a/1", model)
+    model["f"].append(2)
+
+    assert modifier.get_model("a/1") == {"f": [1]}
+
+
+def test_database_keyframe_modifier_get_all_ids_modified():
+    stored_models = {
+        "a/1": {"fqid": "a/1", "data": {"f": 1}, "deleted": False},
+        "a/2": {"fqid": "a/2", "data": {"f": 2}, "deleted": False},
+    }
+    connection = MagicMock()
+    connection.query_single_value = MagicMock(return_value=1)
+    connection.query = MagicMock(
+        side_effect=lambda _, args: [
+            stored_models[fqid] for fqid in args[1] if fqid in stored_models
+        ]
+    )
+    connection.query_list_of_single_values = MagicMock(
+        side_effect=lambda _, args: [
+            fqid for fqid in stored_models if fqid.startswith(args[1][:-1])
+        ]
+    )
+    modifier = DatabaseMigrationKeyframeModifier(connection, 1, 1, 2, False)
+
+    modifier.apply_event(CreateEvent("a/3", {"f": 3}))
+    modifier.apply_event(CreateEvent("b/1", {"f": 1}))
+    modifier.apply_event(DeleteEvent("a/2"))
+
+    assert modifier.get_all_ids_for_collection("a") == {1, 3}
+    assert modifier.get_all_ids_for_collection("b") == {1}
@@ -17,8 +17,8 @@ from datastore.migrations.core.migration_logger import (
 from datastore.migrations.core.migration_reader import MigrationReader
 from datastore.shared.di import injector
 from datastore.shared.postgresql_backend import ConnectionHandler
-from datastore.shared.services import ReadDatabase
-from datastore.writer.core import Database
+from datastore.shared.services import EnvironmentService, ReadDatabase
+from datastore.writer.core import Database, Messaging
 from tests import reset_di  # noqa
 
 from ..util import get_noop_event_migration, get_noop_model_migration
@@ -29,6 +29,8 @@ def migration_handler(reset_di):  # noqa
     injector.register_as_singleton(ConnectionHandler, MagicMock)
     injector.register_as_singleton(ReadDatabase, MagicMock)
     injector.register_as_singleton(Database, MagicMock)
+    injector.register_as_singleton(Messaging, MagicMock)
+    injector.register_as_singleton(EnvironmentService, MagicMock)
     injector.register_as_singleton(MigrationReader, MagicMock)
     injector.register_as_singleton(MigrationLogger, MigrationLoggerImplementation)
     injector.register_as_singleton(EventMigrater, EventMigraterImplementation)
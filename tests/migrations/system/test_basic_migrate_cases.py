@@ -1,8 +1,15 @@
+from unittest.mock import MagicMock
+
 import pytest
 
 from datastore.migrations import MismatchingMigrationIndicesException
+from datastore.migrations.core.migraters.event_migrater import RawPosition
 from datastore.migrations.core.migraters.migrater import EventMigrater
 from datastore.shared.di import injector
+from datastore.shared.services import EnvironmentService
+from datastore.writer.postgresql_backend.sql_database_backend_service import (
+    SNAPSHOT_INTERVAL_ENVIRONMENT_VAR,
+)
 
 from ..util import LogMock, get_noop_event_migration
 
@@ -17,10 +24,12 @@ def test_no_migrations_to_apply(
 
     migration_handler.register_migrations(get_noop_event_migration(2))
     migration_handler.logger.info = i = LogMock()
+    migration_handler.messaging = messaging = MagicMock()
     migration_handler.finalize()
 
     i.assert_called()
     assert "Position 1 from MI 1 to MI 2 ..." in i.output
+    messaging.handle_reset.assert_called_once()
 
     i.reset_mock()
     migration_handler.migrate()
@@ -74,6 +83,27 @@ def test_finalizing_not_needed(
     assert "No model migrations to apply." in i.output
 
 
+def test_finalize_resets_snapshots(
+    migration_handler,
+    write,
+    set_migration_index_to_1,
+    query_single_value,
+):
+    injector.get(EnvironmentService).set(SNAPSHOT_INTERVAL_ENVIRONMENT_VAR, "2")
+    write({"type": "create", "fqid": "a/1", "fields": {}})
+    write({"type": "update", "fqid": "a/1", "fields": {"f": 1}})
+    write({"type": "update", "fqid": "a/1", "fields": {"f": 2}})
+    set_migration_index_to_1()
+    assert query_single_value("select count(*) from model_snapshots") == 1
+    assert query_single_value("select events_since_snapshot from models") == 1
+
+    migration_handler.register_migrations(get_noop_event_migration(2))
+    migration_handler.finalize()
+
+    assert query_single_value("select count(*) from model_snapshots") == 0
+    assert query_single_value("select events_since_snapshot from models") == 0
+
+
 def test_migration_index_not_initialized(
     write,
     migration_handler,
@@ -93,6 +123,43 @@ def test_migration_index_not_initialized(
     )
 
 
+def test_event_migrater_empty_events(migration_handler, query_single_value):
+    migrater = injector.get(EventMigrater)
+    migrater.init(2, {2: get_noop_event_migration(2)()})
+    migrater.get_batch_size = MagicMock()
+
+    migrater.migrate()
+
+    migrater.get_batch_size.assert_not_called()
+    assert query_single_value("select count(*) from migration_positions") == 0
+
+
+def test_event_migrater_skips_migrated_positions(
+    migration_handler,
+    write,
+    connection_handler,
+    set_migration_index_to_1,
+):
+    write({"type": "create", "fqid": "a/1", "fields": {}})
+    write({"type": "update", "fqid": "a/1", "fields": {"f": 1}})
+    set_migration_index_to_1()
+    migration_handler.register_migrations(get_noop_event_migration(2))
+    migration_handler.migrate()
+
+    migrater = injector.get(EventMigrater)
+    migrater.init(2, {2: get_noop_event_migration(2)()})
+    with connection_handler.get_connection_context():
+        positions = [
+            RawPosition(**row)
+            for row in connection_handler.query(
+                "select * from positions order by position asc", []
+            )
+        ]
+        migration_indices = migrater.get_migration_indices(positions)
+        assert migration_indices == {1: 2, 2: 2}
+        assert migrater.get_first_events(positions, migration_indices) == {}
+
+
 def test_raising_migration_index(
     migration_handler,
     write,
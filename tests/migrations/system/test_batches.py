@@ -0,0 +1,122 @@
+import pytest
+
+from datastore.migrations.core.migraters.event_migrater import (
+    MIGRATION_BATCH_SIZE_ENVIRONMENT_VAR,
+)
+from datastore.shared.di import injector
+from datastore.shared.services import EnvironmentService
+
+from ..util import get_lambda_event_migration, get_noop_event_migration
+
+
+class AbortException(Exception):
+    pass
+
+
+@pytest.fixture(autouse=True, params=[1, 2])
+def batch_size(request):
+    injector.get(EnvironmentService).set(
+        MIGRATION_BATCH_SIZE_ENVIRONMENT_VAR, str(request.param)
+    )
+    yield request.param
+
+
+def rename_field(event):
+    if isinstance(event.data, dict) and "f" in event.data:
+        event.data["g"] = event.data.pop("f")
+    return [event]
+
+
+def test_migrate_multiple_batches(
+    migration_handler,
+    write,
+    set_migration_index_to_1,
+    assert_model,
+    assert_finalized,
+):
+    write({"type": "create", "fqid": "a/1", "fields": {"f": 1}})
+    write({"type": "update", "fqid": "a/1", "fields": {"f": 2}})
+    write({"type": "create", "fqid": "a/2", "fields": {"f": 3}})
+    write({"type": "delete", "fqid": "a/1"})
+    write({"type": "restore", "fqid": "a/1"})
+    set_migration_index_to_1()
+
+    migration_handler.register_migrations(get_lambda_event_migration(rename_field))
+    migration_handler.finalize()
+
+    assert_model("a/1", {"g": 2, "meta_deleted": False, "meta_position": 5})
+    assert_model("a/2", {"g": 3, "meta_deleted": False, "meta_position": 3})
+    assert_model("a/1", {"g": 1, "meta_deleted": False, "meta_position": 1}, 1)
+    assert_finalized()
+
+
+def test_failing_position_keeps_previous_positions(
+    migration_handler,
+    write,
+    set_migration_index_to_1,
+    assert_model,
+    assert_finalized,
+    assert_count,
+):
+    write({"type": "create", "fqid": "a/1", "fields": {"f": 1}})
+    write({"type": "create", "fqid": "a/2", "fields": {"f": 1}})
+    write({"type": "create", "fqid": "a/3", "fields": {"f": 1}})
+    write({"type": "create", "fqid": "a/4", "fields": {"f": 1}})
+    set_migration_index_to_1()
+
+    def fail_handler(event):
+        if event.fqid == "a/3":
+            raise AbortException()
+        return rename_field(event)
+
+    migration_handler.register_migrations(get_lambda_event_migration(fail_handler))
+    with pytest.raises(AbortException):
+        migration_handler.migrate()
+
+    assert_count("migration_positions", 2)
+    assert_count("migration_events", 2)
+
+    migration_handler.migrations_by_target_migration_index = {}
+    migration_handler.register_migrations(get_lambda_event_migration(rename_field))
+    migration_handler.finalize()
+
+    for id in range(1, 5):
+        assert_model(f"a/{id}", {"g": 1, "meta_deleted": False, "meta_position": id})
+    assert_finalized()
+
+
+def test_continue_with_migration_events(
+    migration_handler,
+    write,
+    set_migration_index_to_1,
+    assert_model,
+    assert_finalized,
+    assert_count,
+):
+    write({"type": "create", "fqid": "a/1", "fields": {"f": 1}})
+    write({"type": "create", "fqid": "a/2", "fields": {"f": 1}})
+    write({"type": "create", "fqid": "a/3", "fields": {"f": 1}})
+    set_migration_index_to_1()
+
+    migration_handler.register_migrations(get_lambda_event_migration(rename_field))
+    migration_handler.migrate()
+    assert_count("migration_positions", 3)
+
+    def add_field(event):
+        event.data["h"] = event.data["g"] + 1
+        return [event]
+
+    migration_handler.migrations_by_target_migration_index = {}
+    migration_handler.register_migrations(
+        get_lambda_event_migration(rename_field),
+        get_lambda_event_migration(add_field, 3),
+        get_noop_event_migration(4),
+    )
+    migration_handler.finalize()
+
+    for id in range(1, 4):
+        assert_model(
+            f"a/{id}",
+            {"g": 1, "h": 2, "meta_deleted": False, "meta_position": id},
+        )
+    assert_finalized()
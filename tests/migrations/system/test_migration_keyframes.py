@@ -303,6 +303,30 @@ class BaseTest:
         migration_handler.register_migrations(MyMigration)
         migration_handler.finalize()
 
+    def test_get_all_ids_for_collection_deleted(self, migration_handler, write_data):
+        write_data(
+            {"type": "create", "fqid": "a/1", "fields": {}},
+            {"type": "create", "fqid": "a/2", "fields": {}},
+            {"type": "delete", "fqid": "a/2"},
+        )
+
+        class MyMigration(BaseEventMigration):
+            target_migration_index = 2
+
+            def migrate_event(
+                inner_self,
+                event: BaseEvent,
+            ) -> Optional[List[BaseEvent]]:
+                if event.fqid == "trigger/1":
+                    old = inner_self.old_accessor.get_all_ids_for_collection("a")
+                    new = inner_self.new_accessor.get_all_ids_for_collection("a")
+                    assert old == new
+                    assert old == set([1])
+                return None
+
+        migration_handler.register_migrations(MyMigration)
+        migration_handler.finalize()
+
     def test_get_all_ids_for_collection_single_id(self, migration_handler, write_data):
         write_data({"type": "create", "fqid": "a/1", "fields": {}})
 
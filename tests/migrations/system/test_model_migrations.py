@@ -1,3 +1,5 @@
+from unittest.mock import MagicMock
+
 from datastore.migrations.core.base_migrations.base_model_migration import (
     BaseModelMigration,
 )
@@ -34,6 +36,7 @@ def test_model_migration(
     )
 
     i.reset_mock()
+    migration_handler.messaging = messaging = MagicMock()
     migration_handler.finalize()
 
     assert i.output == (
@@ -48,6 +51,7 @@ def test_model_migration(
     )
     assert_finalized(2)
     assert_model("a/2", {"f": 1, "meta_deleted": False, "meta_position": 2}, position=2)
+    messaging.handle_reset.assert_called_once()
 
 
 def test_model_migration_with_database_access(
@@ -0,0 +1,115 @@
+from unittest.mock import patch
+
+import pytest
+
+from datastore.migrations import BaseModelMigration
+from datastore.migrations.core.migraters.model_migrater import (
+    MIGRATION_WORKERS_ENVIRONMENT_VAR,
+    init_worker,
+    migrate_shard,
+)
+from datastore.shared.di import injector
+from datastore.shared.services import EnvironmentService
+from datastore.shared.util import FilterOperator
+from datastore.writer.core import RequestUpdateEvent
+from tests.migrations.util import LogMock
+
+
+class AbortException(Exception):
+    pass
+
+
+class CountMotions(BaseModelMigration):
+    """Stores the amount of motions in each meeting."""
+
+    target_migration_index = 2
+
+    def shard_models(self):
+        return sorted(self.reader.get_all("meeting", ["id"]))
+
+    def migrate_models(self):
+        motions = self.reader.filter(
+            "motion", FilterOperator("meeting_id", "=", self.shard), ["id"]
+        )
+        return [
+            RequestUpdateEvent(f"meeting/{self.shard}", {"motion_count": len(motions)})
+        ]
+
+
+class FailingMigration(CountMotions):
+    def migrate_models(self):
+        if self.shard == 2:
+            raise AbortException()
+        return super().migrate_models()
+
+
+@pytest.fixture(params=[1, 2])
+def workers(request):
+    injector.get(EnvironmentService).set(
+        MIGRATION_WORKERS_ENVIRONMENT_VAR, str(request.param)
+    )
+    yield request.param
+
+
+@pytest.fixture()
+def write_meetings(write, set_migration_index_to_1):
+    for meeting_id in range(1, 4):
+        write({"type": "create", "fqid": f"meeting/{meeting_id}", "fields": {}})
+        for id in range(meeting_id):
+            write(
+                {
+                    "type": "create",
+                    "fqid": f"motion/{meeting_id * 10 + id}",
+                    "fields": {"meeting_id": meeting_id},
+                }
+            )
+    set_migration_index_to_1()
+
+
+def test_sharded_model_migration(
+    migration_handler, workers, write_meetings, read_model, assert_finalized
+):
+    migration_handler.register_migrations(CountMotions)
+    migration_handler.logger.info = i = LogMock()
+    migration_handler.finalize()
+
+    assert_finalized(2)
+    for meeting_id in range(1, 4):
+        assert read_model(f"meeting/{meeting_id}")["motion_count"] == meeting_id
+    if workers > 1:
+        assert "Migrating 3 shards with 2 workers ..." in i.output
+        assert (
+            len([line for line in i.output if line.startswith("Migrated shard ")]) == 3
+        )
+
+
+def test_sharded_model_migration_failing_shard(
+    migration_handler,
+    workers,
+    write_meetings,
+    read_model,
+    query_single_value,
+):
+    migration_handler.register_migrations(FailingMigration)
+    with pytest.raises(AbortException):
+        migration_handler.finalize()
+
+    assert query_single_value("select max(migration_index) from positions") == 1
+    for meeting_id in range(1, 4):
+        assert "motion_count" not in read_model(f"meeting/{meeting_id}")
+
+
+def test_init_worker():
+    with patch("datastore.migrations.core.setup.register_services") as register:
+        init_worker()
+    register.assert_called_once_with()
+
+
+def test_migrate_shard_in_process(migration_handler, write_meetings):
+    # the worker processes are not traced, so the worker function is run here
+    events = migrate_shard(CountMotions(), 2)
+    assert events is not None and len(events) == 1
+    event = events[0]
+    assert isinstance(event, RequestUpdateEvent)
+    assert event.fqid == "meeting/2"
+    assert event.fields == {"motion_count": 2}
@@ -0,0 +1,15 @@
+import pytest
+
+from tests import (  # noqa
+    db_connection,
+    db_cur,
+    reset_db_data,
+    reset_db_schema,
+    reset_di,
+    setup_db_connection,
+)
+
+
+@pytest.fixture(autouse=True)
+def setup(reset_di):  # noqa
+    yield
@@ -0,0 +1,111 @@
+import json
+import os
+import runpy
+import subprocess
+from unittest.mock import MagicMock
+
+import pytest
+
+
+BENCHMARK_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "..", "..", "performance-tests", "benchmark.py"
+)
+SCALE = ["--meetings", "2", "--users", "3", "--motions", "4", "--history", "2"]
+
+
+@pytest.fixture()
+def benchmark_module():
+    yield runpy.run_path(BENCHMARK_PATH)
+
+
+@pytest.fixture()
+def benchmark_main(benchmark_module):
+    yield benchmark_module["main"]
+
+
+def test_benchmark(benchmark_main, tmp_path):
+    output = tmp_path / "results.json"
+    assert benchmark_main(SCALE + ["--repetitions", "2", "--output", str(output)]) == 0
+
+    results = json.loads(output.read_text())
+    assert results["metadata"]["scale"] == {
+        "meetings": 2,
+        "users": 3,
+        "motions": 4,
+        "history": 2,
+    }
+    assert set(results["results"]) == {
+        "get_many",
+        "get_many_mapped_fields",
+        "get_many_position",
+        "get_position",
+        "filter",
+        "get_all",
+        "write_with_locks",
+        "migration_migrate",
+        "migration_rewrite_events",
+        "migration_finalize",
+    }
+    assert results["results"]["get_many"]["repetitions"] == 2
+    assert results["results"]["migration_migrate"]["repetitions"] == 1
+
+
+def test_benchmark_not_empty(benchmark_main, db_cur, tmp_path):
+    db_cur.execute(
+        "INSERT INTO positions (timestamp, user_id, migration_index) VALUES (now(), 1, 1)",
+        [],
+    )
+    db_cur.connection.commit()
+    assert benchmark_main(SCALE + ["--output", str(tmp_path / "results.json")]) == 1
+
+
+def test_benchmark_regression(benchmark_main, tmp_path):
+    baseline = tmp_path / "baseline.json"
+    args = SCALE + ["--repetitions", "1", "--truncate"]
+    assert benchmark_main(args + ["--output", str(baseline)]) == 0
+
+    results = json.loads(baseline.read_text())
+    for timings in results["results"].values():
+        timings["median"] /= 1000
+    baseline.write_text(json.dumps(results))
+    assert (
+        benchmark_main(
+            args
+            + ["--output", str(tmp_path / "results.json"), "--compare", str(baseline)]
+        )
+        == 0
+    )
+    assert (
+        benchmark_main(
+            args
+            + [
+                "--output",
+                str(tmp_path / "results.json"),
+                "--compare",
+                str(baseline),
+                "--max-regression",
+                "0.5",
+            ]
+        )
+        == 1
+    )
+
+
+def test_benchmark_without_git(benchmark_main, tmp_path, monkeypatch):
+    monkeypatch.setattr(subprocess, "run", MagicMock(side_effect=OSError))
+    output = tmp_path / "results.json"
+    args = SCALE + ["--repetitions", "1", "--truncate", "--output", str(output)]
+    assert benchmark_main(args) == 0
+    assert json.loads(output.read_text())["metadata"]["commit"] is None
+
+
+def test_compare_skips_new_benchmarks(benchmark_module, capsys):
+    results = {"results": {"get_many": {"median": 2.0}, "new": {"median": 1.0}}}
+    baseline = {
+        "metadata": {"commit": "abc"},
+        "results": {"get_many": {"median": 1.0}},
+    }
+    assert benchmark_module["compare"](results, baseline, 0.5) is False
+    output = capsys.readouterr().out
+    assert "get_many" in output
+    assert "new" not in output
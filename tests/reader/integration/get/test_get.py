@@ -2,7 +2,7 @@ from unittest.mock import MagicMock, patch
 
 import pytest
 
-from datastore.reader.core import Reader
+from datastore.reader.core import ModelCache, Reader
 from datastore.reader.core.reader_service import ReaderService
 from datastore.reader.flask_frontend.json_handler import JSONHandler
 from datastore.reader.flask_frontend.routes import Route
@@ -12,6 +12,9 @@ from datastore.shared.postgresql_backend.connection_handler import (
     ConnectionHandler,
     DatabaseError,
 )
+from datastore.shared.postgresql_backend.filter_index_registry import (
+    FilterIndexRegistry,
+)
 from datastore.shared.postgresql_backend.sql_query_helper import SqlQueryHelper
 from datastore.shared.postgresql_backend.sql_read_database_backend_service import (
     SqlReadDatabaseBackendService,
@@ -30,11 +33,15 @@ class FakeConnectionHandler:
 
 @pytest.fixture(autouse=True)
 def setup_di(reset_di):  # noqa
+    injector.register(EnvironmentService, EnvironmentService)
     injector.register_as_singleton(ConnectionHandler, FakeConnectionHandler)
+    injector.register_as_singleton(FilterIndexRegistry, FilterIndexRegistry)
     injector.register_as_singleton(SqlQueryHelper, SqlQueryHelper)
     injector.register_as_singleton(ReadDatabase, SqlReadDatabaseBackendService)
+    injector.register_as_singleton(
+        ModelCache, lambda: MagicMock(is_active=MagicMock(return_value=False))
+    )
     injector.register_as_singleton(Reader, ReaderService)
-    injector.register(EnvironmentService, EnvironmentService)
 
 
 @pytest.fixture()
@@ -0,0 +1,152 @@
+import json
+
+import pytest
+
+from datastore.reader.flask_frontend.routes import Route
+from datastore.shared.di import injector
+from datastore.shared.flask_frontend import ERROR_CODES
+from datastore.shared.services import ReadDatabase
+from tests import assert_error_response
+from tests.reader.system.util import setup_data
+from tests.util import assert_success_response
+
+
+data = {
+    "a/1": {"fqid": "a/1", "field_1": "data", "field_2": 42, "meta_position": 1},
+    "a/2": {"fqid": "a/2", "field_1": "test", "field_2": 21, "meta_position": 2},
+    "b/1": {"fqid": "b/1", "field_3": "data", "meta_position": 3},
+}
+filter = {"field": "field_1", "operator": "=", "value": "data"}
+
+
+def test_batch(json_client, db_connection, db_cur):
+    setup_data(db_connection, db_cur, data)
+    response = json_client.post(
+        Route.BATCH.URL,
+        {
+            "requests": [
+                {"route": Route.GET, "request": {"fqid": "a/1"}},
+                {
+                    "route": Route.GET_MANY,
+                    "request": {"requests": ["a/2/field_1", "b/1/field_3"]},
+                },
+                {
+                    "route": Route.FILTER,
+                    "request": {
+                        "collection": "a",
+                        "filter": filter,
+                        "mapped_fields": ["field_2"],
+                    },
+                },
+                {
+                    "route": Route.EXISTS,
+                    "request": {"collection": "a", "filter": filter},
+                },
+                {
+                    "route": Route.COUNT,
+                    "request": {"collection": "a", "filter": filter},
+                },
+                {
+                    "route": Route.MIN,
+                    "request": {
+                        "collection": "a",
+                        "filter": filter,
+                        "field": "field_2",
+                    },
+                },
+                {
+                    "route": Route.MAX,
+                    "request": {
+                        "collection": "a",
+                        "filter": filter,
+                        "field": "field_2",
+                    },
+                },
+            ]
+        },
+    )
+    assert_success_response(response)
+    assert response.json == {
+        "results": [
+            data["a/1"],
+            {"a": {"2": {"field_1": "test"}}, "b": {"1": {"field_3": "data"}}},
+            {"data": {"1": {"field_2": 42}}, "position": 3},
+            {"exists": True, "position": 3},
+            {"count": 1, "position": 3},
+            {"min": 42, "position": 3},
+            {"max": 42, "position": 3},
+        ],
+        "position": 3,
+    }
+
+
+def test_empty(json_client, db_connection, db_cur):
+    setup_data(db_connection, db_cur, data)
+    response = json_client.post(Route.BATCH.URL, {"requests": []})
+    assert_success_response(response)
+    assert response.json == {"results": [], "position": 3}
+
+
+def test_consistent_snapshot(json_client, db_connection, db_cur):
+    setup_data(db_connection, db_cur, data)
+    read_database = injector.get(ReadDatabase)
+    get_many = read_database.get_many
+
+    def get_many_and_write(*args, **kwargs):
+        result = get_many(*args, **kwargs)
+        # a concurrent write between two requests of the batch
+        db_cur.execute("insert into positions (user_id, migration_index) values (0, 1)")
+        db_cur.execute(
+            "insert into models (fqid, data, deleted) values (%s, %s, false)",
+            ["a/3", json.dumps({**data["a/1"], "fqid": "a/3", "meta_position": 4})],
+        )
+        db_connection.commit()
+        return result
+
+    read_database.get_many = get_many_and_write
+    response = json_client.post(
+        Route.BATCH.URL,
+        {
+            "requests": [
+                {"route": Route.GET, "request": {"fqid": "a/1"}},
+                {
+                    "route": Route.COUNT,
+                    "request": {"collection": "a", "filter": filter},
+                },
+            ]
+        },
+    )
+    assert_success_response(response)
+    assert response.json["results"][1] == {"count": 1, "position": 3}
+    assert response.json["position"] == 3
+
+
+def test_error(json_client, db_connection, db_cur):
+    setup_data(db_connection, db_cur, data)
+    response = json_client.post(
+        Route.BATCH.URL,
+        {
+            "requests": [
+                {"route": Route.GET, "request": {"fqid": "a/1"}},
+                {"route": Route.GET, "request": {"fqid": "a/3"}},
+            ]
+        },
+    )
+    assert_error_response(response, ERROR_CODES.MODEL_DOES_NOT_EXIST)
+    assert response.json["error"]["fqid"] == "a/3"
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {},
+        {"requests": {}},
+        {"requests": [{"route": Route.GET}]},
+        {"requests": [{"route": Route.GET_ALL, "request": {"collection": "a"}}]},
+        {"requests": [{"route": Route.BATCH, "request": {"requests": []}}]},
+        {"requests": [{"route": Route.GET, "request": {"fqid": 1}}]},
+    ],
+)
+def test_invalid_request(json_client, payload):
+    response = json_client.post(Route.BATCH.URL, payload)
+    assert_error_response(response, ERROR_CODES.INVALID_REQUEST)
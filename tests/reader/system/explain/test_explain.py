@@ -0,0 +1,97 @@
+import pytest
+
+from datastore.reader.flask_frontend.routes import (
+    EXPLAIN_ENABLED_ENVIRONMENT_VAR,
+    Route,
+)
+from datastore.shared.di import injector
+from datastore.shared.flask_frontend import ERROR_CODES
+from datastore.shared.services import EnvironmentService
+from datastore.shared.services.environment_service import (
+    DATASTORE_DEV_MODE_ENVIRONMENT_VAR,
+)
+from tests import assert_error_response, assert_response_code
+from tests.reader.system.util import setup_data
+from tests.util import assert_success_response
+
+
+data = {
+    "a/1": {"fqid": "a/1", "field_1": "data", "field_2": 42, "meta_position": 1},
+    "a/2": {"fqid": "a/2", "field_1": "test", "field_2": 21, "meta_position": 2},
+}
+filter = {"field": "field_1", "operator": "=", "value": "data"}
+
+
+@pytest.mark.parametrize(
+    "route,request_data",
+    [
+        (Route.FILTER, {"mapped_fields": ["field_2"]}),
+        (Route.EXISTS, {}),
+        (Route.COUNT, {}),
+        (Route.MIN, {"field": "field_2"}),
+        (Route.MAX, {"field": "field_2", "type": "int"}),
+    ],
+)
+def test_explain(json_client, db_connection, db_cur, route, request_data):
+    setup_data(db_connection, db_cur, data)
+    response = json_client.post(
+        Route.EXPLAIN.URL,
+        {
+            "route": route,
+            "request": {"collection": "a", "filter": filter, **request_data},
+        },
+    )
+    assert_success_response(response)
+    assert "from models" in response.json["query"]
+    assert "a" in response.json["arguments"]
+    assert response.json["duration"] > 0
+    plan = response.json["plan"][0]
+    assert plan["Plan"]["Actual Rows"] == 1
+    assert "Execution Time" in plan
+    assert "Shared Hit Blocks" in plan["Plan"]
+
+
+def test_explain_enabled_in_non_dev(json_client):
+    env_service = injector.get(EnvironmentService)
+    env_service.set(DATASTORE_DEV_MODE_ENVIRONMENT_VAR, "0")
+    env_service.set(EXPLAIN_ENABLED_ENVIRONMENT_VAR, "1")
+    response = json_client.post(
+        Route.EXPLAIN.URL,
+        {"route": Route.COUNT, "request": {"collection": "a", "filter": filter}},
+    )
+    assert_success_response(response)
+
+
+def test_not_found_in_non_dev(json_client):
+    injector.get(EnvironmentService).set(DATASTORE_DEV_MODE_ENVIRONMENT_VAR, "0")
+    response = json_client.post(
+        Route.EXPLAIN.URL,
+        {"route": Route.COUNT, "request": {"collection": "a", "filter": filter}},
+    )
+    assert_response_code(response, 404)
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"route": Route.GET, "request": {"fqid": "a/1"}},
+        {"route": Route.COUNT},
+        {"route": Route.COUNT, "request": {"collection": "a"}},
+        {"route": Route.MIN, "request": {"collection": "a", "filter": filter}},
+    ],
+)
+def test_invalid_request(json_client, payload):
+    response = json_client.post(Route.EXPLAIN.URL, payload)
+    assert_error_response(response, ERROR_CODES.INVALID_REQUEST)
+
+
+def test_invalid_filter(json_client):
+    response = json_client.post(
+        Route.EXPLAIN.URL,
+        {
+            "route": Route.FILTER,
+            "request": {"collection": "a", "filter": {"field": "f"}},
+        },
+    )
+    assert_error_response(response, ERROR_CODES.INVALID_REQUEST)
+    assert "Invalid filter definition" in response.json["error"]["msg"]
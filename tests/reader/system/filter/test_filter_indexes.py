@@ -0,0 +1,82 @@
+import pytest
+
+from datastore.reader.flask_frontend.routes import Route
+from datastore.shared.di import injector
+from datastore.shared.postgresql_backend import (
+    ConnectionHandler,
+    FilterIndexRegistry,
+    SqlQueryHelper,
+)
+from datastore.shared.postgresql_backend.filter_index_registry import (
+    FILTER_INDEXES_ENVIRONMENT_VAR,
+)
+from datastore.shared.services import EnvironmentService
+from tests.reader.system.util import setup_data
+from tests.util import assert_success_response
+
+
+data = {
+    "a/1": {"f": 5, "meta_position": 1},
+    "a/2": {"f": "5", "meta_position": 2},
+    "a/3": {"f": 5.0, "meta_position": 3},
+    "a/4": {"f": [5], "meta_position": 4},
+    "a/5": {"f": "x", "g": True, "meta_position": 5},
+    "a/6": {"f": [1, 2], "meta_position": 6},
+    "b/1": {"f": 5, "meta_position": 7},
+}
+
+
+@pytest.fixture(autouse=True)
+def registry(json_client):
+    def update_indexes(value):
+        injector.get(EnvironmentService).set(FILTER_INDEXES_ENVIRONMENT_VAR, value)
+        injector.register(FilterIndexRegistry, FilterIndexRegistry)
+        registry = injector.get(FilterIndexRegistry)
+        injector.get(SqlQueryHelper).filter_index_registry = registry
+        connection = injector.get(ConnectionHandler)
+        with connection.get_connection_context(autocommit=True):
+            registry.update_indexes()
+        return registry
+
+    yield update_indexes("a/f:gin,a/g:gin,a/h,b/f")
+    update_indexes("")
+
+
+def get_index_names(db_cur):
+    db_cur.execute(
+        "select indexname from pg_indexes where indexname like 'models\\_filter\\_%%'"
+    )
+    return sorted(row[0] for row in db_cur.fetchall())
+
+
+def test_indexes_created(db_cur):
+    assert get_index_names(db_cur) == [
+        "models_filter_a/h",
+        "models_filter_a:gin",
+        "models_filter_b/f",
+    ]
+
+
+@pytest.mark.parametrize(
+    "field,value,ids",
+    [
+        ("f", 5, ["1", "2"]),
+        ("f", "5", ["1", "2"]),
+        ("f", "[1, 2]", ["6"]),
+        ("f", "x", ["5"]),
+        ("g", True, ["5"]),
+        ("g", "true", ["5"]),
+        ("f", 6, []),
+    ],
+)
+def test_filter(json_client, db_connection, db_cur, field, value, ids):
+    setup_data(db_connection, db_cur, data)
+    response = json_client.post(
+        Route.FILTER.URL,
+        {
+            "collection": "a",
+            "filter": {"field": field, "operator": "=", "value": value},
+        },
+    )
+    assert_success_response(response)
+    assert sorted(response.json["data"].keys()) == ids
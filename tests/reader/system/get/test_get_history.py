@@ -0,0 +1,137 @@
+import json
+
+import pytest
+
+from datastore.reader.flask_frontend.routes import Route
+from datastore.shared.di import injector
+from datastore.shared.postgresql_backend import EVENT_TYPE
+from datastore.shared.services import ReadDatabase
+from datastore.shared.util import DeletedModelsBehaviour
+from tests.util import assert_success_response
+
+
+FQID = "a/1"
+
+# (type, data) per position
+EVENTS = [
+    (EVENT_TYPE.CREATE, {"f": 1, "g": [1], "h": "x"}),
+    (EVENT_TYPE.UPDATE, {"f": 2}),
+    (EVENT_TYPE.LIST_FIELDS, {"add": {"g": [2]}, "remove": {}}),
+    (EVENT_TYPE.DELETE_FIELDS, ["h"]),
+    (EVENT_TYPE.DELETE, None),
+    (EVENT_TYPE.RESTORE, None),
+    (EVENT_TYPE.UPDATE, {"f": 3, "i": 1}),
+    (EVENT_TYPE.LIST_FIELDS, {"add": {}, "remove": {"g": [1]}}),
+    (EVENT_TYPE.UPDATE, {"h": "y"}),
+]
+
+MODELS = [
+    {"f": 1, "g": [1], "h": "x", "meta_deleted": False},
+    {"f": 2, "g": [1], "h": "x", "meta_deleted": False},
+    {"f": 2, "g": [1, 2], "h": "x", "meta_deleted": False},
+    {"f": 2, "g": [1, 2], "meta_deleted": False},
+    {"f": 2, "g": [1, 2], "meta_deleted": True},
+    {"f": 2, "g": [1, 2], "meta_deleted": False},
+    {"f": 3, "g": [1, 2], "i": 1, "meta_deleted": False},
+    {"f": 3, "g": [2], "i": 1, "meta_deleted": False},
+    {"f": 3, "g": [2], "h": "y", "i": 1, "meta_deleted": False},
+]
+
+
+@pytest.fixture(autouse=True, params=[[], [2, 5]], ids=["", "snapshots"])
+def setup_events_data(request, db_connection, db_cur):
+    db_cur.execute(
+        "insert into positions (user_id, migration_index) values "
+        + ", ".join(["(0, 1)"] * (len(EVENTS) + 1))
+    )
+    for position, (type, data) in enumerate(EVENTS, start=1):
+        db_cur.execute(
+            "insert into events (position, fqid, type, data, weight) values (%s, %s, %s, %s, 1)",
+            [position, FQID, type, json.dumps(data)],
+        )
+    db_cur.execute(
+        "insert into events (position, fqid, type, data, weight) values (%s, %s, %s, %s, 1)",
+        [len(EVENTS) + 1, "a/2", EVENT_TYPE.CREATE, json.dumps({})],
+    )
+    db_cur.execute(
+        "insert into models (fqid, data, deleted) values (%s, %s, false), (%s, %s, false)",
+        [
+            FQID,
+            json.dumps({**MODELS[-1], "meta_position": len(EVENTS)}),
+            "a/2",
+            json.dumps({"meta_deleted": False, "meta_position": len(EVENTS) + 1}),
+        ],
+    )
+    for position in request.param:
+        model = MODELS[position - 1]
+        db_cur.execute(
+            "insert into model_snapshots (fqid, position, data, deleted) values (%s, %s, %s, %s)",
+            [
+                FQID,
+                position,
+                json.dumps({**model, "meta_position": position}),
+                model["meta_deleted"],
+            ],
+        )
+    db_connection.commit()
+
+
+@pytest.mark.parametrize("position", range(1, len(EVENTS) + 1))
+def test_position(json_client, position):
+    response = json_client.post(
+        Route.GET_MANY.URL,
+        {
+            "requests": [{"collection": "a", "ids": [1, 2]}],
+            "position": position,
+            "get_deleted_models": DeletedModelsBehaviour.ALL_MODELS,
+        },
+    )
+    assert_success_response(response)
+    assert response.json == {
+        "a": {"1": {**MODELS[position - 1], "meta_position": position}}
+    }
+
+
+def test_forward_and_reverse(json_client, db_connection):
+    read_database = injector.get(ReadDatabase)
+    with read_database.get_context():
+        for position in range(1, len(EVENTS) + 1):
+            snapshots = read_database.get_snapshots([FQID], position)
+            forward = read_database.build_models_from_events(
+                [FQID], position, snapshots
+            )
+            current = read_database.get_current_models([FQID])
+            current[FQID]["meta_position"] = position
+            reverse = read_database.revert_models_to_position(
+                current, position, snapshots
+            )
+            assert forward == reverse
+            assert forward == {
+                FQID: {**MODELS[position - 1], "meta_position": position}
+            }
+
+
+@pytest.mark.parametrize("position", range(1, len(EVENTS) + 1))
+def test_deleted_status(json_client, position):
+    read_database = injector.get(ReadDatabase)
+    with read_database.get_context():
+        assert read_database.get_deleted_status([FQID, "a/2"], position) == {
+            FQID: MODELS[position - 1]["meta_deleted"]
+        }
+
+
+def test_current_model(json_client, db_connection, db_cur):
+    # the current model is used as is if it was not changed after the position
+    db_cur.execute(
+        "update models set data = data || '{\"j\": 1}'::jsonb where fqid = %s", [FQID]
+    )
+    db_connection.commit()
+    response = json_client.post(
+        Route.GET.URL, {"fqid": FQID, "position": len(EVENTS) + 1}
+    )
+    assert_success_response(response)
+    assert response.json == {
+        **MODELS[-1],
+        "j": 1,
+        "meta_position": len(EVENTS),
+    }
@@ -92,3 +92,24 @@ def test_invalid_mapped_fields(json_client):
         Route.GET_ALL.URL, {"collection": "a", "mapped_fields": ["not valid"]}
     )
     assert_error_response(response, ERROR_CODES.INVALID_FORMAT)
+
+
+def test_stream(json_client, db_connection, db_cur):
+    setup_data(db_connection, db_cur, 2)
+    response = json_client.post(
+        Route.GET_ALL.URL,
+        {
+            "collection": "a",
+            "mapped_fields": ["field_4"],
+            "get_deleted_models": DeletedModelsBehaviour.ALL_MODELS,
+            "stream": True,
+        },
+    )
+    assert_success_response(response)
+    assert response.json == {"1": {"field_4": "data"}, "2": {"field_4": "data"}}
+
+
+def test_stream_empty(json_client, db_connection, db_cur):
+    response = json_client.post(Route.GET_ALL.URL, {"collection": "a", "stream": True})
+    assert_success_response(response)
+    assert response.json == {}
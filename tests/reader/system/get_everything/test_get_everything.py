@@ -2,6 +2,7 @@ import json
 
 from datastore.reader.flask_frontend.routes import Route
 from datastore.shared.di import injector
+from datastore.shared.postgresql_backend import ConnectionHandler
 from datastore.shared.services import EnvironmentService
 from datastore.shared.services.environment_service import (
     DATASTORE_DEV_MODE_ENVIRONMENT_VAR,
@@ -90,3 +91,32 @@ def test_prod(json_client, db_connection, db_cur):
         "a": {"1": get_data_with_id("a/1")},
         "b": {"1": get_data_with_id("b/1")},
     }
+
+
+def test_stream(json_client, db_connection, db_cur):
+    setup_data(db_connection, db_cur)
+    # insert a model of another collection in between
+    db_cur.execute(
+        "insert into models (fqid, data, deleted) values ('b/2', '{}', false)"
+    )
+    db_connection.commit()
+    response = json_client.post(
+        Route.GET_EVERYTHING.URL,
+        {"get_deleted_models": DeletedModelsBehaviour.ALL_MODELS, "stream": True},
+    )
+    assert_success_response(response)
+    assert response.json == {
+        "a": {"1": get_data_with_id("a/1"), "2": get_data_with_id("a/2")},
+        "b": {"1": get_data_with_id("b/1"), "2": {"id": 2}},
+    }
+
+
+def test_stream_batches(json_client, db_connection, db_cur, monkeypatch):
+    setup_data(db_connection, db_cur)
+    monkeypatch.setattr(injector.get(ConnectionHandler), "stream_batch_size", 1)
+    response = json_client.post(Route.GET_EVERYTHING.URL, {"stream": True})
+    assert_success_response(response)
+    assert response.json == {
+        "a": {"1": get_data_with_id("a/1")},
+        "b": {"1": get_data_with_id("b/1")},
+    }
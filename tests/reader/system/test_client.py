@@ -7,8 +7,9 @@ import pytest
 
 from datastore.reader.flask_frontend.routes import URL_PREFIX, Route
 from datastore.shared.di import injector
-from datastore.shared.flask_frontend import ERROR_CODES, get_health_url
+from datastore.shared.flask_frontend import ERROR_CODES, get_health_url, get_metrics_url
 from datastore.shared.postgresql_backend import ConnectionHandler
+from datastore.shared.postgresql_backend.statement_stats import StatementStatistics
 from datastore.shared.services import ReadDatabase
 from tests import assert_error_response
 
@@ -50,6 +51,30 @@ def test_health_route(json_client):
     assert response.status_code == 200
 
 
+def test_metrics_route(json_client):
+    response = json_client.post(Route.GET.URL, {"fqid": "a/1"})
+    assert_error_response(response, ERROR_CODES.MODEL_DOES_NOT_EXIST)
+    response = json_client.get(get_metrics_url(URL_PREFIX))
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    metrics = response.get_data(as_text=True)
+    assert 'datastore_requests_total{route="get",status="400"}' in metrics
+    assert 'datastore_request_duration_seconds_count{route="get"}' in metrics
+    assert 'datastore_db_query_duration_seconds_count{operation="query"}' in metrics
+    assert "\ndatastore_db_pool_max_connections " in metrics
+    assert "\ndatastore_model_cache_hits_total " in metrics
+    assert "\ndatastore_model_cache_position " in metrics
+    assert "datastore_db_statement_calls_total" not in metrics
+
+
+def test_metrics_route_statement_stats(json_client):
+    injector.get(ConnectionHandler).statement_stats = StatementStatistics(True, None)
+    json_client.post(Route.GET.URL, {"fqid": "a/1"})
+    metrics = json_client.get(get_metrics_url(URL_PREFIX)).get_data(as_text=True)
+    assert "# TYPE datastore_db_statement_calls_total counter" in metrics
+    assert 'statement="select fqid, data from models where fqid in ?' in metrics
+
+
 class TestConcurrentRequests:
     """
     The ConnectionPool is set to accept 2 concurrent connections.
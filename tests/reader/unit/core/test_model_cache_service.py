@@ -0,0 +1,300 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from datastore.reader.core import ModelCache
+from datastore.reader.core.model_cache_service import (
+    ENVIRONMENT_VARIABLES,
+    ModelCacheService,
+)
+from datastore.reader.redis_backend.connection_handler import ConnectionHandler
+from datastore.shared.di import injector
+from datastore.shared.redis_backend import MODELS_RESET_TOPIC, MODIFIED_FIELDS_TOPIC
+from datastore.shared.services import EnvironmentService, ShutdownService
+from tests import reset_di  # noqa
+
+
+@pytest.fixture(autouse=True)
+def provide_di(reset_di):  # noqa
+    injector.register(ShutdownService, ShutdownService)
+    injector.register(EnvironmentService, EnvironmentService)
+    injector.register_as_singleton(ConnectionHandler, MagicMock)
+    env_service = injector.get(EnvironmentService)
+    env_service.set(ENVIRONMENT_VARIABLES.ENABLED, "1")
+    env_service.set(ENVIRONMENT_VARIABLES.MAX_ENTRIES, "3")
+    yield
+
+
+@pytest.fixture()
+def model_cache(provide_di) -> ModelCacheService:
+    injector.register(ModelCache, ModelCacheService)
+    yield injector.get(ModelCache)
+
+
+@pytest.fixture()
+def connection(provide_di):
+    yield injector.get(ConnectionHandler)
+
+
+def put(model_cache, fqid, position=1, token=0, **fields):
+    model_cache.put_many({fqid: {"meta_position": position, **fields}}, token)
+
+
+def test_disabled(provide_di):
+    injector.get(EnvironmentService).set(ENVIRONMENT_VARIABLES.ENABLED, "0")
+    injector.register(ModelCache, ModelCacheService)
+    model_cache = injector.get(ModelCache)
+    model_cache.ensure_listener = el = MagicMock()
+
+    assert not model_cache.is_active()
+    el.assert_not_called()
+
+
+def test_max_size(provide_di):
+    injector.get(EnvironmentService).set(ENVIRONMENT_VARIABLES.MAX_SIZE, "0.5")
+    injector.register(ModelCache, ModelCacheService)
+    assert injector.get(ModelCache).max_size == 512 * 1024
+
+
+def test_is_active(model_cache):
+    model_cache.ensure_listener = el = MagicMock()
+    model_cache.active = True
+
+    assert model_cache.is_active()
+    el.assert_called()
+
+
+def test_put_and_get(model_cache):
+    put(model_cache, "a/1", f=[1])
+
+    models, missing = model_cache.get_many(["a/1", "a/2"])
+
+    assert models == {"a/1": {"meta_position": 1, "f": [1]}}
+    assert missing == ["a/2"]
+    assert model_cache.get_stats() == {
+        "hits": 1,
+        "misses": 1,
+        "evictions": 0,
+        "invalidations": 0,
+        "entries": 1,
+        "size": len('{"meta_position":1,"f":[1]}'),
+    }
+
+
+def test_get_returns_copies(model_cache):
+    put(model_cache, "a/1", f=[1])
+
+    model_cache.get_many(["a/1"])[0]["a/1"]["f"].append(2)
+
+    assert model_cache.get_many(["a/1"])[0]["a/1"]["f"] == [1]
+
+
+def test_put_overwrite(model_cache):
+    put(model_cache, "a/1", f="long value")
+    put(model_cache, "a/1", 2)
+
+    assert model_cache.get_many(["a/1"])[0] == {"a/1": {"meta_position": 2}}
+    assert model_cache.size == len('{"meta_position":2}')
+
+
+def test_lru_eviction(model_cache):
+    for i in range(1, 4):
+        put(model_cache, f"a/{i}")
+    model_cache.get_many(["a/1"])
+    put(model_cache, "a/4")
+
+    assert list(model_cache.entries.keys()) == ["a/3", "a/1", "a/4"]
+    assert model_cache.get_stats()["evictions"] == 1
+
+
+def test_size_eviction(model_cache):
+    model_cache.max_size = 45
+    put(model_cache, "a/1")
+    put(model_cache, "a/2")
+    put(model_cache, "a/3", f="x")
+
+    assert list(model_cache.entries.keys()) == ["a/3"]
+    assert model_cache.size == len('{"meta_position":1,"f":"x"}')
+    assert model_cache.get_stats()["evictions"] == 2
+
+
+def test_too_large_model(model_cache):
+    model_cache.max_size = 45
+    put(model_cache, "a/1")
+    put(model_cache, "a/2", f="x" * 30)
+
+    assert list(model_cache.entries.keys()) == ["a/1"]
+    assert model_cache.get_stats()["evictions"] == 0
+
+
+def test_invalidate(model_cache):
+    put(model_cache, "a/1", 1)
+    put(model_cache, "a/2", 2)
+    put(model_cache, "a/3", 2)
+
+    model_cache.invalidate({"a/1": 2, "a/2": 2, "a/3": 0, "a/4": 2})
+
+    assert list(model_cache.entries.keys()) == ["a/2"]
+    assert model_cache.get_stats()["invalidations"] == 2
+    assert model_cache.get_position() == 2
+
+
+def test_invalidate_keeps_newest_position(model_cache):
+    model_cache.invalidate({"a/1": 3})
+    model_cache.invalidate({"a/1": 2, "a/2": 0})
+
+    assert model_cache.get_position() == 3
+
+
+def test_put_after_invalidation(model_cache):
+    token = model_cache.get_token()
+    model_cache.invalidate({"a/1": 2})
+    put(model_cache, "a/1", token=token)
+    put(model_cache, "a/2", token=token)
+
+    assert list(model_cache.entries.keys()) == ["a/2"]
+
+    put(model_cache, "a/1", 2, token=model_cache.get_token())
+    assert "a/1" in model_cache.entries
+
+
+def test_put_after_forgotten_invalidation(model_cache):
+    token = model_cache.get_token()
+    model_cache.invalidate({f"a/{i}": 2 for i in range(1, 5)})
+    assert list(model_cache.invalidated_at.keys()) == ["a/2", "a/3", "a/4"]
+
+    put(model_cache, "a/5", token=token)
+
+    assert not model_cache.entries
+
+
+def test_clear(model_cache):
+    token = model_cache.get_token()
+    put(model_cache, "a/1")
+    model_cache.clear()
+    put(model_cache, "a/2", token=token)
+
+    assert not model_cache.entries
+    assert model_cache.size == 0
+    assert model_cache.get_position() == 0
+
+
+def test_get_positions_from_message(model_cache):
+    fields = {
+        "a/1/f": "1",
+        "a/1/meta_position": "3",
+        "a/2/f": "null",
+        "traceparent": "x",
+    }
+
+    assert model_cache.get_positions_from_message(fields) == {"a/1": 3, "a/2": 0}
+
+
+def test_ensure_listener(model_cache):
+    with patch("threading.Thread") as thread:
+        model_cache.ensure_listener()
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+
+        thread.return_value.is_alive.return_value = True
+        model_cache.ensure_listener()
+        thread.assert_called_once()
+
+        model_cache.process_id = 0
+        model_cache.ensure_listener()
+        assert thread.call_count == 2
+
+
+def test_listen(model_cache, connection):
+    put(model_cache, "a/4")
+    connection.get_last_entry.side_effect = [("1-0", {"a/1/meta_position": "1"}), None]
+
+    def xread(last_ids, block):
+        if connection.xread.call_count == 1:
+            assert last_ids == {MODIFIED_FIELDS_TOPIC: "1-0", MODELS_RESET_TOPIC: "0-0"}
+            assert model_cache.active
+            assert model_cache.get_position() == 1
+            put(model_cache, "a/2", token=model_cache.get_token())
+            put(model_cache, "a/3", token=model_cache.get_token())
+            return {MODIFIED_FIELDS_TOPIC: [("2-0", {"a/2/meta_position": "2"})]}
+        assert last_ids == {MODIFIED_FIELDS_TOPIC: "2-0", MODELS_RESET_TOPIC: "0-0"}
+        model_cache.shutdown()
+        return {}
+
+    connection.xread.side_effect = xread
+    model_cache.listen()
+
+    assert list(model_cache.entries.keys()) == ["a/3"]
+    assert model_cache.get_position() == 2
+
+
+def test_listen_reset(model_cache, connection):
+    connection.get_last_entry.side_effect = [
+        ("1-0", {"a/1/meta_position": "1"}),
+        ("5-0", {"reset": "1"}),
+    ]
+
+    def xread(last_ids, block):
+        if connection.xread.call_count == 1:
+            assert last_ids == {MODIFIED_FIELDS_TOPIC: "1-0", MODELS_RESET_TOPIC: "5-0"}
+            put(model_cache, "a/1", token=model_cache.get_token())
+            return {MODELS_RESET_TOPIC: [("6-0", {"reset": "1"})]}
+        assert last_ids == {MODIFIED_FIELDS_TOPIC: "1-0", MODELS_RESET_TOPIC: "6-0"}
+        assert not model_cache.entries
+        model_cache.shutdown()
+        return {}
+
+    connection.xread.side_effect = xread
+    model_cache.listen()
+
+    assert connection.xread.call_count == 2
+
+
+def test_listen_empty_stream(model_cache, connection):
+    connection.get_last_entry.return_value = None
+
+    def xread(last_ids, block):
+        assert last_ids == {MODIFIED_FIELDS_TOPIC: "0-0", MODELS_RESET_TOPIC: "0-0"}
+        model_cache.shutdown()
+        return {}
+
+    connection.xread.side_effect = xread
+    model_cache.listen()
+
+    assert model_cache.get_position() == 0
+
+
+def test_listen_error(model_cache, connection):
+    connection.get_last_entry.side_effect = [RuntimeError(), None, None]
+
+    def xread(last_ids, block):
+        model_cache.shutdown()
+        return {}
+
+    connection.xread.side_effect = xread
+    with patch("datastore.reader.core.model_cache_service.LISTENER_RETRY_TIMEOUT", 0):
+        model_cache.listen()
+
+    connection.close.assert_called_once()
+    assert connection.get_last_entry.call_count == 3
+
+
+def test_listen_thread(model_cache, connection):
+    read = threading.Event()
+
+    def xread(last_ids, block):
+        read.set()
+        model_cache.stop_event.wait()
+        return {}
+
+    connection.get_last_entry.return_value = None
+    connection.xread.side_effect = xread
+
+    model_cache.is_active()
+    assert read.wait(1)
+    assert model_cache.is_active()
+    model_cache.shutdown()
+    model_cache.listener.join(1)
+    assert not model_cache.listener.is_alive()
+    assert not model_cache.is_active()
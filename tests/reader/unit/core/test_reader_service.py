@@ -1,11 +1,15 @@
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
+import psycopg2
 import pytest
 
-from datastore.reader.core import Reader
+from datastore.reader.core import ModelCache, Reader
 from datastore.reader.core.reader_service import ReaderService
 from datastore.reader.core.requests import (
     AggregateRequest,
+    BatchRequest,
+    BatchRequestPart,
+    ExplainRequest,
     FilterRequest,
     GetAllRequest,
     GetEverythingRequest,
@@ -15,7 +19,7 @@ from datastore.reader.core.requests import (
     MinMaxRequest,
 )
 from datastore.shared.di import injector
-from datastore.shared.postgresql_backend import ConnectionHandler
+from datastore.shared.postgresql_backend import ConnectionHandler, DatabaseError
 from datastore.shared.postgresql_backend.sql_read_database_backend_service import (
     SqlReadDatabaseBackendService,
 )
@@ -23,6 +27,7 @@ from datastore.shared.services import EnvironmentService, ReadDatabase
 from datastore.shared.services.read_database import (
     AggregateFilterQueryFieldsParameters,
     CountFilterQueryFieldsParameters,
+    MappedFieldsFilterQueryFieldsParameters,
 )
 from datastore.shared.util import (
     DeletedModelsBehaviour,
@@ -37,6 +42,9 @@ from tests import reset_di  # noqa
 def provide_di(reset_di):  # noqa
     injector.register_as_singleton(ConnectionHandler, MagicMock)
     injector.register_as_singleton(ReadDatabase, MagicMock)
+    injector.register_as_singleton(
+        ModelCache, lambda: MagicMock(is_active=MagicMock(return_value=False))
+    )
     injector.register(Reader, ReaderService)
     injector.register(EnvironmentService, EnvironmentService)
     yield
@@ -52,6 +60,14 @@ def read_db(provide_di):
     yield injector.get(ReadDatabase)
 
 
+@pytest.fixture()
+def model_cache(provide_di):
+    model_cache = injector.get(ModelCache)
+    model_cache.is_active.return_value = True
+    model_cache.get_token.return_value = 42
+    yield model_cache
+
+
 def test_get(reader: ReaderService, read_db: SqlReadDatabaseBackendService):
     model = MagicMock()
     read_db.get = get = MagicMock(return_value=model)
@@ -185,6 +201,77 @@ def test_get_many_with_position_not_deleted_only_deleted(
     bmid.assert_called_with(["a/1"], 42)
 
 
+def test_get_from_cache(reader: ReaderService, read_db, model_cache):
+    model = {"field": 1, "other": 2, "meta_deleted": False}
+    model_cache.get_many.return_value = ({"c/1": model}, [])
+    read_db.get_many = MagicMock()
+
+    request = GetRequest("c/1", ["field"])
+
+    assert reader.get(request) == {"field": 1}
+    model_cache.get_many.assert_called_with(["c/1"])
+    read_db.get_many.assert_not_called()
+
+
+def test_get_from_cache_inactive(reader: ReaderService, read_db, model_cache):
+    model_cache.is_active.return_value = False
+    read_db.get = MagicMock(return_value={"field": 1})
+
+    assert reader.get(GetRequest("c/1", ["field"])) == {"field": 1}
+    model_cache.get_many.assert_not_called()
+
+
+def test_get_from_cache_deleted(reader: ReaderService, read_db, model_cache):
+    model = {"field": 1, "meta_deleted": True}
+    model_cache.get_many.return_value = ({"c/1": model}, [])
+
+    with pytest.raises(ModelDoesNotExist):
+        reader.get(GetRequest("c/1"))
+    request = GetRequest("c/1", get_deleted_models=DeletedModelsBehaviour.ONLY_DELETED)
+    assert reader.get(request) == model
+
+
+def test_get_from_cache_not_deleted_only_deleted(reader, read_db, model_cache):
+    model = {"field": 1, "meta_deleted": False}
+    model_cache.get_many.return_value = ({"c/1": model}, [])
+
+    request = GetRequest("c/1", get_deleted_models=DeletedModelsBehaviour.ONLY_DELETED)
+    with pytest.raises(ModelNotDeleted):
+        reader.get(request)
+
+
+def test_get_many_from_cache(reader: ReaderService, read_db, model_cache):
+    cached = {"field1": 1, "field2": 2, "meta_deleted": False}
+    fetched = {"field1": 3, "meta_deleted": True}
+    model_cache.get_many.return_value = ({"a/1": cached}, ["b/1"])
+    read_db.get_many = get_many = MagicMock(return_value={"b/1": fetched})
+
+    parts = [GetManyRequestPart("a", [1], ["field1"]), GetManyRequestPart("b", [1])]
+    request = GetManyRequest(
+        parts, get_deleted_models=DeletedModelsBehaviour.ALL_MODELS
+    )
+
+    assert reader.get_many(request) == {"a": {1: {"field1": 1}}, "b": {1: fetched}}
+    get_many.assert_called_once()
+    ca = get_many.call_args[0]
+    assert ca[0] == ["b/1"]
+    assert ca[1].needs_whole_model
+    assert ca[2] == DeletedModelsBehaviour.ALL_MODELS
+    model_cache.put_many.assert_called_with({"b/1": fetched}, 42)
+
+
+def test_get_many_from_cache_no_deleted(reader: ReaderService, read_db, model_cache):
+    model_cache.get_many.return_value = (
+        {"a/1": {"meta_deleted": False}, "a/2": {"meta_deleted": True}},
+        [],
+    )
+
+    request = GetManyRequest([GetManyRequestPart("a", [1, 2])])
+
+    assert reader.get_many(request) == {"a": {1: {"meta_deleted": False}}}
+    model_cache.put_many.assert_not_called()
+
+
 def test_get_all(reader: ReaderService, read_db: SqlReadDatabaseBackendService):
     result = MagicMock()
     read_db.get_all = get_all = MagicMock(return_value=result)
@@ -207,6 +294,19 @@ def test_get_everything(reader: ReaderService, read_db: SqlReadDatabaseBackendSe
     get_everything.assert_called_with(DeletedModelsBehaviour.ALL_MODELS)
 
 
+def test_get_everything_stream(
+    reader: ReaderService, read_db: SqlReadDatabaseBackendService
+):
+    result = MagicMock()
+    read_db.get_everything_stream = stream = MagicMock(return_value=result)
+
+    request = GetEverythingRequest(DeletedModelsBehaviour.ALL_MODELS, stream=True)
+
+    assert reader.get_everything_stream(request) == result
+
+    stream.assert_called_with(DeletedModelsBehaviour.ALL_MODELS)
+
+
 def test_filter(reader: ReaderService, read_db: SqlReadDatabaseBackendService):
     result = MagicMock()
     read_db.filter = filter = MagicMock(return_value=result)
@@ -221,6 +321,90 @@ def test_filter(reader: ReaderService, read_db: SqlReadDatabaseBackendService):
     get_pos.assert_called()
 
 
+def test_batch(
+    reader: ReaderService,
+    read_db: SqlReadDatabaseBackendService,
+    model_cache,
+):
+    connection = injector.get(ConnectionHandler)
+    read_db.get_max_position = get_pos = MagicMock(return_value=42)
+    read_db.filter = MagicMock(return_value={})
+    read_db.get_many = MagicMock(return_value={})
+    filter_operator = FilterOperator("field", "=", "data")
+    request = BatchRequest(
+        [
+            BatchRequestPart("get_many", GetManyRequest(["a/1/f"])),
+            BatchRequestPart("filter", FilterRequest("a", filter_operator)),
+        ]
+    )
+
+    assert reader.batch(request) == {
+        "results": [{"a": {}}, {"data": {}, "position": 42}],
+        "position": 42,
+    }
+
+    assert "repeatable read" in connection.execute.call_args.args[0]
+    get_pos.assert_called_once()
+    model_cache.get_many.assert_not_called()
+    assert reader.batch_position is None
+
+
+def test_batch_retry(
+    reader: ReaderService,
+    read_db: SqlReadDatabaseBackendService,
+    model_cache,
+):
+    read_db.get_context = get_context = MagicMock()
+    read_db.get_max_position = MagicMock(return_value=42)
+    error = DatabaseError("", psycopg2.OperationalError())
+    read_db.filter = filter = MagicMock(side_effect=[error, {}])
+    request = BatchRequest(
+        [BatchRequestPart("filter", FilterRequest("a", FilterOperator("f", "=", 1)))]
+    )
+
+    with patch("datastore.shared.postgresql_backend.pg_connection_handler.sleep"):
+        assert reader.batch(request) == {
+            "results": [{"data": {}, "position": 42}],
+            "position": 42,
+        }
+
+    # each try is executed in a new transaction
+    assert get_context.call_count == 2
+    assert filter.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "route,request_class,fields_params_class",
+    [
+        ("filter", FilterRequest, MappedFieldsFilterQueryFieldsParameters),
+        ("count", AggregateRequest, CountFilterQueryFieldsParameters),
+        ("max", MinMaxRequest, AggregateFilterQueryFieldsParameters),
+    ],
+)
+def test_explain(
+    reader: ReaderService,
+    read_db: SqlReadDatabaseBackendService,
+    route,
+    request_class,
+    fields_params_class,
+):
+    result = MagicMock()
+    read_db.explain_filter = explain = MagicMock(return_value=result)
+
+    filter_operator = FilterOperator("field", "=", "data")
+    args = ["field"] if request_class != AggregateRequest else []
+    request = ExplainRequest(route, request_class("collection", filter_operator, *args))
+
+    assert reader.explain(request) == result
+
+    assert explain.call_args.args[:2] == ("collection", filter_operator)
+    fields_params = explain.call_args.args[2]
+    assert type(fields_params) is fields_params_class
+    if route == "max":
+        assert fields_params.function == "max"
+        assert fields_params.field == "field"
+
+
 def test_exists_true(reader: ReaderService):
     reader.count = count = MagicMock(return_value={"count": 1, "position": 0})
 
@@ -0,0 +1,72 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from datastore.reader.redis_backend.connection_handler import ConnectionHandler
+from datastore.reader.redis_backend.redis_connection_handler import (
+    RedisConnectionHandlerService,
+)
+from datastore.shared.di import injector
+from datastore.shared.services import EnvironmentService, ShutdownService
+from tests import reset_di  # noqa
+
+
+@pytest.fixture(autouse=True)
+def provide_di(reset_di):  # noqa
+    injector.register(ShutdownService, ShutdownService)
+    injector.register(EnvironmentService, EnvironmentService)
+    injector.register(ConnectionHandler, RedisConnectionHandlerService)
+    yield
+
+
+@pytest.fixture()
+def connection(provide_di):
+    yield injector.get(ConnectionHandler)
+
+
+def test_get_connection(connection):
+    injector.get(EnvironmentService).set("MESSAGE_BUS_HOST", "host")
+    with patch("redis.Redis") as redis:
+        assert connection.ensure_connection() == redis.return_value
+        assert connection.ensure_connection() == redis.return_value
+    redis.assert_called_once_with(host="host", port=6379, decode_responses=True)
+
+
+def test_get_last_entry(connection):
+    connection.connection = c = MagicMock()
+    c.xrevrange.return_value = [("1-0", {"a/1/f": "1"})]
+
+    assert connection.get_last_entry("topic") == ("1-0", {"a/1/f": "1"})
+    c.xrevrange.assert_called_with("topic", count=1)
+
+
+def test_get_last_entry_empty(connection):
+    connection.connection = c = MagicMock()
+    c.xrevrange.return_value = []
+
+    assert connection.get_last_entry("topic") is None
+
+
+def test_xread(connection):
+    connection.connection = c = MagicMock()
+    c.xread.return_value = [["topic", [("1-0", {"a/1/f": "1"})]]]
+
+    assert connection.xread({"topic": "0-0", "other": "0-0"}, 10) == {
+        "topic": [("1-0", {"a/1/f": "1"})]
+    }
+    c.xread.assert_called_with({"topic": "0-0", "other": "0-0"}, block=10)
+
+
+def test_xread_empty(connection):
+    connection.connection = c = MagicMock()
+    c.xread.return_value = []
+
+    assert connection.xread({"topic": "0-0"}, 10) == {}
+
+
+def test_shutdown(connection):
+    connection.connection = c = MagicMock()
+    connection.shutdown()
+
+    c.close.assert_called()
+    assert connection.connection is None
@@ -0,0 +1,97 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from datastore.shared.di import injector
+from datastore.shared.postgresql_backend import ConnectionHandler, FilterIndexRegistry
+from datastore.shared.postgresql_backend.filter_index_registry import (
+    FILTER_INDEXES_ENVIRONMENT_VAR,
+    FilterIndex,
+)
+from datastore.shared.services import EnvironmentService
+from datastore.shared.util import InvalidFormat
+from tests import reset_di  # noqa
+
+
+@pytest.fixture(autouse=True)
+def provide_di(reset_di):  # noqa
+    injector.register(EnvironmentService, EnvironmentService)
+    injector.register_as_singleton(ConnectionHandler, MagicMock)
+    yield
+
+
+def get_registry(value):
+    injector.get(EnvironmentService).set(FILTER_INDEXES_ENVIRONMENT_VAR, value)
+    injector.register(FilterIndexRegistry, FilterIndexRegistry)
+    return injector.get(FilterIndexRegistry)
+
+
+def test_empty():
+    registry = get_registry("")
+    assert registry.indexes == []
+    assert registry.get_index_definitions() == {}
+
+
+def test_parse():
+    registry = get_registry(" a/f, b/g:gin,")
+    assert registry.indexes == [
+        FilterIndex("a", "f", False),
+        FilterIndex("b", "g", True),
+    ]
+    assert registry.uses_gin_index("b", "g")
+    assert not registry.uses_gin_index("a", "f")
+    assert not registry.uses_gin_index("b", "f")
+
+
+@pytest.mark.parametrize("value", ["a", "a/f/g", "a/F", "a/1:gin"])
+def test_parse_invalid(value):
+    with pytest.raises(InvalidFormat):
+        get_registry(value)
+
+
+def test_index_definitions():
+    registry = get_registry("a/f,a/g:gin,a/h:gin")
+    definitions = registry.get_index_definitions()
+    assert list(definitions.keys()) == ["models_filter_a/f", "models_filter_a:gin"]
+    assert definitions["models_filter_a/f"][1] == ["f", "a"]
+    assert definitions["models_filter_a:gin"][1] == ["a"]
+
+
+def test_long_index_name():
+    registry = get_registry("")
+    name = registry.get_index_name("a" * 32 + "/" + "f" * 32)
+    assert len(name) == 63
+    assert name != registry.get_index_name("a" * 32 + "/" + "f" * 33)
+
+
+def test_update_indexes():
+    registry = get_registry("a/f,b/g:gin")
+    connection = injector.get(ConnectionHandler)
+    connection.query.return_value = [
+        ("models_filter_a/f", True),
+        ("models_filter_c/h", True),
+    ]
+
+    assert registry.update_indexes() == (
+        ["models_filter_b:gin"],
+        ["models_filter_c/h"],
+    )
+    assert connection.execute.call_count == 2
+    assert connection.execute.call_args_list[0].args[2] == ["models_filter_c/h"]
+    assert connection.execute.call_args_list[1].args[1:] == (
+        ["b"],
+        ["models_filter_b:gin"],
+    )
+    assert "concurrently" in connection.execute.call_args_list[1].args[0]
+
+
+def test_update_indexes_invalid():
+    registry = get_registry("a/f")
+    connection = injector.get(ConnectionHandler)
+    connection.query.return_value = [("models_filter_a/f", False)]
+
+    assert registry.update_indexes() == (["models_filter_a/f"], [])
+    assert connection.execute.call_count == 2
+    assert connection.execute.call_args_list[0].args[0].startswith("drop index")
+    assert connection.execute.call_args_list[0].args[2] == ["models_filter_a/f"]
+    assert connection.execute.call_args_list[1].args[2] == ["models_filter_a/f"]
@@ -1,28 +1,160 @@
-import sys
-from unittest.mock import MagicMock, patch
+from importlib import import_module
 
-from datastore.shared.postgresql_backend import filter_models
-from datastore.shared.util import And, FilterOperator, Not, Or
+import pytest
 
+from datastore.shared.postgresql_backend import (
+    CollectionIndexedModels,
+    compile_filter,
+    filter_models,
+    iter_collection,
+)
+from datastore.shared.util import (
+    And,
+    BadCodingError,
+    FilterOperator,
+    InvalidFormat,
+    Not,
+    Or,
+)
 
-# Hack to patch the eval function in the module - since the function has the same name as the
-# module, the former shadows the latter.
-filter_models_module = sys.modules["datastore.shared.postgresql_backend.filter_models"]
 
+# the package exports the function filter_models under the name of the module
+filter_models_module = import_module(
+    "datastore.shared.postgresql_backend.filter_models"
+)
 
-@patch.object(filter_models_module, "eval")
-class TestFilterModels:
-    models = {"a/1": MagicMock()}
 
-    def test_sql_to_filter_code_simple(self, mock) -> None:
-        filter_models(self.models, "a", FilterOperator("test", "=", 1))
-        assert mock.call_args[0][0] == 'model.get("test") == 1'
+models = {
+    "a/1": {"id": 1, "f": 1, "s": "Test", "l": [1, {"x": 1}], "b": True},
+    "a/2": {"id": 2, "f": 2, "s": "other", "b": False},
+    "a/3": {"id": 3, "f": "1", "s": "100%_done"},
+    "b/1": {"id": 1, "f": 1},
+    "ab/1": {"id": 1, "f": 1},
+}
 
-    def test_sql_to_filter_code_complex(self, mock) -> None:
-        operator = FilterOperator("test", "=", 1)
-        _filter = Or([operator, And([operator, Not(operator)])])
-        filter_models(self.models, "a", _filter)
-        assert (
-            mock.call_args[0][0]
-            == '(model.get("test") == 1) or ((model.get("test") == 1) and (not (model.get("test") == 1)))'
-        )
+
+@pytest.mark.parametrize(
+    "filter,ids",
+    [
+        (FilterOperator("f", "=", 1), [1]),
+        (FilterOperator("f", "!=", 1), [2, 3]),
+        (FilterOperator("f", "=", None), []),
+        (FilterOperator("l", "=", None), [2, 3]),
+        (FilterOperator("l", "!=", None), [1]),
+        (FilterOperator("f", "<", 2), [1]),
+        (FilterOperator("f", "<=", 2), [1, 2]),
+        (FilterOperator("f", ">", 1), [2]),
+        (FilterOperator("f", ">=", "1"), [3]),
+        (FilterOperator("s", "~=", "TEST"), [1]),
+        (FilterOperator("b", "~=", True), [1]),
+        (FilterOperator("f", "~=", 1), [1, 3]),
+        (FilterOperator("s", "%=", "t%"), [1]),
+        (FilterOperator("s", "%=", "%T%"), [1, 2]),
+        (FilterOperator("s", "%=", "_ther"), [2]),
+        (FilterOperator("s", "%=", "100\\%\\_%"), [3]),
+        (FilterOperator("s", "%=", "100%x"), []),
+        (FilterOperator("s", "%=", "(.*)"), []),
+        (Not(FilterOperator("f", "=", 1)), [2, 3]),
+        (Or([FilterOperator("f", "=", 1), FilterOperator("f", "=", 2)]), [1, 2]),
+        (And([FilterOperator("f", ">=", 1), FilterOperator("s", "=", "other")]), [2]),
+        (
+            Or(
+                [
+                    FilterOperator("f", "=", "1"),
+                    And(
+                        [FilterOperator("f", "=", 1), Not(FilterOperator("b", "=", 1))]
+                    ),
+                ]
+            ),
+            [3],
+        ),
+    ],
+)
+def test_filter_models(filter, ids):
+    assert list(filter_models(models, "a", filter)) == ids
+
+
+def test_filter_models_indexed():
+    indexed_models = CollectionIndexedModels(models)
+    assert list(filter_models(indexed_models, "a", FilterOperator("f", "=", 1))) == [1]
+    assert list(filter_models(indexed_models, "ab", FilterOperator("f", "=", 1))) == [1]
+
+
+def test_filter_models_invalid_none_comparison():
+    with pytest.raises(InvalidFormat):
+        filter_models(models, "a", FilterOperator("f", "<", None))
+
+
+def test_filter_models_invalid_operator():
+    with pytest.raises(BadCodingError):
+        filter_models(models, "a", FilterOperator("f", "in", 1))
+
+
+def test_filter_models_invalid_filter_type():
+    with pytest.raises(BadCodingError):
+        filter_models(models, "a", None)
+
+
+def test_filter_models_mapped_fields():
+    result = filter_models(models, "a", FilterOperator("f", "=", 1), ["f", "l", "x"])
+    assert result == {1: {"f": 1, "l": [1, {"x": 1}]}}
+    result[1]["l"][1]["x"] = 2
+    assert models["a/1"]["l"] == [1, {"x": 1}]
+
+
+def test_filter_models_copy():
+    result = filter_models(models, "a", FilterOperator("f", "=", 1))
+    assert result == {1: models["a/1"]}
+    result[1]["l"].append(2)
+    assert models["a/1"]["l"] == [1, {"x": 1}]
+
+
+def test_compile_filter_cached():
+    assert compile_filter(FilterOperator("f", "=", 1)) is compile_filter(
+        FilterOperator("f", "=", 1)
+    )
+    assert compile_filter(FilterOperator("f", "=", 1)) is not compile_filter(
+        FilterOperator("f", "=", "1")
+    )
+
+
+def test_compile_filter_cache_eviction(monkeypatch):
+    monkeypatch.setattr(filter_models_module, "MAX_COMPILED_FILTERS", 2)
+    monkeypatch.setattr(filter_models_module, "compiled_filters", {})
+    compile_filter(FilterOperator("f", "=", 1))
+    compile_filter(FilterOperator("f", "=", 2))
+    assert len(filter_models_module.compiled_filters) == 2
+    compile_filter(FilterOperator("f", "=", 3))
+    assert list(filter_models_module.compiled_filters) == [
+        repr(FilterOperator("f", "=", 3))
+    ]
+
+
+def test_collection_indexed_models():
+    indexed_models = CollectionIndexedModels({"a/1": {"id": 1}})
+    indexed_models["b/1"] = {"id": 1}
+    indexed_models["a/2"] = {"id": 2}
+    indexed_models.update({"a/3": {"id": 3}})
+    indexed_models.setdefault("a/4", {"id": 4})
+    del indexed_models["a/1"]
+    assert indexed_models.pop("a/3") == {"id": 3}
+    assert indexed_models.pop("a/5", None) is None
+
+    assert [fqid for fqid, _ in iter_collection(indexed_models, "a")] == ["a/2", "a/4"]
+    assert [fqid for fqid, _ in iter_collection(indexed_models, "b")] == ["b/1"]
+    assert list(iter_collection(indexed_models, "c")) == []
+    assert indexed_models == {"b/1": {"id": 1}, "a/2": {"id": 2}, "a/4": {"id": 4}}
+
+    indexed_models.clear()
+    assert list(iter_collection(indexed_models, "a")) == []
+
+
+def test_collection_indexed_models_empty():
+    assert CollectionIndexedModels() == {}
+    assert list(iter_collection(CollectionIndexedModels(), "a")) == []
+
+
+def test_collection_indexed_models_popitem():
+    indexed_models = CollectionIndexedModels({"a/1": {"id": 1}, "a/2": {"id": 2}})
+    assert indexed_models.popitem() == ("a/2", {"id": 2})
+    assert [fqid for fqid, _ in iter_collection(indexed_models, "a")] == ["a/1"]
@@ -1,7 +1,6 @@
 import concurrent.futures
 import multiprocessing
 import os
-import threading
 from datetime import datetime
 from threading import Thread
 from time import sleep
@@ -21,9 +20,15 @@ from datastore.shared.postgresql_backend import (
 from datastore.shared.postgresql_backend.connection_handler import DatabaseError
 from datastore.shared.postgresql_backend.pg_connection_handler import (
     ConnectionContext,
+    ConnectionWaiter,
+    CopyInput,
     PgConnectionHandlerService,
     retry_on_db_failure,
 )
+from datastore.shared.postgresql_backend.statement_stats import (
+    SLOW_STATEMENT_THRESHOLD_ENVIRONMENT_VAR,
+    STATEMENT_STATS_ENVIRONMENT_VAR,
+)
 from datastore.shared.services import EnvironmentService, setup_di as util_setup_di
 from datastore.shared.util import BadCodingError
 from tests import reset_di  # noqa
@@ -62,6 +67,19 @@ def test_connection_context(handler):
     pc.assert_called_with(connection, False, False)
 
 
+def test_connection_context_autocommit(handler):
+    connection = MagicMock()
+    connection.closed = 0
+    handler.get_connection = MagicMock(return_value=connection)
+    handler.put_connection = pc = MagicMock()
+
+    with ConnectionContext(handler, autocommit=True):
+        assert connection.autocommit
+    connection.__enter__.assert_not_called()
+    connection.__exit__.assert_not_called()
+    pc.assert_called_with(connection, False, False)
+
+
 def test_init_error():
     os.environ["DATASTORE_MIN_CONNECTIONS"] = "1"
     injector.get(EnvironmentService).cache = {}
@@ -106,18 +124,89 @@ def test_get_connection_ignore_invalid_connection(handler):
 
 
 def test_get_connection_lock(handler):
+    handler.max_conn = 1
     conn = handler.get_connection()
-    handler.sync_event.clear()
     thread = Thread(target=handler.get_connection)
     thread.start()
     thread.join(0.05)
     assert thread.is_alive()
-    handler.sync_event.set()
     handler.put_connection(conn, False)
     thread.join(0.05)
     assert not thread.is_alive()
 
 
+def test_get_connection_fifo(handler):
+    handler.max_conn = 1
+    conn = handler.get_connection()
+    order = []
+
+    def get_connection(name):
+        with ConnectionContext(handler):
+            order.append(name)
+
+    threads = []
+    for name in ("a", "b", "c"):
+        thread = Thread(target=get_connection, args=(name,))
+        thread.start()
+        threads.append(thread)
+        while len(handler.waiters) < len(threads):
+            sleep(0.001)
+
+    handler.put_connection(conn)
+    for thread in threads:
+        thread.join(1)
+    assert order == ["a", "b", "c"]
+    stats = handler.get_pool_stats()
+    assert stats["acquisitions"] == 4
+    assert stats["exhaustions"] == 3
+    assert stats["checked_out"] == 0
+    assert stats["waiting"] == 0
+    assert stats["wait_time"] > 0
+
+
+def test_get_connection_timeout(handler):
+    handler.max_conn = 1
+    handler.pool_timeout = 0.01
+    conn = handler.get_connection()
+
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        future = executor.submit(handler.get_connection)
+        with pytest.raises(DatabaseError) as e:
+            future.result()
+    assert "Timeout while waiting for a database connection" in e.value.msg
+    stats = handler.get_pool_stats()
+    assert stats["timeouts"] == 1
+    assert stats["waiting"] == 0
+    assert stats["checked_out"] == 1
+    handler.put_connection(conn)
+
+
+def test_serve_waiters_error(handler):
+    waiter = ConnectionWaiter()
+    handler.waiters.append(waiter)
+    handler.connection_pool = MagicMock()
+    handler.connection_pool.getconn.side_effect = psycopg2.Error
+
+    handler.serve_waiters()
+
+    assert waiter.event.is_set()
+    assert not handler.waiters
+    with pytest.raises(DatabaseError):
+        handler.wait_for_connection(waiter, 0)
+
+
+def test_get_pool_stats_without_pool(handler):
+    assert handler.get_pool_stats() == {
+        "max_connections": handler.max_conn,
+        "checked_out": 0,
+        "waiting": 0,
+        "acquisitions": 0,
+        "exhaustions": 0,
+        "timeouts": 0,
+        "wait_time": 0.0,
+    }
+
+
 def test_get_connection_different():
     os.environ["DATASTORE_MAX_CONNECTIONS"] = "2"
     injector.get(EnvironmentService).cache = {}
@@ -160,7 +249,7 @@ def test_get_connection_context(handler):
         "datastore.shared.postgresql_backend.pg_connection_handler.ConnectionContext"
     ) as context:
         handler.get_connection_context()
-        context.assert_called_with(handler)
+        context.assert_called_with(handler, False)
 
 
 # Connection context and error handling
@@ -206,12 +295,13 @@ def test_operational_error_in_context(handler):
 def test_to_json(handler):
     json = handler.to_json({"a": "a", "b": "b"})
     assert type(json) is Json
-    assert str(json) == '\'{"a": "a", "b": "b"}\''
+    assert str(json) == '\'{"a":"a","b":"b"}\''
 
 
 def setup_mocked_connection(handler):
     cursor = MagicMock(name="cursor")
     cursor.execute = MagicMock(name="execute")
+    cursor.rowcount = -1
     cursor_context = MagicMock(name="cursor_context")
     cursor_context.__enter__ = MagicMock(return_value=cursor, name="enter")
     mock = MagicMock(name="connection_mock")
@@ -255,6 +345,93 @@ def test_query_single_value_none(handler):
     assert handler.query_single_value("", "") is None
 
 
+def test_query_stream(handler):
+    cursor = setup_mocked_connection(handler)
+    cursor.__iter__ = MagicMock(return_value=iter([1, 2]))
+    handler.stream_batch_size = 2
+
+    assert list(handler.query_stream("", "")) == [1, 2]
+    cursor.execute.assert_called()
+    assert cursor.itersize == 2
+    name = handler.get_current_connection().cursor.call_args.kwargs["name"]
+    assert name.startswith("stream_")
+
+
+def test_copy_from(handler):
+    cursor = setup_mocked_connection(handler)
+
+    handler.copy_from("t", ("a", "b"), [(1, "x")])
+
+    query, copy_input = cursor.copy_expert.call_args.args
+    assert isinstance(copy_input, CopyInput)
+    assert copy_input.read() == b"1\tx\n"
+
+
+def test_copy_input():
+    rows = [
+        (1, None, True, False),
+        ("a\tb\nc\rd\\e", Json({"f": "x\ny"}), 1.5, "f"),
+    ]
+    copy_input = CopyInput(rows)
+
+    assert copy_input.read(3) == b"1\t\\"
+    assert copy_input.read() == (
+        b"N\tt\tf\n" b"a\\tb\\nc\\rd\\\\e\t" b'{"f": "x\\\\ny"}\t1.5\tf\n'
+    )
+    assert copy_input.read() == b""
+
+
+def test_copy_input_array():
+    copy_input = CopyInput([(["f", 'a"b\\c', None], [])])
+
+    # the array escaping is escaped again by COPY
+    assert copy_input.read() == b'{"f","a\\\\"b\\\\\\\\c",NULL}\t{}\n'
+
+
+def test_statement_stats(provide_di):
+    injector.get(EnvironmentService).set(STATEMENT_STATS_ENVIRONMENT_VAR, "1")
+    injector.register(ConnectionHandler, PgConnectionHandlerService)
+    handler = injector.get(ConnectionHandler)
+    cursor = setup_mocked_connection(handler)
+    cursor.fetchall = MagicMock(return_value=[1, 2])
+    cursor.__iter__ = MagicMock(return_value=iter([1, 2, 3]))
+
+    handler.query("select * from t where id=%s", [1])
+    handler.query("select * from t where id=%s", [2])
+    assert list(handler.query_stream("select 1", [])) == [1, 2, 3]
+    cursor.rowcount = 4
+    handler.execute("delete from t", [])
+
+    stats = {stat.statement: stat for stat in handler.get_statement_stats()}
+    assert stats["select * from t where id=?"].calls == 2
+    assert stats["select * from t where id=?"].rows == 4
+    assert stats["select ?"].rows == 3
+    assert stats["delete from t"].rows == 4
+
+
+def test_statement_stats_disabled(handler):
+    setup_mocked_connection(handler)
+    handler.execute("delete from t", [])
+    assert handler.statement_stats is None
+    assert handler.get_statement_stats() == []
+
+
+def test_slow_statement_logged(provide_di):
+    injector.get(EnvironmentService).set(SLOW_STATEMENT_THRESHOLD_ENVIRONMENT_VAR, "0")
+    injector.register(ConnectionHandler, PgConnectionHandlerService)
+    handler = injector.get(ConnectionHandler)
+    setup_mocked_connection(handler)
+
+    with patch("datastore.shared.postgresql_backend.statement_stats.logger") as logger:
+        handler.execute("delete from t where id in (%s, %s)", [1, 2])
+
+    message = logger.warning.call_args.args[0]
+    assert message.startswith("Slow statement ")
+    assert message.endswith(": delete from t where id in (?, ...)")
+    # only logging is enabled
+    assert handler.get_statement_stats() == []
+
+
 def test_query_list_of_single_values(handler):
     handler.query = MagicMock()
     handler.query_list_of_single_values("", "")
@@ -268,6 +445,14 @@ def test_shutdown(handler):
     pool.closeall.assert_called()
 
 
+def test_shutdown_statement_summary(handler):
+    handler.connection_pool = MagicMock()
+    handler.statement_stats = statement_stats = MagicMock()
+
+    handler.shutdown()
+    statement_stats.log_summary.assert_called()
+
+
 # test retry_on_db_failure
 def test_retry_on_db_failure():
     @retry_on_db_failure
@@ -282,6 +467,25 @@ def test_retry_on_db_failure():
     assert counter.call_count == 5
 
 
+def test_retry_on_db_failure_nested():
+    @retry_on_db_failure
+    def inner(counter):
+        counter()
+        error = psycopg2.OperationalError()
+        raise DatabaseError("", error)
+
+    @retry_on_db_failure
+    def outer(counter):
+        inner(counter)
+
+    counter = MagicMock()
+    with patch("datastore.shared.postgresql_backend.pg_connection_handler.sleep"):
+        with pytest.raises(DatabaseError):
+            outer(counter)
+    # only the outer function is retried
+    assert counter.call_count == 5
+
+
 def test_retry_on_db_failure_raise_on_other_error():
     @retry_on_db_failure
     def test(counter):
@@ -312,42 +516,6 @@ def test_retry_on_db_failure_with_timeout():
     assert sleep.call_count == 4
 
 
-def test_sync_event_for_getter():
-    """
-    Test the 5.line "continue" in get_connection of the handler,
-    leaving the lock, if sync_event is not set
-    """
-    injector.get(EnvironmentService).cache = {}
-    handler = service(PgConnectionHandlerService)()
-
-    handler.max_conn = (
-        2  # possible, because connection_pool will be created on first get_connection
-    )
-    block_event = threading.Event()
-    block_event.clear()
-    conn = handler.get_connection()
-    thread_blocking_conn = Thread(
-        target=thread_method_block,
-        kwargs={"handler": handler, "block_event": block_event},
-    )
-    thread_blocking_conn.start()
-    handler.sync_event.clear()
-
-    threads: Thread = []
-    for i in range(handler.max_conn):
-        thread = Thread(target=thread_method, kwargs={"handler": handler, "secs": 0.1})
-        thread.start()
-        threads.append(thread)
-    handler.sync_event.set()
-    sleep(0.1)
-    assert not handler.sync_event.is_set()
-    handler.put_connection(conn)
-    block_event.set()
-    for i in range(handler.max_conn):
-        threads[i].join()
-    thread_blocking_conn.join()
-
-
 def test_error_in_putconn_2_times():
     injector.get(EnvironmentService).cache = {}
     handler = service(PgConnectionHandlerService)()
@@ -458,9 +626,3 @@ def thread_method_conn_close_exc(handler, secs):
     with ConnectionContext(handler):
         sleep(secs)
         raise psycopg2.Error("test raising psycopg2")
-
-
-def thread_method_block(handler, block_event):
-    """only for consuming a connection"""
-    with ConnectionContext(handler):
-        block_event.wait()
@@ -3,7 +3,9 @@ from unittest.mock import MagicMock
 import pytest
 
 from datastore.shared.di import injector
+from datastore.shared.postgresql_backend import ConnectionHandler, FilterIndexRegistry
 from datastore.shared.postgresql_backend.sql_query_helper import SqlQueryHelper
+from datastore.shared.services import EnvironmentService
 from datastore.shared.services.read_database import (
     AggregateFilterQueryFieldsParameters,
     CountFilterQueryFieldsParameters,
@@ -22,6 +24,9 @@ from tests import reset_di  # noqa
 
 @pytest.fixture(autouse=True)
 def provide_di(reset_di):  # noqa
+    injector.register(EnvironmentService, EnvironmentService)
+    injector.register_as_singleton(ConnectionHandler, MagicMock)
+    injector.register(FilterIndexRegistry, FilterIndexRegistry)
     injector.register(SqlQueryHelper, SqlQueryHelper)
     yield
 
@@ -43,6 +48,61 @@ def test_build_filter_query_mapped_fields(query_helper: SqlQueryHelper):
     assert s == ["field"]
 
 
+def test_build_filter_query_select_id(query_helper: SqlQueryHelper):
+    query_helper.build_filter_str = MagicMock(return_value="filter")
+    param = MappedFieldsFilterQueryFieldsParameters([])
+
+    q, a, s = query_helper.build_filter_query("c", MagicMock(), param, select_id=True)
+
+    assert q.startswith("select id as __id__, ")
+    assert q.endswith("from models where collection = %s and (filter)")
+    assert a == ["c"]
+
+
+def test_build_filter_query_gin_index(query_helper: SqlQueryHelper):
+    injector.get(FilterIndexRegistry).gin_fields = {("c", "f")}
+    filter = And([FilterOperator("f", "=", 5), Not(FilterOperator("g", "=", "x"))])
+    param = MappedFieldsFilterQueryFieldsParameters([])
+
+    q, a, s = query_helper.build_filter_query("c", filter, param)
+
+    assert q.endswith(
+        "where collection = %s and (((data @> %s::jsonb OR data @> %s::jsonb)"
+        " AND data->>%s = %s::text) AND (NOT (data->>%s = %s::text)))"
+    )
+    assert a == ["c", '{"f":"5"}', '{"f":5}', "f", 5, "g", "x"]
+
+
+def test_build_filter_str_gin_index_without_collection(
+    query_helper: SqlQueryHelper,
+):
+    injector.get(FilterIndexRegistry).gin_fields = {("c", "f")}
+    arguments: list = []
+
+    q = query_helper.build_filter_str(FilterOperator("f", "=", 5), arguments)
+
+    assert q == "data->>%s = %s::text"
+    assert arguments == ["f", 5]
+
+
+@pytest.mark.parametrize(
+    "value,documents",
+    [
+        ("x", ['{"f":"x"}']),
+        ("5.10", ['{"f":"5.10"}', '{"f":5.10}']),
+        ("[1, 2]", ['{"f":"[1, 2]"}', '{"f":[1, 2]}']),
+        ("NaN", ['{"f":"NaN"}']),
+        ("1e400", ['{"f":"1e400"}', '{"f":1e400}']),
+        (True, ['{"f":"true"}', '{"f":true}']),
+        (-3, ['{"f":"-3"}', '{"f":-3}']),
+        (1.5, []),
+    ],
+)
+def test_get_containment_documents(query_helper: SqlQueryHelper, value, documents):
+    filter = FilterOperator("f", "=", value)
+    assert query_helper.get_containment_documents(filter) == documents
+
+
 def test_build_filter_query_invalid_function(query_helper: SqlQueryHelper):
     query_helper.build_filter_str = bfs = MagicMock(return_value=MagicMock())
     filter = MagicMock()
@@ -5,14 +5,20 @@ from unittest.mock import MagicMock
 import pytest
 
 from datastore.shared.di import injector
-from datastore.shared.postgresql_backend import EVENT_TYPE, ConnectionHandler
+from datastore.shared.postgresql_backend import (
+    EVENT_TYPE,
+    ConnectionHandler,
+    FilterIndexRegistry,
+)
 from datastore.shared.postgresql_backend.connection_handler import DatabaseError
 from datastore.shared.postgresql_backend.sql_query_helper import SqlQueryHelper
 from datastore.shared.postgresql_backend.sql_read_database_backend_service import (
     SqlReadDatabaseBackendService,
 )
+from datastore.shared.services import EnvironmentService
 from datastore.shared.services.read_database import (
     CountFilterQueryFieldsParameters,
+    MappedFieldsFilterQueryFieldsParameters,
     ReadDatabase,
 )
 from datastore.shared.util import (
@@ -29,7 +35,9 @@ from tests import reset_di  # noqa
 
 @pytest.fixture(autouse=True)
 def provide_di(reset_di):  # noqa
+    injector.register(EnvironmentService, EnvironmentService)
     injector.register_as_singleton(ConnectionHandler, MagicMock)
+    injector.register(FilterIndexRegistry, FilterIndexRegistry)
     injector.register(SqlQueryHelper, SqlQueryHelper)
     injector.register(ReadDatabase, SqlReadDatabaseBackendService)
     yield
@@ -134,7 +142,10 @@ def test_get_all_without_mapped_fields(read_database: ReadDatabase):
 
 
 def test_get_everything(read_database: ReadDatabase, connection: ConnectionHandler):
-    res = [{"__fqid__": "a/2", "data": {}}, {"__fqid__": "a/1", "data": {}}]
+    res = [
+        {"collection": "a", "id": 2, "data": {}},
+        {"collection": "a", "id": 1, "data": {}},
+    ]
     connection.query = f = MagicMock(return_value=res)
 
     models = read_database.get_everything(
@@ -145,6 +156,43 @@ def test_get_everything(read_database: ReadDatabase, connection: ConnectionHandl
     assert models == {"a": {1: {"id": 1}, 2: {"id": 2}}}
 
 
+def test_get_all_stream(read_database: ReadDatabase, connection: ConnectionHandler):
+    res = [{"__id__": 1, "f": 1}, {"__id__": 2, "f": None}]
+    connection.query_stream = f = MagicMock(return_value=iter(res))
+
+    models = read_database.get_all_stream("c", MappedFields(["f"]))
+
+    f.assert_not_called()
+    assert list(models) == [(1, {"f": 1}), (2, {"f": None})]
+    f.assert_called()
+
+
+def test_get_all_stream_without_mapped_fields(
+    read_database: ReadDatabase, connection: ConnectionHandler
+):
+    res = [{"__id__": 1, "data": {"f": 1}}]
+    connection.query_stream = MagicMock(return_value=iter(res))
+
+    models = read_database.get_all_stream("c")
+
+    assert list(models) == [(1, {"f": 1})]
+
+
+def test_get_everything_stream(
+    read_database: ReadDatabase, connection: ConnectionHandler
+):
+    res = [
+        {"collection": "a", "id": 2, "data": {}},
+        {"collection": "b", "id": 1, "data": {}},
+    ]
+    connection.query_stream = f = MagicMock(return_value=iter(res))
+
+    models = read_database.get_everything_stream()
+
+    assert list(models) == [("a", 2, {"id": 2}), ("b", 1, {"id": 1})]
+    assert "order by" in f.call_args.args[0]
+
+
 def test_filter(read_database: ReadDatabase):
     res = MagicMock()
     read_database.fetch_models = f = MagicMock(return_value=res)
@@ -169,6 +217,21 @@ def test_aggregate(read_database: ReadDatabase, connection: ConnectionHandler):
     assert models == res
 
 
+def test_explain_filter(read_database: ReadDatabase, connection: ConnectionHandler):
+    plan = [{"Plan": {}}]
+    connection.query_single_value = q = MagicMock(return_value=plan)
+    filter = FilterOperator("a", "=", "a")
+    param = MappedFieldsFilterQueryFieldsParameters([])
+
+    result = read_database.explain_filter("c", filter, param)
+
+    assert q.call_args.args[0].startswith("explain (analyze, buffers, format json)")
+    assert "id as __id__" in result["query"]
+    assert result["arguments"] == ["c", "a", "a"]
+    assert result["plan"] == plan
+    assert result["duration"] >= 0
+
+
 def test_fetch_models(read_database: ReadDatabase, connection: ConnectionHandler):
     args = [MagicMock(), MagicMock(), MagicMock()]
     row = MagicMock()
@@ -212,6 +275,7 @@ def test_build_model_ignore_deleted(
     events = [{"fqid": fqid, "data": MagicMock()}, {"fqid": fqid, "data": MagicMock()}]
     model = MagicMock()
     connection.query = q = MagicMock(return_value=events)
+    read_database.get_current_models = MagicMock(return_value={})
     read_database.build_model_from_events = bmfe = MagicMock(return_value=model)
 
     result = read_database.build_model_ignore_deleted(fqid)
@@ -228,6 +292,7 @@ def test_build_model_ignore_deleted_invalid_fqid(
     events = [{"fqid": MagicMock()}]
     model = MagicMock()
     connection.query = q = MagicMock(return_value=events)
+    read_database.get_current_models = MagicMock(return_value={})
     read_database.build_model_from_events = bmfe = MagicMock(return_value=model)
 
     with pytest.raises(ModelDoesNotExist):
@@ -245,6 +310,8 @@ def test_build_model_ignore_deleted_position(
     events = [{"fqid": fqid, "data": MagicMock()}, {"fqid": fqid, "data": MagicMock()}]
     model = MagicMock()
     connection.query = q = MagicMock(return_value=events)
+    read_database.get_current_models = MagicMock(return_value={})
+    read_database.get_snapshots = MagicMock(return_value={})
     read_database.build_model_from_events = bmfe = MagicMock(return_value=model)
 
     result = read_database.build_model_ignore_deleted(fqid, pos)
@@ -329,12 +396,13 @@ def test_get_deleted_status_position(
     read_database: ReadDatabase, connection: ConnectionHandler
 ):
     fqid = MagicMock()
-    result = [{"fqid": fqid, "type": EVENT_TYPE.DELETE}]
+    result = [{"fqid": fqid, "deleted": True}]
     connection.query = q = MagicMock(return_value=result)
 
     assert read_database.get_deleted_status([fqid], 42) == {fqid: True}
     assert "from events" in q.call_args.args[0]
-    assert q.call_args.args[1] == [(fqid,)]
+    assert "from model_snapshots" in q.call_args.args[0]
+    assert q.call_args.args[1] == [(fqid,), (fqid,)]
 
 
 def test_get_position(read_database: ReadDatabase, connection: ConnectionHandler):
@@ -497,3 +565,12 @@ def test_json(read_database: ReadDatabase, connection: ConnectionHandler):
 
     assert read_database.json(data) == value
     tj.assert_called_with(data)
+
+
+def test_build_models_ignore_deleted_no_fqids(
+    read_database: ReadDatabase, connection: ConnectionHandler
+):
+    connection.query = q = MagicMock()
+
+    assert read_database.build_models_ignore_deleted([], 42) == {}
+    q.assert_not_called()
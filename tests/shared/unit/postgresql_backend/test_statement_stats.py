@@ -0,0 +1,102 @@
+from unittest.mock import patch
+
+import pytest
+
+from datastore.shared.postgresql_backend.statement_stats import (
+    OTHER_FINGERPRINT,
+    StatementStatistics,
+    normalize_statement,
+)
+
+
+@pytest.mark.parametrize(
+    "query,statement",
+    [
+        ("select 1", "select ?"),
+        (
+            "select * from models where fqid in %s and data->>'f'='x'",
+            "select * from models where fqid in ? and data->>?=?",
+        ),
+        (
+            """
+            select e2.id from events e2
+            where e2.position > 10 -- comment
+            and e2.weight = 1.5""",
+            "select e2.id from events e2 where e2.position > ? and e2.weight = ?",
+        ),
+        (
+            "insert into t (a, b) values (%s, %s), (%s, %s), (%s,%s)",
+            "insert into t (a, b) values (?, ...), ...",
+        ),
+        ("select {} from t where id=%s", "select {} from t where id=?"),
+        ("select 'it''s'", "select ?"),
+    ],
+)
+def test_normalize_statement(query, statement):
+    fingerprint, result = normalize_statement(query)
+    assert result == statement
+    assert len(fingerprint) == 12
+
+
+def test_normalize_statement_same_fingerprint():
+    assert (
+        normalize_statement("select * from t where id in (%s, %s)")[0]
+        == normalize_statement("select * from t where id in (%s,%s,%s)")[0]
+    )
+    assert (
+        normalize_statement("select * from t where id in (%s)")[0]
+        != normalize_statement("select * from u where id in (%s)")[0]
+    )
+
+
+def test_record():
+    statistics = StatementStatistics(True, None)
+    statistics.record("select * from t where id=%s", 0.5, 1)
+    statistics.record("select * from t where id=%s", 1.5, 2)
+    statistics.record("delete from t", 3, 10)
+
+    stats = statistics.get_stats()
+    assert [stat.statement for stat in stats] == [
+        "delete from t",
+        "select * from t where id=?",
+    ]
+    assert stats[1].calls == 2
+    assert stats[1].total_time == 2
+    assert stats[1].max_time == 1.5
+    assert stats[1].rows == 3
+
+
+def test_record_max_fingerprints():
+    statistics = StatementStatistics(True, None)
+    with patch(
+        "datastore.shared.postgresql_backend.statement_stats.MAX_FINGERPRINTS", 1
+    ):
+        statistics.record("select a from t", 1, 1)
+        statistics.record("select b from t", 1, 1)
+        statistics.record("select c from t", 1, 1)
+
+    stats = {stat.fingerprint: stat for stat in statistics.get_stats()}
+    assert len(stats) == 2
+    assert stats[OTHER_FINGERPRINT].calls == 2
+
+
+def test_slow_statement():
+    statistics = StatementStatistics(False, 1)
+    with patch("datastore.shared.postgresql_backend.statement_stats.logger") as logger:
+        statistics.record("select 1", 0.5, 1)
+        logger.warning.assert_not_called()
+        statistics.record("select 1", 1.5, 1)
+        logger.warning.assert_called_once()
+    assert "(1500.0 ms, 1 rows): select ?" in logger.warning.call_args.args[0]
+    assert statistics.get_stats() == []
+
+
+def test_log_summary():
+    statistics = StatementStatistics(True, None)
+    with patch("datastore.shared.postgresql_backend.statement_stats.logger") as logger:
+        statistics.log_summary()
+        logger.info.assert_not_called()
+        statistics.record("select 1", 0.5, 1)
+        statistics.log_summary()
+    message = logger.info.call_args.args[0]
+    assert "1 calls, 500.0 ms total, 500.0 ms max, 1 rows: select ?" in message
@@ -0,0 +1,101 @@
+import json
+from time import perf_counter
+
+import pytest
+
+from datastore.shared.util import json_dumps, json_loads, json_serializer
+from datastore.shared.util.json_serializer import (
+    OrjsonSerializer,
+    StdlibJsonSerializer,
+    get_json_serializer,
+    set_json_serializer,
+)
+from tests.util import performance
+
+
+DATA = {"a": [1, 2.5, None, True], "b": {"c": "ä\n"}, "d": ""}
+
+
+@pytest.fixture()
+def orjson_serializer():
+    pytest.importorskip("orjson")
+    yield OrjsonSerializer()
+
+
+def test_stdlib():
+    serializer = StdlibJsonSerializer()
+    assert serializer.dumps({"a": [1, 2], 1: None}) == '{"a":[1,2],"1":null}'
+    assert serializer.loads(serializer.dumps(DATA)) == DATA
+
+
+def test_orjson(orjson_serializer):
+    assert orjson_serializer.dumps({"a": [1, 2], 1: None}) == '{"a":[1,2],"1":null}'
+    assert orjson_serializer.loads(orjson_serializer.dumps(DATA)) == DATA
+    assert orjson_serializer.loads(b"[1]") == [1]
+
+
+def test_orjson_fallback(orjson_serializer):
+    assert orjson_serializer.dumps([2**64]) == f"[{2**64}]"
+
+
+@pytest.mark.parametrize(
+    "value", [2**64, 2**70, -(2**63) - 1, 2**64 - 1, -(2**63), 10**18]
+)
+def test_orjson_big_int_round_trip(orjson_serializer, value):
+    data = {"a": value, "b": [value, 1.5]}
+    serialized = orjson_serializer.dumps(data)
+    assert orjson_serializer.loads(serialized) == data
+    assert orjson_serializer.loads(serialized.encode()) == data
+    assert type(orjson_serializer.loads(serialized)["a"]) is int
+
+
+def test_orjson_long_digits_in_string(orjson_serializer):
+    data = {"a": "1" * 30, "b": 1.5}
+    assert orjson_serializer.loads(orjson_serializer.dumps(data)) == data
+
+
+def test_json_loads_big_int():
+    assert json_loads(json_dumps({"a": 2**70})) == {"a": 2**70}
+
+
+def test_set_json_serializer():
+    original = get_json_serializer()
+    serializer = StdlibJsonSerializer()
+    try:
+        set_json_serializer(serializer)
+        assert get_json_serializer() is serializer
+        assert json_loads(json_dumps(DATA)) == DATA
+    finally:
+        set_json_serializer(original)
+
+
+@performance
+def test_serializer_performance():
+    models = {
+        f"motion/{i}": {
+            "id": i,
+            "title": f"Motion {i}",
+            "text": "<p>" + "lorem ipsum " * 50 + "</p>",
+            "meeting_id": 1,
+            "submitter_ids": list(range(10)),
+            "state_extension": None,
+            "meta_deleted": False,
+            "meta_position": i,
+        }
+        for i in range(10000)
+    }
+    serializers = {"json (builtin)": StdlibJsonSerializer()}
+    if json_serializer.orjson:
+        serializers["orjson"] = OrjsonSerializer()
+
+    for name, serializer in serializers.items():
+        start = perf_counter()
+        for model in models.values():
+            serializer.dumps(model)
+        dumps_time = perf_counter() - start
+        serialized = serializer.dumps(models)
+        start = perf_counter()
+        serializer.loads(serialized)
+        loads_time = perf_counter() - start
+        print(f"{name}: dumps {dumps_time:.3f}s, loads {loads_time:.3f}s")
+        assert json.loads(serialized) == models
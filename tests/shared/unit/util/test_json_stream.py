@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from datastore.shared.util import stream_json
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {},
+        {"a": {}},
+        {"a": {"1": {"f": 1}}},
+        {"a": {"1": {"f": 1}, "2": {"f": [1, "x"]}}, "b": {"1": {}}},
+        {"a": {"1": {"b": {"c": None}}}, "d": 1},
+    ],
+)
+def test_nested(data):
+    rows = []
+    for key, value in data.items():
+        if isinstance(value, dict):
+            rows.extend((key, id, model) for id, model in value.items())
+        else:
+            rows.append((key, value))
+    chunks = list(stream_json(rows))
+    expected = {key: value for key, value in data.items() if value != {}}
+    assert "".join(chunks) == json.dumps(expected, separators=(",", ":"))
+
+
+def test_int_keys():
+    assert "".join(stream_json([(1, {}), (2, None)])) == '{"1":{},"2":null}'
+
+
+def test_trailing():
+    chunks = stream_json([("a", 1, {})], trailing={"x": 1}, separators=(", ", ": "))
+    assert "".join(chunks) == json.dumps({"a": {"1": {}}, "x": 1})
+
+
+def test_trailing_only():
+    assert "".join(stream_json([], trailing={"x": 1})) == '{"x":1}'
+
+
+def test_chunks():
+    chunks = list(stream_json(((i, "x" * 10) for i in range(10)), chunk_size=30))
+    assert len(chunks) == 6
+    assert all(len(chunk) >= 30 for chunk in chunks[:-1])
+    assert json.loads("".join(chunks)) == {str(i): "x" * 10 for i in range(10)}
@@ -0,0 +1,65 @@
+from datastore.shared.util.metrics import (
+    REGISTRY,
+    Counter,
+    Histogram,
+    render_gauge,
+    render_metrics,
+)
+
+
+def test_counter():
+    counter = Counter("test_counter_total", "Test counter")
+    counter.inc()
+    counter.inc(2)
+    assert counter.get() == 3
+    assert counter.render() == [
+        "# HELP test_counter_total Test counter",
+        "# TYPE test_counter_total counter",
+        "test_counter_total 3.0",
+    ]
+
+
+def test_counter_labels():
+    counter = Counter("test_counter_labels_total", "Test counter", ["route", "status"])
+    assert counter.render_samples() == []
+    counter.inc(labels=("get", "200"))
+    counter.inc(labels=('a"b\\', "200"))
+    assert counter.render_samples() == [
+        'test_counter_labels_total{route="get",status="200"} 1.0',
+        'test_counter_labels_total{route="a\\"b\\\\",status="200"} 1.0',
+    ]
+
+
+def test_histogram():
+    histogram = Histogram("test_histogram", "Test histogram", buckets=(1, 2))
+    histogram.observe(0.5)
+    histogram.observe(1)
+    histogram.observe(3)
+    assert histogram.get_count() == 3
+    assert histogram.render_samples() == [
+        'test_histogram_bucket{le="1.0"} 2',
+        'test_histogram_bucket{le="2.0"} 2',
+        'test_histogram_bucket{le="+Inf"} 3',
+        "test_histogram_sum 4.5",
+        "test_histogram_count 3",
+    ]
+
+
+def test_histogram_time():
+    histogram = Histogram("test_histogram_time", "Test histogram", ["operation"])
+    with histogram.time(("query",)):
+        pass
+    assert histogram.get_count(("query",)) == 1
+    assert histogram.get_count(("execute",)) == 0
+
+
+def test_render_gauge():
+    assert render_gauge("test_gauge", "Test gauge", 2) == (
+        "# HELP test_gauge Test gauge\n# TYPE test_gauge gauge\ntest_gauge 2.0"
+    )
+
+
+def test_render_metrics():
+    Counter("test_render_total", "Test counter")
+    assert "test_render_total" in REGISTRY
+    assert "\ntest_render_total 0.0" in render_metrics()
@@ -19,6 +19,10 @@ from datastore.writer.postgresql_backend import (
     EventTranslator,
     SqlDatabaseBackendService,
 )
+from datastore.writer.postgresql_backend.recent_changes import (
+    RecentChanges,
+    RecentChangesService,
+)
 from datastore.writer.postgresql_backend.sql_database_backend_service import (
     COLLECTION_MAX_LEN,
 )
@@ -46,10 +50,11 @@ def setup_di(reset_di):  # noqa
     injector.register_as_singleton(ConnectionHandler, FakeConnectionHandler)
     injector.register_as_singleton(ReadDatabase, MagicMock)
     injector.register_as_singleton(EventTranslator, MagicMock)
+    injector.register(EnvironmentService, EnvironmentService)
+    injector.register(RecentChanges, RecentChangesService)
     injector.register(Database, SqlDatabaseBackendService)
     injector.register_as_singleton(OccLocker, MagicMock)
     injector.register_as_singleton(Messaging, MagicMock)
-    injector.register(EnvironmentService, EnvironmentService)
     core_setup_di()
 
 
@@ -19,6 +19,10 @@ from datastore.writer.postgresql_backend import (
     SqlDatabaseBackendService,
 )
 from datastore.writer.postgresql_backend.event_translator import EventTranslatorService
+from datastore.writer.postgresql_backend.recent_changes import (
+    RecentChanges,
+    RecentChangesService,
+)
 from tests import reset_di  # noqa
 
 
@@ -29,6 +33,9 @@ class FakeConnectionHandler:
     def execute(self, query, arguments, use_execute_values=False):
         return self._query(query, arguments, use_execute_values)
 
+    def query(self, query, arguments, use_execute_values=False):
+        return self._query(query, arguments, use_execute_values) or []
+
     def query_single_value(self, query, arguments):
         return self._query(query, arguments)
 
@@ -76,10 +83,11 @@ def setup_di(reset_di):  # noqa
     injector.register_as_singleton(ConnectionHandler, FakeConnectionHandler)
     injector.register_as_singleton(ReadDatabase, MagicMock)
     injector.register_as_singleton(EventTranslator, EventTranslatorService)
+    injector.register(EnvironmentService, EnvironmentService)
+    injector.register(RecentChanges, RecentChangesService)
     injector.register(Database, SqlDatabaseBackendService)
     injector.register_as_singleton(OccLocker, lambda: MagicMock(unsafe=True))
     injector.register_as_singleton(Messaging, MagicMock)
-    injector.register(EnvironmentService, EnvironmentService)
     core_setup_di()
 
 
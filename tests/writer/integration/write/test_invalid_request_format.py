@@ -5,7 +5,7 @@ import pytest
 
 from datastore.shared.di import injector
 from datastore.shared.flask_frontend import InvalidRequest
-from datastore.shared.services import ReadDatabase
+from datastore.shared.services import EnvironmentService, ReadDatabase
 from datastore.shared.util import META_FIELD_PREFIX, InvalidFormat
 from datastore.writer.core import (
     Database,
@@ -23,6 +23,7 @@ def setup_di(reset_di):  # noqa
     injector.register_as_singleton(Database, MagicMock)
     injector.register_as_singleton(ReadDatabase, MagicMock)
     injector.register_as_singleton(Messaging, MagicMock)
+    injector.register(EnvironmentService, EnvironmentService)
     core_setup_di()
 
 
@@ -5,7 +5,11 @@ from unittest.mock import MagicMock
 import pytest
 
 from datastore.shared.di import injector
-from datastore.shared.postgresql_backend import ConnectionHandler, SqlQueryHelper
+from datastore.shared.postgresql_backend import (
+    ConnectionHandler,
+    FilterIndexRegistry,
+    SqlQueryHelper,
+)
 from datastore.shared.services import EnvironmentService, ReadDatabase
 from datastore.shared.services.shutdown_service import ShutdownService
 from datastore.shared.util import FilterOperator, ModelLocked
@@ -17,19 +21,24 @@ from datastore.writer.core import (
 )
 from datastore.writer.flask_frontend.json_handlers import WriteHandler
 from datastore.writer.postgresql_backend import SqlOccLockerBackendService
+from datastore.writer.postgresql_backend.recent_changes import (
+    RecentChanges,
+    RecentChangesService,
+)
 from tests import reset_di  # noqa
 
 
 class FakeConnectionHandler:
     def query_list_of_single_values(self, query, arguments):
-        if query.startswith(
-            "select e.fqid || %s || split_part(cf.collectionfield, %s, 2)"
-        ):
-            return [self.fqfield()]
-        elif query.startswith("select fqid from events"):
-            return [self.fqid()]
-        elif query.startswith("select collectionfield from collectionfields"):
-            return [self.collectionfield()]
+        # all locks are checked in a single query
+        result = []
+        if "l(fqid, position)" in query:
+            result.append(self.fqid())
+        if "l(fqfield, fqid, collectionfield, position)" in query:
+            result.append(self.fqfield())
+        if "select cf.collectionfield" in query:
+            result.append(self.collectionfield())
+        return result
 
     def fqid(self):
         """"""
@@ -43,13 +52,15 @@ class FakeConnectionHandler:
 
 @pytest.fixture(autouse=True)
 def setup_di(reset_di):  # noqa
+    injector.register(EnvironmentService, EnvironmentService)
     injector.register_as_singleton(ConnectionHandler, FakeConnectionHandler)
+    injector.register(FilterIndexRegistry, FilterIndexRegistry)
     injector.register(SqlQueryHelper, SqlQueryHelper)
     injector.register(OccLocker, SqlOccLockerBackendService)
     injector.register_as_singleton(Database, MagicMock)
     injector.register_as_singleton(ReadDatabase, MagicMock)
     injector.register_as_singleton(Messaging, MagicMock)
-    injector.register(EnvironmentService, EnvironmentService)
+    injector.register(RecentChanges, RecentChangesService)
     injector.register(ShutdownService, ShutdownService)
     core_setup_di()
 
@@ -12,6 +12,7 @@ from datastore.writer.redis_backend.redis_connection_handler import (
     ENVIRONMENT_VARIABLES as REDIS_ENVIRONMENT_VARIABLES,
 )
 from datastore.writer.redis_backend.redis_messaging_backend_service import (
+    MODELS_RESET_TOPIC,
     MODIFIED_FIELDS_TOPIC,
 )
 from tests import (  # noqa
@@ -57,6 +58,7 @@ def redis_connection():
 def reset_redis_data(redis_connection):
     def reset_fn():
         redis_connection.xtrim(MODIFIED_FIELDS_TOPIC, 0, approximate=False)
+        redis_connection.xtrim(MODELS_RESET_TOPIC, 0, approximate=False)
 
     reset_fn()
     yield reset_fn
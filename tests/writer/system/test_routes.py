@@ -1,4 +1,5 @@
-from datastore.shared.flask_frontend import get_health_url
+from datastore.shared.flask_frontend import get_health_url, get_metrics_url
+from datastore.writer.core.writer_service import EVENTS_WRITTEN, POSITIONS_WRITTEN
 from datastore.writer.flask_frontend.routes import (
     RESERVE_IDS_URL,
     URL_PREFIX,
@@ -12,6 +13,34 @@ def test_health_route(client):
     assert response.status_code == 200
 
 
+def test_metrics_route(json_client):
+    positions = POSITIONS_WRITTEN.get()
+    events = EVENTS_WRITTEN.get()
+    response = json_client.post(
+        WRITE_URL,
+        {
+            "user_id": 1,
+            "information": {},
+            "locked_fields": {},
+            "events": [
+                {"type": "create", "fqid": "a/1", "fields": {"f": 1}},
+                {"type": "create", "fqid": "a/2", "fields": {"f": 1}},
+            ],
+        },
+    )
+    assert response.status_code == 201
+    assert POSITIONS_WRITTEN.get() == positions + 1
+    assert EVENTS_WRITTEN.get() == events + 2
+
+    response = json_client.get(get_metrics_url(URL_PREFIX))
+    assert response.status_code == 200
+    metrics = response.get_data(as_text=True)
+    assert 'datastore_requests_total{route="write",status="201"}' in metrics
+    assert "\ndatastore_writer_lock_wait_seconds_count " in metrics
+    assert "\ndatastore_messaging_publish_duration_seconds_count " in metrics
+    assert "\ndatastore_db_pool_checked_out " in metrics
+
+
 def test_wrong_method_write(client):
     response = client.get(WRITE_URL)
     assert response.status_code == 405
@@ -4,6 +4,7 @@ import pytest
 
 from datastore.writer.flask_frontend.routes import WRITE_WITHOUT_EVENTS_URL
 from tests.util import assert_response_code
+from tests.writer.system.util import assert_modified_fields
 
 
 @pytest.fixture()
@@ -132,7 +133,9 @@ def test_delete_action_worker_wrong_collection(json_client, data, db_cur):
     )
 
 
-def test_delete_action_worker_with_2_events(json_client, data, db_cur):
+def test_delete_action_worker_with_2_events(
+    json_client, data, db_cur, redis_connection
+):
     db_cur.execute(
         "insert into models (fqid, data, deleted) values"
         " ('action_worker/1', '{\"data\": \"content1\"}', false),"
@@ -164,3 +167,8 @@ def test_delete_action_worker_with_2_events(json_client, data, db_cur):
     )
     result = db_cur.fetchall()
     assert len(result) == 0, "There must be 0 records found"
+    assert_modified_fields(
+        redis_connection,
+        {"action_worker/1": [], "action_worker/2": []},
+        meta_deleted=False,
+    )
@@ -7,6 +7,9 @@ from datastore.shared.services.environment_service import (
     DATASTORE_DEV_MODE_ENVIRONMENT_VAR,
 )
 from datastore.writer.flask_frontend.routes import TRUNCATE_DB_URL
+from datastore.writer.redis_backend.redis_messaging_backend_service import (
+    MODELS_RESET_TOPIC,
+)
 from tests.util import assert_response_code
 
 
@@ -32,6 +35,12 @@ def test_truncate_db(db_connection, db_cur, json_client):
             assert cursor.fetchone() is None
 
 
+def test_truncate_db_reset_message(json_client, redis_connection):
+    response = json_client.post(TRUNCATE_DB_URL, {})
+    assert_response_code(response, 204)
+    assert redis_connection.xlen(MODELS_RESET_TOPIC) == 1
+
+
 GLOB = {}
 
 
@@ -0,0 +1,105 @@
+import pytest
+
+from datastore.shared.di import injector
+from datastore.shared.services import EnvironmentService
+from datastore.writer.flask_frontend.routes import WRITE_URL
+from datastore.writer.postgresql_backend.sql_database_backend_service import (
+    COPY_THRESHOLD_ENVIRONMENT_VAR,
+)
+from tests.util import assert_response_code
+from tests.writer.system.util import assert_model, assert_no_model
+
+
+# with a threshold of 1, all events are written via COPY
+@pytest.fixture(autouse=True, params=["0", "1"], ids=["values", "copy"])
+def setup_copy_threshold(request, setup_di):
+    injector.get(EnvironmentService).set(COPY_THRESHOLD_ENVIRONMENT_VAR, request.param)
+
+
+def write(json_client, *events):
+    response = json_client.post(
+        WRITE_URL,
+        {
+            "user_id": 1,
+            "information": {},
+            "locked_fields": {},
+            "events": list(events),
+        },
+    )
+    assert_response_code(response, 201)
+
+
+def get_events_to_collectionfields(db_cur):
+    db_cur.execute(
+        """
+        select e.position, e.weight, c.collectionfield from events_to_collectionfields ec
+        join events e on ec.event_id = e.id
+        join collectionfields c on ec.collectionfield_id = c.id"""
+    )
+    return sorted(tuple(row) for row in db_cur.fetchall())
+
+
+def test_copy(json_client, db_cur):
+    value = 'a\tb\nc\\d"e'
+    write(
+        json_client,
+        {"type": "create", "fqid": "a/1", "fields": {"f": 1, "g": [1]}},
+        {"type": "create", "fqid": "a/2", "fields": {"f": value}},
+        {"type": "create", "fqid": "b/1", "fields": {}},
+    )
+    write(
+        json_client,
+        {"type": "update", "fqid": "a/1", "fields": {"f": None}},
+        {"type": "update", "fqid": "a/1", "list_fields": {"add": {"g": [2]}}},
+        {"type": "delete", "fqid": "b/1"},
+    )
+
+    assert_model("a/1", {"g": [1, 2]}, 2)
+    assert_model("a/2", {"f": value}, 1)
+    assert_no_model("b/1")
+    db_cur.execute("select position, fqid, type, weight from events order by id")
+    assert db_cur.fetchall() == [
+        (1, "a/1", "create", 1),
+        (1, "a/2", "create", 2),
+        (1, "b/1", "create", 3),
+        (2, "a/1", "deletefields", 1),
+        (2, "a/1", "listfields", 2),
+        (2, "b/1", "delete", 3),
+    ]
+    assert get_events_to_collectionfields(db_cur) == [
+        (1, 1, "a/f"),
+        (1, 1, "a/g"),
+        (1, 1, "a/meta_deleted"),
+        (1, 2, "a/f"),
+        (1, 2, "a/meta_deleted"),
+        (1, 3, "b/meta_deleted"),
+        (2, 1, "a/f"),
+        (2, 2, "a/g"),
+        (2, 3, "b/meta_deleted"),
+        (2, 3, "b/meta_position"),
+    ]
+
+
+def test_multiple_requests(json_client, db_cur):
+    response = json_client.post(
+        WRITE_URL,
+        [
+            {
+                "user_id": 1,
+                "information": {},
+                "locked_fields": {},
+                "events": [{"type": "create", "fqid": f"a/{id}", "fields": {"f": id}}],
+            }
+            for id in (1, 2)
+        ],
+    )
+    assert_response_code(response, 201)
+
+    assert_model("a/1", {"f": 1}, 1)
+    assert_model("a/2", {"f": 2}, 2)
+    assert get_events_to_collectionfields(db_cur) == [
+        (1, 1, "a/f"),
+        (1, 1, "a/meta_deleted"),
+        (2, 1, "a/f"),
+        (2, 1, "a/meta_deleted"),
+    ]
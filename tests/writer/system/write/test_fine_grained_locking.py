@@ -0,0 +1,75 @@
+import concurrent.futures
+
+import pytest
+
+from datastore.shared.di import injector
+from datastore.shared.util import ModelLocked
+from datastore.writer.core import WriteScheduler
+from datastore.writer.core.write_scheduler_service import LOCKING_MODE
+from datastore.writer.flask_frontend.json_handlers import WriteHandler
+from datastore.writer.redis_backend.redis_messaging_backend_service import (
+    MODIFIED_FIELDS_TOPIC,
+)
+from tests.writer.system.util import assert_model
+
+
+def get_request(event, locked_fields={}):
+    return {
+        "user_id": 1,
+        "information": {},
+        "locked_fields": locked_fields,
+        "events": [event],
+    }
+
+
+@pytest.fixture(autouse=True)
+def setup_fine_grained_locking(setup_di):
+    injector.get(WriteScheduler).mode = LOCKING_MODE.FINE_GRAINED
+
+
+def write_concurrently(requests):
+    with concurrent.futures.ThreadPoolExecutor(len(requests)) as executor:
+        futures = [executor.submit(WriteHandler().write, r) for r in requests]
+        concurrent.futures.wait(futures)
+    return [future.exception() for future in futures]
+
+
+def test_concurrent_writes(db_cur, redis_connection):
+    requests = [
+        get_request({"type": "create", "fqid": f"{collection}/1", "fields": {"f": 1}})
+        for collection in "abcdefgh"
+    ]
+
+    assert write_concurrently(requests) == [None] * 8
+
+    db_cur.execute("select count(*) from positions")
+    assert db_cur.fetchone()[0] == 8
+    # the updates are published in the order of the positions
+    messages = redis_connection.xrange(MODIFIED_FIELDS_TOPIC)
+    positions = [
+        int(value)
+        for _, fields in messages
+        for key, value in fields.items()
+        if key.endswith(b"/meta_position")
+    ]
+    assert positions == list(range(1, 9))
+
+
+def test_conflicting_writes():
+    assert write_concurrently(
+        [get_request({"type": "create", "fqid": "a/1", "fields": {"f": 0}})]
+    ) == [None]
+
+    requests = [
+        get_request(
+            {"type": "update", "fqid": "a/1", "fields": {"f": i}},
+            locked_fields={"a/1": 1},
+        )
+        for i in range(1, 9)
+    ]
+    errors = write_concurrently(requests)
+
+    # exactly one write succeeds, all others see its position
+    assert errors.count(None) == 1
+    assert all(isinstance(error, ModelLocked) for error in errors if error)
+    assert_model("a/1", {"f": errors.index(None) + 1}, 2)
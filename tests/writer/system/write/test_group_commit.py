@@ -0,0 +1,89 @@
+import concurrent.futures
+
+import pytest
+
+from datastore.shared.di import injector
+from datastore.shared.services import EnvironmentService
+from datastore.shared.util import ModelExists, ModelLocked
+from datastore.writer.core.writer_service import GROUP_COMMIT_WINDOW_ENVIRONMENT_VAR
+from datastore.writer.flask_frontend.json_handlers import WriteHandler
+from datastore.writer.redis_backend.redis_messaging_backend_service import (
+    MODIFIED_FIELDS_TOPIC,
+)
+from tests.writer.system.util import assert_model, assert_no_model
+
+
+def get_request(event, locked_fields={}):
+    return {
+        "user_id": 1,
+        "information": {},
+        "locked_fields": locked_fields,
+        "events": [event],
+    }
+
+
+@pytest.fixture(autouse=True)
+def setup_group_commit(setup_di):
+    injector.get(EnvironmentService).set(GROUP_COMMIT_WINDOW_ENVIRONMENT_VAR, "100")
+
+
+def write_concurrently(requests):
+    with concurrent.futures.ThreadPoolExecutor(len(requests)) as executor:
+        futures = [executor.submit(WriteHandler().write, r) for r in requests]
+        concurrent.futures.wait(futures)
+    return [future.exception() for future in futures]
+
+
+def test_group_commit(db_cur, redis_connection):
+    errors = write_concurrently(
+        [
+            get_request({"type": "create", "fqid": "a/1", "fields": {"f": 1}}),
+            get_request({"type": "create", "fqid": "a/2", "fields": {"f": 2}}),
+        ]
+    )
+
+    assert errors == [None, None]
+    db_cur.execute("select count(*) from positions")
+    assert db_cur.fetchone()[0] == 2
+    assert redis_connection.xlen(MODIFIED_FIELDS_TOPIC) == 1
+
+
+def test_failing_requests(db_cur, redis_connection):
+    for event in (
+        {"type": "create", "fqid": "a/1", "fields": {"f": 1}},
+        {"type": "update", "fqid": "a/1", "fields": {"f": 2}},
+    ):
+        assert write_concurrently([get_request(event)]) == [None]
+
+    errors = write_concurrently(
+        [
+            get_request(
+                {"type": "update", "fqid": "a/1", "fields": {"f": 3}},
+                locked_fields={"a/1": 1},
+            ),
+            get_request({"type": "create", "fqid": "a/1", "fields": {"f": 4}}),
+            get_request({"type": "create", "fqid": "a/2", "fields": {"f": 5}}),
+        ]
+    )
+
+    assert isinstance(errors[0], ModelLocked)
+    assert isinstance(errors[1], ModelExists)
+    assert errors[2] is None
+    assert_model("a/1", {"f": 2}, 2)
+    db_cur.execute("select max(position) from positions")
+    assert_model("a/2", {"f": 5}, db_cur.fetchone()[0])
+    db_cur.execute("select count(*) from positions")
+    assert db_cur.fetchone()[0] == 3
+    assert redis_connection.xlen(MODIFIED_FIELDS_TOPIC) == 3
+
+
+def test_all_requests_failing(redis_connection):
+    errors = write_concurrently(
+        [
+            get_request({"type": "update", "fqid": "a/1", "fields": {"f": 1}}),
+        ]
+    )
+
+    assert errors[0] is not None
+    assert_no_model("a/1")
+    assert redis_connection.xlen(MODIFIED_FIELDS_TOPIC) == 0
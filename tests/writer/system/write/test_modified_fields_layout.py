@@ -0,0 +1,69 @@
+import pytest
+
+from datastore.shared.di import injector
+from datastore.shared.services import EnvironmentService
+from datastore.writer.flask_frontend.routes import WRITE_URL
+from datastore.writer.postgresql_backend.modified_fields_layout import (
+    MODIFIED_FIELDS_LAYOUT,
+    MODIFIED_FIELDS_LAYOUT_ENVIRONMENT_VAR,
+)
+from datastore.writer.postgresql_backend.sql_database_backend_service import (
+    COPY_THRESHOLD_ENVIRONMENT_VAR,
+)
+from tests.util import assert_response_code
+from tests.writer.system.util import assert_model
+
+
+@pytest.fixture(autouse=True, params=["0", "1"], ids=["values", "copy"])
+def setup_array_layout(request, setup_di):
+    environment = injector.get(EnvironmentService)
+    environment.set(
+        MODIFIED_FIELDS_LAYOUT_ENVIRONMENT_VAR, MODIFIED_FIELDS_LAYOUT.ARRAY
+    )
+    environment.set(COPY_THRESHOLD_ENVIRONMENT_VAR, request.param)
+
+
+def write(json_client, *events):
+    response = json_client.post(
+        WRITE_URL,
+        {
+            "user_id": 1,
+            "information": {},
+            "locked_fields": {},
+            "events": list(events),
+        },
+    )
+    assert_response_code(response, 201)
+
+
+def test_array_layout(json_client, db_cur):
+    write(
+        json_client,
+        {"type": "create", "fqid": "a/1", "fields": {"f": 1, "g": [1]}},
+        {"type": "create", "fqid": "a/2", "fields": {"f": 2}},
+    )
+    write(
+        json_client,
+        {"type": "update", "fqid": "a/1", "fields": {"f": None}},
+        {"type": "update", "fqid": "a/1", "list_fields": {"add": {"g": [2]}}},
+        {"type": "delete", "fqid": "a/2"},
+    )
+
+    assert_model("a/1", {"g": [1, 2]}, 2)
+    db_cur.execute("select position, fqid, modified_fields from events order by id")
+    assert [(p, fqid, sorted(fields)) for p, fqid, fields in db_cur.fetchall()] == [
+        (1, "a/1", ["f", "g", "meta_deleted"]),
+        (1, "a/2", ["f", "meta_deleted"]),
+        (2, "a/1", ["f"]),
+        (2, "a/1", ["g"]),
+        (2, "a/2", ["f", "meta_deleted", "meta_position"]),
+    ]
+    db_cur.execute("select count(*) from events_to_collectionfields")
+    assert db_cur.fetchone()[0] == 0
+    db_cur.execute("select collectionfield, position from collectionfields")
+    assert sorted(db_cur.fetchall()) == [
+        ("a/f", 2),
+        ("a/g", 2),
+        ("a/meta_deleted", 2),
+        ("a/meta_position", 2),
+    ]
@@ -2,12 +2,34 @@ import copy
 
 import pytest
 
+from datastore.shared.di import injector
 from datastore.shared.flask_frontend import ERROR_CODES
+from datastore.shared.services import EnvironmentService
 from datastore.writer.flask_frontend.routes import WRITE_URL
+from datastore.writer.postgresql_backend import RecentChanges
+from datastore.writer.postgresql_backend.modified_fields_layout import (
+    MODIFIED_FIELDS_LAYOUT,
+    MODIFIED_FIELDS_LAYOUT_ENVIRONMENT_VAR,
+)
 from tests.util import assert_error_response, assert_response_code
 from tests.writer.system.util import assert_model, assert_no_model
 
 
+@pytest.fixture(autouse=True, params=[True, False], ids=["recent_changes", "database"])
+def setup_recent_changes(request, setup_di):
+    if not request.param:
+        injector.get(RecentChanges).size = 0
+
+
+@pytest.fixture(
+    autouse=True, params=[MODIFIED_FIELDS_LAYOUT.TABLE, MODIFIED_FIELDS_LAYOUT.ARRAY]
+)
+def setup_modified_fields_layout(request, setup_di):
+    injector.get(EnvironmentService).set(
+        MODIFIED_FIELDS_LAYOUT_ENVIRONMENT_VAR, request.param
+    )
+
+
 @pytest.fixture()
 def data():
     yield copy.deepcopy(
@@ -76,6 +98,18 @@ def test_lock_fqid_not_ok(json_client, data):
     assert_no_model("a/2")
 
 
+def test_lock_fqid_not_ok_unknown_position(json_client, data):
+    create_and_update_model(json_client, "a/1", {"f1": 1}, {"f2": 2})
+    # simulate that the positions were written by another process
+    injector.get(RecentChanges).clear()
+    data["locked_fields"]["a/1"] = 1
+
+    response = json_client.post(WRITE_URL, data)
+    assert_error_response(response, ERROR_CODES.MODEL_LOCKED)
+    assert response.json["error"]["keys"] == ["a/1"]
+    assert_no_model("a/2")
+
+
 # FQFields
 
 
@@ -115,6 +149,31 @@ def test_lock_fqfield_not_ok(json_client, data):
     assert_no_model("a/2")
 
 
+def test_lock_fqfields_with_different_positions(json_client, data):
+    create_and_update_model(json_client, "a/1", {"f1": 1}, {"f2": 2})
+    # f1 was not modified after position 1, but f2 was
+    data["locked_fields"]["a/1/f1"] = 1
+    data["locked_fields"]["a/1/f2"] = 1
+    data["locked_fields"]["a/1/f3"] = 2
+
+    response = json_client.post(WRITE_URL, data)
+    assert_error_response(response, ERROR_CODES.MODEL_LOCKED)
+    assert response.json["error"]["keys"] == ["a/1/f2"]
+    assert_no_model("a/2")
+
+
+def test_lock_many_fqfields(json_client, data):
+    create_and_update_model(json_client, "a/1", {"f1": 1}, {"f2": 2})
+    for i in range(1, 1001):
+        data["locked_fields"][f"a/{i}/f1"] = 2
+    data["locked_fields"]["b/1"] = 2
+    data["locked_fields"]["b/f"] = 2
+
+    response = json_client.post(WRITE_URL, data)
+    assert_response_code(response, 201)
+    assert_model("a/2", {}, 3)
+
+
 # Collectionfields
 
 
@@ -0,0 +1,75 @@
+import copy
+
+import pytest
+
+from datastore.shared.di import injector
+from datastore.shared.postgresql_backend import ConnectionHandler
+from datastore.shared.services import EnvironmentService, ReadDatabase
+from datastore.writer.flask_frontend.routes import WRITE_URL
+from datastore.writer.postgresql_backend.sql_database_backend_service import (
+    COPY_THRESHOLD_ENVIRONMENT_VAR,
+    SNAPSHOT_INTERVAL_ENVIRONMENT_VAR,
+)
+from tests.util import assert_response_code
+
+
+@pytest.fixture()
+def data():
+    yield copy.deepcopy(
+        {
+            "user_id": 1,
+            "information": {},
+            "locked_fields": {},
+            "events": [{"type": "create", "fqid": "a/1", "fields": {"f": 0}}],
+        }
+    )
+
+
+def get_snapshots(db_cur):
+    db_cur.execute("select fqid, position, data, deleted from model_snapshots")
+    return db_cur.fetchall()
+
+
+def test_no_snapshots(json_client, data, db_cur):
+    for i in range(1, 4):
+        response = json_client.post(WRITE_URL, data)
+        assert_response_code(response, 201)
+        data["events"] = [{"type": "update", "fqid": "a/1", "fields": {"f": i}}]
+
+    assert get_snapshots(db_cur) == []
+    db_cur.execute("select events_since_snapshot from models")
+    assert db_cur.fetchall() == [(0,)]
+
+
+@pytest.mark.parametrize("copy_threshold", ["0", "1"])
+def test_snapshot_interval(json_client, data, db_cur, copy_threshold):
+    injector.get(EnvironmentService).set(COPY_THRESHOLD_ENVIRONMENT_VAR, copy_threshold)
+    injector.get(EnvironmentService).set(SNAPSHOT_INTERVAL_ENVIRONMENT_VAR, "2")
+    data["events"].append({"type": "create", "fqid": "a/2", "fields": {}})
+    for i in range(1, 6):
+        response = json_client.post(WRITE_URL, data)
+        assert_response_code(response, 201)
+        data["events"] = [{"type": "update", "fqid": "a/1", "fields": {"f": i}}]
+    data["events"] = [{"type": "delete", "fqid": "a/1"}]
+    response = json_client.post(WRITE_URL, data)
+    assert_response_code(response, 201)
+
+    assert sorted(get_snapshots(db_cur)) == [
+        ("a/1", 2, {"f": 1, "meta_deleted": False, "meta_position": 2}, False),
+        ("a/1", 4, {"f": 3, "meta_deleted": False, "meta_position": 4}, False),
+        ("a/1", 6, {"f": 4, "meta_deleted": True, "meta_position": 6}, True),
+    ]
+
+    connection_handler = injector.get(ConnectionHandler)
+    with connection_handler.get_connection_context():
+        read_db = injector.get(ReadDatabase)
+        assert read_db.build_model_ignore_deleted("a/1", 3) == {
+            "f": 2,
+            "meta_deleted": False,
+            "meta_position": 3,
+        }
+        assert read_db.get_deleted_status(["a/1", "a/2"], 5) == {
+            "a/1": False,
+            "a/2": False,
+        }
+        assert read_db.get_deleted_status(["a/1"], 6) == {"a/1": True}
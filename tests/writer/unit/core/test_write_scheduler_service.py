@@ -0,0 +1,222 @@
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from datastore.shared.di import injector
+from datastore.shared.services import EnvironmentService
+from datastore.shared.util import InvalidFormat
+from datastore.writer.core import (
+    RequestCreateEvent,
+    RequestDeleteEvent,
+    RequestUpdateEvent,
+    WriteRequest,
+    WriteScheduler,
+)
+from datastore.writer.core.write_scheduler_service import (
+    LOCKING_MODE,
+    WRITER_LOCKING_ENVIRONMENT_VAR,
+    WriteSchedulerService,
+)
+from tests import reset_di  # noqa
+
+
+@pytest.fixture(autouse=True)
+def provide_di(reset_di):  # noqa
+    injector.register(EnvironmentService, EnvironmentService)
+    injector.get(EnvironmentService).set(
+        WRITER_LOCKING_ENVIRONMENT_VAR, LOCKING_MODE.FINE_GRAINED
+    )
+    yield
+
+
+@pytest.fixture()
+def scheduler(provide_di) -> WriteSchedulerService:
+    injector.register(WriteScheduler, WriteSchedulerService)
+    yield injector.get(WriteScheduler)
+
+
+def get_write_request(*events, locked_fields={}):
+    return WriteRequest(list(events), {}, 1, locked_fields)
+
+
+def test_invalid_mode(provide_di):
+    injector.get(EnvironmentService).set(WRITER_LOCKING_ENVIRONMENT_VAR, "invalid")
+    with pytest.raises(InvalidFormat):
+        injector.register(WriteScheduler, WriteSchedulerService)
+
+
+def test_global_mode(provide_di):
+    injector.get(EnvironmentService).set(WRITER_LOCKING_ENVIRONMENT_VAR, "")
+    injector.register(WriteScheduler, WriteSchedulerService)
+    scheduler = injector.get(WriteScheduler)
+
+    write = scheduler.get_scheduled_write([MagicMock()])
+    assert write.exclusive
+
+
+def test_exclusive_writes(scheduler):
+    write_request = get_write_request(RequestDeleteEvent("a/1"))
+    assert scheduler.get_scheduled_write([write_request, write_request]).exclusive
+    write_request.migration_index = 1
+    assert scheduler.get_scheduled_write([write_request]).exclusive
+
+
+def test_keys(scheduler):
+    write_request = get_write_request(
+        RequestCreateEvent("a/1", {"f": 1}),
+        RequestUpdateEvent("b/1", {"f": 1}, {"add": {"g": [1]}, "remove": {"h": [1]}}),
+        RequestDeleteEvent("c/1"),
+        locked_fields={"d/1": 1, "e/1/f": 1, "f/f": 1},
+    )
+
+    write = scheduler.get_scheduled_write([write_request])
+
+    assert not write.exclusive
+    assert write.keys == {
+        "a/1",
+        "a/f",
+        "a/meta_deleted",
+        "b/1",
+        "b/f",
+        "b/g",
+        "b/h",
+        "c/1",
+        "d/1",
+        "e/1",
+        "f/f",
+    }
+    assert write.collections == {"c"}
+
+
+@pytest.mark.parametrize(
+    "event,conflicts",
+    [
+        (RequestUpdateEvent("a/1", {"g": 1}), True),
+        (RequestUpdateEvent("a/2", {"f": 1}), True),
+        (RequestUpdateEvent("a/2", {"g": 1}), False),
+        (RequestCreateEvent("a/2", {"g": 1}), False),
+        (RequestDeleteEvent("a/2"), True),
+        (RequestDeleteEvent("b/1"), False),
+    ],
+)
+def test_conflicts(scheduler, event, conflicts):
+    write = scheduler.get_scheduled_write(
+        [get_write_request(RequestUpdateEvent("a/1", {"f": 1}))]
+    )
+    other = scheduler.get_scheduled_write([get_write_request(event)])
+
+    assert write.conflicts_with(other) == conflicts
+    assert other.conflicts_with(write) == conflicts
+
+
+def start_in_thread(scheduler, write_request, position=None):
+    started = threading.Event()
+    finish = threading.Event()
+
+    def run():
+        scheduler.start([write_request])
+        started.set()
+        if position:
+            scheduler.register_position(position)
+            scheduler.wait_for_previous_positions()
+        finish.wait()
+        scheduler.finish()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, started, finish
+
+
+def test_concurrent_writes(scheduler):
+    thread1, started1, finish1 = start_in_thread(
+        scheduler, get_write_request(RequestUpdateEvent("a/1", {"f": 1}))
+    )
+    assert started1.wait(1)
+    thread2, started2, finish2 = start_in_thread(
+        scheduler, get_write_request(RequestUpdateEvent("a/2", {"g": 1}))
+    )
+    assert started2.wait(1)
+
+    finish1.set()
+    finish2.set()
+    thread1.join(1)
+    thread2.join(1)
+    assert not scheduler.writes
+
+
+def test_conflicting_writes(scheduler):
+    thread1, started1, finish1 = start_in_thread(
+        scheduler, get_write_request(RequestUpdateEvent("a/1", {"f": 1}))
+    )
+    assert started1.wait(1)
+    thread2, started2, finish2 = start_in_thread(
+        scheduler, get_write_request(RequestUpdateEvent("a/2", {"f": 1, "g": 1}))
+    )
+    # the third write only conflicts with the waiting second one, but must not
+    # overtake it
+    thread3, started3, finish3 = start_in_thread(
+        scheduler, get_write_request(RequestUpdateEvent("a/3", {"g": 1}))
+    )
+    assert not started2.wait(0.1)
+
+    finish1.set()
+    assert started2.wait(1)
+    assert not started3.is_set()
+    finish2.set()
+    assert started3.wait(1)
+    finish3.set()
+    for thread in (thread1, thread2, thread3):
+        thread.join(1)
+    assert not scheduler.writes
+
+
+def test_wait_for_previous_positions(scheduler):
+    thread1, started1, finish1 = start_in_thread(
+        scheduler, get_write_request(RequestUpdateEvent("a/1", {"f": 1}))
+    )
+    assert started1.wait(1)
+    registered = threading.Event()
+
+    def run():
+        scheduler.start([get_write_request(RequestUpdateEvent("b/1", {"f": 1}))])
+        scheduler.register_position(2)
+        scheduler.wait_for_previous_positions()
+        registered.set()
+        scheduler.finish()
+
+    thread2 = threading.Thread(target=run)
+    thread2.start()
+    # the first write has not registered a position yet
+    assert not registered.wait(0.1)
+
+    scheduler.writes[0].position = 1
+    with scheduler.condition:
+        scheduler.condition.notify_all()
+    assert not registered.wait(0.1)
+
+    finish1.set()
+    assert registered.wait(1)
+    thread1.join(1)
+    thread2.join(1)
+
+
+def test_wait_for_higher_position(scheduler):
+    thread1, started1, finish1 = start_in_thread(
+        scheduler, get_write_request(RequestUpdateEvent("a/1", {"f": 1})), 2
+    )
+    assert started1.wait(1)
+
+    scheduler.start([get_write_request(RequestUpdateEvent("b/1", {"f": 1}))])
+    scheduler.register_position(1)
+    scheduler.wait_for_previous_positions()
+    scheduler.finish()
+
+    finish1.set()
+    thread1.join(1)
+    assert not thread1.is_alive()
+
+
+def test_finish_without_start(scheduler):
+    scheduler.finish()
+    assert not scheduler.writes
@@ -6,6 +6,7 @@ import pytest
 
 from datastore.shared.di import injector
 from datastore.shared.services import EnvironmentService, ReadDatabase
+from datastore.shared.util import ModelLocked
 from datastore.writer.core import (
     Database,
     Messaging,
@@ -14,8 +15,13 @@ from datastore.writer.core import (
     RequestDeleteEvent,
     Writer,
     WriteRequest,
+    WriteScheduler,
+)
+from datastore.writer.core.write_scheduler_service import WriteSchedulerService
+from datastore.writer.core.writer_service import (
+    GROUP_COMMIT_WINDOW_ENVIRONMENT_VAR,
+    WriterService,
 )
-from datastore.writer.core.writer_service import WriterService
 from tests import reset_di  # noqa
 
 
@@ -25,8 +31,9 @@ def provide_di(reset_di):  # noqa
     injector.register_as_singleton(OccLocker, lambda: MagicMock(unsafe=True))
     injector.register_as_singleton(Messaging, MagicMock)
     injector.register_as_singleton(ReadDatabase, MagicMock)
-    injector.register(Writer, WriterService)
     injector.register(EnvironmentService, EnvironmentService)
+    injector.register(WriteScheduler, WriteSchedulerService)
+    injector.register(Writer, WriterService)
     yield
 
 
@@ -95,10 +102,11 @@ def test_writer_delete_history_information(writer, database):
     database.delete_history_information.assert_called()
 
 
-def test_writer_truncate_db(writer, database):
+def test_writer_truncate_db(writer, database, messaging):
     writer.truncate_db()
     database.get_context.assert_called()
     database.truncate_db.assert_called()
+    messaging.handle_reset.assert_called_once()
 
 
 def test_writer_single_thread(writer):
@@ -134,3 +142,51 @@ def test_writer_single_thread(writer):
     thread2.join(0.10)
     assert not thread1.is_alive()
     assert not thread2.is_alive()
+
+
+def test_write_grouped(writer, database, occ_locker, messaging):
+    injector.get(EnvironmentService).set(GROUP_COMMIT_WINDOW_ENVIRONMENT_VAR, "50")
+    positions = iter(range(1, 4))
+    database.insert_events = lambda *args: (next(positions), {"a/1": {"f": 1}})
+    database.get_savepoint_context = MagicMock()
+    locked_request = WriteRequest([RequestCreateEvent("a/1", {})], {}, 1, {"a/1": 1})
+
+    def assert_locked_fields(write_request):
+        if write_request is locked_request:
+            raise ModelLocked(["a/1"])
+
+    occ_locker.assert_locked_fields = assert_locked_fields
+    requests = [
+        WriteRequest([RequestCreateEvent("a/1", {})], {}, 1, {}),
+        locked_request,
+        WriteRequest([RequestCreateEvent("a/1", {})], {}, 1, {}),
+    ]
+    errors = []
+
+    def write(write_request):
+        try:
+            injector.get(Writer).write([write_request])
+        except ModelLocked as e:
+            errors.append(e)
+
+    threads = [Thread(target=write, args=(request,)) for request in requests]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 1
+    database.get_context.assert_called_once()
+    assert database.get_savepoint_context.call_count == 3
+    messaging.handle_events.assert_called_once()
+    assert list(messaging.handle_events.call_args.args[0].keys()) == [1, 2]
+
+
+def test_write_grouped_database_error(writer, database, messaging):
+    injector.get(EnvironmentService).set(GROUP_COMMIT_WINDOW_ENVIRONMENT_VAR, "1")
+    database.get_context.side_effect = RuntimeError()
+
+    with pytest.raises(RuntimeError):
+        writer.write([WriteRequest([RequestCreateEvent("a/1", {})], {}, 1, {})])
+
+    messaging.handle_events.assert_not_called()
@@ -0,0 +1,68 @@
+import pytest
+
+from datastore.shared.di import injector
+from datastore.shared.services import EnvironmentService
+from datastore.writer.postgresql_backend.recent_changes import (
+    MAX_FQFIELDS_PER_POSITION,
+    RECENT_CHANGES_SIZE_ENVIRONMENT_VAR,
+    RecentChange,
+    RecentChanges,
+    RecentChangesService,
+)
+from tests import reset_di  # noqa
+
+
+@pytest.fixture(autouse=True)
+def provide_di(reset_di):  # noqa
+    injector.register(EnvironmentService, EnvironmentService)
+    injector.get(EnvironmentService).set(RECENT_CHANGES_SIZE_ENVIRONMENT_VAR, "2")
+    yield
+
+
+@pytest.fixture()
+def recent_changes(provide_di):
+    injector.register(RecentChanges, RecentChangesService)
+    yield injector.get(RecentChanges)
+
+
+def test_add(recent_changes):
+    assert recent_changes.is_empty()
+    recent_changes.add(1, 3, {"a/1": {"f": 1, "g": None}, "b/1": {}})
+
+    assert not recent_changes.is_empty()
+    assert recent_changes.get(1) == RecentChange(
+        3, {"a/1", "b/1"}, {"a/1/f", "a/1/g"}, {"a/f", "a/g"}
+    )
+    assert recent_changes.get(2) is None
+
+
+def test_evict_oldest(recent_changes):
+    for position in (1, 2, 3):
+        recent_changes.add(position, 1, {"a/1": {"f": 1}})
+
+    assert recent_changes.get(1) is None
+    assert recent_changes.get(2)
+    assert recent_changes.get(3)
+
+
+def test_too_many_fqfields(recent_changes):
+    recent_changes.add(
+        1, 1, {"a/1": {f"f{i}": i for i in range(MAX_FQFIELDS_PER_POSITION + 1)}}
+    )
+    assert recent_changes.is_empty()
+
+
+def test_disabled(provide_di):
+    injector.get(EnvironmentService).set(RECENT_CHANGES_SIZE_ENVIRONMENT_VAR, "0")
+    injector.register(RecentChanges, RecentChangesService)
+    recent_changes = injector.get(RecentChanges)
+
+    assert recent_changes.get_size() == 0
+    recent_changes.add(1, 1, {"a/1": {"f": 1}})
+    assert recent_changes.is_empty()
+
+
+def test_clear(recent_changes):
+    recent_changes.add(1, 1, {"a/1": {"f": 1}})
+    recent_changes.clear()
+    assert recent_changes.is_empty()
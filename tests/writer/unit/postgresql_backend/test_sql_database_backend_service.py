@@ -4,7 +4,7 @@ import pytest
 
 from datastore.shared.di import injector
 from datastore.shared.postgresql_backend import ALL_TABLES, ConnectionHandler
-from datastore.shared.services import ReadDatabase
+from datastore.shared.services import EnvironmentService, ReadDatabase
 from datastore.shared.util import (
     META_DELETED,
     META_POSITION,
@@ -22,10 +22,20 @@ from datastore.writer.postgresql_backend import (
     EventTranslator,
     SqlDatabaseBackendService,
 )
+from datastore.writer.postgresql_backend.modified_fields_layout import (
+    MODIFIED_FIELDS_LAYOUT,
+    MODIFIED_FIELDS_LAYOUT_ENVIRONMENT_VAR,
+)
+from datastore.writer.postgresql_backend.recent_changes import (
+    RecentChanges,
+    RecentChangesService,
+)
 from datastore.writer.postgresql_backend.sql_database_backend_service import (
     COLLECTION_MAX_LEN,
     COLLECTIONFIELD_MAX_LEN,
+    COPY_THRESHOLD_ENVIRONMENT_VAR,
     FQID_MAX_LEN,
+    SNAPSHOT_INTERVAL_ENVIRONMENT_VAR,
 )
 from tests import reset_di  # noqa
 
@@ -35,6 +45,8 @@ def provide_di(reset_di):  # noqa
     injector.register_as_singleton(ConnectionHandler, MagicMock)
     injector.register_as_singleton(ReadDatabase, MagicMock)
     injector.register_as_singleton(EventTranslator, MagicMock)
+    injector.register(EnvironmentService, EnvironmentService)
+    injector.register(RecentChanges, RecentChangesService)
     injector.register(Database, SqlDatabaseBackendService)
     yield
 
@@ -69,6 +81,19 @@ def test_get_context(sql_backend, connection):
     assert sql_backend.get_context() == "my_return_value"
 
 
+def test_get_savepoint_context(sql_backend, connection):
+    with sql_backend.get_savepoint_context():
+        connection.execute.assert_called_once_with("savepoint write_request", [])
+    connection.execute.assert_called_with("release savepoint write_request", [])
+
+
+def test_get_savepoint_context_error(sql_backend, connection):
+    with pytest.raises(InvalidFormat):
+        with sql_backend.get_savepoint_context():
+            raise InvalidFormat("")
+    connection.execute.assert_called_with("rollback to savepoint write_request", [])
+
+
 def test_json(sql_backend, connection):
     connection.to_json = tj = MagicMock(return_value="my_return_value")
 
@@ -112,6 +137,72 @@ class TestInsertEvents:
         gmf1.assert_called()
         gmf2.assert_called()
 
+    @pytest.mark.parametrize(
+        "layout", [MODIFIED_FIELDS_LAYOUT.TABLE, MODIFIED_FIELDS_LAYOUT.ARRAY]
+    )
+    def test_modified_fields_layout(self, sql_backend, event_translator, layout):
+        injector.get(EnvironmentService).set(
+            MODIFIED_FIELDS_LAYOUT_ENVIRONMENT_VAR, layout
+        )
+        sql_backend.create_position = MagicMock(return_value=1)
+        sql_backend.apply_event_to_models = MagicMock()
+        sql_backend.write_events = we = MagicMock(return_value=[1])
+        sql_backend.connect_events_and_collection_fields = cecf = MagicMock()
+        event_translator.translate = MagicMock(side_effect=lambda x, _: [x])
+        event = MagicMock()
+        event.fqid = "a/1"
+        event.get_modified_fields = MagicMock(return_value={"f": 1, "g": 2})
+
+        sql_backend.insert_events([event], 1, {}, 1)
+
+        modified_fields = we.call_args.args[0][0][-1]
+        if layout == MODIFIED_FIELDS_LAYOUT.ARRAY:
+            assert modified_fields == ["f", "g"]
+            cecf.assert_not_called()
+        else:
+            assert modified_fields is None
+            cecf.assert_called_once()
+
+
+def test_invalid_modified_fields_layout(sql_backend):
+    injector.get(EnvironmentService).set(
+        MODIFIED_FIELDS_LAYOUT_ENVIRONMENT_VAR, "invalid"
+    )
+    with pytest.raises(InvalidFormat):
+        sql_backend.use_modified_fields_array()
+
+
+@pytest.mark.parametrize(
+    "threshold,event_count,expected",
+    [("", 9999, False), ("", 10000, True), ("2", 2, True), ("0", 10000, False)],
+)
+def test_use_copy(sql_backend, threshold, event_count, expected):
+    injector.get(EnvironmentService).set(COPY_THRESHOLD_ENVIRONMENT_VAR, threshold)
+    assert sql_backend.use_copy(event_count) == expected
+
+
+def test_copy_model_updates(sql_backend, connection):
+    models = {"a/1": {"f": 1, META_DELETED: False}}
+    connection.to_json = lambda x: x
+
+    connection.query.return_value = [{"fqid": "a/1", "events_since_snapshot": 3}]
+
+    assert sql_backend.copy_model_updates(models, {"a/1": 2}) == {"a/1": 3}
+
+    table, columns, rows = connection.copy_from.call_args.args
+    assert table == "models_copy"
+    assert list(rows) == [("a/1", models["a/1"], False, 2)]
+    assert "from models_copy" in connection.query.call_args.args[0]
+
+
+def test_copy_events_to_collectionfields(sql_backend, connection):
+    sql_backend.copy_events_to_collectionfields(3, [7, 8], [[0, 1], [1]])
+
+    table, columns, rows = connection.copy_from.call_args.args
+    assert table == "events_to_collectionfields_copy"
+    assert list(rows) == [(1, 7), (2, 7), (2, 8)]
+    assert connection.execute.call_args.args[1] == [3]
+
 
 def test_create_position(sql_backend, connection):
     sql_backend.json = json = MagicMock(side_effect=lambda data: data)
@@ -231,22 +322,52 @@ class TestApplyEventToModels:
 
 
 def test_write_model_updates(sql_backend, connection):
-    connection.execute = execute = MagicMock()
+    connection.query = query = MagicMock(
+        return_value=[
+            {"fqid": "a/1", "events_since_snapshot": 1},
+            {"fqid": "a/2", "events_since_snapshot": 5},
+        ]
+    )
     sql_backend.json = MagicMock(side_effect=lambda data: data)
 
-    sql_backend.write_model_updates(
+    events_since_snapshot = sql_backend.write_model_updates(
         {
             "a/1": {"f": 1, META_DELETED: False},
             "a/2": {"f": 1, META_DELETED: True},
-        }
+        },
+        {"a/1": 1, "a/2": 2},
     )
 
-    execute.assert_called_once()
-    assert execute.call_args.args[0].startswith("insert into models (")
-    assert execute.call_args.args[1] == [
-        ("a/1", {"f": 1, META_DELETED: False}, False),
-        ("a/2", {"f": 1, META_DELETED: True}, True),
+    query.assert_called_once()
+    assert query.call_args.args[0].startswith("insert into models (")
+    assert query.call_args.args[1] == [
+        ("a/1", {"f": 1, META_DELETED: False}, False, 1),
+        ("a/2", {"f": 1, META_DELETED: True}, True, 2),
     ]
+    assert events_since_snapshot == {"a/1": 1, "a/2": 5}
+
+
+def test_write_model_snapshots(sql_backend, connection):
+    injector.get(EnvironmentService).set(SNAPSHOT_INTERVAL_ENVIRONMENT_VAR, "3")
+    connection.execute = execute = MagicMock()
+    sql_backend.json = MagicMock(side_effect=lambda data: data)
+    models = {
+        "a/1": {"f": 1, META_DELETED: False, META_POSITION: 4},
+        "a/2": {"f": 1, META_DELETED: True, META_POSITION: 4},
+    }
+
+    sql_backend.write_model_snapshots(models, {"a/1": 2, "a/2": 3})
+
+    execute.assert_called_once()
+    assert execute.call_args.args[1] == [("a/2", 4, models["a/2"], True)]
+
+
+def test_write_model_snapshots_disabled(sql_backend, connection):
+    connection.execute = execute = MagicMock()
+
+    sql_backend.write_model_snapshots({"a/1": {}}, {"a/1": 100})
+
+    execute.assert_not_called()
 
 
 def test_update_id_sequences(sql_backend, connection):
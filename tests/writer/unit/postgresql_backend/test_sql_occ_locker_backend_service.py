@@ -3,21 +3,36 @@ from unittest.mock import MagicMock
 import pytest
 
 from datastore.shared.di import injector
-from datastore.shared.postgresql_backend import ConnectionHandler, SqlQueryHelper
+from datastore.shared.postgresql_backend import (
+    ConnectionHandler,
+    FilterIndexRegistry,
+    SqlQueryHelper,
+)
 from datastore.shared.postgresql_backend.sql_read_database_backend_service import (
     SqlReadDatabaseBackendService,
 )
-from datastore.shared.services import ReadDatabase
+from datastore.shared.services import EnvironmentService, ReadDatabase
 from datastore.shared.services.shutdown_service import ShutdownService
-from datastore.shared.util import KEYSEPARATOR, ModelLocked
-from datastore.writer.core import OccLocker
+from datastore.shared.util import FilterOperator, ModelLocked
+from datastore.writer.core import CollectionFieldLockWithFilter, OccLocker
 from datastore.writer.postgresql_backend import SqlOccLockerBackendService
+from datastore.writer.postgresql_backend.modified_fields_layout import (
+    MODIFIED_FIELDS_LAYOUT,
+    MODIFIED_FIELDS_LAYOUT_ENVIRONMENT_VAR,
+)
+from datastore.writer.postgresql_backend.recent_changes import (
+    RecentChanges,
+    RecentChangesService,
+)
 from tests import reset_di  # noqa
 
 
 @pytest.fixture(autouse=True)
 def provide_di(reset_di):  # noqa
+    injector.register(EnvironmentService, EnvironmentService)
+    injector.register(RecentChanges, RecentChangesService)
     injector.register_as_singleton(ConnectionHandler, MagicMock)
+    injector.register(FilterIndexRegistry, FilterIndexRegistry)
     injector.register(SqlQueryHelper, SqlQueryHelper)
     injector.register(ReadDatabase, SqlReadDatabaseBackendService)
     injector.register(OccLocker, SqlOccLockerBackendService)
@@ -38,17 +53,15 @@ def connection(provide_di):
 @pytest.fixture()
 def mock_write_request(provide_di):
     write_request = MagicMock()
-    write_request.locked_fqids = None
-    write_request.locked_fqfields = None
-    write_request.locked_collectionfields = None
+    write_request.locked_fqids = {}
+    write_request.locked_fqfields = {}
+    write_request.locked_collectionfields = {}
     yield write_request
 
 
-def test_no_data(occ_locker, mock_write_request):
+def test_no_data(occ_locker, connection, mock_write_request):
     occ_locker.assert_locked_fields(mock_write_request)
-    assert occ_locker.get_locked_fqids({}) == []
-    assert occ_locker.get_locked_fqfields({}) == []
-    assert occ_locker.get_locked_collectionfields({}) == []
+    connection.query_list_of_single_values.assert_not_called()
 
 
 def test_raise_model_locked_fqid(occ_locker, connection, mock_write_request):
@@ -97,9 +110,9 @@ def test_raise_model_locked_multiple_reduced_to_one(
 def test_raise_model_locked_multiple_different(
     occ_locker, connection, mock_write_request
 ):
-    connection.query_list_of_single_values = lambda query, args: [
-        args[2] if len(args) > 2 else args[0]
-    ]
+    connection.query_list_of_single_values = MagicMock(
+        return_value=["a/f", "a/1", "a/f"]
+    )
     mock_write_request.locked_fqids = {"a/1": 2}
     mock_write_request.locked_fqfields = {"a/1/f": 2}
     mock_write_request.locked_collectionfields = {"a/f": 2}
@@ -108,67 +121,240 @@ def test_raise_model_locked_multiple_different(
     assert set(e.value.keys) == {"a/f", "a/1"}
 
 
-def test_query_arguments_fqid(occ_locker, connection):
-    connection.query_list_of_single_values = qsv = MagicMock(return_value=None)
-
-    occ_locker.get_locked_fqids({"a/1": 2, "b/3": 42})
-
-    query = qsv.call_args.args[0]
-    assert query.count("(fqid=%s and position>%s)") == 2
-    args = qsv.call_args.args[1]
-    assert (args == ["a/1", 2, "b/3", 42]) or (
-        args == ["b/3", 42, "a/1", 2]
-    )  # order of arguments is not determinated
-
-
-def test_query_arguments_fqfield(occ_locker, connection):
-    connection.query_list_of_single_values = qsv = MagicMock(return_value=None)
-
-    occ_locker.get_locked_fqfields({"a/1/f": 2, "b/3/e": 42})
-
-    query = qsv.call_args.args[0]
-    assert query.count("(e.fqid=%s and e.position>%s)") == 2
-    assert query.count("(fqid=%s and collectionfield = ANY(%s))") == 2
-    args = qsv.call_args.args[1]
-    assert (
-        args
-        == [
-            KEYSEPARATOR,
-            KEYSEPARATOR,
-            "a/1",
-            2,
-            "b/3",
-            42,
-            "a/1",
-            ["a/f"],
-            "b/3",
-            ["b/e"],
-        ]
-    ) or (
-        args
-        == [
-            KEYSEPARATOR,
-            KEYSEPARATOR,
-            "b/3",
-            42,
-            "a/1",
-            2,
-            "b/3",
-            ["b/e"],
-            "a/1",
-            ["a/f"],
+def test_single_query(occ_locker, connection, mock_write_request):
+    connection.query_list_of_single_values = qsv = MagicMock(return_value=[])
+    mock_write_request.locked_fqids = {"a/1": 2}
+    mock_write_request.locked_fqfields = {"a/1/f": 2}
+    mock_write_request.locked_collectionfields = {"a/f": 2}
+
+    occ_locker.assert_locked_fields(mock_write_request)
+
+    qsv.assert_called_once()
+    query, args = qsv.call_args.args
+    assert query.count("union all") == 2
+    assert args == [
+        ["a/1"],
+        [2],
+        ["a/1/f"],
+        ["a/1"],
+        ["a/f"],
+        [2],
+        ["a/f"],
+        [2],
+    ]
+
+
+def test_query_arguments_fqid(occ_locker):
+    args = []
+    query = occ_locker.build_locked_fqids_query({"a/1": 2, "b/3": 42}, args)
+
+    assert query.count("%s") == 2
+    assert args == [["a/1", "b/3"], [2, 42]]
+
+
+def test_query_arguments_fqfield(occ_locker):
+    args = []
+    query = occ_locker.build_locked_fqfields_query({"a/1/f": 2, "b/3/e": 42}, args)
+
+    assert query.count("%s") == 4
+    assert args == [["a/1/f", "b/3/e"], ["a/1", "b/3"], ["a/f", "b/e"], [2, 42]]
+
+
+def test_query_arguments_fqfield_array_layout(occ_locker):
+    injector.get(EnvironmentService).set(
+        MODIFIED_FIELDS_LAYOUT_ENVIRONMENT_VAR, MODIFIED_FIELDS_LAYOUT.ARRAY
+    )
+    args = []
+    query = occ_locker.build_locked_fqfields_query({"a/1/f": 2, "b/3/e": 42}, args)
+
+    assert "any(e.modified_fields)" in query
+    assert "events_to_collectionfields" not in query
+    assert args == [["a/1/f", "b/3/e"], ["a/1", "b/3"], ["f", "e"], [2, 42]]
+
+
+def test_query_arguments_collectionfield(occ_locker):
+    args = []
+    query = occ_locker.build_locked_collectionfields_query({"a/f": 2, "b/e": 42}, args)
+
+    assert query.count("%s") == 2
+    assert "union all" not in query
+    assert args == [["a/f", "b/e"], [2, 42]]
+
+
+def test_query_arguments_collectionfield_with_filter(occ_locker):
+    args = []
+    query = occ_locker.build_locked_collectionfields_query(
+        {
+            "a/f": 2,
+            "b/e": [
+                CollectionFieldLockWithFilter(42, FilterOperator("f", "=", 1)),
+                CollectionFieldLockWithFilter(43, None),
+            ],
+        },
+        args,
+    )
+
+    assert query.count("union all") == 1
+    assert query.count("(e.position>%s and cf.collectionfield=%s") == 2
+    assert args == [["a/f"], [2], 42, "b/e", "f", 1, 43, "b/e"]
+
+
+def test_query_arguments_collectionfield_with_filter_array_layout(occ_locker):
+    injector.get(EnvironmentService).set(
+        MODIFIED_FIELDS_LAYOUT_ENVIRONMENT_VAR, MODIFIED_FIELDS_LAYOUT.ARRAY
+    )
+    args = []
+    query = occ_locker.build_locked_collectionfields_query(
+        {"b/e": [CollectionFieldLockWithFilter(42, None)]}, args
+    )
+
+    assert "any(e.modified_fields)" in query
+    assert "events_to_collectionfields" not in query
+    assert args == [42, ["b/e"], 42, 42, "b/e"]
+
+
+def test_query_arguments_collectionfield_with_filter_array_layout_min_position(
+    occ_locker,
+):
+    injector.get(EnvironmentService).set(
+        MODIFIED_FIELDS_LAYOUT_ENVIRONMENT_VAR, MODIFIED_FIELDS_LAYOUT.ARRAY
+    )
+    args = []
+    query = occ_locker.build_locked_collectionfields_query(
+        {
+            "a/f": 2,
+            "b/e": [
+                CollectionFieldLockWithFilter(42, None),
+                CollectionFieldLockWithFilter(40, None),
+            ],
+            "c/g": [CollectionFieldLockWithFilter(41, None)],
+        },
+        args,
+    )
+
+    assert "e.position>%s and split_part" in query
+    assert args == [
+        ["a/f"],
+        [2],
+        40,
+        ["b/e", "c/g"],
+        40,
+        42,
+        "b/e",
+        40,
+        "b/e",
+        41,
+        "c/g",
+    ]
+
+
+def test_query_arguments_collectionfield_empty_filter_list(occ_locker):
+    args = []
+    assert occ_locker.build_locked_collectionfields_query({"a/f": []}, args) == ""
+    assert args == []
+
+
+@pytest.fixture()
+def recent_changes(provide_di):
+    recent_changes = injector.get(RecentChanges)
+    recent_changes.add(3, 1, {"a/1": {"f": 1}})
+    recent_changes.add(4, 1, {"a/2": {"g": 1}})
+    yield recent_changes
+
+
+def set_positions(connection, *positions, migration_index=1):
+    connection.query = MagicMock(
+        return_value=[
+            {"position": position, "migration_index": migration_index}
+            for position in positions
         ]
-    )  # order of arguments is not determinated
+    )
+    connection.query_list_of_single_values = MagicMock(return_value=[])
+
 
+def test_recent_changes(occ_locker, connection, recent_changes, mock_write_request):
+    set_positions(connection, 4, 3)
+    mock_write_request.locked_fqids = {"a/1": 2, "a/2": 4}
+    mock_write_request.locked_fqfields = {"a/2/f": 2, "a/2/g": 3}
+    mock_write_request.locked_collectionfields = {"a/f": 3, "a/g": 2}
+
+    with pytest.raises(ModelLocked) as e:
+        occ_locker.assert_locked_fields(mock_write_request)
 
-def test_query_arguments_collectionfield(occ_locker, connection):
-    connection.query_list_of_single_values = qsv = MagicMock(return_value=None)
+    assert set(e.value.keys) == {"a/1", "a/2/g", "a/g"}
+    assert connection.query.call_args.args[1] == [2, 1001]
+    connection.query_list_of_single_values.assert_not_called()
+
+
+def test_recent_changes_not_broken(
+    occ_locker, connection, recent_changes, mock_write_request
+):
+    set_positions(connection, 4)
+    mock_write_request.locked_fqids = {"a/1": 3}
+    mock_write_request.locked_collectionfields = {"b/f": 3}
+
+    occ_locker.assert_locked_fields(mock_write_request)
+
+    connection.query_list_of_single_values.assert_not_called()
+
+
+def test_recent_changes_missing_position(
+    occ_locker, connection, recent_changes, mock_write_request
+):
+    set_positions(connection, 5, 4, 3)
+    mock_write_request.locked_fqids = {"a/1": 2, "a/2": 5}
+
+    occ_locker.assert_locked_fields(mock_write_request)
+
+    # only the lock before the unknown position 5 is checked in the database
+    assert connection.query_list_of_single_values.call_args.args[1] == [["a/1"], [2]]
+
+
+def test_recent_changes_other_migration_index(
+    occ_locker, connection, recent_changes, mock_write_request
+):
+    set_positions(connection, 4, migration_index=2)
+    mock_write_request.locked_fqids = {"a/1": 3}
 
-    occ_locker.get_locked_collectionfields({"a/f": 2, "b/e": 42})
+    occ_locker.assert_locked_fields(mock_write_request)
+
+    assert connection.query_list_of_single_values.call_args.args[1] == [["a/1"], [3]]
+
+
+def test_recent_changes_truncated(
+    occ_locker, connection, recent_changes, mock_write_request
+):
+    recent_changes.size = 1
+    set_positions(connection, 4, 3)
+    mock_write_request.locked_fqids = {"a/1": 2, "a/2": 4}
+
+    occ_locker.assert_locked_fields(mock_write_request)
+
+    assert connection.query_list_of_single_values.call_args.args[1] == [["a/1"], [2]]
+
+
+def test_recent_changes_filter_lock(
+    occ_locker, connection, recent_changes, mock_write_request
+):
+    set_positions(connection, 4, 3)
+    lock = CollectionFieldLockWithFilter(2, FilterOperator("f", "=", 1))
+    mock_write_request.locked_collectionfields = {"a/f": [lock], "b/f": [lock]}
+
+    occ_locker.assert_locked_fields(mock_write_request)
+
+    # a/f was modified, so the filter has to be checked in the database
+    assert connection.query_list_of_single_values.call_args.args[1] == [
+        2,
+        "a/f",
+        "f",
+        1,
+    ]
+
+
+def test_recent_changes_empty(occ_locker, connection, mock_write_request):
+    mock_write_request.locked_fqids = {"a/1": 2}
+    connection.query_list_of_single_values = MagicMock(return_value=[])
+
+    occ_locker.assert_locked_fields(mock_write_request)
 
-    query = qsv.call_args.args[0]
-    assert query.count("(cf.collectionfield=%s and cf.position>%s)") == 2
-    args = qsv.call_args.args[1]
-    assert (args == ["a/f", 2, "b/e", 42]) or (
-        args == ["b/e", 42, "a/f", 2]
-    )  # order of arguments is not determinated
+    connection.query.assert_not_called()